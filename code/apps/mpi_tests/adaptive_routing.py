@@ -0,0 +1,123 @@
+#
+# adaptive_routing.py :- oblivious against adaptive routing under adversarial traffic
+#
+# Hosts send a number of raw transfers (Cluster.sched_raw_xfer) each,
+# all at the same time, in a pattern that overloads the links of the
+# minimal (or dimension order) routes:
+#
+#   dragonfly: the hosts of each group send to the hosts of the next
+#              group (a simple dragonfly, all to all within groups),
+#              which minimal routing crams into the few global links
+#              between the two groups
+#   aries:     the same on an Aries dragonfly (cascade within groups)
+#   torus:     on a 3D torus, the host at (x,y,z) sends to the one at
+#              (y,z,x), whose dimension order routes pile up
+#
+# Each is simulated with the oblivious route methods and with the
+# adaptive ones (UGAL-L and UGAL-G for the dragonflies, minimal
+# adaptive for the torus; see dragonfly.py and torus.py). For each,
+# the time the last packet arrived, the packets dropped, the number of
+# events, the wall-clock time of the run, and the wall-clock time per
+# packet hop are reported. Each simulation is made in a separate
+# interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+route_methods = {
+    "dragonfly" : ("minimal", "non_minimal", "ugal_local", "ugal_global"),
+    "aries" : ("minimal", "non_minimal", "ugal_local", "ugal_global"),
+    "torus" : ("deterministic_dimension_order", "adaptive_dimension_order", "minimal_adaptive"),
+}
+
+def simulate(topo, route_method, options):
+    """Simulates the transfers; prints the results."""
+
+    modeldict = {
+        "model_name" : "adaptive_routing",
+        "sim_time" : 1e3,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "debug_options" : set(),
+    }
+    if topo == "dragonfly":
+        modeldict["intercon_type"] = "Dragonfly"
+        modeldict["dragonfly"] = dict(configs.dragonfly_intercon, route_method=route_method)
+    elif topo == "aries":
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = dict(configs.aries_intercon, route_method=route_method)
+    else:
+        modeldict["intercon_type"] = "Torus"
+        modeldict["torus"] = { "dims" : (options.dim,)*3, "attached_hosts_per_switch" : 1,
+                               "route_method" : route_method }
+    cluster = Cluster(modeldict)
+    intercon = cluster.intercon
+
+    if topo == "torus":
+        pairs = []
+        for src in xrange(cluster.num_hosts()):
+            (x, y, z), p = intercon.hid_to_coords(src)
+            dst = intercon.coords_to_hid((y, z, x), p)
+            if dst != src: pairs.append((src, dst))
+    else:
+        # the first hosts of each group send to those of the next group
+        nh = intercon.num_hosts_per_group
+        n = min(options.nsenders, nh)
+        pairs = [(g*nh+h, ((g+1)%intercon.num_groups)*nh+h)
+                 for g in xrange(intercon.num_groups) for h in xrange(n)]
+    for src, dst in pairs:
+        for m in xrange(options.nmsgs):
+            cluster.sched_raw_xfer(0, src, dst, options.sz)
+    t0 = time.time()
+    cluster.run()
+    print("RUN: %f" % (time.time()-t0))
+
+    engine = cluster.hpcsim_dict["simian"]
+    hops = dropped = 0
+    for sw in engine.entities.get("Switch", {}).itervalues():
+        for iface in sw.interfaces.itervalues():
+            hops += iface.stats_total_rcvd_pkts()
+            dropped += iface.stats_total_dropped_pkts()
+    print("LAST: %.9f" % engine.now)
+    print("HOPS: %d" % hops)
+    print("DROPPED: %d" % dropped)
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [dragonfly] [aries] [torus]")
+parser.add_option("-m", "--msgs", type="int", dest="nmsgs", default=8, help="transfers per sending host")
+parser.add_option("-s", "--size", type="int", dest="sz", default=4096, help="transfer size (bytes)")
+parser.add_option("-n", "--senders", type="int", dest="nsenders", default=100,
+                  help="sending hosts per group (dragonfly and aries)")
+parser.add_option("-d", "--dim", type="int", dest="dim", default=8, help="size of each torus dimension")
+parser.add_option("--run", dest="run", default=None, help="(internal) topology,route method of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    topo, route_method = options.run.split(",")
+    simulate(topo, route_method, options)
+    sys.exit(0)
+
+print("%-10s %-30s %16s %9s %10s %9s %10s" % ("topology", "route method", "last arrival (s)",
+      "dropped", "events", "run (s)", "us/hop"))
+for topo in args or ["dragonfly", "aries", "torus"]:
+    for route_method in route_methods[topo]:
+        cmd = [sys.executable, sys.argv[0], "--run", "%s,%s" % (topo, route_method),
+               "-m", str(options.nmsgs), "-s", str(options.sz), "-n", str(options.nsenders), "-d", str(options.dim)]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        run = field(out, "RUN")
+        if p.returncode or run is None:
+            sys.stderr.write(out)
+            sys.exit("run failed: %s" % " ".join(cmd))
+        run = float(run)
+        hops = int(field(out, "HOPS"))
+        print("%-10s %-30s %16s %9s %10s %9.3f %10.2f" % (topo, route_method, field(out, "LAST"),
+              field(out, "DROPPED"), field(out, "SIMULATED EVENTS"), run,
+              run*1e6/hops if hops else 0))
@@ -0,0 +1,169 @@
+#
+# analytic_validation.py :- the analytic interconnect against the packet model
+#
+# The bandwidth test (as in bandwidth-meter-nompi.py: pairs of ranks,
+# each sender sending a number of messages of a given size to its
+# receiver) and the allreduce test (as in allreduce-nompi.py) are
+# simulated on a Gemini torus, a fat-tree and an Aries dragonfly, once
+# with the switches of the interconnect forwarding each packet, and
+# once with the analytic interconnect of the same topology
+# (hpcsim_dict["intercon_type"] = "Analytic"), with or without
+# contention. For each run, the simulated completion time of the test,
+# the number of events and the wall-clock time are reported, together
+# with the relative difference of the completion times of the analytic
+# interconnect from the packet model. Then the time to compute the
+# matrix of latencies between a number of hosts spread over the
+# machine (Analytic.latency_matrix) is reported for each topology.
+# Each simulation is made in a separate interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+def bandwidth_app(mpi_comm_world, nmsgs, sz):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    if p%2 == 0:
+        for i in xrange(nmsgs):
+            if not mpi_send(p+1, None, sz, mpi_comm_world):
+                raise Exception("send failed at rank %d" % p)
+    else:
+        for i in xrange(nmsgs):
+            if mpi_recv(mpi_comm_world) is None:
+                raise Exception("recv failed at rank %d" % p)
+    t = mpi_reduce(0, mpi_wtime(mpi_comm_world), mpi_comm_world, op="max")
+    if p == 0: print("RESULT: %.12f" % t)
+    mpi_finalize(mpi_comm_world)
+
+def allreduce_app(mpi_comm_world, sz):
+    p = mpi_comm_rank(mpi_comm_world)
+    if mpi_allreduce(p, mpi_comm_world, sz) is None:
+        raise Exception("allreduce failed at rank %d" % p)
+    t = mpi_reduce(0, mpi_wtime(mpi_comm_world), mpi_comm_world, op="max")
+    if p == 0: print("RESULT: %.12f" % t)
+    mpi_finalize(mpi_comm_world)
+
+def make_modeldict(intercon, model):
+    modeldict = {
+        "model_name" : "analytic_validation",
+        "sim_time" : 1e9,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "lazy_entities" : True,
+        "debug_options" : set(),
+    }
+    if intercon == "torus":
+        modeldict["intercon_type"] = "Gemini"
+        modeldict["torus"] = configs.hopper_intercon
+        modeldict["mpiopt"] = configs.gemini_mpiopt
+    elif intercon == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = configs.stampede_intercon
+        modeldict["mpiopt"] = configs.infiniband_mpiopt
+    else:
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = configs.edison_intercon
+        modeldict["mpiopt"] = configs.aries_mpiopt
+    if model != "packet":
+        modeldict["analytic"] = { "topology" : modeldict["intercon_type"],
+                                  "contention" : model == "contention" }
+        modeldict["intercon_type"] = "Analytic"
+    return modeldict
+
+def simulate(test, intercon, model, options):
+    """Runs one simulation; prints the result and the wall-clock time."""
+
+    t0 = time.time()
+    cluster = Cluster(make_modeldict(intercon, model))
+
+    # the ranks are spread over the whole machine
+    total_hosts = cluster.num_hosts()
+    n = options.nranks
+    hostmap = [(i*total_hosts/n)%total_hosts for i in range(n)]
+    if test == "bandwidth":
+        # senders on one half of the machine, receivers on the other
+        hostmap = [(i/2*total_hosts/n+(i%2)*total_hosts/2)%total_hosts for i in range(n)]
+        cluster.start_mpi(hostmap, bandwidth_app, options.nmsgs, options.bwsz)
+    else:
+        cluster.start_mpi(hostmap, allreduce_app, options.arsz)
+    cluster.run()
+    print("WALL: %f" % (time.time()-t0))
+
+def latency_matrix(intercon):
+    """Computes the latency matrix; prints its size and the time."""
+
+    cluster = Cluster(make_modeldict(intercon, "analytic"))
+    total_hosts = cluster.num_hosts()
+    n = min(options.nhosts, total_hosts)
+    hosts = [i*total_hosts/n for i in range(n)]
+    t0 = time.time()
+    m = cluster.intercon.latency_matrix(options.bwsz, hosts)
+    print("WALL: %f" % (time.time()-t0))
+    print("HOSTS: %d" % len(m))
+    print("MAX: %.9f" % m.max())
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [torus] [fattree] [dragonfly]")
+parser.add_option("-n", "--ranks", type="int", dest="nranks", default=16, help="mpi ranks")
+parser.add_option("-m", "--msgs", type="int", dest="nmsgs", default=2, help="messages per sender (bandwidth test)")
+parser.add_option("-b", "--bwsize", type="int", dest="bwsz", default=50000, help="message size (bandwidth test)")
+parser.add_option("-a", "--arsize", type="int", dest="arsz", default=4000, help="data size (allreduce test)")
+parser.add_option("-L", "--hosts", type="int", dest="nhosts", default=4096, help="hosts (latency matrix)")
+parser.add_option("-t", "--tolerance", type="float", dest="tol", default=0.25, help="max relative difference of the analytic interconnect")
+parser.add_option("--run", dest="run", default=None, help="(internal) test,intercon,model of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    test, intercon, model = options.run.split(",")
+    if test == "matrix": latency_matrix(intercon)
+    else: simulate(test, intercon, model, options)
+    sys.exit(0)
+
+def run(test, intercon, model):
+    cmd = [sys.executable, sys.argv[0], "--run", "%s,%s,%s" % (test, intercon, model),
+           "-n", str(options.nranks), "-m", str(options.nmsgs),
+           "-b", str(options.bwsz), "-a", str(options.arsz), "-L", str(options.nhosts)]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    if p.returncode or field(out, "WALL") is None:
+        sys.stderr.write(out)
+        sys.exit("run failed: %s" % " ".join(cmd))
+    return out
+
+intercons = args or ["torus", "fattree", "dragonfly"]
+print("%-10s %-10s %-10s %14s %10s %9s %10s" % ("test", "intercon", "model", "time (s)", "events",
+                                              "wall (s)", "diff"))
+failed = 0
+for test in ("bandwidth", "allreduce"):
+    for intercon in intercons:
+        base = None
+        for model in ("packet", "analytic", "contention"):
+            out = run(test, intercon, model)
+            result = float(field(out, "RESULT"))
+            if base is None:
+                base = result
+                diff = ""
+            else:
+                d = (result-base)/base
+                diff = "%+.2f%%" % (d*100)
+                if abs(d) > options.tol:
+                    diff += " FAIL"
+                    failed += 1
+            print("%-10s %-10s %-10s %14.9f %10s %9.3f %10s" % (test, intercon, model, result,
+                  field(out, "SIMULATED EVENTS"), float(field(out, "WALL")), diff))
+
+print("")
+print("%-10s %8s %14s %10s" % ("intercon", "hosts", "max (s)", "wall (s)"))
+for intercon in intercons:
+    out = run("matrix", intercon, "analytic")
+    print("%-10s %8s %14s %10.3f" % (intercon, field(out, "HOSTS"), field(out, "MAX"),
+                                     float(field(out, "WALL"))))
+if failed:
+    sys.exit("%d tests differ by more than %g%%" % (failed, options.tol*100))
@@ -0,0 +1,100 @@
+#
+# arbitration_stress.py :- routing processes of switches with many ports
+#
+# Many hosts send raw transfers (Cluster.sched_raw_xfer) at about the
+# same time to a few hot hosts, so that the packets queue up at the
+# input ports of the switches on the way, which the routing process of
+# each switch then serves round robin. This is simulated on fat-trees
+# of 32-port and 64-port switches and on an Aries dragonfly (of 42-port
+# switches), with the switch processing delay given
+# (zero by default). For each, the number of events, the wall-clock
+# time of the run, the time of the last event, and a checksum of the
+# packets received by all ports of all switches (which is the same as
+# long as the switches forward the same packets the same way) are
+# reported. Each simulation is made in a separate interpreter.
+#
+
+import sys, time, random, zlib, subprocess
+from optparse import OptionParser
+
+def simulate(topo, nxfers, nhot, sz, proc_delay):
+    """Simulates the transfers; prints the results."""
+
+    modeldict = {
+        "model_name" : "arbitration_stress",
+        "sim_time" : 1.0,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "debug_options" : set(),
+    }
+    if topo == "fattree32":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = dict(configs.moonlight_intercon, proc_delay=proc_delay)
+    elif topo == "fattree64":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = dict(configs.omnipath_intercon, proc_delay=proc_delay)
+    else:
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = dict(configs.edison_intercon, proc_delay=proc_delay)
+    cluster = Cluster(modeldict)
+    nhosts = cluster.num_hosts()
+    random.seed(1)
+    hot = random.sample(xrange(nhosts), nhot)
+    for i in xrange(nxfers):
+        dst = hot[i%nhot]
+        src = random.randrange(nhosts)
+        while src == dst: src = random.randrange(nhosts)
+        cluster.sched_raw_xfer(1e-9*random.random(), src, dst, sz)
+    t0 = time.time()
+    cluster.run()
+    print("RUN: %f" % (time.time()-t0))
+
+    engine = cluster.hpcsim_dict["simian"]
+    crc = 0
+    nports = 0
+    switches = engine.entities.get("Switch", {})
+    for swid in sorted(switches):
+        sw = switches[swid]
+        nports = max(nports, sum(i.get_num_ports() for i in sw.interfaces.itervalues()))
+        for key in sorted(sw.interfaces):
+            iface = sw.interfaces[key]
+            for p in xrange(iface.get_num_ports()):
+                crc = zlib.crc32("%d %s %d %d;" % (swid, key, p, iface.stats_rcvd_pkts(p)), crc)
+    print("LAST: %.12f" % engine.now)
+    print("PORTS: %d" % nports)
+    print("CHECKSUM: %x" % (crc & 0xffffffff))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [fattree32] [fattree64] [aries]")
+parser.add_option("-x", "--xfers", type="int", dest="nxfers", default=20000, help="raw transfers")
+parser.add_option("-o", "--hot", type="int", dest="nhot", default=8, help="destination hosts")
+parser.add_option("-s", "--size", type="int", dest="sz", default=4096, help="transfer size (bytes)")
+parser.add_option("-d", "--delay", type="float", dest="proc_delay", default=0, help="switch processing delay (seconds)")
+parser.add_option("--run", dest="run", default=None, help="(internal) topology of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    simulate(options.run, options.nxfers, options.nhot, options.sz, options.proc_delay)
+    sys.exit(0)
+
+print("%-10s %6s %10s %9s %12s %16s %10s" % ("topology", "ports", "events", "run (s)",
+                                            "events/s", "last event (s)", "checksum"))
+for topo in args or ["fattree32", "fattree64", "aries"]:
+    cmd = [sys.executable, sys.argv[0], "--run", topo, "-x", str(options.nxfers),
+           "-o", str(options.nhot), "-s", str(options.sz), "-d", repr(options.proc_delay)]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    run = field(out, "RUN")
+    if p.returncode or run is None:
+        sys.stderr.write(out)
+        sys.exit("run failed: %s" % " ".join(cmd))
+    run = float(run)
+    events = int(field(out, "SIMULATED EVENTS"))
+    print("%-10s %6s %10d %9.3f %12.1f %16s %10s" % (topo, field(out, "PORTS"), events, run,
+          events/run, field(out, "LAST"), field(out, "CHECKSUM")))
@@ -0,0 +1,89 @@
+#
+# collectives_calibrate.py :- fits the cost model of the collectives
+#
+# The parameters of the LogGP model with which mpi charges the
+# collectives when mpiopt "collective_model" is "analytic" (see
+# collectives.py) are fitted to packet-level runs of an mpi_allreduce
+# (allreduce.py, or allreduce-nompi.py which runs without an mpi
+# library), for each number of ranks and each message size given, a
+# rank per host. The model has the time of an allreduce as a*(L+2o) +
+# b*G, where a and b are the messages and bytes on the critical path
+# of the algorithm the allreduce picks (with the mpiopt the
+# application uses); L+2o and G are fitted by least squares on the
+# relative errors (so that the short messages count as much as the
+# long ones), and L is what remains with the overhead o taken as the
+# call time in mpiopt.
+#
+# For each run, the simulated time of the allreduce and that of the
+# model are reported, followed by the mpiopt entries to use. Each
+# simulation is made in a separate interpreter (or under the command
+# given by --mpirun, such as "mpirun -np 4", for allreduce.py).
+#
+
+import sys, os, re, subprocess
+from optparse import OptionParser
+
+def fit(rows):
+    """Returns (alpha, G) minimizing the sum of the squared relative
+    errors of alpha*a + G*b against t, for rows of (a, b, t)."""
+
+    saa = sab = sbb = sat = sbt = 0.0
+    for a, b, t in rows:
+        w = 1.0/(t*t)
+        saa += w*a*a
+        sab += w*a*b
+        sbb += w*b*b
+        sat += w*a*t
+        sbt += w*b*t
+    det = saa*sbb-sab*sab
+    if det == 0:
+        raise Exception("too few runs to fit the model")
+    return (sat*sbb-sbt*sab)/det, (saa*sbt-sab*sat)/det
+
+parser = OptionParser(usage="%prog [options] [ranks ...]")
+parser.add_option("-a", "--app", dest="app", default="allreduce.py",
+                  help="the allreduce application (allreduce.py or allreduce-nompi.py)")
+parser.add_option("-s", "--sizes", dest="sizes", default="8,2048,16384,65536",
+                  help="message sizes (bytes, comma separated)")
+parser.add_option("-m", "--mpiopt", dest="mpiopt", default="gemini_mpiopt",
+                  help="the mpiopt of the application (in configs)")
+parser.add_option("--mpirun", dest="mpirun", default="", help="command to run the application under")
+(options, args) = parser.parse_args()
+
+from ppt import *
+import collectives
+
+mpiopt = getattr(configs, options.mpiopt)
+opts = collectives.collective_options(mpiopt)
+overhead = mpiopt.get("call_time", 0)
+app = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), options.app)
+
+print("%s with %s" % (options.app, options.mpiopt))
+print("%6s %9s %-20s %14s" % ("ranks", "size", "algorithm", "packet (us)"))
+runs = []
+for n in [int(x) for x in args or ["4", "16", "64"]]:
+    for sz in [int(x) for x in options.sizes.split(",")]:
+        cmd = options.mpirun.split()+[sys.executable, app, str(n), "1", str(sz)]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        m = re.search(r"^p=\d+ c=\d+ \d+ ([0-9.]+) \(nanosecs\)", out, re.M)
+        if p.returncode or m is None:
+            sys.stderr.write(out)
+            sys.exit("run failed: %s" % " ".join(cmd))
+        alg = collectives.choose_algorithm(opts, "allreduce", n, sz)
+        a, b = collectives.cost_terms("allreduce", alg, n, sz)
+        t = float(m.group(1))*1e-9
+        runs.append((n, sz, alg, a, b, t))
+        print("%6d %9d %-20s %14.3f" % (n, sz, alg, t*1e6))
+
+alpha, G = fit([(a, b, t) for n, sz, alg, a, b, t in runs])
+print("")
+print("%6s %9s %14s %14s %8s" % ("ranks", "size", "packet (us)", "model (us)", "error"))
+for n, sz, alg, a, b, t in runs:
+    x = a*alpha+b*G
+    print("%6d %9d %14.3f %14.3f %7.1f%%" % (n, sz, t*1e6, x*1e6, (x-t)/t*100))
+print("")
+print("    \"collective_model\" : \"analytic\",")
+print("    \"loggp_L\" : %.6g," % (alpha-2*overhead))
+print("    \"loggp_o\" : %.6g," % overhead)
+print("    \"loggp_G\" : %.6g," % G)
@@ -0,0 +1,112 @@
+#
+# collectives_sweep.py :- the algorithms of a collective over sizes
+#
+# All ranks call a collective (barrier, bcast, allreduce, allgather or
+# alltoall) a number of times in a row, with each of its algorithms
+# (see collectives.py) forced through the mpiopt dictionary, and with
+# the one picked automatically ("auto"), for each number of ranks and
+# each message size given (per rank, or per pair of ranks for
+# alltoall). The interconnect is a small 3D torus (4x4x4, a host per
+# switch) or a crossbar.
+#
+# For each run, the simulated time per call, the number of events, and
+# the wall-clock time of the run are reported (or "failed", if the
+# messages were lost for good). Each simulation is made in a separate
+# interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+algorithms = {
+    "barrier" : ("binomial", "dissemination"),
+    "bcast" : ("binomial", "scatter_allgather"),
+    "allreduce" : ("binomial", "recursive_doubling", "rabenseifner", "ring"),
+    "allgather" : ("binomial", "recursive_doubling", "bruck", "ring"),
+    "alltoall" : ("hypercube", "pairwise", "bruck"),
+}
+
+def collective_app(mpi_comm_world, coll, sz, reps):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    t0 = mpi_wtime(mpi_comm_world)
+    for i in xrange(reps):
+        if coll == "barrier": mpi_barrier(mpi_comm_world)
+        elif coll == "bcast": mpi_bcast(0, i, mpi_comm_world, sz)
+        elif coll == "allreduce": mpi_allreduce(p, mpi_comm_world, sz)
+        elif coll == "allgather": mpi_allgather(p, mpi_comm_world, sz)
+        else: mpi_alltoall(range(n), mpi_comm_world, sz)
+    if p == 0:
+        print("CALL: %.9f" % ((mpi_wtime(mpi_comm_world)-t0)/reps))
+    mpi_finalize(mpi_comm_world)
+
+def simulate(alg, n, sz, options):
+    """Runs one simulation; prints the results."""
+
+    modeldict = {
+        "model_name" : "collectives_sweep",
+        "sim_time" : 1e9,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "mpiopt" : dict(configs.infiniband_mpiopt),
+        "debug_options" : set(),
+    }
+    modeldict["mpiopt"][options.coll+"_algorithm"] = alg
+    if options.topo == "torus":
+        modeldict["intercon_type"] = "Torus"
+        modeldict["torus"] = { "dims" : (4, 4, 4), "attached_hosts_per_switch" : 1 }
+    else:
+        modeldict["intercon_type"] = "Crossbar"
+        modeldict["crossbar"] = { "nhosts" : n }
+    cluster = Cluster(modeldict)
+    if n > cluster.num_hosts():
+        raise Exception("%d ranks on %d hosts" % (n, cluster.num_hosts()))
+    cluster.start_mpi(range(n), collective_app, options.coll, sz, options.reps)
+    t0 = time.time()
+    cluster.run()
+    print("RUN: %f" % (time.time()-t0))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [ranks ...]")
+parser.add_option("-c", "--collective", dest="coll", default="allreduce",
+                  help="barrier, bcast, allreduce, allgather or alltoall")
+parser.add_option("-s", "--sizes", dest="sizes", default="8,4096,65536",
+                  help="message sizes (bytes, comma separated)")
+parser.add_option("-r", "--reps", type="int", dest="reps", default=4, help="calls per run")
+parser.add_option("-t", "--topology", dest="topo", default="torus", help="torus or crossbar")
+parser.add_option("--run", dest="run", default=None, help="(internal) algorithm,ranks,size of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    alg, n, sz = options.run.split(",")
+    simulate(alg, int(n), int(sz), options)
+    sys.exit(0)
+
+if options.coll not in algorithms:
+    sys.exit("unknown collective %s" % options.coll)
+sizes = [int(x) for x in options.sizes.split(",")]
+if options.coll == "barrier": sizes = [4]
+print("%s on %s, %d calls" % (options.coll, options.topo, options.reps))
+print("%-20s %6s %9s %14s %10s %9s" % ("algorithm", "ranks", "size", "us/call", "events", "run (s)"))
+for n in [int(x) for x in args or ["12", "64"]]:
+    for sz in sizes:
+        for alg in algorithms[options.coll]+("auto",):
+            cmd = [sys.executable, sys.argv[0], "--run", "%s,%d,%d" % (alg, n, sz),
+                   "-c", options.coll, "-r", str(options.reps), "-t", options.topo]
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            out = p.communicate()[0]
+            run = field(out, "RUN")
+            if p.returncode or run is None:
+                # such as the sequential pairs of the old alltoall
+                # running out of retransmissions
+                print("%-20s %6d %9d %14s" % (alg, n, sz, "failed"))
+                continue
+            print("%-20s %6d %9d %14.3f %10s %9.3f" % (alg, n, sz, float(field(out, "CALL"))*1e6,
+                  field(out, "SIMULATED EVENTS"), float(run)))
@@ -0,0 +1,150 @@
+#
+# credit_flow_control.py :- lossy links against credit-based flow control
+#
+# All ranks but rank 0 send a number of messages of a given size to
+# rank 0 at once (incast) on an Infiniband fat-tree and on an Aries
+# dragonfly, and each rank sends them to the ranks one and half way
+# around a ring (shift) on a Gemini torus, through switches with small
+# buffers. The messages are small enough to be sent eagerly (rather
+# than by rendezvous, which paces them by the receiver). This is
+# simulated once with the default links, which drop the packets their
+# buffers can't take (so that mpi has to resend them), and once with
+# credit-based flow control (hpcsim_dict["flow_control"] = "credit"),
+# where the packets wait for buffer space instead, with the default
+# number of virtual channels unless one is given. For each run, the
+# simulated completion time of the test, the number of events, the
+# packets dropped, the packets that had to wait for credits, the
+# messages mpi resent and the wall-clock time are reported; a run
+# fails unless every rank completes.
+# Each simulation is made in a separate interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+def incast_app(mpi_comm_world, nmsgs, sz):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    if p > 0:
+        for i in xrange(nmsgs):
+            if not mpi_send(0, None, sz, mpi_comm_world):
+                raise Exception("send failed at rank %d" % p)
+    else:
+        for i in xrange(nmsgs*(n-1)):
+            if mpi_recv(mpi_comm_world) is None:
+                raise Exception("recv failed at rank %d" % p)
+    finish(mpi_comm_world)
+
+def shift_app(mpi_comm_world, nmsgs, sz):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    for k in (1, n/2):
+        reqs = [mpi_isend((p+k)%n, None, sz, mpi_comm_world) for i in xrange(nmsgs)]
+        for i in xrange(nmsgs):
+            if mpi_recv(mpi_comm_world, (p-k)%n) is None:
+                raise Exception("recv failed at rank %d" % p)
+        mpi_waitall(reqs)
+    finish(mpi_comm_world)
+
+def finish(mpi_comm_world):
+    p = mpi_comm_rank(mpi_comm_world)
+    print("DONE: %d" % p)
+    t = mpi_reduce(0, mpi_wtime(mpi_comm_world), mpi_comm_world, op="max")
+    if p == 0: print("RESULT: %.12f" % t)
+    mpi_finalize(mpi_comm_world)
+
+def simulate(intercon, flow_control, options):
+    """Runs one simulation; prints the result and the statistics."""
+
+    modeldict = {
+        "model_name" : "credit_flow_control",
+        "sim_time" : 1e9,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "flow_control" : flow_control,
+        "debug_options" : set(),
+    }
+    if options.nvcs is not None:
+        modeldict["num_vcs"] = options.nvcs
+    if intercon == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = dict(configs.stampede_intercon, bufsz=options.bufsz)
+        modeldict["mpiopt"] = configs.infiniband_mpiopt
+        app = incast_app
+    elif intercon == "aries":
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = dict(configs.edison_intercon, bufsz=options.bufsz)
+        modeldict["mpiopt"] = configs.aries_mpiopt
+        app = incast_app
+    else:
+        modeldict["intercon_type"] = "Gemini"
+        modeldict["torus"] = dict(configs.hopper_intercon, bufsz=options.bufsz)
+        modeldict["mpiopt"] = configs.gemini_mpiopt
+        app = shift_app
+    t0 = time.time()
+    cluster = Cluster(modeldict)
+
+    # the ranks are spread over the whole machine for the incast; for
+    # the shift, they're on consecutive hosts, which on hopper line up
+    # along the z rings of the torus (two hosts to a switch)
+    total_hosts = cluster.num_hosts()
+    n = options.nranks
+    if app is shift_app:
+        hostmap = range(n)
+    else:
+        hostmap = [(i*total_hosts/n)%total_hosts for i in range(n)]
+    cluster.start_mpi(hostmap, app, options.nmsgs, options.sz)
+    cluster.run()
+    print("WALL: %f" % (time.time()-t0))
+
+    dropped = blocked = 0
+    for name in ("Host", "Switch"):
+        for node in cluster.simian.entities.get(name, {}).itervalues():
+            for iface in node.interfaces.itervalues():
+                for op in iface.outports:
+                    dropped += op.stats["dropped_pkts"]
+                    blocked += op.stats["blocked_pkts"]
+    print("DROPPED: %d" % dropped)
+    print("BLOCKED: %d" % blocked)
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [fattree] [aries] [gemini]")
+parser.add_option("-n", "--ranks", type="int", dest="nranks", default=48, help="mpi ranks (48 fill a z ring of hopper)")
+parser.add_option("-m", "--msgs", type="int", dest="nmsgs", default=4, help="messages per sender")
+parser.add_option("-s", "--size", type="int", dest="sz", default=4000, help="message size")
+parser.add_option("-B", "--bufsz", type="int", dest="bufsz", default=16384, help="buffer size of the links (bytes)")
+parser.add_option("-v", "--vcs", type="int", dest="nvcs", default=None, help="virtual channels (default: the model's)")
+parser.add_option("--run", dest="run", default=None, help="(internal) intercon,flow_control of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    intercon, flow_control = options.run.split(",")
+    simulate(intercon, flow_control, options)
+    sys.exit(0)
+
+print("%-10s %-7s %14s %10s %9s %9s %8s %9s" % ("intercon", "links", "time (s)", "events",
+      "dropped", "blocked", "resent", "wall (s)"))
+for intercon in args or ["fattree", "aries", "gemini"]:
+    for flow_control in ("drop", "credit"):
+        cmd = [sys.executable, sys.argv[0], "--run", "%s,%s" % (intercon, flow_control),
+               "-n", str(options.nranks), "-m", str(options.nmsgs), "-s", str(options.sz),
+               "-B", str(options.bufsz)]
+        if options.nvcs is not None: cmd.extend(["-v", str(options.nvcs)])
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        result = field(out, "RESULT")
+        done = sum(1 for line in out.splitlines() if line.startswith("DONE:"))
+        if p.returncode or result is None or done != options.nranks:
+            sys.stderr.write(out)
+            sys.exit("run failed (%d of %d ranks done): %s" % (done, options.nranks, " ".join(cmd)))
+        resent = sum(1 for line in out.splitlines() if " retransmit " in line)
+        print("%-10s %-7s %14.9f %10s %9s %9s %8d %9.3f" % (intercon, flow_control, float(result),
+              field(out, "SIMULATED EVENTS"), field(out, "DROPPED"), field(out, "BLOCKED"),
+              resent, float(field(out, "WALL"))))
@@ -0,0 +1,135 @@
+#
+# flow_validation.py :- the flow-level network model against the packet model
+#
+# The bandwidth test (as in bandwidth-meter-nompi.py: pairs of ranks,
+# each sender sending a number of messages of a given size to its
+# receiver) and the allreduce test (as in allreduce-nompi.py) are
+# simulated on a Gemini torus, a fat-tree and an Aries dragonfly, once
+# with the default packet-level network model and once with the
+# flow-level one (hpcsim_dict["network_model"] = "flow"). For each
+# run, the simulated completion time of the test, the number of events
+# and the wall-clock time are reported, together with the relative
+# difference of the completion times of the flow model from the packet
+# model.
+# Each simulation is made in a separate interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+def bandwidth_app(mpi_comm_world, nmsgs, sz):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    if p%2 == 0:
+        for i in xrange(nmsgs):
+            if not mpi_send(p+1, None, sz, mpi_comm_world):
+                raise Exception("send failed at rank %d" % p)
+    else:
+        for i in xrange(nmsgs):
+            if mpi_recv(mpi_comm_world) is None:
+                raise Exception("recv failed at rank %d" % p)
+    t = mpi_reduce(0, mpi_wtime(mpi_comm_world), mpi_comm_world, op="max")
+    if p == 0: print("RESULT: %.12f" % t)
+    mpi_finalize(mpi_comm_world)
+
+def allreduce_app(mpi_comm_world, sz):
+    p = mpi_comm_rank(mpi_comm_world)
+    if mpi_allreduce(p, mpi_comm_world, sz) is None:
+        raise Exception("allreduce failed at rank %d" % p)
+    t = mpi_reduce(0, mpi_wtime(mpi_comm_world), mpi_comm_world, op="max")
+    if p == 0: print("RESULT: %.12f" % t)
+    mpi_finalize(mpi_comm_world)
+
+def simulate(test, intercon, model, options):
+    """Runs one simulation; prints the result and the wall-clock time."""
+
+    modeldict = {
+        "model_name" : "flow_validation",
+        "sim_time" : 1e9,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "network_model" : model,
+        "lazy_entities" : True,
+        "debug_options" : set(),
+    }
+    if intercon == "torus":
+        modeldict["intercon_type"] = "Gemini"
+        modeldict["torus"] = configs.hopper_intercon
+        modeldict["mpiopt"] = configs.gemini_mpiopt
+    elif intercon == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = configs.stampede_intercon
+        modeldict["mpiopt"] = configs.infiniband_mpiopt
+    else:
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = configs.edison_intercon
+        modeldict["mpiopt"] = configs.aries_mpiopt
+    t0 = time.time()
+    cluster = Cluster(modeldict)
+
+    # the ranks are spread over the whole machine
+    total_hosts = cluster.num_hosts()
+    n = options.nranks
+    hostmap = [(i*total_hosts/n)%total_hosts for i in range(n)]
+    if test == "bandwidth":
+        # senders on one half of the machine, receivers on the other
+        hostmap = [(i/2*total_hosts/n+(i%2)*total_hosts/2)%total_hosts for i in range(n)]
+        cluster.start_mpi(hostmap, bandwidth_app, options.nmsgs, options.bwsz)
+    else:
+        cluster.start_mpi(hostmap, allreduce_app, options.arsz)
+    cluster.run()
+    print("WALL: %f" % (time.time()-t0))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [torus] [fattree] [dragonfly]")
+parser.add_option("-n", "--ranks", type="int", dest="nranks", default=16, help="mpi ranks")
+parser.add_option("-m", "--msgs", type="int", dest="nmsgs", default=2, help="messages per sender (bandwidth test)")
+parser.add_option("-b", "--bwsize", type="int", dest="bwsz", default=50000, help="message size (bandwidth test)")
+parser.add_option("-a", "--arsize", type="int", dest="arsz", default=4000, help="data size (allreduce test)")
+parser.add_option("-t", "--tolerance", type="float", dest="tol", default=0.15, help="max relative difference of the flow model")
+parser.add_option("--run", dest="run", default=None, help="(internal) test,intercon,model of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    test, intercon, model = options.run.split(",")
+    simulate(test, intercon, model, options)
+    sys.exit(0)
+
+intercons = args or ["torus", "fattree", "dragonfly"]
+print("%-10s %-10s %-7s %14s %10s %9s %10s" % ("test", "intercon", "model", "time (s)", "events",
+                                             "wall (s)", "diff"))
+failed = 0
+for test in ("bandwidth", "allreduce"):
+    for intercon in intercons:
+        base = None
+        for model in ("packet", "flow"):
+            cmd = [sys.executable, sys.argv[0], "--run", "%s,%s,%s" % (test, intercon, model),
+                   "-n", str(options.nranks), "-m", str(options.nmsgs),
+                   "-b", str(options.bwsz), "-a", str(options.arsz)]
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            out = p.communicate()[0]
+            result = field(out, "RESULT")
+            if p.returncode or result is None:
+                sys.stderr.write(out)
+                sys.exit("run failed: %s" % " ".join(cmd))
+            result = float(result)
+            if base is None:
+                base = result
+                diff = ""
+            else:
+                d = (result-base)/base
+                diff = "%+.2f%%" % (d*100)
+                if abs(d) > options.tol:
+                    diff += " FAIL"
+                    failed += 1
+            print("%-10s %-10s %-7s %14.9f %10s %9.3f %10s" % (test, intercon, model, result,
+                  field(out, "SIMULATED EVENTS"), float(field(out, "WALL")), diff))
+if failed:
+    sys.exit("%d tests differ by more than %g%%" % (failed, options.tol*100))
@@ -0,0 +1,96 @@
+#
+# matching_scale.py :- the cost of matching receives as messages pile up
+#
+# A number of ranks send messages of distinct types to rank 0, which
+# receives them in the reverse order of their arrival, so that each
+# receive has to get past all the messages pending (or, for
+# "posted", all the receives pending):
+#
+#   unexpected: the messages all arrive first; rank 0 then receives
+#               each by source and type
+#   wildcard:   the same, with each received by type from any source
+#   posted:     rank 0 posts all receives (mpi_irecv) first; the
+#               messages then arrive and are matched with them
+#
+# For each number of messages given, the wall-clock time of the run
+# and the time per message are reported (see matching.py). Each
+# simulation is made in a separate interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+def matching_app(mpi_comm_world, nmsgs, pattern):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    per_sender = nmsgs/(n-1)
+    if p > 0:
+        reqs = [mpi_isend(0, None, 8, mpi_comm_world, type="t%d" % i)
+                for i in xrange(per_sender)]
+        mpi_waitall(reqs)
+    elif pattern == "posted":
+        reqs = [mpi_irecv(mpi_comm_world, q, "t%d" % i)
+                for i in reversed(xrange(per_sender)) for q in reversed(xrange(1, n))]
+        mpi_waitall(reqs)
+    else:
+        # long enough for all messages to arrive
+        mpi_ext_sleep(1, mpi_comm_world)
+        for i in reversed(xrange(per_sender)):
+            for q in reversed(xrange(1, n)):
+                if pattern == "wildcard": r = mpi_recv(mpi_comm_world, None, "t%d" % i)
+                else: r = mpi_recv(mpi_comm_world, q, "t%d" % i)
+                if r is None or r["type"] != "t%d" % i:
+                    raise Exception("receive failed at message %d" % i)
+    mpi_finalize(mpi_comm_world)
+
+def simulate(nmsgs, options):
+    """Runs one simulation; prints the wall-clock time."""
+
+    modeldict = {
+        "model_name" : "matching_scale",
+        "sim_time" : 1e9,
+        "use_mpi" : False,
+        "intercon_type" : "Crossbar",
+        "crossbar" : { "nhosts" : options.nsenders+1 },
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "mpiopt" : configs.infiniband_mpiopt,
+        "debug_options" : set(),
+    }
+    cluster = Cluster(modeldict)
+    cluster.start_mpi(range(options.nsenders+1), matching_app, nmsgs, options.pattern)
+    t0 = time.time()
+    cluster.run()
+    print("RUN: %f" % (time.time()-t0))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [messages ...]")
+parser.add_option("-p", "--pattern", dest="pattern", default="unexpected",
+                  help="unexpected, wildcard or posted")
+parser.add_option("-n", "--senders", type="int", dest="nsenders", default=4, help="sending ranks")
+parser.add_option("--run", type="int", dest="run", default=None, help="(internal) messages of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    simulate(options.run, options)
+    sys.exit(0)
+
+print("%s, %d senders" % (options.pattern, options.nsenders))
+print("%10s %10s %9s %12s" % ("messages", "events", "run (s)", "us/message"))
+for nmsgs in [int(x) for x in args or ["1000", "4000", "16000"]]:
+    cmd = [sys.executable, sys.argv[0], "--run", str(nmsgs), "-p", options.pattern,
+           "-n", str(options.nsenders)]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    run = field(out, "RUN")
+    if p.returncode or run is None:
+        sys.stderr.write(out)
+        sys.exit("run failed: %s" % " ".join(cmd))
+    print("%10d %10s %9.3f %12.2f" % (nmsgs, field(out, "SIMULATED EVENTS"), float(run),
+          float(run)*1e6/nmsgs))
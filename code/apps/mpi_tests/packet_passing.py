@@ -0,0 +1,101 @@
+#
+# packet_passing.py :- cost of passing packets between nodes
+#
+# Nodes on the same rank pass packets to one another by reference,
+# while packets sent to another rank are encoded (Packet.encode). Here
+# we first measure, per hop, the time to pass a packet by reference,
+# to encode and decode it, and to pickle and unpickle it (as every hop
+# used to do), together with the size of the encoded packet. Then,
+# random raw transfers (Cluster.sched_raw_xfer) are simulated on a
+# Gemini torus, once with packets passed by reference, and once with
+# every hop encoding the packet as if the next node were on another
+# rank. Each simulation is made in a separate interpreter.
+#
+
+import sys, time, random, subprocess, timeit
+from cPickle import dumps, loads
+from optparse import OptionParser
+
+def hop_costs(n):
+    """Prints the per-hop cost of passing a raw and an mpi packet."""
+
+    raw = Packet(0, 1, "data_raw", 0, 1000, ttl=10)
+    mpi = Packet(0, 1, "data_mpi", 12, 4096+64, ttl=10,
+                 nonreturn_data={ "to_rank" : 1, "to_true_rank" : 1, "from_rank" : 0,
+                                  "comm_id" : 2, "msg_id" : 5, "data_size" : 4096,
+                                  "data" : None, "type" : "default", "piece_idx" : 0,
+                                  "num_pieces" : 1, "ack_overhead" : 64 })
+    print("%-10s %14s %14s %14s %12s %12s" % ("packet", "reference (us)", "encode (us)",
+                                              "pickle (us)", "encoded (B)", "pickled (B)"))
+    for name, pkt in (("raw", raw), ("mpi", mpi)):
+        pkt.set_nexthop("r", 0)
+        pkt.add_to_path("host[0]")
+        ref = timeit.timeit(lambda: pkt.size(), number=n)
+        enc = timeit.timeit(lambda: Packet.decode(pkt.encode()), number=n)
+        pic = timeit.timeit(lambda: loads(dumps(pkt)), number=n)
+        print("%-10s %14.3f %14.3f %14.3f %12d %12d" % (name, ref/n*1e6, enc/n*1e6, pic/n*1e6,
+                                                        len(pkt.encode()), len(dumps(pkt))))
+
+def simulate(dim, nxfers, sz, encode):
+    """Simulates random raw transfers; prints the wall-clock time."""
+
+    if encode:
+        # no node is local to any other
+        Node.is_local = lambda self, name, id: False
+    modeldict = {
+        "model_name" : "packet_passing",
+        "sim_time" : 1.0,
+        "use_mpi" : False,
+        "intercon_type" : "Gemini",
+        "torus" : configs.gemini_anydim(dim, dim, dim),
+        "host_type" : "Host",
+        "debug_options" : set(),
+    }
+    cluster = Cluster(modeldict)
+    nhosts = cluster.num_hosts()
+    random.seed(1)
+    for i in xrange(nxfers):
+        cluster.sched_raw_xfer(1e-7*i, random.randrange(nhosts), random.randrange(nhosts), sz)
+    t0 = time.time()
+    cluster.run()
+    print("RUN: %f" % (time.time()-t0))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options]")
+parser.add_option("-d", "--dim", type="int", dest="dim", default=8, help="torus dimension (cube)")
+parser.add_option("-x", "--xfers", type="int", dest="nxfers", default=2000, help="raw transfers")
+parser.add_option("-s", "--size", type="int", dest="sz", default=100000, help="transfer size (bytes)")
+parser.add_option("-n", "--hops", type="int", dest="nhops", default=100000, help="hops timed per packet")
+parser.add_option("--run", dest="run", default=None, help="(internal) encode flag of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    simulate(options.dim, options.nxfers, options.sz, options.run == "1")
+    sys.exit(0)
+
+from ppt import *
+hop_costs(options.nhops)
+print("")
+
+print("%-10s %10s %10s %12s %8s" % ("packets", "events", "run (s)", "events/s", "speedup"))
+base = None
+for encode in (1, 0):
+    cmd = [sys.executable, sys.argv[0], "--run", str(encode), "-d", str(options.dim),
+           "-x", str(options.nxfers), "-s", str(options.sz)]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    run = field(out, "RUN")
+    if p.returncode or run is None:
+        sys.stderr.write(out)
+        sys.exit("run failed: %s" % " ".join(cmd))
+    run = float(run)
+    events = int(field(out, "SIMULATED EVENTS"))
+    if base is None: base = run
+    print("%-10s %10d %10.3f %12.1f %7.2fx" % ("encoded" if encode else "reference",
+                                              events, run, events/run, base/run))
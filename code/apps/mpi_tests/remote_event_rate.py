@@ -0,0 +1,111 @@
+#
+# remote_event_rate.py :- cross-rank event rate of the parallel engine
+#
+# Random point-to-point MPI traffic (as in point2point.py) is simulated
+# on a fat-tree and on a dragonfly, in parallel under the MPI launcher,
+# once for each size of the batches in which simian sends events to
+# other ranks (hpcsim_dict["event_batch"]); a batch size of 1 sends
+# every remote event in a message of its own. For each run, the number
+# of events and messages exchanged between ranks and the rate of remote
+# events per second of wall-clock time are reported.
+#
+
+import sys, math, random, subprocess
+from optparse import OptionParser
+
+def exponential(mean):
+    return -math.log(random.random())*mean
+
+def point2point(mpi_comm_world, iat, data_size):
+    n = mpi_comm_size(mpi_comm_world)
+    p = mpi_comm_rank(mpi_comm_world)
+    if p%2 == 0:
+        # even processes are receivers
+        while True:
+            r = mpi_recv(mpi_comm_world)
+            if r is None:
+                raise Exception("recv failed at rank %d" % p)
+    else:
+        # odd processes are senders, to random receivers
+        random.seed(p)
+        while True:
+            mpi_ext_sleep(exponential(iat), mpi_comm_world)
+            d = random.randrange(n/2)*2
+            r = mpi_send(d, None, data_size, mpi_comm_world)
+            if r is None:
+                raise Exception("send failed at rank %d" % p)
+    mpi_finalize(mpi_comm_world)
+
+def simulate(intercon, batch, n, iat, sz, sim_time):
+    """Runs one simulation (on each rank under the launcher)."""
+
+    modeldict = {
+        "model_name" : "remote_event_rate",
+        "sim_time" : sim_time,
+        "use_mpi" : True,
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "event_batch" : batch,
+        "debug_options" : set(),
+    }
+    if intercon == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = configs.stampede_intercon
+        modeldict["mpiopt"] = configs.infiniband_mpiopt
+    else:
+        modeldict["intercon_type"] = "Dragonfly"
+        modeldict["dragonfly"] = configs.dragonfly_intercon
+        modeldict["mpiopt"] = configs.aries_mpiopt
+    cluster = Cluster(modeldict)
+
+    # 2n processes, a sender and a receiver on each of n hosts spread
+    # over the whole machine
+    total_hosts = cluster.num_hosts()
+    hostmap = [(i/2*total_hosts/n)%total_hosts for i in range(n*2)]
+    cluster.start_mpi(hostmap, point2point, iat*n, sz)
+    cluster.run()
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [fattree] [dragonfly]")
+parser.add_option("-l", "--launcher", dest="launcher", default="mpirun -np 4", help="MPI launch command")
+parser.add_option("-b", "--batches", dest="batches", default="1,16,256", help="event batch sizes to compare")
+parser.add_option("-n", "--hosts", type="int", dest="n", default=64, help="hosts running traffic")
+parser.add_option("-i", "--iat", type="float", dest="iat", default=1e-6, help="mean inter-arrival time of messages (seconds)")
+parser.add_option("-s", "--size", type="int", dest="sz", default=1024, help="message size (bytes)")
+parser.add_option("-t", "--time", type="float", dest="sim_time", default=1e-3, help="simulated time (seconds)")
+parser.add_option("--run", dest="run", default=None, help="(internal) intercon,batch of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    intercon, batch = options.run.split(",")
+    simulate(intercon, int(batch), options.n, options.iat, options.sz, options.sim_time)
+    sys.exit(0)
+
+intercons = args or ["fattree", "dragonfly"]
+batches = [int(b) for b in options.batches.split(",")]
+print("%-10s %6s %14s %10s %9s %16s %8s" % ("intercon", "batch", "remote events", "messages",
+                                            "wall (s)", "remote events/s", "speedup"))
+for intercon in intercons:
+    base = None
+    for batch in batches:
+        cmd = options.launcher.split() + [sys.executable, sys.argv[0],
+              "--run", "%s,%d" % (intercon, batch), "-n", str(options.n), "-i", str(options.iat),
+              "-s", str(options.sz), "-t", str(options.sim_time)]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        remote = field(out, "REMOTE EVENTS")
+        if p.returncode or remote is None:
+            sys.stderr.write(out)
+            sys.exit("run failed: %s" % " ".join(cmd))
+        wall = float(field(out, "SIMULATION COMPLETED IN").split()[0])
+        events, messages = remote.split(" (IN ")
+        rate = int(events)/wall
+        if base is None: base = rate
+        print("%-10s %6d %14s %10s %9.3f %16.1f %7.2fx" % (intercon, batch, events, messages.split()[0],
+                                                         wall, rate, rate/base))
@@ -0,0 +1,115 @@
+#
+# routing_cost.py :- per-packet cost of routing in the switches
+#
+# Packets between random pairs of hosts are routed hop by hop, calling
+# calc_route at each switch on the way (as the switch's routing
+# process would, without simulating the transmission), on a Gemini
+# torus, a fat-tree, a dragonfly and an Aries dragonfly. For each, the
+# number of hops, the time of this walk (which includes building any
+# routing tables or caches), the time per calc_route call when routing
+# the packets again at each switch of their walk, and a checksum of
+# the routes taken are reported. The checksum is the same as long as
+# the routing decisions are (with the same random seed), so it can be
+# compared across versions of the switches.
+#
+
+import sys, time, random, zlib, copy
+from optparse import OptionParser
+from ppt import *
+
+def make_cluster(topo, route_method):
+    modeldict = {
+        "model_name" : "routing_cost",
+        "sim_time" : 1.0,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "debug_options" : set(),
+    }
+    if topo == "torus":
+        modeldict["intercon_type"] = "Gemini"
+        modeldict["torus"] = dict(configs.hopper_intercon)
+        key = "torus"
+    elif topo == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = dict(configs.moonlight_intercon)
+        key = "fattree"
+    elif topo == "dragonfly":
+        modeldict["intercon_type"] = "Dragonfly"
+        modeldict["dragonfly"] = dict(configs.dragonfly_intercon)
+        key = "dragonfly"
+    else:
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = dict(configs.edison_intercon)
+        key = "dragonfly"
+    if route_method is not None:
+        modeldict[key]["route_method"] = route_method
+    return Cluster(modeldict)
+
+def copy_packet(pkt):
+    """Returns a copy of the packet, with the routing state it carries."""
+    c = copy.copy(pkt)
+    c.nonreturn_data = dict(pkt.nonreturn_data)
+    return c
+
+def route_pairs(cluster, pairs, maxhops):
+    """Routes a packet for each pair; returns the switch, and a copy of
+    the packet as it arrives there, of each hop, and the checksum of the
+    routes."""
+
+    engine = cluster.hpcsim_dict["simian"]
+    hops = []; crc = 0
+    for src, dst in pairs:
+        pkt = Packet(src, dst, "data_raw", 0, 1000, nonreturn_data=dict())
+        op = engine.getEntity("Host", src).interfaces["r"].outports[0]
+        sw = engine.getEntity("Switch", op.peer_node_id)
+        for h in xrange(maxhops):
+            hops.append((sw, copy_packet(pkt)))
+            iface, port = sw.calc_route(pkt)
+            if port < 0: port = 0
+            crc = zlib.crc32("%d %s %d;" % (sw.node_id, iface, port), crc)
+            op = sw.interfaces[iface].outports[port]
+            if op.peer_node_name == "Host": break
+            sw = engine.getEntity("Switch", op.peer_node_id)
+        else:
+            raise Exception("no route from %d to %d in %d hops" % (src, dst, maxhops))
+        if op.peer_node_id != dst:
+            raise Exception("packet from %d to %d arrives at %d" % (src, dst, op.peer_node_id))
+    return hops, crc & 0xffffffff
+
+def route_time(hops, repeat):
+    """Returns the least time, over repeated runs, of calling
+    calc_route again for each hop."""
+
+    best = None
+    for r in xrange(repeat):
+        # from the state of each packet at the hop
+        hopcopies = [(sw, copy_packet(pkt)) for sw, pkt in hops]
+        t0 = time.time()
+        for sw, pkt in hopcopies: sw.calc_route(pkt)
+        t = time.time()-t0
+        if best is None or t < best: best = t
+    return best
+
+parser = OptionParser(usage="%prog [options] [torus] [fattree] [dragonfly] [aries]")
+parser.add_option("-p", "--pairs", type="int", dest="npairs", default=20000, help="host pairs per topology")
+parser.add_option("-n", "--repeat", type="int", dest="repeat", default=3, help="timed runs over the hops")
+parser.add_option("-r", "--route", dest="route", default=None, help="route method (default: as configured)")
+(options, args) = parser.parse_args()
+
+print("%-10s %8s %10s %10s %12s %10s" % ("topology", "hosts", "hops", "walk (s)",
+                                         "route (us)", "checksum"))
+for topo in args or ["torus", "fattree", "dragonfly", "aries"]:
+    cluster = make_cluster(topo, options.route)
+    nhosts = cluster.num_hosts()
+    random.seed(1)
+    pairs = []
+    while len(pairs) < options.npairs:
+        src = random.randrange(nhosts); dst = random.randrange(nhosts)
+        if src != dst: pairs.append((src, dst))
+    random.seed(2)
+    t0 = time.time()
+    hops, crc = route_pairs(cluster, pairs, 1000)
+    walk = time.time()-t0
+    route = route_time(hops, options.repeat)
+    print("%-10s %8d %10d %10.3f %12.3f %10x" % (topo, nhosts, len(hops), walk,
+                                                 route/len(hops)*1e6, crc))
@@ -0,0 +1,73 @@
+#
+# startup_scaling.py :- model startup time and memory for growing tori
+#
+# A small job (a few raw transfers between neighboring hosts) is
+# simulated on Gemini tori of growing size, once with all hosts and
+# switches instantiated when the interconnect is built, and once with
+# hpcsim_dict["lazy_entities"], where they are only instantiated when
+# their first event arrives. Each run is made in a separate interpreter;
+# the wall-clock time to build the model, its resident memory once
+# built, the total wall-clock time, the events simulated and the number
+# of entities instantiated are reported.
+#
+
+import sys, time, resource, subprocess
+from optparse import OptionParser
+
+def simulate(dim, lazy, nxfers):
+    """Builds and runs one model; prints its startup figures."""
+
+    t0 = time.time()
+    modeldict = {
+        "model_name" : "startup_scaling",
+        "sim_time" : 1.0,
+        "use_mpi" : False,
+        "intercon_type" : "Gemini",
+        "torus" : configs.gemini_anydim(dim, dim, dim),
+        "host_type" : "Host",
+        "lazy_entities" : lazy,
+        "debug_options" : set(),
+    }
+    cluster = Cluster(modeldict)
+    startup = time.time()-t0
+    # ru_maxrss is in kilobytes on linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+    for i in xrange(nxfers):
+        cluster.sched_raw_xfer(1e-6*i, 2*i, 2*i+3, 100000)
+    cluster.run()
+    print("STARTUP: %f %f %f" % (startup, rss, time.time()-t0))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options]")
+parser.add_option("-d", "--dims", dest="dims", default="4,8,12,16", help="torus dimensions (cubes) to compare")
+parser.add_option("-x", "--xfers", type="int", dest="nxfers", default=4, help="raw transfers in the job")
+parser.add_option("--run", dest="run", default=None, help="(internal) dim,lazy of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    dim, lazy = options.run.split(",")
+    simulate(int(dim), lazy == "1", options.nxfers)
+    sys.exit(0)
+
+print("%-10s %7s %6s %12s %10s %10s %8s %10s" % ("torus", "hosts", "lazy", "startup (s)", "rss (MB)",
+                                                  "total (s)", "events", "entities"))
+for dim in [int(d) for d in options.dims.split(",")]:
+    for lazy in (0, 1):
+        cmd = [sys.executable, sys.argv[0], "--run", "%d,%d" % (dim, lazy), "-x", str(options.nxfers)]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out = p.communicate()[0]
+        startup = field(out, "STARTUP")
+        if p.returncode or startup is None:
+            sys.stderr.write(out)
+            sys.exit("run failed: %s" % " ".join(cmd))
+        startup, rss, total = [float(x) for x in startup.split()]
+        entities = field(out, "ENTITIES INSTANTIATED") or "all"
+        print("%-10s %7d %6s %12.3f %10.1f %10.3f %8s %10s" % ("%dx%dx%d" % (dim, dim, dim), 2*dim**3,
+              "yes" if lazy else "no", startup, rss, total, field(out, "SIMULATED EVENTS"),
+              entities.split(" OF ")[0]))
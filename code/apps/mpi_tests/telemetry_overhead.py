@@ -0,0 +1,98 @@
+#
+# telemetry_overhead.py :- the cost of sampling the links over time
+#
+# All ranks exchange messages of a given size (mpi_alltoall) a number
+# of times, with a pause in between, on an Infiniband fat-tree or an
+# Aries dragonfly. This is simulated once without telemetry, and once
+# for each of the sampling intervals given, with the links sampled
+# every interval (hpcsim_dict["telemetry"], see telemetry.py). For
+# each run, the number of events, the samples taken and the wall-clock
+# time of the run (including writing out the samples) are reported,
+# as well as the busiest link and its peak utilization.
+# Each simulation is made in a separate interpreter.
+#
+
+import sys, time, subprocess
+from optparse import OptionParser
+
+def alltoall_app(mpi_comm_world, rounds, sz, pause):
+    n = mpi_comm_size(mpi_comm_world)
+    for i in xrange(rounds):
+        mpi_alltoall(range(n), mpi_comm_world, data_size=sz)
+        mpi_ext_sleep(pause, mpi_comm_world)
+    mpi_finalize(mpi_comm_world)
+
+def simulate(intercon, interval, options):
+    """Runs one simulation; prints the results."""
+
+    modeldict = {
+        "model_name" : "telemetry_overhead",
+        "sim_time" : 1e9,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "load_libraries": set(["mpi"]),
+        "debug_options" : set(),
+    }
+    if intercon == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = configs.moonlight_intercon
+        modeldict["mpiopt"] = configs.infiniband_mpiopt
+    else:
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = configs.edison_intercon
+        modeldict["mpiopt"] = configs.aries_mpiopt
+    if interval > 0:
+        modeldict["telemetry"] = { "interval" : interval, "prefix" : options.prefix,
+                                   "samples" : options.nsamples }
+    cluster = Cluster(modeldict)
+    total_hosts = cluster.num_hosts()
+    n = options.nranks
+    hostmap = [(i*total_hosts/n)%total_hosts for i in range(n)]
+    cluster.start_mpi(hostmap, alltoall_app, options.rounds, options.sz, options.pause)
+
+    t0 = time.time()
+    cluster.run()
+    print("RUN: %f" % (time.time()-t0))
+    if interval > 0:
+        print("SAMPLES: %d" % modeldict["telemetry_sampler"].count)
+        cols = read_telemetry(options.prefix)
+        i = cols["util"].argmax()
+        print("BUSIEST: %s[%d] %s(%d) %.3f" % (cols["kind"][i], cols["node"][i],
+              cols["iface"][i], cols["port"][i], cols["util"][i]))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [interval ...]")
+parser.add_option("-t", "--intercon", dest="intercon", default="fattree", help="fattree or aries")
+parser.add_option("-n", "--ranks", type="int", dest="nranks", default=16, help="mpi ranks")
+parser.add_option("-r", "--rounds", type="int", dest="rounds", default=3, help="rounds of alltoall")
+parser.add_option("-s", "--size", type="int", dest="sz", default=20000, help="message size")
+parser.add_option("-p", "--pause", type="float", dest="pause", default=1e-4, help="pause between rounds (seconds)")
+parser.add_option("-k", "--samples", type="int", dest="nsamples", default=1024, help="samples kept per port")
+parser.add_option("-o", "--prefix", dest="prefix", default="/tmp/telemetry_overhead", help="telemetry file name prefix")
+parser.add_option("--run", type="float", dest="run", default=None, help="(internal) interval of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    simulate(options.intercon, options.run, options)
+    sys.exit(0)
+
+print("%-12s %10s %9s %9s %s" % ("interval", "events", "samples", "run (s)", "busiest link"))
+for interval in [0.0] + [float(x) for x in args or ["1e-5", "1e-6"]]:
+    cmd = [sys.executable, sys.argv[0], "--run", repr(interval), "-t", options.intercon,
+           "-n", str(options.nranks), "-r", str(options.rounds), "-s", str(options.sz),
+           "-p", repr(options.pause), "-k", str(options.nsamples), "-o", options.prefix]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    run = field(out, "RUN")
+    if p.returncode or run is None:
+        sys.stderr.write(out)
+        sys.exit("run failed: %s" % " ".join(cmd))
+    print("%-12s %10s %9s %9.3f %s" % (interval if interval > 0 else "off",
+          field(out, "SIMULATED EVENTS"), field(out, "SAMPLES") or "-", float(run),
+          field(out, "BUSIEST") or "-"))
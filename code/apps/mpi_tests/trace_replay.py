@@ -0,0 +1,71 @@
+#
+# trace_replay.py :- runs an mpi application from its trace
+#
+# The ranks replay the events of the trace of the given prefix (see
+# mpi_trace.py, which also writes synthetic traces for testing) on a
+# small interconnect, a rank per host:
+#
+#   torus:    a 3D torus (4x4x4, a host per switch)
+#   fattree:  a 2-level fat-tree of 8-port switches
+#   crossbar: a single switch (as many hosts as ranks)
+#   hopper:   the Gemini torus of Hopper
+#
+# The number of ranks is that of the trace files found. The number of
+# events, the time the last rank ended, and the simulator's counts are
+# reported. For example:
+#
+#   python ../../middleware/mpi/mpi_trace.py -n 16 /tmp/halo
+#   python trace_replay.py -t torus /tmp/halo
+#
+
+import sys, os
+from optparse import OptionParser
+
+parser = OptionParser(usage="%prog [options] prefix")
+parser.add_option("-t", "--topology", dest="topo", default="torus",
+                  help="torus, fattree, crossbar or hopper")
+parser.add_option("-m", "--mpiopt", dest="mpiopt", default="infiniband_mpiopt",
+                  help="the mpi options (in configs)")
+parser.add_option("-c", "--collectives", dest="coll", default="packet",
+                  help="collective model: packet or analytic")
+(options, args) = parser.parse_args()
+if len(args) != 1: parser.error("a trace prefix is required")
+prefix = args[0]
+
+from ppt import *
+import mpi_trace
+
+n = 0
+while any([os.path.exists(f) for f in mpi_trace.trace_files(prefix, n)]): n += 1
+if n == 0: sys.exit("no trace found for %s" % prefix)
+print("trace_replay.py %s: %d ranks on %s" % (prefix, n, options.topo))
+
+modeldict = {
+    "model_name" : "trace_replay",
+    "sim_time" : 1e9,
+    "use_mpi" : False,
+    "host_type" : "Host",
+    "load_libraries": set(["mpi"]),
+    "mpiopt" : dict(getattr(configs, options.mpiopt), collective_model=options.coll),
+    "debug_options" : set(),
+}
+if options.topo == "torus":
+    modeldict["intercon_type"] = "Torus"
+    modeldict["torus"] = { "dims" : (4, 4, 4), "attached_hosts_per_switch" : 1 }
+elif options.topo == "fattree":
+    modeldict["intercon_type"] = "Fattree"
+    modeldict["fattree"] = dict(configs.moonlight_intercon, num_ports_per_switch=8)
+elif options.topo == "crossbar":
+    modeldict["intercon_type"] = "Crossbar"
+    modeldict["crossbar"] = { "nhosts" : n }
+elif options.topo == "hopper":
+    modeldict["intercon_type"] = "Gemini"
+    modeldict["torus"] = configs.hopper_intercon
+else:
+    sys.exit("unknown topology %s" % options.topo)
+
+cluster = Cluster(modeldict)
+if n > cluster.num_hosts():
+    sys.exit("%d ranks on %d hosts" % (n, cluster.num_hosts()))
+cluster.start_mpi(range(n), mpi_trace.replay, prefix)
+cluster.run()
@@ -0,0 +1,131 @@
+#
+# traffic_sweep.py :- throughput and latency against offered load
+#
+# The hosts of an interconnect send synthetic traffic of a given
+# pattern (hpcsim_dict["traffic"], see traffic.py) at each of the
+# offered loads given (as fractions of the bandwidth of the host
+# links), on a small instance of each topology:
+#
+#   torus:     a 3D torus (4x4x4, a host per switch)
+#   fattree:   a 2-level fat-tree of 8-port switches
+#   dragonfly: a simple dragonfly of 9 groups of 8 switches
+#   aries:     an Aries dragonfly of 5 groups of 16 switches
+#   crossbar:  a single switch
+#   bypass:    hosts connected all to all, without congestion
+#   analytic:  the torus as an analytic interconnect, with contention
+#
+# For each load, the accepted throughput (as a fraction of the host
+# link bandwidth), the mean and 99th percentile latency of the
+# messages sent within the measurement window, the messages lost, and
+# the simulator's events per second are reported. The network
+# saturates where the accepted throughput falls behind the offered
+# load and the latency shoots up. Each simulation is made in a
+# separate interpreter.
+#
+
+import sys, subprocess
+from optparse import OptionParser
+
+def make_modeldict(topo, options):
+    modeldict = {
+        "model_name" : "traffic_sweep",
+        "sim_time" : 1e3,
+        "use_mpi" : False,
+        "host_type" : "Host",
+        "debug_options" : set(),
+    }
+    torus = { "dims" : (4, 4, 4), "attached_hosts_per_switch" : 1 }
+    if topo == "torus":
+        modeldict["intercon_type"] = "Torus"
+        modeldict["torus"] = torus
+    elif topo == "fattree":
+        modeldict["intercon_type"] = "Fattree"
+        modeldict["fattree"] = dict(configs.moonlight_intercon, num_ports_per_switch=8)
+    elif topo == "dragonfly":
+        modeldict["intercon_type"] = "Dragonfly"
+        modeldict["dragonfly"] = dict(configs.dragonfly_intercon, num_groups=9,
+                                      num_switches_per_group=8, num_intra_links_per_switch=7,
+                                      num_inter_links_per_switch=1, inter_group_bdw=4.75e9,
+                                      intra_group_bdw=5.25e9, switch_host_bdw=1.6e9)
+    elif topo == "aries":
+        modeldict["intercon_type"] = "Aries"
+        modeldict["dragonfly"] = dict(configs.aries_intercon, num_groups=5,
+                                      num_switches_per_group=16, num_chassis_per_group=2,
+                                      num_blades_per_chassis=8, num_inter_links_per_switch=4)
+    elif topo == "crossbar":
+        modeldict["intercon_type"] = "Crossbar"
+        modeldict["crossbar"] = { "nhosts" : 64 }
+    elif topo == "bypass":
+        modeldict["intercon_type"] = "Bypass"
+        modeldict["bypass"] = { "nhosts" : 64 }
+    elif topo == "analytic":
+        modeldict["intercon_type"] = "Analytic"
+        modeldict["analytic"] = { "topology" : "Torus", "contention" : True }
+        modeldict["torus"] = torus
+    else:
+        raise Exception("unknown topology %s" % topo)
+    return modeldict
+
+def simulate(topo, load, options):
+    """Runs one simulation; prints the measurements."""
+
+    modeldict = make_modeldict(topo, options)
+    modeldict["traffic"] = {
+        "pattern" : options.pattern,
+        "load" : load,
+        "msg_size" : options.sz,
+        "warmup" : options.warmup,
+        "duration" : options.duration,
+        "seed" : options.seed,
+    }
+    cluster = Cluster(modeldict)
+    cluster.run()
+
+    # the host link bandwidth, from one of the hosts sending
+    engine = cluster.hpcsim_dict["simian"]
+    host = engine.entities["Host"].itervalues().next()
+    s = modeldict["traffic_generator"].summary(host.interfaces['r'].outports[0].bdw)
+    print("ACCEPTED: %.4f" % s["accepted_load"])
+    print("LATENCY: %.3f %.3f" % (s["mean_latency"]*1e6, s["p99_latency"]*1e6))
+    print("LOST: %d/%d" % (s["lost"], s["sent"]))
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+parser = OptionParser(usage="%prog [options] [load ...]")
+parser.add_option("-t", "--topology", dest="topo", default="torus",
+                  help="torus, fattree, dragonfly, aries, crossbar, bypass or analytic")
+parser.add_option("-p", "--pattern", dest="pattern", default="uniform_random",
+                  help="traffic pattern (see traffic.py)")
+parser.add_option("-s", "--size", type="int", dest="sz", default=1024, help="message size (bytes)")
+parser.add_option("-w", "--warmup", type="float", dest="warmup", default=2e-4, help="warmup (seconds)")
+parser.add_option("-d", "--duration", type="float", dest="duration", default=1e-3,
+                  help="measurement window (seconds)")
+parser.add_option("-r", "--seed", type="int", dest="seed", default=0, help="random seed")
+parser.add_option("--run", type="float", dest="run", default=None, help="(internal) offered load of a single run")
+(options, args) = parser.parse_args()
+
+if options.run is not None:
+    from ppt import *
+    simulate(options.topo, options.run, options)
+    sys.exit(0)
+
+print("%s, %s, %d-byte messages" % (options.topo, options.pattern, options.sz))
+print("%8s %9s %12s %12s %12s %12s" % ("offered", "accepted", "mean (us)", "p99 (us)",
+      "lost", "events/s"))
+for load in [float(x) for x in args or ["0.1", "0.2", "0.4", "0.6", "0.8", "1.0"]]:
+    cmd = [sys.executable, sys.argv[0], "--run", repr(load), "-t", options.topo,
+           "-p", options.pattern, "-s", str(options.sz), "-w", repr(options.warmup),
+           "-d", repr(options.duration), "-r", str(options.seed)]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    accepted = field(out, "ACCEPTED")
+    if p.returncode or accepted is None:
+        sys.stderr.write(out)
+        sys.exit("run failed: %s" % " ".join(cmd))
+    mean, p99 = field(out, "LATENCY").split()
+    print("%8.2f %9s %12s %12s %12s %12.0f" % (load, accepted, mean, p99, field(out, "LOST"),
+          float(field(out, "EVENTS PER SECOND"))))
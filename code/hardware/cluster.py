@@ -142,6 +142,12 @@ class Cluster(object):
         if "mpi_putget_thresh" not in hpcsim_dict["default_configs"]:
             hpcsim_dict["default_configs"]["mpi_putget_thresh"] = 4096
 
+        # default threshold for the rendezvous protocol (i.e., upper
+        # size limit for eager sends) is infinite: all messages are
+        # sent eagerly
+        if "mpi_eager_thresh" not in hpcsim_dict["default_configs"]:
+            hpcsim_dict["default_configs"]["mpi_eager_thresh"] = 1e38
+
         # default maximum injection rate is 1G bytes-per-second
         if "mpi_max_injection" not in hpcsim_dict["default_configs"]:
             hpcsim_dict["default_configs"]["mpi_max_injection"] = 1e9
@@ -165,9 +171,29 @@ class Cluster(object):
         intercontype = self.get_intercon_typename(hpcsim_dict)
         hpcsim_dict["min_delay"] = intercontype.calc_min_delay(hpcsim_dict)
 
-        # instantiate (start) the simian engine
+        # instantiate (start) the simian engine; the event queue
+        # backend can be chosen with hpcsim_dict["event_queue"]:
+        # "heap" (default), "calendar", or "ladder"; in parallel,
+        # hpcsim_dict["event_batch"] bounds the events sent to another
+        # rank in one message (default 256); if hpcsim_dict["profile"]
+        # is True, the engine writes a profile of the events handled
+        # by each entity type and service on each rank (see profiler.py
+        # in SimianPie); the engine saves a checkpoint every
+        # hpcsim_dict["checkpoint_interval"] simulated seconds, if
+        # given, and a model set up again with hpcsim_dict["restart"]
+        # as True continues from the last one (see checkpoint.py in
+        # SimianPie); if hpcsim_dict["lazy_entities"] is True, hosts
+        # and switches are only instantiated when they receive their
+        # first event, so that a small job on a large machine starts
+        # quickly
         self.simian = Simian(hpcsim_dict["model_name"], 0, hpcsim_dict["sim_time"],
-                             hpcsim_dict["min_delay"], hpcsim_dict["use_mpi"], hpcsim_dict["mpi_path"])
+                             hpcsim_dict["min_delay"], hpcsim_dict["use_mpi"], hpcsim_dict["mpi_path"],
+                             queueType=hpcsim_dict.get("event_queue", "heap"),
+                             batchSize=hpcsim_dict.get("event_batch", 256),
+                             profile=hpcsim_dict.get("profile", False),
+                             checkpointInterval=hpcsim_dict.get("checkpoint_interval", None),
+                             restart=hpcsim_dict.get("restart", False),
+                             lazyEntities=hpcsim_dict.get("lazy_entities", False))
 
         # print out all model parameters if requested so
         if self.simian.rank==0:
@@ -203,6 +229,79 @@ class Cluster(object):
         #                         hpcsim_dict["min_delay"])
         #
         hpcsim_dict["simian"] = self.simian
+        hpcsim_dict["packet_decoder"] = Packet.decode
+        self.simian.registerShared("hpcsim_dict", hpcsim_dict)
+        self.simian.registerShared("cluster", self)
+
+        # 2.5 entities are placed on ranks as given in a placement
+        # file, if specified (see save_partition); otherwise, as the
+        # interconnect decides
+        self.placement = None
+        self.default_partition = (None, None)
+        if "partition_file" in hpcsim_dict:
+            self.placement = Placement.load(hpcsim_dict["partition_file"])
+            if self.simian.rank == 0 and "hpcsim" in hpcsim_dict["debug_options"]:
+                print("hpcsim: entities placed on %d ranks as in %s" % 
+                      (self.placement.nranks, hpcsim_dict["partition_file"]))
+
+        # 2.6 the network is modeled per packet (default), or, with
+        # hpcsim_dict["network_model"] as "flow", per flow (see flow.py)
+        self.network_model = hpcsim_dict.get("network_model", "packet")
+        if self.network_model not in ("packet", "flow"):
+            raise Exception("network model %s not implemented" % self.network_model)
+
+        # 2.7 a link drops the packets its send buffer can't take
+        # (default), or, with hpcsim_dict["flow_control"] as "credit",
+        # is lossless, with hpcsim_dict["num_vcs"] virtual channels
+        # (see Outport)
+        self.flow_control = hpcsim_dict.get("flow_control", "drop")
+        if self.flow_control not in ("drop", "credit"):
+            raise Exception("flow control %s not implemented" % self.flow_control)
+        if self.flow_control == "credit":
+            if self.network_model != "packet":
+                raise Exception("credit-based flow control requires the packet network model")
+            if hpcsim_dict.get("num_vcs", 2) < 1:
+                raise Exception("credit-based flow control requires at least one virtual channel")
+
+        # 2.8 with hpcsim_dict["packet_trace"] as a file name prefix,
+        # each rank writes the records of the packets sent and of
+        # their arrivals at switches and hosts to a binary trace file
+        # (see packet_trace.py)
+        if "packet_trace" in hpcsim_dict:
+            tracer = PacketTracer(hpcsim_dict["packet_trace"], self.simian.rank,
+                                  append=hpcsim_dict.get("restart", False))
+            hpcsim_dict["packet_tracer"] = tracer
+            self.simian.registerShared("packet_tracer", tracer)
+
+        # 2.9 with hpcsim_dict["telemetry"] (a dictionary with the
+        # sampling "interval" and optionally the file name "prefix",
+        # the "samples" kept, the "format" and the time "until" which
+        # to sample), each rank samples the utilization, queue
+        # occupancy and drops of the links of its nodes over time
+        # (see telemetry.py)
+        if "telemetry" in hpcsim_dict:
+            opts = dict(hpcsim_dict["telemetry"])
+            if "interval" not in opts:
+                raise Exception("telemetry requires a sampling interval")
+            if self.network_model != "packet":
+                raise Exception("telemetry requires the packet network model")
+            sampler = TelemetrySampler(opts.pop("prefix", hpcsim_dict["model_name"]),
+                                       self.simian.rank, restart=hpcsim_dict.get("restart", False),
+                                       **opts)
+            hpcsim_dict["telemetry_sampler"] = sampler
+            self.simian.registerShared("telemetry_sampler", sampler)
+
+        # 2.10 with hpcsim_dict["traffic"] (a dictionary with the
+        # traffic "pattern", the offered "load" and optionally the
+        # "msg_size", "duration", "warmup" and so on), the hosts send
+        # synthetic traffic, which is measured (see traffic.py)
+        if "traffic" in hpcsim_dict:
+            opts = dict(hpcsim_dict["traffic"])
+            if "pattern" not in opts or "load" not in opts:
+                raise Exception("traffic requires a pattern and an offered load")
+            generator = TrafficGenerator(**opts)
+            hpcsim_dict["traffic_generator"] = generator
+            self.simian.registerShared("traffic_generator", generator)
 
         # 3. instantiate the interconnect according to model
         # configuration (important: this in turn will instantiate all
@@ -210,6 +309,25 @@ class Cluster(object):
         #intercontype = self.get_intercon_typename(hpcsim_dict)
         self.intercon = intercontype(self, hpcsim_dict)
         hpcsim_dict["intercon"] = self.intercon
+        self.simian.registerShared("intercon", self.intercon)
+
+        if self.flow_control == "credit":
+            if self.intercon.num_switchs() == 0:
+                raise Exception("credit-based flow control requires an interconnect with switches")
+            # with fewer virtual channels than the switches assign,
+            # packets could wait on each other in a cycle forever
+            if hpcsim_dict.get("num_vcs", 2) < self.intercon.min_vcs():
+                raise Exception("credit-based flow control on %s requires at least %d virtual channels (num_vcs=%d)" %
+                                (hpcsim_dict["intercon_type"], self.intercon.min_vcs(),
+                                 hpcsim_dict.get("num_vcs", 2)))
+
+        # 3.5 the flow network carries all messages between hosts
+        # under the flow-level model
+        if self.network_model == "flow":
+            if self.intercon.num_switchs() == 0:
+                raise Exception("flow network model requires an interconnect with switches")
+            self.simian.addEntity("FlowNetwork", FlowNetwork, 0, hpcsim_dict,
+                                  **self.get_partition(*self.default_partition))
 
     def num_hosts(self):
         """Returns the total number of hosts (compute nodes)."""
@@ -262,6 +380,8 @@ class Cluster(object):
             mpiopt["call_time"] = self.hpcsim_dict["default_configs"]["mpi_call_time"]
         if "putget_thresh" not in mpiopt:
             mpiopt["putget_thresh"] = self.hpcsim_dict["default_configs"]["mpi_putget_thresh"]
+        if "eager_thresh" not in mpiopt:
+            mpiopt["eager_thresh"] = self.hpcsim_dict["default_configs"]["mpi_eager_thresh"]
         if "max_injection" not in mpiopt:
             mpiopt["max_injection"] = self.hpcsim_dict["default_configs"]["mpi_max_injection"]
 
@@ -301,11 +421,39 @@ class Cluster(object):
             mpiopt["get_data_overhead"] = 0
             mpiopt["get_ack_overhead"] = 0
             mpiopt["putget_thresh"] = 1e38 # PUT only
+            mpiopt["eager_thresh"] = 1e38 # eager only
             mpiopt["resend_intv"] = 1e38 # no more retransmissions
             mpiopt["resend_trials"] = 10 # no need actually
             mpiopt["call_time"]  = 0
             mpiopt["max_injection"] = 1e38 # no limit
 
+        if self.network_model == "flow":
+            # the flow network carries a message as a whole (though
+            # its latency is that of the message pipelined in
+            # packets), and loses none
+            if "flow_packet_size" not in self.hpcsim_dict:
+                self.hpcsim_dict["flow_packet_size"] = mpiopt["max_pktsz"]
+            if "flow_window" not in self.hpcsim_dict:
+                # the send window of mpi (see MPIHost.create_mpi_proc)
+                self.hpcsim_dict["flow_window"] = mpiopt["max_injection"] * \
+                    self.intercon.network_diameter_time()*4
+            mpiopt["max_pktsz"] = 1e38 # big enough
+            mpiopt["resend_intv"] = 1e38 # no more retransmissions
+
+        if self.hpcsim_dict["intercon_type"] == 'Analytic':
+            # likewise, the analytic interconnect computes the latency
+            # of a message as a whole, pipelined in packets
+            if "packet_size" not in self.hpcsim_dict["analytic"]:
+                self.hpcsim_dict["analytic"]["packet_size"] = mpiopt["max_pktsz"]
+                self.intercon.pktsz = mpiopt["max_pktsz"]
+            if "window" not in self.hpcsim_dict["analytic"]:
+                # the send window of mpi (see MPIHost.create_mpi_proc)
+                self.hpcsim_dict["analytic"]["window"] = mpiopt["max_injection"] * \
+                    self.intercon.network_diameter_time()*4
+                self.intercon.window = self.hpcsim_dict["analytic"]["window"]
+            mpiopt["max_pktsz"] = 1e38 # big enough
+            mpiopt["resend_intv"] = 1e38 # no more retransmissions
+
         # output mpiopt if hpcsim/mpi debug flags are set
         if self.simian.rank == 0 and \
            ("hpcsim" in self.hpcsim_dict["debug_options"] or \
@@ -317,6 +465,7 @@ class Cluster(object):
             print("mpiopt: get_data_overhead=%d" % mpiopt["get_data_overhead"])
             print("mpiopt: get_ack_overhead=%d" % mpiopt["get_ack_overhead"])
             print("mpiopt: putget_thresh=%d" % mpiopt["putget_thresh"])
+            print("mpiopt: eager_thresh=%g" % mpiopt["eager_thresh"])
             print("mpiopt: resend_intv=%f" % mpiopt["resend_intv"])
             print("mpiopt: resend_trials=%d" % mpiopt["resend_trials"])
             print("mpiopt: call_time=%f" % mpiopt["call_time"])
@@ -340,12 +489,109 @@ class Cluster(object):
                 raise Exception("mpi rank %d mapped to host %d out of range: total #hosts=%d)" %
                                 (idx, hostmap[idx], self.intercon.num_hosts()))
 
+    def get_partition(self, partfct=None, partarg=None):
+        """Returns the keyword arguments for placing entities on ranks.
+
+        The interconnect passes them to simian's addEntity; they name
+        the partition function of the placement file if one is used,
+        and otherwise the given partition function (or none, for
+        simian's default placement).
+        """
+
+        self.default_partition = (partfct, partarg)
+        if self.placement is not None:
+            partfct, partarg = placement_partition, self.placement
+        if self.network_model == "flow":
+            # the switches go with the flow network
+            return { "partition" : flow_partition, "partition_arg" : (partfct, partarg) }
+        elif partfct is not None:
+            return { "partition" : partfct, "partition_arg" : partarg }
+        else:
+            return {}
+
+    def save_partition(self, fname, nranks):
+        """Partitions the model for a parallel run on nranks ranks.
+
+        The topology graph is weighted by the packets sent so far, so
+        the placement follows the traffic if the model has been run
+        (sequentially); the load imbalance and the fraction of traffic
+        between ranks are reported for the interconnect's own placement
+        and for the new one, which is saved to the file.
+        """
+
+        graph = TopologyGraph.from_simian(self.simian)
+        placement = Placement.from_graph(graph, nranks)
+        partfct, partarg = self.default_partition
+        b = graph.quality(Placement(nranks).parts(graph, partfct, partarg), nranks)
+        p = graph.quality(placement.parts(graph), nranks)
+        print("hpcsim: partition for %d ranks of %d entities: "
+              "load imbalance %.3f (was %.3f), cross-rank traffic %.2f%% (was %.2f%%)" % 
+              (nranks, len(graph.vertices), p[0], b[0], p[1]*100, b[1]*100))
+        placement.save(fname)
+        return placement
+
     def run(self):
         """Runs simulation to completion."""
 
+        if "telemetry_sampler" in self.hpcsim_dict:
+            self.start_telemetry()
+        if "traffic_generator" in self.hpcsim_dict:
+            self.hpcsim_dict["traffic_generator"].start_hosts(self.simian, self.num_hosts(),
+                                                              self.hpcsim_dict.get("restart", False))
         self.simian.run()
+        if self.flow_control == "credit":
+            self.report_blocked()
+        if "telemetry_sampler" in self.hpcsim_dict:
+            self.hpcsim_dict["telemetry_sampler"].close()
+        if "packet_tracer" in self.hpcsim_dict:
+            self.hpcsim_dict["packet_tracer"].close()
         self.simian.exit()
 
+        # a sequential run may save the placement of the model for a
+        # parallel one, partitioned according to its traffic
+        if "partition_save" in self.hpcsim_dict:
+            if "partition_ranks" not in self.hpcsim_dict:
+                raise Exception("partition_ranks must be specified with partition_save")
+            self.save_partition(self.hpcsim_dict["partition_save"], self.hpcsim_dict["partition_ranks"])
+
+    def report_blocked(self):
+        """Reports the packets on this rank still waiting for credits.
+
+        Under credit-based flow control, packets left waiting when the
+        simulation ends were held up for good (as in a deadlock), or
+        were still in flight if it ended by time.
+        """
+
+        npkts = nbytes = 0
+        for kind in ("Switch", "Host"):
+            table = self.simian.entities.get(kind)
+            if table is None: continue
+            for node in table.itervalues():
+                for iface in node.interfaces.itervalues():
+                    for op in iface.outports:
+                        npkts += sum(len(q) for q in op.blocked)
+                        nbytes += op.blocked_bytes
+        if npkts > 0:
+            print("WARNING: hpcsim: %d packets (%d bytes) on rank %d still wait for credits at the end of the simulation" %
+                  (npkts, nbytes, self.simian.rank))
+
+    def start_telemetry(self):
+        """Schedules the first sample of the links on this rank.
+
+        The samples are taken by the first switch (or host) on the
+        rank; upon restart, the pending sample is in the checkpoint.
+        """
+
+        if self.hpcsim_dict.get("restart", False): return
+        for kind in ("Switch", "Host"):
+            table = self.simian.entities.get(kind)
+            if table is None: continue
+            ids = table.keys() + table.lazy.keys()
+            if ids:
+                self.simian.schedService(self.hpcsim_dict["telemetry_sampler"].interval,
+                                         "sample_telemetry", None, kind, min(ids))
+                return
+
     @staticmethod
     def get_intercon_typename(hpcsim_dict):
         """Returns the type name of the interconnect class string."""
@@ -5,3 +5,9 @@ from configs import *
 from dragonfly import *
 from fattree import *
 from bypass import *
+from partition import *
+from flow import *
+from analytic import *
+from packet_trace import *
+from telemetry import *
+from traffic import *
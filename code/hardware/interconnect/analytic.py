@@ -0,0 +1,512 @@
+#
+# analytic.py :- an interconnect with closed-form latencies
+#
+# With hpcsim_dict["intercon_type"] set to "Analytic", the hosts are
+# connected as with the bypass interconnect (a message goes straight
+# from the source host to the destination host, without switches),
+# but the time it takes is that of the minimal route between them in
+# the topology given by hpcsim_dict["analytic"]["topology"]: "Torus",
+# "Gemini", "BlueGeneQ" (configured by hpcsim_dict["torus"]),
+# "Fattree" (hpcsim_dict["fattree"]), or "Dragonfly", "Aries"
+# (hpcsim_dict["dragonfly"]). The number of hops, the propagation and
+# processing delays, and the transmission time of a packet over each
+# link of the route are computed in closed form from the coordinates
+# of the source and destination switches; the rest of the message is
+# pipelined at the bandwidth of the slowest link (the message is cut
+# into packets of hpcsim_dict["analytic"]["packet_size"] bytes, or
+# sent as one packet if not given; an mpi message is also charged the
+# header of every packet). If hpcsim_dict["analytic"]["window"] is
+# given, a sender has at most that many bytes in flight: beyond the
+# first window, a message is sent at no more than a window per
+# round-trip time (as with the send window of mpi, see flow.py). The
+# route parameters from a switch to all
+# others are computed at once (with numpy) the first time a host on
+# the switch sends a message, and kept.
+#
+# If hpcsim_dict["analytic"]["contention"] is True, the bytes sent
+# out of and into each switch, into each host, and (for a dragonfly)
+# between each pair of groups are added up during each communication
+# phase (of hpcsim_dict["analytic"]["phase"] seconds, 1e-5 by
+# default), and a message cannot be through before all bytes sent
+# over the same switches, host link or global links during the phase
+# so far can be carried at their bandwidth. Only the messages sent
+# from hosts on the same rank are counted. The model is lossless, and
+# mpi messages are sent as one packet each, without being
+# retransmitted.
+#
+
+import numpy
+from intercon import *
+from torus import *
+from fattree import *
+from dragonfly import *
+from bypass import bypass_partition
+from flow import pipelined_sizes
+
+class TorusGeometry(object):
+    """Minimal routes in a torus (the route of dimension-order routing)."""
+
+    # local variables:
+    #   dims: the dimensions of the torus
+    #   coords: array of the coordinates of each switch
+    #   bdws: array of the link bandwidth in each dimension
+    #   switch_link_delay, host_link_delay, proc_delay: as for Torus
+    #   host_bdw: bandwidth of the link between a host and its switch
+    #   nswitches: number of switches
+    #   host_sw: array of the switch of each host
+    #   switch_bdw: total bandwidth of the links of a switch to the others
+    #   channels: number of links with loads kept apart (none)
+
+    def __init__(self, hpcsim_dict, topology):
+        if "torus" not in hpcsim_dict:
+            raise Exception("'torus' must be specified for analytic %s topology" % topology)
+        if topology == "Gemini": Gemini.set_torus_config(hpcsim_dict)
+        elif topology == "BlueGeneQ": BlueGeneQ.set_torus_config(hpcsim_dict)
+        config = hpcsim_dict["torus"]
+        if "dims" not in config:
+            raise Exception("'dims' must be specified for torus config")
+        if "attached_hosts_per_switch" not in config:
+            raise Exception("'attached_hosts_per_switch' must be specified for torus config")
+        dflt = hpcsim_dict["default_configs"]
+        self.dims = numpy.array(config["dims"], dtype=int)
+        dimh = config["attached_hosts_per_switch"]
+        ndims = len(self.dims)
+        self.bdws = numpy.array(config.get("bdws", (dflt["intercon_bandwidth"],)*ndims), dtype=float)
+        dups = config.get("dups", (1,)*ndims)
+        self.host_bdw = config.get("bdwh", dflt["intercon_bandwidth"])
+        self.switch_link_delay = config.get("switch_link_delay", dflt["intercon_link_delay"])
+        self.host_link_delay = config.get("host_link_delay", dflt["intercon_link_delay"])
+        self.proc_delay = config.get("proc_delay", dflt["intercon_proc_delay"])
+
+        # coordinates as Torus.swid_to_coords
+        self.nswitches = int(numpy.prod(self.dims))
+        cm = numpy.cumprod(numpy.concatenate(([1], self.dims[:-1])))
+        self.coords = (numpy.arange(self.nswitches)[:,None]/cm)%self.dims
+        nhosts = self.nswitches*dimh
+        if "hostmap" in config:
+            if len(config["hostmap"]) != nhosts:
+                raise Exception("incorrect number of hosts in torus hostmap")
+            self.host_sw = numpy.zeros(nhosts, dtype=int)
+            for hmap in config["hostmap"]:
+                self.host_sw[hmap[0]] = numpy.dot(hmap[1:-1], cm)
+        else:
+            self.host_sw = numpy.arange(nhosts)/dimh
+        self.switch_bdw = sum(2*dups[d]*self.bdws[d] for d in xrange(ndims) if self.dims[d] > 1)
+        self.channels = 0
+
+    def paths(self, s, t):
+        """Returns the number of links, the propagation delay, the time
+        per bit and the least bandwidth of the links between switches
+        s and t (arrays of switch ids, broadcast against each other)."""
+
+        dx = numpy.abs(self.coords[s]-self.coords[t])
+        hops = numpy.minimum(dx, self.dims-dx)
+        links = hops.sum(-1)
+        perbit = (hops/self.bdws).sum(-1)
+        minbdw = numpy.where(hops > 0, self.bdws, numpy.inf).min(-1)
+        return links, links*self.switch_link_delay, perbit, minbdw
+
+    def channel(self, s, t):
+        return -1
+
+    def diameter(self):
+        """Returns the network diameter in hops and in time (as Torus)."""
+        d = 2+int((self.dims/2).sum())
+        return d, (d-2)*self.switch_link_delay+2*self.host_link_delay
+
+
+class FattreeGeometry(object):
+    """Minimal routes in a fat-tree (up to the nearest common ancestor
+    and down)."""
+
+    # local variables: (as TorusGeometry)
+    #   levels: number of levels of the tree (nswitches are those at the lowest)
+    #   digits: array of the label of each switch at the lowest level
+    #           (those the hosts are attached to)
+    #   up_delay, down_delay, up_bdw, down_bdw: delay and bandwidth of the links
+
+    def __init__(self, hpcsim_dict, topology):
+        if "fattree" not in hpcsim_dict:
+            raise Exception("'fattree' must be specified for analytic %s topology" % topology)
+        config = hpcsim_dict["fattree"]
+        for k in ("num_ports_per_switch", "num_levels", "switch_link_up_delay",
+                  "switch_link_down_delay", "host_link_delay", "switch_link_up_bdw",
+                  "switch_link_down_bdw", "host_link_bdw", "switch_link_dups"):
+            if k not in config:
+                raise Exception("'%s' must be specified for fattree config" % k)
+        m = config["num_ports_per_switch"]
+        n = self.levels = config["num_levels"]
+        self.up_delay = config["switch_link_up_delay"]
+        self.down_delay = config["switch_link_down_delay"]
+        self.host_link_delay = config["host_link_delay"]
+        self.up_bdw = config["switch_link_up_bdw"]
+        self.down_bdw = config["switch_link_down_bdw"]
+        self.host_bdw = config["host_link_bdw"]
+        self.proc_delay = config.get("proc_delay", \
+            hpcsim_dict["default_configs"]["intercon_proc_delay"])
+
+        # a host label is p_0...p_{n-1} and it's attached at port
+        # p_{n-1} to the switch whose label is p_0...p_{n-2} (the first
+        # number in [0, m), the others in [0, m/2)); as Fattree numbers
+        # the hosts, this switch is the host id divided by m/2
+        nhosts = 2*(m/2)**n
+        self.nswitches = nhosts/(m/2)
+        leaves = numpy.arange(self.nswitches)
+        self.digits = numpy.zeros((self.nswitches, n-1), dtype=int)
+        for i in xrange(n-1):
+            w = (m/2)**(n-2-i)
+            self.digits[:,i] = leaves/w if i == 0 else (leaves/w)%(m/2)
+        self.host_sw = numpy.arange(nhosts)/(m/2)
+        self.switch_bdw = (m/2)*config["switch_link_dups"]*self.up_bdw
+        self.channels = 0
+
+    def paths(self, s, t):
+        """As TorusGeometry.paths."""
+
+        # the common prefix of the labels gives the level of the
+        # nearest common ancestor
+        eq = self.digits[s] == self.digits[t]
+        up = self.levels-1-numpy.cumprod(eq, axis=-1).sum(-1)
+        perbit = up*(1.0/self.up_bdw+1.0/self.down_bdw)
+        minbdw = numpy.where(up > 0, min(self.up_bdw, self.down_bdw), numpy.inf)
+        return 2*up, up*(self.up_delay+self.down_delay), perbit, minbdw
+
+    def channel(self, s, t):
+        return -1
+
+    def diameter(self):
+        """Returns the network diameter in hops and in time (as Fattree)."""
+        n = self.levels
+        return 2*n+2, 2*self.host_link_delay+(self.up_delay+self.down_delay)*n
+
+
+class DragonflyGeometry(object):
+    """Minimal routes in a dragonfly (as the switches' MIN routing)."""
+
+    # local variables: (as TorusGeometry)
+    #   groups: number of groups
+    #   group_size: number of switches in a group
+    #   inter_links: number of (bundles of) global links of a switch
+    #   cascade: whether the groups are connected as cascade
+    #   blades: number of blades per chassis (cascade)
+    #   local_delay, local_bdw: of the links inside a group (all-to-all)
+    #   blade_delay, blade_bdw, chassis_delay, chassis_bdw: of the
+    #       links among blades and among chassis (cascade)
+    #   global_delay, global_bdw: of the links between groups
+    #   channel_bdw: bandwidth between two groups
+
+    def __init__(self, hpcsim_dict, topology):
+        if "dragonfly" not in hpcsim_dict:
+            raise Exception("'dragonfly' must be specified for analytic %s topology" % topology)
+        config = hpcsim_dict["dragonfly"]
+        dflt = hpcsim_dict["default_configs"]
+        for k in ("num_groups", "num_switches_per_group", "num_hosts_per_switch",
+                  "num_inter_links_per_switch", "inter_link_dups",
+                  "inter_group_topology", "intra_group_topology"):
+            if k not in config:
+                raise Exception("'%s' must be specified for dragonfly config" % k)
+        self.groups = config["num_groups"]
+        self.group_size = config["num_switches_per_group"]
+        hps = config["num_hosts_per_switch"]
+        self.inter_links = config["num_inter_links_per_switch"]
+        bundle = 1
+        if config["inter_group_topology"] == "consecutive_aries":
+            bundle = config["num_inter_links_grouped"]
+            self.inter_links /= bundle
+        self.global_delay = config.get("inter_group_delay", dflt["intercon_link_delay"])
+        self.global_bdw = config.get("inter_group_bdw", dflt["intercon_bandwidth"])
+        self.host_bdw = config.get("switch_host_bdw", dflt["intercon_bandwidth"])
+        self.host_link_delay = config.get("switch_host_delay", dflt["intercon_link_delay"])
+        self.proc_delay = config.get("proc_delay", dflt["intercon_proc_delay"])
+        self.cascade = config["intra_group_topology"] == "cascade"
+        if self.cascade:
+            self.blades = config["num_blades_per_chassis"]
+            chassis = config["num_chassis_per_group"]
+            self.blade_delay = config["intra_chassis_delay"]
+            self.blade_bdw = config["intra_chassis_bdw"]
+            self.chassis_delay = config["inter_chassis_delay"]
+            self.chassis_bdw = config["inter_chassis_bdw"]
+            local_bdw = (self.blades-1)*config["intra_chassis_dups"]*self.blade_bdw + \
+                (chassis-1)*config["num_intra_links_grouped"]* \
+                config["inter_chassis_dups"]*self.chassis_bdw
+        else:
+            self.local_delay = config.get("intra_group_delay", dflt["intercon_link_delay"])
+            self.local_bdw = config.get("intra_group_bdw", dflt["intercon_bandwidth"])
+            local_bdw = (self.group_size-1)*config["intra_link_dups"]*self.local_bdw
+
+        self.nswitches = self.groups*self.group_size
+        self.host_sw = numpy.arange(self.nswitches*hps)/hps
+        self.channel_bdw = bundle*config["inter_link_dups"]*self.global_bdw
+        self.switch_bdw = local_bdw+self.inter_links*self.channel_bdw
+        self.channels = self.groups*self.groups
+
+    def local_paths(self, u, v):
+        """Returns the links, delay, time per bit and least bandwidth
+        between switches u and v of the same group."""
+
+        if self.cascade:
+            # among blades of the chassis, then to the other chassis
+            bl = u%self.blades != v%self.blades
+            ch = u/self.blades != v/self.blades
+            links = bl.astype(int)+ch
+            delay = bl*self.blade_delay+ch*self.chassis_delay
+            perbit = bl/self.blade_bdw+ch/self.chassis_bdw
+            minbdw = numpy.minimum(numpy.where(bl, self.blade_bdw, numpy.inf),
+                                   numpy.where(ch, self.chassis_bdw, numpy.inf))
+        else:
+            links = (u != v)*1
+            delay = links*self.local_delay
+            perbit = links/self.local_bdw
+            minbdw = numpy.where(links > 0, self.local_bdw, numpy.inf)
+        return links, delay, perbit, minbdw
+
+    def paths(self, s, t):
+        """As TorusGeometry.paths."""
+
+        a = self.group_size; h = self.inter_links
+        sg = s/a; ss = s%a; tg = t/a; ts = t%a
+        same = sg == tg
+        # the switches of the global link from sg to tg (as
+        # DragonflySwitch.min_forward and connect_inter_link)
+        gw = numpy.where(sg > tg, tg, tg-1)/h
+        land = numpy.where(tg > sg, sg, sg-1)/h
+        l1, d1, p1, b1 = self.local_paths(ss, numpy.where(same, ts, gw))
+        l2, d2, p2, b2 = self.local_paths(land, ts)
+        links = l1+numpy.where(same, 0, 1+l2)
+        delay = d1+numpy.where(same, 0, self.global_delay+d2)
+        perbit = p1+numpy.where(same, 0, 1.0/self.global_bdw+p2)
+        minbdw = numpy.where(same, b1, numpy.minimum(numpy.minimum(b1, b2), self.global_bdw))
+        return links, delay, perbit, minbdw
+
+    def channel(self, s, t):
+        """Returns the index of the global links between the groups of
+        switches s and t, or -1 if in the same group."""
+        sg = s/self.group_size; tg = t/self.group_size
+        return -1 if sg == tg else sg*self.groups+tg
+
+    def diameter(self):
+        """Returns the network diameter in hops and in time (as Dragonfly)."""
+        if self.cascade:
+            return 16, 2*self.host_link_delay+14*(self.chassis_delay+self.blade_delay)+ \
+                2*self.global_delay
+        else:
+            return 7, 2*self.host_link_delay+3*self.local_delay+2*self.global_delay
+
+
+class AnalyticOutport(Outport):
+    """outgoing portal of a host to the analytic interconnect"""
+
+    def send_pkt(self, pkt, upstream=None):
+        """Sends a packet to the destination host, which it reaches
+        after the delay the interconnect computes for it."""
+
+        now = self.node.get_now()
+        sz = pkt.size()
+        xmit_delay = sz*8/self.bdw
+        if self.last_sent_time <= now: qdelay = 0
+        else: qdelay = self.last_sent_time-now
+        self.last_sent_time = now+qdelay+xmit_delay
+        delay = self.node.intercon.calc_delay(pkt, self.last_sent_time)
+        if "interface" in self.node.hpcsim_dict["debug_options"]:
+            print("%f: %s iface(%s) outport %d sends %s to arrive in %0.9f" %
+                  (now, self.node, self.iface.name, self.port, pkt, qdelay+xmit_delay+delay))
+        pkt.set_nexthop(self.peer_iface_name, self.peer_iface_port)
+        self.node.reqService(qdelay+xmit_delay+delay, "handle_packet_arrival",
+                             pkt if self.node.is_local("Host", pkt.dsthost) else pkt.encode(),
+                             "Host", pkt.dsthost)
+        self.stats["sent_bytes"] += sz
+        self.stats["sent_pkts"] += 1
+
+
+# the interconnects whose topologies can be modeled analytically
+analytic_topologies = {
+    "Torus" : (Torus, TorusGeometry),
+    "Gemini" : (Gemini, TorusGeometry),
+    "BlueGeneQ" : (BlueGeneQ, TorusGeometry),
+    "Fattree" : (Fattree, FattreeGeometry),
+    "Dragonfly" : (Dragonfly, DragonflyGeometry),
+    "Aries" : (Aries, DragonflyGeometry),
+}
+
+class Analytic(Interconnect):
+    """Hosts connect all-to-all, with the latencies of a topology."""
+
+    # local variables: (class derived from Interconnect)
+    #   topology: name of the topology
+    #   geometry: the minimal routes of the topology (see TorusGeometry)
+    #   host_sw: list of the switch of each host
+    #   pktsz: size of the packets a message is pipelined in (or None)
+    #   window: the most bytes a sender has in flight (or None)
+    #   contention: whether the loads of the phase slow down messages
+    #   phase: length of a communication phase (in seconds)
+    #   rows: map from switch to the lists of the base delay, time per
+    #         bit, and least bandwidth of the routes to all switches
+    #   load_phase: the phase of the loads
+    #   out_load, in_load: bytes sent out of and into each switch
+    #   eject_load: bytes sent to each host
+    #   channel_load: bytes sent over each channel of the geometry
+
+    def __init__(self, hpcsim, hpcsim_dict):
+        super(Analytic, self).__init__(hpcsim_dict)
+
+        self.nswitches = 0
+        if "analytic" not in hpcsim_dict:
+            raise Exception("'analytic' must be specified for analytic interconnect")
+        config = hpcsim_dict["analytic"]
+        self.topology = config.get("topology", None)
+        if self.topology not in analytic_topologies:
+            raise Exception("analytic topology %r not implemented" % self.topology)
+        self.geometry = analytic_topologies[self.topology][1](hpcsim_dict, self.topology)
+        self.nhosts = len(self.geometry.host_sw)
+        self.host_sw = self.geometry.host_sw.tolist()
+        self.pktsz = config.get("packet_size", None)
+        self.window = config.get("window", None)
+        self.contention = config.get("contention", False)
+        self.phase = config.get("phase", 1e-5)
+        self.rows = dict()
+        self.load_phase = 0
+        self.out_load = numpy.zeros(self.geometry.nswitches)
+        self.in_load = numpy.zeros(self.geometry.nswitches)
+        self.eject_load = numpy.zeros(self.nhosts)
+        self.channel_load = numpy.zeros(self.geometry.channels)
+
+        g = self.geometry
+        mem_bandwidth = config.get("mem_bandwidth", \
+            hpcsim_dict["default_configs"]["mem_bandwidth"])
+        mem_bufsz = config.get("mem_bufsz", \
+            hpcsim_dict["default_configs"]["mem_bufsz"])
+        mem_delay = config.get("mem_delay", \
+            hpcsim_dict["default_configs"]["mem_delay"])
+
+        if hpcsim_dict['simian'].rank == 0 and \
+           ("hpcsim" in hpcsim_dict["debug_options"] or \
+            "intercon" in hpcsim_dict["debug_options"] or \
+            "analytic" in hpcsim_dict["debug_options"]):
+            print("analytic: %s topology, %d hosts" % (self.topology, self.nhosts))
+            print("analytic: packet_size=%r (bytes)" % self.pktsz)
+            print("analytic: window=%r (bytes)" % self.window)
+            print("analytic: contention=%r" % self.contention)
+            print("analytic: phase=%f (seconds)" % self.phase)
+
+        # add hosts as entities (a host only sends over its link, whose
+        # delay is thus its lookahead)
+        simian = hpcsim_dict["simian"]
+        for h in xrange(self.nhosts):
+            simian.addEntity("Host", hpcsim.get_host_typename(hpcsim_dict), h,
+                             hpcsim_dict, # simulation configuration
+                             self, # interconnect
+                             -1, # switch id (-1 means host to host),
+                             'r', 0, # switch interface, and switch port
+                             g.host_bdw, # bandwidth
+                             1e38, # buffer size (big enough to be considered infinite)
+                             g.host_link_delay, # link delay
+                             mem_bandwidth, mem_bufsz, mem_delay, # memory bypass configs
+                             lookahead=g.host_link_delay,
+                             **hpcsim.get_partition(bypass_partition, self))
+
+    def host_outport_type(self):
+        return AnalyticOutport
+
+    def network_diameter(self):
+        """Returns the network diameter in hops."""
+        return self.geometry.diameter()[0]
+
+    def network_diameter_time(self):
+        """Returns the network diameter in time."""
+        return self.geometry.diameter()[1]
+
+    def calc_row(self, s):
+        """Computes the routes from switch s to all switches; returns
+        the base delay, time per bit and least bandwidth of each."""
+
+        g = self.geometry
+        links, delay, perbit, minbdw = g.paths(s, numpy.arange(g.nswitches))
+        # the links between switches, the processing at each switch,
+        # and the links from and to the hosts
+        base = 2*g.host_link_delay+delay+(links+1)*g.proc_delay
+        perbit = perbit+1.0/g.host_bdw
+        minbdw = numpy.minimum(minbdw, g.host_bdw)
+        row = (base.tolist(), perbit.tolist(), minbdw.tolist())
+        self.rows[s] = row
+        return row
+
+    def calc_delay(self, pkt, t):
+        """Returns the time for the packet to get to the destination
+        host after it's been sent by the source host at time t."""
+
+        s = self.host_sw[pkt.srchost]
+        d = self.host_sw[pkt.dsthost]
+        row = self.rows.get(s)
+        if row is None: row = self.calc_row(s)
+        size, pktsz = pipelined_sizes(pkt, self.pktsz)
+
+        # the first packet goes over all links, the rest of the
+        # message is pipelined at the bottleneck (or a window per
+        # round trip), beyond the time the source host took to send it
+        g = self.geometry
+        latency = row[0][d]+pktsz*8*row[1][d]
+        xmit = size*8/row[2][d]
+        if self.window is not None and size > self.window:
+            xmit = max(xmit, self.window*8/row[2][d]+(size-self.window)*2*latency/self.window)
+        if self.contention:
+            xmit = max(xmit, self.add_load(s, d, pkt.dsthost, size, t))
+        return latency+max(0, xmit-pkt.size()*8/g.host_bdw)
+
+    def add_load(self, s, d, h, size, t):
+        """Adds the message to the loads of the phase; returns the
+        time to carry the loads of the switches and links it uses."""
+
+        g = self.geometry
+        phase = int(t/self.phase)
+        if phase != self.load_phase:
+            self.load_phase = phase
+            self.out_load.fill(0)
+            self.in_load.fill(0)
+            self.eject_load.fill(0)
+            self.channel_load.fill(0)
+        self.eject_load[h] += size
+        busy = self.eject_load[h]*8/g.host_bdw
+        if s != d:
+            self.out_load[s] += size
+            self.in_load[d] += size
+            busy = max(busy, max(self.out_load[s], self.in_load[d])*8/g.switch_bdw)
+            c = g.channel(s, d)
+            if c >= 0:
+                self.channel_load[c] += size
+                busy = max(busy, self.channel_load[c]*8/g.channel_bdw)
+        return busy
+
+    def latency_matrix(self, size, hosts=None):
+        """Returns the matrix of the time to send a message of the given
+        size between each pair of the given hosts (all by default),
+        without contention; a host sends to itself in no time."""
+
+        g = self.geometry
+        if hosts is None: hosts = numpy.arange(self.nhosts)
+        else: hosts = numpy.asarray(hosts)
+        if self.pktsz is None or self.pktsz >= size: pktsz = size
+        else: pktsz = self.pktsz
+
+        # between all switches the hosts are attached to, then the hosts
+        sw, idx = numpy.unique(g.host_sw[hosts], return_inverse=True)
+        links, delay, perbit, minbdw = g.paths(sw[:,None], sw[None,:])
+        base = 2*g.host_link_delay+delay+(links+1)*g.proc_delay
+        minbdw = numpy.minimum(minbdw, g.host_bdw)
+        latency = base+pktsz*8*(perbit+1.0/g.host_bdw)
+        xmit = size*8/minbdw
+        if self.window is not None and size > self.window:
+            xmit = numpy.maximum(xmit, self.window*8/minbdw+(size-self.window)*2*latency/self.window)
+        m = (latency+xmit)[idx[:,None], idx[None,:]]
+        numpy.fill_diagonal(m, 0)
+        return m
+
+    @staticmethod
+    def calc_min_delay(hpcsim_dict):
+        """Calculates and returns the min delay value from config parameters."""
+
+        if "analytic" not in hpcsim_dict:
+            raise Exception("'analytic' must be specified for analytic interconnect")
+        topology = hpcsim_dict["analytic"].get("topology", None)
+        if topology not in analytic_topologies:
+            raise Exception("analytic topology %r not implemented" % topology)
+        return analytic_topologies[topology][0].calc_min_delay(hpcsim_dict)
@@ -70,7 +70,7 @@ class Bypass(Interconnect):
                              1e38, # buffer size (big enough to be considered infinite) 
                              self.link_delay, # link delay
                              mem_bandwidth, mem_bufsz, mem_delay, # memory bypass configs
-                             partition=bypass_partition, partition_arg=self)
+                             **hpcsim.get_partition(bypass_partition, self))
 
     # the network diameter (override the same in Interconnect)
     def network_diameter(self):
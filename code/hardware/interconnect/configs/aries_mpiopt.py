@@ -25,6 +25,9 @@
 
 # Assumption: only put transactions considered
 
+# Cray MPICH sends messages up to 8 KB eagerly (MPICH_GNI_MAX_EAGER_MSG_SIZE)
+# and larger ones by the rendezvous protocol.
+
 aries_mpiopt = {
     "min_pktsz" : 0,
     "max_pktsz" : 64,
@@ -32,6 +35,7 @@ aries_mpiopt = {
     "put_ack_overhead" : 3, # 1 phit (1X3 = 3 bytes)
     "get_data_overhead" : 36, # 12 phits (12X3 = 36 bytes)
     "get_ack_overhead" : 9, # 3 phit3 (3X3 = 9 bytes)
+    "eager_thresh" : 8192, # Cray MPICH default
 }
 
 
@@ -11,10 +11,14 @@
 # From "The IBM Blue Gene/Q interconnection network and message unit"
 # The data portion of packet is from 0 to 512B, in increments of 32B chunks
 # Data packets on BG/Q include a 32 byte header; 12B for the network and 20B for the MU
+
+# The MPICH of BG/Q sends messages up to 4KB eagerly (PAMID_EAGER) and
+# larger ones by the rendezvous protocol
 bluegeneq_mpiopt = {
     "min_pktsz" : 0,
     "max_pktsz" : 32,
     "data_overhead" : 32,
+    "eager_thresh" : 4096,
 }
 
 
@@ -24,6 +24,9 @@
 #
 # User data injection rate can sustain greater than 6 GB/s.
 #
+# Cray MPICH sends messages up to 8 KB eagerly (MPICH_GNI_MAX_EAGER_MSG_SIZE)
+# and larger ones by the rendezvous protocol.
+#
 
 gemini_mpiopt = { 
     "min_pktsz" : 0,
@@ -36,4 +39,5 @@ gemini_mpiopt = {
     "max_injection" : 6e9,
     #"resend_intv" : 1e-3,
     "resend_intv" : 0.1,
+    "eager_thresh" : 8192,
 }
@@ -5,9 +5,13 @@
 
 # MVAPICH2 uses a chunk size of 8KByte for most host platform
 
+# MVAPICH2 sends messages up to 12KByte eagerly (MV2_IBA_EAGER_THRESHOLD)
+# and larger ones by the rendezvous protocol
+
 infiniband_mpiopt = {
     "min_pktsz" : 0,
     "max_pktsz" : 8*1024,
+    "eager_thresh" : 12*1024,
 }
 
 
@@ -105,14 +105,14 @@ class Crossbar(Interconnect):
         simian = hpcsim_dict["simian"]
         simian.addEntity("Switch", CrossbarSwitch, 0, hpcsim_dict, proc_delay, 
                          self, bdw, bufsz, self.link_delay,
-                         partition=crossbar_partition, partition_arg=self)
+                         **hpcsim.get_partition(crossbar_partition, self))
 
         for h in xrange(self.nhosts):
             simian.addEntity("Host", hpcsim.get_host_typename(hpcsim_dict), h,
                              hpcsim_dict, self, 0, 'h%d'%h, 0,
                              bdw, bufsz, self.link_delay,
                              mem_bandwidth, mem_bufsz, mem_delay,
-                             partition=crossbar_partition, partition_arg=self)
+                             **hpcsim.get_partition(crossbar_partition, self))
 
     # the network diameter (override the same in Interconnect)
     def network_diameter(self):
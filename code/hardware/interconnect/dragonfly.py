@@ -3,6 +3,7 @@
 #
 
 from intercon import *
+from array import array
 import random
 
 # block decomposition for both hosts and switches
@@ -20,6 +21,21 @@ def dragonfly_partition(entname, entid, nranks, dragonfly):
 
 class DragonflySwitch(Switch):
     """A switch for the dragonfly and aries interconnect."""
+
+    # local variables: (class derived from Switch)
+    #   dragonfly: the dragonfly interconnect
+    #   gid: the group id of this switch
+    #   swid: the switch id inside the group
+    #   route_local: for minimal routing, an array giving the number of
+    #                the interface towards each switch in the group
+    #                (-1 until first used)
+    #   route_local_width: if non-zero, the number of interfaces from
+    #                      the one in route_local, among which the
+    #                      interface is chosen randomly
+    #   route_global: as route_local, towards each other group
+    #   route_global_width: as route_local_width, for route_global
+    #   hop_class: the class of the links of each interface by number
+    #              (see next_vc)
     
     def __init__(self, baseinfo, hpcsim_dict, intercon, gid, swid):
         self.dragonfly = intercon
@@ -31,7 +47,7 @@ class DragonflySwitch(Switch):
         i = self.swid
         j = self.gid
         # establish inter-group connections
-        if self.dragonfly.inter_group_topology is 'consecutive':
+        if self.dragonfly.inter_group_topology == 'consecutive':
             for k in xrange(h):
                 peer_dict = self.connect_inter_link(j, i, k) # j:group id, i:switch id, k:port
                 peer_gid = peer_dict["g_id"]
@@ -55,7 +71,7 @@ class DragonflySwitch(Switch):
                           (self, self.interfaces[iface_name], peer_node_ids, 
                            peer_iface_names, peer_iface_ports))
         # the inter-links are grouped together in such connection.
-        elif self.dragonfly.inter_group_topology is 'consecutive_aries':
+        elif self.dragonfly.inter_group_topology == 'consecutive_aries':
             m = self.dragonfly.num_inter_links_grouped
             for k in xrange(h):
                 for l in xrange(m): # for individual cable (which are bundled together) 
@@ -178,10 +194,45 @@ class DragonflySwitch(Switch):
                   (self, self.interfaces[dir], tuple(peer_node_ids),
                    peer_iface_names, peer_iface_ports))
 
+        # the routing tables: interface x is 'l<x>', interface L+y is
+        # 'g<y>' (where L is the number of local interfaces), followed
+        # by 'h'; the entries for minimal routing are filled in when
+        # first used
+        nl = len([k for k in self.interfaces if k[0] == 'l'])
+        ng = len([k for k in self.interfaces if k[0] == 'g'])
+        self.index_interfaces(['l%d'%x for x in xrange(nl)]+['g%d'%y for y in xrange(ng)]+['h'])
+        self.route_local = array('i', [-1])*self.dragonfly.num_switches_per_group
+        self.route_local_width = array('i', [0])*self.dragonfly.num_switches_per_group
+        self.route_global = array('i', [-1])*self.dragonfly.num_groups
+        self.route_global_width = array('i', [0])*self.dragonfly.num_groups
+
+        # the links between blades are of class 0, the links between
+        # chassis (with cascade) of class 1 and the global links of
+        # class 2, the order in which minimal routes take them
+        nb = self.dragonfly.num_intra_links_for_blades \
+             if self.dragonfly.intra_group_topology == 'cascade' else nl
+        self.hop_class = array('b', [0]*nb+[1]*(nl-nb)+[2]*ng+[-1])
+
     def __str__(self):
         return "switch[%d](%d,%d)"%(self.gid*self.dragonfly.num_switches_per_group+self.swid,
                 self.gid, self.swid)
 
+    def next_vc(self, pkt, iface_in, iface_out):
+        """Returns the virtual channel for a packet to be sent on in.
+
+        Virtual channels are assigned by hop class: a packet stays in
+        its channel as long as it takes links of increasing class
+        (blade, chassis, global), and moves to the next one whenever
+        it doesn't, e.g., on entering a new group; the channels a
+        route needs are given by Dragonfly.min_vcs.
+        """
+        o = self.hop_class[self.iface_index[iface_out]]
+        if o < 0: return 0 # to host
+        i = self.hop_class[self.iface_index[iface_in]]
+        if i < 0: return 0 # from host
+        if o > i: return pkt.vc
+        return pkt.vc+1
+
     def connect_inter_link(self, gid, sid, port, aries = False, l = None):
         """Returns inter-link connection info (grp id, switch id, port)"""
         
@@ -375,6 +426,15 @@ class DragonflySwitch(Switch):
     # (source grp/dest grp/intermediate grp) for cascade connection
     def route_inside_grp_min(self, cur_sid, dest_sid):
         """Returns interface for minimal (MIN) routing inside a grp (cascade connection)."""
+
+        a, b = self.route_inside_grp_min_range(cur_sid, dest_sid)
+        if b is None: return a
+        return self.find_port_aries([a, b])
+
+    def route_inside_grp_min_range(self, cur_sid, dest_sid):
+        """Returns the range of ports, from which one is selected
+        randomly, for minimal (MIN) routing inside a grp (cascade
+        connection), or the port and None if there is no choice."""
         
         # Local vairables    
         #   cur_sid: current switch id, dest_sid: destination switch
@@ -396,10 +456,7 @@ class DragonflySwitch(Switch):
             port = subgrp_output + l_b 
             # select a random port from "bundled" intra-links:
             m = self.dragonfly.num_intra_links_grouped
-            port_range = [l_b+(port-l_b)*m, l_b+(port-l_b)*m+m-1]
-            port_rand = self.find_port_aries(port_range)
-            port = port_rand
-            return port  
+            return l_b+(port-l_b)*m, l_b+(port-l_b)*m+m-1
         # next, check if the switches are in the same row
         # (i.e., directly reachable through blade connection/horizontal connection)
         elif cur_sid/n_b == dest_sid/n_b:
@@ -409,7 +466,7 @@ class DragonflySwitch(Switch):
                 port = dest_sid_rel%n_b-1
             else:
                 port = dest_sid_rel%n_b
-            return port  
+            return port, None
         else:
             # step 1c. go to router "M" to reach destination or intermediate router.
             dest_sid_temp = cur_sgid*n_b+dest_sid_rel  # switch id at intersection of src and dest switch     
@@ -418,7 +475,7 @@ class DragonflySwitch(Switch):
                 port = dest_sid_temp_rel%n_b-1
             else:
                 port = dest_sid_temp_rel%n_b
-            return port  
+            return port, None
         #raise Exception("No port could be found during MIN routing inside grp for Aries")
    
     def find_port_aries(self, port_range):
@@ -432,6 +489,17 @@ class DragonflySwitch(Switch):
 
     def min_forward_cascade(self, dest_gid, dest_sid):
         """Returns interface for minimal (MIN) routing (cascade connection)."""
+
+        kind, a, b = self.min_forward_cascade_range(dest_gid, dest_sid)
+        if b is not None: a = self.find_port_aries([a, b])
+        return '%s%d'%(kind, a)
+
+    def min_forward_cascade_range(self, dest_gid, dest_sid):
+        """Returns the kind of interface ('l' or 'g') and the range of
+        ports, from which one is selected randomly, for minimal (MIN)
+        routing (cascade connection), or the kind, the port and None
+        if there is no choice."""
+
         # The routing algorithm is at: "Cray XC30 System: Overview" by Nathan Wichmann(slide 20).
         # Routing algorithm inside the group is also "adaptive".
         # Chooses between two minimal (global and local) and two non_minimal (global and local) paths.
@@ -442,8 +510,8 @@ class DragonflySwitch(Switch):
         k = self.dragonfly.num_inter_links_per_switch
         # step 1: route within destination group
         if cur_gid == dest_gid:
-            port = self.route_inside_grp_min(cur_sid, dest_sid)
-            return 'l%d'%port  
+            a, b = self.route_inside_grp_min_range(cur_sid, dest_sid)
+            return 'l', a, b
         else:
             if cur_gid > dest_gid:
                 grp_output = dest_gid
@@ -453,18 +521,125 @@ class DragonflySwitch(Switch):
             if grp_rid == cur_sid:
                 # step 2: route between groups (i.e., optical links)
                 port = grp_output%k
-                if self.dragonfly.inter_group_topology is 'consecutive_aries':
+                if self.dragonfly.inter_group_topology == 'consecutive_aries':
                     # select "randomly" among multiple ports to reach desired destination (Aries property)
                     m = self.dragonfly.num_inter_links_grouped
-                    port_range = [port*m, port*m+m-1]
-                    port_rand = self.find_port_aries(port_range)
-                    port = port_rand
-                return 'g%d'%port
+                    return 'g', port*m, port*m+m-1
+                return 'g', port, None
             else:
                 # step 3: route within source group
-                port = self.route_inside_grp_min(cur_sid, grp_rid)
-                return 'l%d'%port  
+                a, b = self.route_inside_grp_min_range(cur_sid, grp_rid)
+                return 'l', a, b
         #raise Exception("No port could be found during MIN routing for Aries")
+
+    def set_min_route(self, dest_gid, dest_sid):
+        """Fills in the entry of the tables for minimal routing to the
+        given group (or switch, if in this group)."""
+
+        if self.dragonfly.intra_group_topology == "cascade":
+            kind, a, b = self.min_forward_cascade_range(dest_gid, dest_sid)
+            i = self.iface_index['%s%d'%(kind, a)]
+            w = 0 if b is None else b-a+1
+        else:
+            i = self.iface_index[self.min_forward(self.gid, self.swid, dest_gid, dest_sid)]
+            w = 0
+        if dest_gid == self.gid:
+            self.route_local[dest_sid] = i; self.route_local_width[dest_sid] = w
+        else:
+            self.route_global[dest_gid] = i; self.route_global_width[dest_gid] = w
+
+    def min_route(self, dest_gid, dest_sid):
+        """Returns the number of the interface for minimal (MIN)
+        routing, as min_forward or min_forward_cascade would."""
+
+        if dest_gid == self.gid:
+            if self.route_local[dest_sid] < 0: self.set_min_route(dest_gid, dest_sid)
+            i = self.route_local[dest_sid]; w = self.route_local_width[dest_sid]
+        else:
+            if self.route_global[dest_gid] < 0: self.set_min_route(dest_gid, dest_sid)
+            i = self.route_global[dest_gid]; w = self.route_global_width[dest_gid]
+        # as find_port_aries (the interfaces of a range are consecutive;
+        # this draws the same number as random.randint, but faster)
+        if w > 0: i += int(random.random()*w)
+        return i
+
+    def min_route_adaptive(self, dest_gid, dest_sid):
+        """Returns the min queuing delay and the output port that has
+        it, among the interfaces for minimal routing to the given
+        group (or switch, if in this group)."""
+
+        if dest_gid == self.gid:
+            if self.route_local[dest_sid] < 0: self.set_min_route(dest_gid, dest_sid)
+            i = self.route_local[dest_sid]; w = self.route_local_width[dest_sid]
+        else:
+            if self.route_global[dest_gid] < 0: self.set_min_route(dest_gid, dest_sid)
+            i = self.route_global[dest_gid]; w = self.route_global_width[dest_gid]
+        m, mop = self.iface_list[i].get_min_qdelay()
+        for j in xrange(i+1, i+w):
+            if m == 0: break
+            d, op = self.iface_list[j].get_min_qdelay()
+            if d < m: m = d; mop = op
+        return m, mop
+
+    def path_qdelay(self, dest_gid, dest_sid):
+        """Returns the queuing delay along the minimal route to the
+        given group, up to and including its global link, and the
+        output port of the first hop (for UGAL-G).
+
+        The queues of the switches on other ranks are not known; the
+        delay then stops at the last switch on this rank.
+        """
+
+        engine = self.engine
+        m, mop = self.min_route_adaptive(dest_gid, dest_sid)
+        total = m; op = mop
+        while op.iface.name[0] != 'g':
+            swid = op.peer_node_id
+            if engine.getRank("Switch", swid) != engine.rank: break
+            d, op = engine.entities["Switch"][swid].min_route_adaptive(dest_gid, dest_sid)
+            total += d
+        return total, mop
+
+    def ugal_route(self, pkt, dest_gid, dest_sid):
+        """Returns the output port for UGAL routing.
+
+        Where a data packet enters the network, it's given the group
+        it is to go through (pkt.ugal_gid): -1 for the minimal route,
+        or a random intermediate group, if the route through it is
+        expected to be faster. The packet then goes along minimal
+        routes to that group, and from there to its destination. At
+        each switch, the least loaded of the links on its way is taken.
+        """
+
+        via = getattr(pkt, "ugal_gid", None)
+        if via is None:
+            via = -1
+            ng = self.dragonfly.num_groups
+            if dest_gid != self.gid and ng > 2 and pkt.type[:4] == 'data':
+                # a random group other than this and the destination
+                g = int(random.random()*(ng-2))
+                if g >= min(self.gid, dest_gid): g += 1
+                if g >= max(self.gid, dest_gid): g += 1
+                if self.dragonfly.route_method == "ugal_global":
+                    qm, mop = self.path_qdelay(dest_gid, dest_sid)
+                    qn, nop = self.path_qdelay(g, 0)
+                else:
+                    qm, mop = self.min_route_adaptive(dest_gid, dest_sid)
+                    qn, nop = self.min_route_adaptive(g, 0)
+                    hm, hn = self.dragonfly.ugal_hops
+                    qm *= hm; qn *= hn
+                if qm > qn+self.dragonfly.ugal_threshold:
+                    pkt.ugal_gid = g
+                    return nop
+                pkt.ugal_gid = -1
+                return mop
+            pkt.ugal_gid = -1
+        elif via == self.gid:
+            # the packet has reached its intermediate group
+            via = pkt.ugal_gid = -1
+        if via >= 0:
+            return self.min_route_adaptive(via, 0)[1]
+        return self.min_route_adaptive(dest_gid, dest_sid)[1]
     
     def route_inside_grp_non_min(self, src_sid, int_sid, dest_sid, first_time):
         """Returns interface for non_minimal (VAL) routing inside a grp (cascade connection)."""
@@ -621,7 +796,7 @@ class DragonflySwitch(Switch):
                 # step 2: route among different groups
                 port = grp_output%k
                 dest = self.connect_inter_link(self.gid, self.swid, port) # new src info for dest grp 
-                if self.dragonfly.inter_group_topology is 'consecutive_aries':
+                if self.dragonfly.inter_group_topology == 'consecutive_aries':
                     # select "randomly" among multiple ports to reach desired destination
                     port_range = [port*m, port*m+m-1]
                     port_rand = self.find_port_aries(port_range)
@@ -656,27 +831,37 @@ class DragonflySwitch(Switch):
     def calc_route(self, pkt): 
         """Returns interface name and port number"""
         
-        h = self.dragonfly.num_hosts_per_group
-        k = self.dragonfly.num_hosts_per_switch
         intra_grp_topo = self.dragonfly.intra_group_topology
         route_method = self.dragonfly.route_method
         # find destination group and switch id from packet destination info
-        dest_gid = int(pkt.dsthost/h)
-        dest_sid = (pkt.dsthost%h)/k
-        # find source group and switch id from packet source info
-        src_gid = int(pkt.srchost/h)
-        src_sid = (pkt.srchost%h)/k
+        dest_gid = self.dragonfly.host_gid[pkt.dsthost]
+        dest_sid = self.dragonfly.host_sid[pkt.dsthost]
         
-        if route_method is "minimal" and intra_grp_topo is "all_to_all":
+        if route_method == "minimal":
+            # the tables give the same interfaces as min_forward (all
+            # to all) or min_forward_cascade (cascade)
             if self.gid == dest_gid and self.swid == dest_sid:# packet reached dest switch
                 port = self.dragonfly.hid_to_port(pkt.dsthost)
                 return "h", port 
             else: 
-                md = self.min_forward(self.gid, self.swid, dest_gid, dest_sid) 
-                m = self.interfaces[md].get_num_ports()
-                port = random.randint(0, m-1)
-                return md, port
-        elif route_method is "non_minimal" and intra_grp_topo is 'all_to_all': 
+                i = self.min_route(dest_gid, dest_sid)
+                port = int(random.random()*self.iface_nports[i]) # as random.randint
+                return self.iface_names[i], port
+
+        if route_method == "ugal_local" or route_method == "ugal_global":
+            if self.gid == dest_gid and self.swid == dest_sid:# packet reached dest switch
+                port = self.dragonfly.hid_to_port(pkt.dsthost)
+                return "h", port
+            op = self.ugal_route(pkt, dest_gid, dest_sid)
+            return op.iface.name, op.port
+
+        # find source group and switch id from packet source info
+        src_gid = self.dragonfly.host_gid[pkt.srchost]
+        src_sid = self.dragonfly.host_sid[pkt.srchost]
+        if pkt.nonreturn_data is None:
+            # (raw transfers carry none)
+            pkt.nonreturn_data = dict()
+        if route_method == "non_minimal" and intra_grp_topo == 'all_to_all': 
             if pkt.type[:4] == 'data' and "int_gid" not in pkt.nonreturn_data:# insert int grp id
                     group_ids = list(range(0, self.dragonfly.num_groups))
                     group_ids.remove(src_gid)
@@ -693,25 +878,10 @@ class DragonflySwitch(Switch):
                     port = random.randint(0, m-1) 
                     return md, port
                 else:   # ACK
-                    md = self.min_forward(self.gid, self.swid, dest_gid, dest_sid) 
-                    m = self.interfaces[md].get_num_ports()
-                    port = random.randint(0, m-1)
-                    return md, port
-        elif route_method is "minimal" and intra_grp_topo == "cascade":
-            if self.gid == dest_gid and self.swid == dest_sid:# packet reached dest switch
-                port = self.dragonfly.hid_to_port(pkt.dsthost)
-                #TODO: change it later ("debug_options")
-                if pkt.type[:4] == 'data':
-                    if "calculate_hops" in self.hpcsim_dict["debug_options"]:
-                        pass
-                        #print("#hops: %d"%pkt.nonreturn_data["num_hops"])   
-                return "h", port 
-            else: 
-                md = self.min_forward_cascade(dest_gid, dest_sid) 
-                m = self.interfaces[md].get_num_ports()
-                port = random.randint(0, m-1) 
-                return md, port
-        elif route_method is "non_minimal" and intra_grp_topo == 'cascade': 
+                    i = self.min_route(dest_gid, dest_sid)
+                    port = int(random.random()*self.iface_nports[i])
+                    return self.iface_names[i], port
+        elif route_method == "non_minimal" and intra_grp_topo == 'cascade': 
             ### insert intermediate grp id
             if pkt.type[:4] == 'data' and "int_gid" not in pkt.nonreturn_data:
                 grp_ids = list(range(0, self.dragonfly.num_groups))
@@ -801,10 +971,9 @@ class DragonflySwitch(Switch):
                     port = random.randint(0, m-1)
                     return md, port
                 else:   # ACK
-                    md = self.min_forward_cascade(dest_gid, dest_sid)
-                    m = self.interfaces[md].get_num_ports()
-                    port = random.randint(0, m-1)
-                    return md, port
+                    i = self.min_route(dest_gid, dest_sid)
+                    port = int(random.random()*self.iface_nports[i])
+                    return self.iface_names[i], port
         else:
             raise Exception("route method %s has not been implemented yet" % self.dragonfly.route_method)
 
@@ -849,7 +1018,7 @@ class Dragonfly(Interconnect):
         self.inter_group_topology = hpcsim_dict["dragonfly"]["inter_group_topology"]
         
         #NOTE: consecutive_aries is specific to aries interconnect (where links are bundled together)
-        if self.inter_group_topology is "consecutive_aries":
+        if self.inter_group_topology == "consecutive_aries":
             if "num_inter_links_grouped" not in hpcsim_dict["dragonfly"]:
                 raise Exception("'num_inter_links_grouped' must be specified for Aries config") 
             self.num_inter_links_grouped = hpcsim_dict["dragonfly"]["num_inter_links_grouped"]
@@ -859,7 +1028,7 @@ class Dragonfly(Interconnect):
             raise Exception("'intra_group_topology' must be specified for dragonfly config") 
         self.intra_group_topology = hpcsim_dict["dragonfly"]["intra_group_topology"]
         
-        if self.intra_group_topology is "all_to_all":
+        if self.intra_group_topology == "all_to_all":
             #print("I'm here: %s"%self.intra_group_topology)
             if "num_intra_links_per_switch" not in hpcsim_dict["dragonfly"]:
                 raise Exception("'num_intra_links_per_switch' must be specified for dragonfly config") 
@@ -875,7 +1044,7 @@ class Dragonfly(Interconnect):
             self.intra_group_delay = hpcsim_dict["dragonfly"].get("intra_group_delay", \
                 hpcsim_dict["default_configs"]["intercon_link_delay"])
         
-        if self.intra_group_topology is "cascade":
+        if self.intra_group_topology == "cascade":
             if "num_chassis_per_group" not in hpcsim_dict["dragonfly"]:
                 raise Exception("'num_chassis_per_group' must be specified for dragonfly/cascade config") 
             self.num_chassis_per_group = hpcsim_dict["dragonfly"]["num_chassis_per_group"]
@@ -947,6 +1116,13 @@ class Dragonfly(Interconnect):
         self.route_method = hpcsim_dict["dragonfly"].get("route_method", \
             hpcsim_dict["default_configs"]["dragonfly_route_method"])
 
+        # with UGAL routing ("ugal_local" or "ugal_global"), a packet
+        # takes the minimal route unless its queuing delay exceeds
+        # that of a route through a random intermediate group by more
+        # than ugal_threshold (in seconds); UGAL-L weighs the delay of
+        # the first link by the number of hops of each route
+        self.ugal_threshold = hpcsim_dict["dragonfly"].get("ugal_threshold", 0)
+
         # added for intra-node communication
         mem_bandwidth = hpcsim_dict["dragonfly"].get("mem_bandwidth", \
             hpcsim_dict["default_configs"]["mem_bandwidth"])
@@ -967,12 +1143,12 @@ class Dragonfly(Interconnect):
             print("dragonfly: inter_link_dups=%d" % self.inter_link_dups)
             print("dragonfly: inter_group_toplogy=%s" % self.inter_group_topology)
             print("dragonfly: intra_group_toplogy=%s" % self.intra_group_topology)
-            if self.intra_group_topology is "all_to_all":
+            if self.intra_group_topology == "all_to_all":
                 print("dragonfly: num_intra_links_per_switch=%d" % self.num_intra_links_per_switch)
                 print("dragonfly: intra_link_dups=%d" % self.intra_link_dups)
                 print("dragonfly: intra_group_bdw=%f (bits per second)" % self.intra_group_bdw)
                 print("dragonfly: intra_group_delay=%f (seconds)" % self.intra_group_delay)
-            if self.intra_group_topology is "cascade":
+            if self.intra_group_topology == "cascade":
                 print("dragonfly: num_chassis_per_group=%d" % self.num_chassis_per_group)
                 print("dragonfly: num_blades_per_chassis=%d" % self.num_blades_per_chassis)
                 print("dragonfly: num_intra_links_for_blades=%d" % self.num_intra_links_for_blades)
@@ -993,11 +1169,26 @@ class Dragonfly(Interconnect):
             print("dragonfly: mem_bufsz =%d (bytes)" % mem_bufsz)
             print("dragonfly: mem_delay=%f (seconds)" % mem_delay)
             print("dragonfly: route_method=%s" % self.route_method)
+            if self.route_method[:4] == "ugal":
+                print("dragonfly: ugal_threshold=%f (seconds)" % self.ugal_threshold)
         
         # compute the total number of switches and hosts
         self.nswitches = self.num_groups*self.num_switches_per_group
         self.nhosts = self.nswitches*self.num_hosts_per_switch
         self.num_hosts_per_group = self.num_hosts_per_switch*self.num_switches_per_group
+
+        # the switch-to-switch hops of the longest minimal route and of
+        # the longest route through an intermediate group (for UGAL-L)
+        if self.intra_group_topology == "cascade":
+            self.ugal_hops = (5, 8)
+        else:
+            self.ugal_hops = (3, 5)
+
+        # calc once: the group id and the switch id inside the group of
+        # each host (for routing)
+        self.host_gid = array('i', [hid/self.num_hosts_per_group for hid in xrange(self.nhosts)])
+        self.host_sid = array('i', [(hid%self.num_hosts_per_group)/self.num_hosts_per_switch
+                                    for hid in xrange(self.nhosts)])
         
         # add switches and hosts as entities
         simian = hpcsim_dict["simian"]
@@ -1006,8 +1197,9 @@ class Dragonfly(Interconnect):
             for a in xrange(self.num_switches_per_group):
                 # each switch is identified by a group id and switch id pair
                 simian.addEntity("Switch", DragonflySwitch, swid, hpcsim_dict, self, g, a,
-                                 partition=dragonfly_partition, partition_arg=self)
-                # add host as entities 
+                                 **hpcsim.get_partition(dragonfly_partition, self))
+                # add host as entities (a host only sends over its link
+                # to the switch, whose delay is thus its lookahead)
                 for h in xrange(self.num_hosts_per_switch):
                     p = self.hid_to_port(h)
                     simian.addEntity("Host", hpcsim.get_host_typename(hpcsim_dict), hid,
@@ -1015,7 +1207,8 @@ class Dragonfly(Interconnect):
                             p, self.switch_host_bdw, self.bufsz,
                             self.switch_host_delay,
                             mem_bandwidth, mem_bufsz, mem_delay,
-                            partition=dragonfly_partition, partition_arg=self)
+                            lookahead=self.switch_host_delay,
+                            **hpcsim.get_partition(dragonfly_partition, self))
                     hid += 1
                 swid += 1
         
@@ -1041,6 +1234,19 @@ class Dragonfly(Interconnect):
         elif self.intra_group_topology == "all_to_all":
             return 2*self.switch_host_delay+(d-4)*self.intra_group_delay+ \
                     2*self.inter_group_delay
+
+    def min_vcs(self):
+        """Returns the number of virtual channels needed (see DragonflySwitch.next_vc)."""
+
+        if self.route_method == "minimal":
+            # local hops, global hop, local hops
+            return 2
+        elif self.route_method == "non_minimal" and self.intra_group_topology == "cascade":
+            # twice blade and chassis hops within each group
+            return 6
+        else:
+            # through an intermediate group
+            return 3
     
     def hid_to_port(self, hid):
         """Returns switch port (through which the host is connected)."""
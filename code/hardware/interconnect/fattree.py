@@ -3,6 +3,7 @@
 #
 
 from intercon import *
+from array import array
 import random
 import itertools
 import math
@@ -104,8 +105,24 @@ class InfinibandSwitch(Switch):
                 print("%s %s connects to host %r iface %r ports %r" % 
                       (self, self.interfaces[dir], tuple(peer_host_ids), 
                        peer_iface_names, peer_iface_ports))
-        # caching data structure: map to store src-dest pairs' port info into the cache
-        self.map_src_dest = dict()
+
+        # the routing tables: interface k is the one of port k ('d%d'
+        # or 'u%d', if it exists), and interface m is 'h'; the hosts
+        # below this switch are those with ids in [down_lo, down_hi),
+        # i.e., whose labels start with the first self.lid numbers of
+        # the switch label
+        if self.fattree.route_method != "multiple_lid_nca":
+            raise Exception("route method %s has not been implemented" % self.fattree.route_method)
+        names = []
+        for k in xrange(h):
+            if self.lid > 0 and k >= h/2: names.append('u%d'%k)
+            else: names.append('d%d'%k)
+        names.append('h')
+        self.index_interfaces([n for n in names if n in self.interfaces])
+        self.route_port = array('i', [self.iface_index.get(n, -1) for n in names])
+        w = self.fattree.label_weights
+        self.down_lo = sum(self.swid[i]*w[i] for i in xrange(self.lid))
+        self.down_hi = self.down_lo+(w[self.lid-1] if self.lid > 0 else self.fattree.nhosts)
 
     def __str__(self):
         swid_str = ':'.join(str(e) for e in self.swid)
@@ -226,37 +243,33 @@ class InfinibandSwitch(Switch):
     def calc_route(self, pkt):
         """Returns interface name and port number"""
 
-        dst_host_list = self.fattree.host_id_to_label_list(pkt.dsthost)
-        src_host_list = self.fattree.host_id_to_label_list(pkt.srchost)
-        n = self.fattree.num_levels
-        m = self.fattree.num_ports_per_switch
-        if self.fattree.route_method == "multiple_lid_nca": # multiple LID nearest common ancestor
-            # caching of src-dest pair
-            key_idx = str(pkt.srchost) + ":" + str(pkt.dsthost) 
-            if key_idx in self.map_src_dest:
-                port = self.map_src_dest[key_idx] 
-            else:
-                # first, check if current switch is directly connected to the dest host
-                dest_switch, con_type = self.connect(None, None, None, dst_host_list)
-                if dest_switch["level"] == self.lid and dest_switch["s_id"] == self.swid:
-                    return "h", dest_switch["port"]
-                # next, find the port to send packet through
-                lid = self.path_selection(src_host_list, dst_host_list)
-                port = self.find_port(self.swid, self.lid, 
-                        dst_host_list, lid, pkt.dsthost) # pkt.dsthost denotes PID
-                self.map_src_dest[key_idx] = port
-            if self.lid > 0 and port >= m/2:    # connection going up
-                md = 'u%d'%port
-                m = self.interfaces[md].get_num_ports()
-                port = random.randint(0,m-1)
-                return md, port
-            else:                               # connection going down
-                md = 'd%d'%port
-                m = self.interfaces[md].get_num_ports()
-                port = random.randint(0,m-1)
-                return md, port
+        # multiple LID nearest common ancestor: the tables give the same
+        # ports as path_selection and find_port; going down, the port
+        # is the number of the destination label at this switch's
+        # level, and going up, it's m/2 plus the number of the source
+        # label at this level (the rank of the source in the group
+        # sharing the prefix with the destination selects the lid)
+        dst = pkt.dsthost
+        if self.fattree.host_swid[dst] == self.node_id:
+            # the current switch is directly connected to the dest host
+            return "h", self.fattree.host_port[dst]
+        if self.down_lo <= dst < self.down_hi:
+            i = self.route_port[self.fattree.host_labels[self.lid][dst]]
         else:
-            raise Exception("route method %d has not been implemented" % self.route_method)
+            i = self.route_port[self.fattree.host_labels[self.lid][pkt.srchost]+
+                                self.fattree.num_ports_per_switch/2]
+        # (the same port as random.randint(0, nports-1) would draw)
+        port = int(random.random()*self.iface_nports[i])
+        return self.iface_names[i], port
+
+    def next_vc(self, pkt, iface_in, iface_out):
+        """Returns the virtual channel for a packet to be sent on in.
+
+        Routes go up, then down, and never up again, so they can't
+        form a cycle of links waiting on each other: one virtual
+        channel is enough, and all packets go in channel 0.
+        """
+        return 0
             
 class Fattree(Interconnect):
     def __init__(self, hpcsim, hpcsim_dict):
@@ -412,6 +425,16 @@ class Fattree(Interconnect):
             self.host_ids[host_id] = [hid, host_id_list]
             self.host_lists[hid] = host_id_list
             hid += 1
+
+        # calc once: for each level, the numbers of the host labels at
+        # that level, the weight of each number in the host id, and the
+        # switch and switch port of each host (for routing)
+        self.host_labels = [array('i', [self.host_lists[hid][l] for hid in xrange(self.nhosts)])
+                            for l in xrange(n)]
+        self.label_weights = [(m/2)**(n-1-l) for l in xrange(n)]
+        self.host_swid = array('i', [0])*self.nhosts
+        self.host_port = self.host_labels[n-1]
+
         if hpcsim_dict['simian'].rank == 0 and \
            "id_lists" in hpcsim_dict["debug_options"]:
             print("Switch IDs:")
@@ -427,9 +450,10 @@ class Fattree(Interconnect):
             level_idx = self.switch_ids[key][1]
             sw_label_list = self.switch_ids[key][2]
             simian.addEntity("Switch", InfinibandSwitch, swid, hpcsim_dict, self, level_idx, sw_label_list,
-                             partition=fattree_partition, partition_arg=self)
+                             **hpcsim.get_partition(fattree_partition, self))
         
-        # initialize each host as entity
+        # initialize each host as entity (a host only sends over its
+        # link to the switch, whose delay is thus its lookahead)
         for host_key in sorted(self.host_lists.iterkeys()):  # just to sort the keys in ascending order
             hid = host_key
             # find the attached switch ID
@@ -440,6 +464,7 @@ class Fattree(Interconnect):
             sub_sid_2 = host_label[0:n-1]
             dest["s_id"] = ':'.join(str(e) for e in sub_sid_2)      
             swid = self.sw_label_to_id(dest["level"], dest["s_id"])
+            self.host_swid[hid] = swid
 
             h = dest["port"]
             simian.addEntity("Host", hpcsim.get_host_typename(hpcsim_dict), hid,
@@ -447,7 +472,8 @@ class Fattree(Interconnect):
                     h, self.host_link_bdw, self.bufsz,
                     self.host_link_delay,
                     mem_bandwidth, mem_bufsz, mem_delay,
-                    partition=fattree_partition, partition_arg=self)
+                    lookahead=self.host_link_delay,
+                    **hpcsim.get_partition(fattree_partition, self))
             
             # create the groups and their members here
             for i in xrange(len(host_label)-1):
@@ -496,6 +522,10 @@ class Fattree(Interconnect):
         return 2*self.host_link_delay+self.switch_link_up_delay*self.num_levels+ \
                 self.switch_link_down_delay*self.num_levels
 
+    def min_vcs(self):
+        """Returns the number of virtual channels needed (see InfinibandSwitch.next_vc)."""
+        return 1
+
     def sw_label_to_id(self, lid, sw_label):
         """Returns the switch id"""
         
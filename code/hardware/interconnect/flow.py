@@ -0,0 +1,291 @@
+#
+# flow.py :- a flow-level model of the interconnection network
+#
+# With hpcsim_dict["network_model"] set to "flow" (rather than the
+# default "packet"), a message sent by a host is not forwarded as a
+# packet by each switch on its way; instead, the host hands it to the
+# flow network, a single entity that carries it as a flow over all the
+# links of its route at once. The links are shared among the active
+# flows with max-min fairness, and the rates are recomputed only when
+# a flow starts or ends (and only for the flows that share links,
+# directly or indirectly, with it). A message arrives at the
+# destination host once all its bits have been sent at the rates
+# allocated to the flow, plus the propagation delay along its route,
+# plus the time for each link after the first to transmit one packet
+# (as a message would be pipelined through the switches in packets of
+# hpcsim_dict["flow_packet_size"] bytes, or sent as one packet if not
+# given); an mpi message is also charged the header of every packet.
+# If hpcsim_dict["flow_window"] is given, a sender has at most that
+# many bytes in flight: beyond the first window, a flow is sent at no
+# more than a window per round-trip time (as with the send window of
+# mpi); the limit is set on the flow's mean rate.
+#
+# The route of a flow is found by the switches of the interconnect
+# (calc_route), as for a packet; an adaptive choice among the ports of
+# an interface goes to the port carrying the fewest flows. The flow
+# network and all switches are thus placed on the same rank. The model
+# is lossless; mpi messages are sent as one flow each, without being
+# broken into packets, and are never retransmitted.
+#
+
+import hashlib
+import heapq
+from intercon import *
+
+# switches and the flow network on rank 0; hosts as placed otherwise
+def flow_partition(entname, entid, nranks, arg):
+    if entname == "Switch" or entname == "FlowNetwork":
+        return 0
+    partfct, partarg = arg
+    if partfct is not None:
+        return partfct(entname, entid, nranks, partarg)
+    # as simian's getOffsetRank
+    return (int(hashlib.md5(entname).hexdigest(), 16)%nranks+entid)%nranks
+
+def pipelined_sizes(pkt, pktsz):
+    """Returns the size of a message cut into packets of pktsz bytes
+    (or sent as one packet if None), and the size of the packets.
+
+    An mpi message is charged the header of every packet: the header
+    is the size of the message beyond its data.
+    """
+
+    size = pkt.size()
+    if pktsz is None or pktsz >= size:
+        pktsz = size
+    elif type(pkt.nonreturn_data) is dict and "data_size" in pkt.nonreturn_data:
+        datasz = pkt.nonreturn_data["data_size"]
+        if datasz > pktsz:
+            hdr = size-datasz
+            size += (int((datasz+pktsz-1)/pktsz)-1)*hdr
+            pktsz += hdr
+    return size, pktsz
+
+class Flow(object):
+    """A message being carried by the flow network."""
+
+    # local variables:
+    #   pkt: the packet carrying the message
+    #   links: the links along the route (see FlowNetwork)
+    #   latency: delay from the end of the first link to the destination
+    #   bits: bits left to send (as of the last update)
+    #   rate: the current rate in bits per second
+    #   last: time of the last update of bits
+    #   version: incremented whenever the completion time changes
+
+    def __init__(self, pkt, links, latency, now, bits):
+        self.pkt = pkt
+        self.links = links
+        self.latency = latency
+        self.bits = bits
+        self.rate = 0
+        self.last = now
+        self.version = 0
+
+
+class FlowNetwork(Node):
+    """The entity that carries all flows of a flow-level model."""
+
+    # local variables: (class derived from Node; it has no interfaces)
+    #   links: map from link to [bandwidth, set of ids of active flows],
+    #          where a link is an outport named by a tuple (node name,
+    #          node id, interface name, port number), or the window of
+    #          a flow, named ("Window", flow id)
+    #   flows: map from flow id to active flow
+    #   next_id: id of the next flow
+    #   finish: heap of (completion time, flow id, flow version)
+    #   checks: completion times for which a check has been scheduled
+    #   stats: statistics, including "flows" and "reallocations"
+
+    def __init__(self, baseinfo, hpcsim_dict):
+        super(FlowNetwork, self).__init__(baseinfo, hpcsim_dict)
+        self.links = dict()
+        self.flows = dict()
+        self.next_id = 0
+        self.finish = []
+        self.checks = set()
+        self.stats = dict()
+        self.stats["flows"] = 0
+        self.stats["reallocations"] = 0
+
+    def __str__(self):
+        return "flownetwork"
+
+    def start_flow(self, *args):
+        """A service handler for a message handed over by a host.
+
+        The data is a list of the packet (or its encoding), the id of
+        the switch the host is attached to, and the bandwidth and the
+        delay of the link from the host to the switch.
+        """
+
+        pkt, swid, bdw, dly = args[0]
+        if type(pkt) is str: pkt = Packet.decode(pkt)
+        now = self.get_now()
+
+        # the route: the host's link, then the outports chosen by the
+        # switches on the way to the destination host
+        hostlink = ("Host", pkt.srchost, "r", 0)
+        if hostlink not in self.links: self.links[hostlink] = [bdw, set()]
+        links = [hostlink]
+        latency = 0
+        hops = 0
+        minbdw = bdw
+
+        # the size of the message and of the packets it'd be cut into
+        size, pktsz = pipelined_sizes(pkt, self.hpcsim_dict.get("flow_packet_size", None))
+
+        while True:
+            sw = self.engine.getEntity("Switch", swid)
+            if pkt.path is not None: pkt.add_to_path(str(sw))
+            pkt.ttl -= 1
+            iface, port = sw.calc_route(pkt)
+            iface = sw.interfaces[iface]
+            if port < 0:
+                # adaptive: the port with the fewest flows
+                port = 0; m = None
+                for p in xrange(iface.get_num_ports()):
+                    l = self.links.get(("Switch", swid, iface.name, p))
+                    n = len(l[1]) if l is not None else 0
+                    if m is None or n < m: port = p; m = n
+            op = iface.outports[port]
+            link = ("Switch", swid, iface.name, port)
+            if link not in self.links: self.links[link] = [op.bdw, set()]
+            links.append(link)
+            latency += pktsz*8/op.bdw+op.link_delay
+            if op.bdw < minbdw: minbdw = op.bdw
+            op.stats["sent_bytes"] += pkt.size()
+            op.stats["sent_pkts"] += 1
+            if op.peer_node_name == "Host":
+                pkt.set_nexthop(op.peer_iface_name, op.peer_iface_port)
+                break
+            swid = op.peer_node_id
+            hops += 1
+            if hops > 1000:
+                raise Exception("%s finds no route for %s" % (self, pkt))
+
+        self.stats["flows"] += 1
+        if "flow" in self.hpcsim_dict["debug_options"]:
+            print("%f: %s starts flow of %s over %d links" % (now, self, pkt, len(links)))
+        if size == 0:
+            self.deliver(Flow(pkt, links, latency, now, 0))
+            return
+
+        fid = self.next_id
+        self.next_id += 1
+        window = self.hpcsim_dict.get("flow_window", None)
+        if window is not None and size > window:
+            # the window is a link of the flow's own, whose bandwidth
+            # is the mean rate of sending the first window at the
+            # bottleneck bandwidth and the rest a window per round trip
+            rtt = 2*(dly+latency)
+            t = window*8.0/minbdw+(size-window)*rtt/window
+            link = ("Window", fid)
+            self.links[link] = [size*8/t, set()]
+            links.append(link)
+        self.flows[fid] = Flow(pkt, links, latency, now, size*8)
+        for l in links: self.links[l][1].add(fid)
+        self.reallocate(links)
+
+    def flow_check(self, *args):
+        """A service handler to end the flows that complete now."""
+
+        now = self.get_now()
+        self.checks.discard(now)
+        seeds = []
+        # (allowing for rounding of the time of the check)
+        limit = now*(1+1e-12)
+        while self.finish and self.finish[0][0] <= limit:
+            t, fid, version = heapq.heappop(self.finish)
+            flow = self.flows.get(fid)
+            if flow is None or flow.version != version: continue # outdated
+            del self.flows[fid]
+            for l in flow.links:
+                if l[0] == "Window": del self.links[l]
+                else:
+                    self.links[l][1].discard(fid)
+                    seeds.append(l)
+            self.deliver(flow)
+        if seeds: self.reallocate(seeds)
+        else: self.schedule_check()
+
+    def deliver(self, flow):
+        """Sends the message of a completed flow to the destination."""
+
+        pkt = flow.pkt
+        if "flow" in self.hpcsim_dict["debug_options"]:
+            print("%f: %s ends flow of %s" % (self.get_now(), self, pkt))
+        self.reqService(flow.latency, "handle_packet_arrival",
+                        pkt if self.is_local("Host", pkt.dsthost) else pkt.encode(),
+                        "Host", pkt.dsthost)
+
+    def reallocate(self, seeds):
+        """Recomputes the rates of the flows sharing links with seeds.
+
+        The flows that share a link, directly or through other flows,
+        with one of the given links get their max-min fair rates by
+        progressive filling: the link with the least bandwidth per
+        flow is the bottleneck of its flows, whose rates are fixed to
+        that share; they are then removed, and the step repeats with
+        the bandwidth left on the other links.
+        """
+
+        now = self.get_now()
+        self.stats["reallocations"] += 1
+
+        # the connected component of the seed links
+        links = set(); flows = set()
+        stack = list(seeds)
+        while stack:
+            l = stack.pop()
+            if l in links: continue
+            links.add(l)
+            for fid in self.links[l][1]:
+                if fid not in flows:
+                    flows.add(fid)
+                    stack.extend(self.flows[fid].links)
+
+        # bring the flows up to date with their old rates
+        for fid in flows:
+            flow = self.flows[fid]
+            flow.bits -= flow.rate*(now-flow.last)
+            if flow.bits < 0: flow.bits = 0
+            flow.last = now
+
+        # progressive filling
+        cap = dict(); cnt = dict()
+        for l in links:
+            n = len(self.links[l][1])
+            if n > 0:
+                cap[l] = self.links[l][0]; cnt[l] = n
+        while cnt:
+            share, b = min((cap[l]/cnt[l], l) for l in cnt)
+            for fid in sorted(self.links[b][1]):
+                flow = self.flows[fid]
+                if fid not in flows: continue # rate already fixed
+                flows.discard(fid)
+                flow.rate = share
+                flow.version += 1
+                if share > 0:
+                    heapq.heappush(self.finish, (now+flow.bits/share, fid, flow.version))
+                for l in flow.links:
+                    cnt[l] -= 1
+                    if cnt[l] == 0: del cnt[l]; del cap[l]
+                    else: cap[l] = max(0, cap[l]-share)
+        self.schedule_check()
+
+    def schedule_check(self):
+        """Makes sure the earliest completion will be checked."""
+
+        while self.finish:
+            t, fid, version = self.finish[0]
+            flow = self.flows.get(fid)
+            if flow is not None and flow.version == version: break
+            heapq.heappop(self.finish) # outdated
+        if self.finish:
+            t = self.finish[0][0]
+            if not self.checks or t < min(self.checks):
+                now = self.get_now()
+                offset = max(0, t-now)
+                self.checks.add(now+offset) # as the engine sets the time
+                self.reqService(offset, "flow_check", None)
@@ -3,7 +3,9 @@
 #
 
 from collections import deque
-from pickle import dumps
+from array import array
+from cPickle import dumps, loads, HIGHEST_PROTOCOL
+import marshal
 from node import *
 
 class Interconnect(object):
@@ -32,6 +34,22 @@ class Interconnect(object):
         """Returns the network diameter in time (only the propagation delay)."""
         raise Exception("derived class must override this method")
 
+    def min_vcs(self):
+        """Returns the number of virtual channels the switches need to
+        be free of deadlocks under credit-based flow control.
+
+        By default, a packet moves to the next virtual channel at
+        every switch after the first (see Switch.next_vc), so there
+        must be as many of them as links between switches on the
+        longest route; a derived class assigning them otherwise may do
+        with fewer.
+        """
+        return max(1, self.network_diameter()-2)
+
+    def host_outport_type(self):
+        """Returns the class of the output port of a host's interface."""
+        return Outport
+
     @staticmethod
     def calc_min_delay(hpcsim_dict):
         """Calculates the min delay between hosts and switches.
@@ -59,13 +77,33 @@ class Packet(object):
     #   return_data: the data to be returned verbatim by ack
     #   nonreturn_data: data transferred in only one way, not ack
     #   sendtime: recorded for measuring end-to-end delay
-    #   path: a sequence of nodes traversed by the packet if blaze_trail is set
+    #   path: a sequence of nodes traversed by the packet if blaze_trail
+    #         is set, or None (see also packet_trace.py)
     #   nexthop_name: next hop interface name
     #   nexthop_id: next hop interface port number
+    #   vc: virtual channel the packet travels in (under credit-based
+    #       flow control, see Outport)
+    #   pipeline_unit: if nonzero, the packet stands for a stream of
+    #       packets of this size, pipelined through the network (see
+    #       Outport.transmit)
+    #   pipeline_tail: the time the rest of the stream takes to follow
+    #       its head over the slowest link so far
+    #
+    # Between nodes on the same rank, a packet is passed by reference,
+    # not copied; once a node hands a packet to an outport (send_pkt),
+    # the packet, and the data it carries, belong to the node receiving
+    # it, and the sender must not modify or keep using them. Between
+    # ranks, the packet is sent in the binary form made by encode().
+
+    # the attributes sent between ranks, in order
+    fields = ("srchost", "dsthost", "type", "seqno", "msglen", "ttl",
+              "prioritized", "return_data", "nonreturn_data", "sendtime",
+              "path", "nexthop_name", "nexthop_id", "vc", "pipeline_unit",
+              "pipeline_tail")
 
     def __init__(self, from_host, to_host, type, seqno, msglen, 
                  return_data=None, nonreturn_data=None,
-                 ttl=-1, prio=False, blaze_trail=True):
+                 ttl=-1, prio=False, blaze_trail=False):
         # ttl should be default to the diameter of the network, but
         # since we don't really have the information here we default
         # it to be infinite (represented by -1)
@@ -80,6 +118,9 @@ class Packet(object):
         self.nonreturn_data = nonreturn_data
         self.sendtime = 0 # will set upon send
         self.path = [] if blaze_trail else None
+        self.vc = 0
+        self.pipeline_unit = 0
+        self.pipeline_tail = 0
 
     def __str__(self):
         return "%s[src=%d, dst=%d, seqno=%d, sz=%d, ttl=%d%s]" % \
@@ -119,6 +160,34 @@ class Packet(object):
     def get_path(self): 
         return self.path
 
+    def encode(self):
+        """Returns the packet as a string of bytes, for another rank.
+
+        The attributes are marshalled as a tuple, which is compact and
+        fast; only if the data carried by the packet cannot be
+        marshalled (e.g., it contains class instances) is the tuple
+        pickled instead. The first byte tells which.
+        """
+        d = self.__dict__
+        t = tuple([d[f] for f in Packet.fields])
+        if len(d) > len(Packet.fields):
+            # attributes set outside of this class go along as a dict
+            t += (dict((k, v) for k, v in d.iteritems() if k not in Packet.fields),)
+        try:
+            return 'M'+marshal.dumps(t)
+        except ValueError:
+            return 'P'+dumps(t, HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(s):
+        """Returns the packet encoded by encode()."""
+        t = marshal.loads(s[1:]) if s[0] == 'M' else loads(s[1:])
+        pkt = Packet.__new__(Packet)
+        d = pkt.__dict__
+        d.update(zip(Packet.fields, t))
+        if len(t) > len(Packet.fields): d.update(t[-1])
+        return pkt
+
 
 class Outport(object):
     """outgoing portal of a network interface"""
@@ -135,8 +204,24 @@ class Outport(object):
     #   max_delay: max queuing delay to send a message (when buffer is full)
     #   link_delay: link propagation delay (in seconds)
     #   last_sent_time: time to complete sending of the previous message (in seconds)
+    #   stream_end: the time the streams last transmitted complete, if
+    #               they're the last ones queued (in seconds)
+    #   stream_unit: transmission time of a packet of these streams (in seconds)
+    #   peer_local: whether packets can be passed by reference to the peer node (set upon first send)
+    #   credits: bytes the peer can still take in each virtual channel,
+    #            or None without credit-based flow control
+    #   vc_bufsz: buffer size of the peer's port for each virtual channel (in bytes)
+    #   blocked: packets waiting for credits, a deque for each virtual channel
+    #   blocked_bytes: total size of the packets waiting for credits
     #   stats: statistics kept in a dictionary, including:
-    #          "sent_types", "sent_pkts", "dropped_bytes", "dropped_pkts"
+    #          "sent_types", "sent_pkts", "dropped_bytes", "dropped_pkts", "blocked_pkts"
+    #
+    # By default, a packet is dropped if the send buffer can't take
+    # it. Under credit-based flow control (enable_credits), the link
+    # is lossless: the outport holds credits for the buffer of the
+    # peer's port, a packet is only sent when there are enough
+    # credits for it in its virtual channel, and otherwise waits for
+    # the peer to return credits as the packets it sent are moved on.
 
     def __init__(self, iface, port, node, peer_node_name, peer_node_id, 
                  peer_iface_name, peer_iface_port, bdw, bufsz, link_delay):
@@ -152,11 +237,25 @@ class Outport(object):
         self.max_delay = bufsz*8/bdw
         self.link_delay = link_delay
         self.last_sent_time = 0
+        self.stream_end = 0
+        self.stream_unit = 0
+        self.peer_local = None
+        self.credits = None
         self.stats = dict()
         self.stats["sent_bytes"] = 0
         self.stats["sent_pkts"] = 0
         self.stats["dropped_bytes"] = 0
         self.stats["dropped_pkts"] = 0
+        self.stats["blocked_pkts"] = 0
+
+    def enable_credits(self, nvcs, vc_bufsz):
+        """Turns on credit-based flow control with the given number of
+        virtual channels, each with the given buffer size at the peer."""
+
+        self.vc_bufsz = vc_bufsz
+        self.credits = [vc_bufsz]*nvcs
+        self.blocked = [deque() for vc in xrange(nvcs)]
+        self.blocked_bytes = 0
 
     def get_qlen_in_bits(self):
         """Returns the current queue length in bits.
@@ -169,16 +268,49 @@ class Outport(object):
         return self.get_qdelay()*self.bdw
 
     def get_qdelay(self):
-        """Returns the instantaneous queuing delay."""
+        """Returns the instantaneous queuing delay.
+
+        Packets waiting for credits count as if they were queued for
+        transmission.
+        """
         now = self.node.get_now()
         if self.last_sent_time <= now:
-            return 0
+            d = 0
         else:
-            return self.last_sent_time-now
+            d = self.last_sent_time-now
+        if self.credits is not None and self.blocked_bytes:
+            d += self.blocked_bytes*8/self.bdw
+        return d
+
+    def send_pkt(self, pkt, upstream=None):
+        """Sends a packet; drops it if buffer's overflown.
+
+        Under credit-based flow control, the packet is never dropped,
+        but waits for credits if there aren't enough of them in its
+        virtual channel (or if other packets in the channel are
+        already waiting). Upstream is the interface name, port number
+        and virtual channel in which the packet arrived at this node,
+        if it did; the buffer space there is freed (its credits
+        returned) once the packet has been sent on.
+        """
+
+        if self.credits is not None:
+            vc = pkt.vc
+            # a packet larger than the peer's buffer is let through
+            # when the buffer is empty
+            if self.blocked[vc] or self.credits[vc] < min(pkt.size(), self.vc_bufsz):
+                if "interface" in self.node.hpcsim_dict["debug_options"]:
+                    print("%f: %s iface(%s) outport %d blocks %s in vc %d (credits=%d)" % 
+                          (self.node.get_now(), self.node, self.iface.name,
+                           self.port, pkt, vc, self.credits[vc]))
+                self.blocked[vc].append((pkt, upstream))
+                self.blocked_bytes += pkt.size()
+                self.stats["blocked_pkts"] += 1
+            else:
+                self.credits[vc] -= pkt.size()
+                self.transmit(pkt, upstream)
+            return
 
-    def send_pkt(self, pkt):
-        """Sends a packet; drops it if buffer's overflown."""
-        
         xmit_delay = pkt.size()*8/self.bdw
         flush_time = self.get_qdelay()+xmit_delay
         #print("x=%.9f q=%.9f l=%.9f" % (xmit_delay, self.get_qdelay(), self.link_delay))
@@ -192,37 +324,110 @@ class Outport(object):
             self.stats["dropped_bytes"] += pkt.size()
             self.stats["dropped_pkts"] += 1
         else:
-            current = self.node.get_now()
-            # schedule arrival of the packet at destination
+            self.transmit(pkt, upstream)
+
+    def add_credits(self, vc, nbytes):
+        """Takes back credits returned by the peer; sends the packets
+        waiting in the virtual channel that now have enough of them."""
+
+        self.credits[vc] += nbytes
+        q = self.blocked[vc]
+        while q and self.credits[vc] >= min(q[0][0].size(), self.vc_bufsz):
+            pkt, upstream = q.popleft()
+            self.blocked_bytes -= pkt.size()
+            self.credits[vc] -= pkt.size()
+            self.transmit(pkt, upstream)
+
+    def transmit(self, pkt, upstream):
+        """Transmits a packet after the packets already in transmission."""
+
+        sz = pkt.size()
+        current = self.node.get_now()
+        if self.last_sent_time <= current:
+            flush_time = sz*8/self.bdw
+        elif pkt.prioritized and self.stream_end >= self.last_sent_time:
+            # a prioritized packet (such as an ack) cuts into the
+            # streams queued at the next packet boundary, rather than
+            # wait for all of them, which are held up as long
+            flush_time = min(self.last_sent_time-current, self.stream_unit)+sz*8/self.bdw
+            self.last_sent_time += sz*8/self.bdw
+            self.stream_end = self.last_sent_time
+        else:
+            flush_time = self.last_sent_time-current+sz*8/self.bdw
+        # schedule arrival of the packet at destination
+        if self.last_sent_time < current+flush_time:
             self.last_sent_time = current+flush_time
-            if "interface" in self.node.hpcsim_dict["debug_options"]:
-                print("%f: %s iface(%s) outport %d transmits %s until %0.9f qlen=%d (bits)" % 
-                      (current, self.node,
-                       self.iface.name if self.iface is not None else "memory",
-                       self.port, pkt, self.last_sent_time, self.get_qlen_in_bits()))
-
-            if self.peer_node_id is None or self.peer_node_id >= 0:
-                pkt.set_nexthop(self.peer_iface_name, self.peer_iface_port)
-                self.node.reqService(flush_time+self.link_delay, "handle_packet_arrival", dumps(pkt), 
+        arrival = flush_time
+        if pkt.pipeline_unit and pkt.pipeline_unit < sz:
+            # a stream holds the link for all of its size, but its head
+            # moves on once the first packet is through; the rest
+            # follows at the pace of the slowest link, and the stream
+            # arrives at a host as a whole
+            tail = (sz-pkt.pipeline_unit)*8/self.bdw
+            if tail > pkt.pipeline_tail: pkt.pipeline_tail = tail
+            arrival -= tail
+            if self.peer_node_name != "Switch": arrival += pkt.pipeline_tail
+            self.stream_end = self.last_sent_time
+            self.stream_unit = pkt.pipeline_unit*8/self.bdw
+        if "interface" in self.node.hpcsim_dict["debug_options"]:
+            print("%f: %s iface(%s) outport %d transmits %s until %0.9f qlen=%d (bits)" % 
+                  (current, self.node,
+                   self.iface.name if self.iface is not None else "memory",
+                   self.port, pkt, self.last_sent_time, self.get_qlen_in_bits()))
+
+        # the packet is passed by reference if the peer node is
+        # on this rank, or else encoded (see Packet)
+        if self.peer_node_id is None or self.peer_node_id >= 0:
+            pkt.set_nexthop(self.peer_iface_name, self.peer_iface_port)
+            if self.peer_local is None:
+                self.peer_local = self.node.is_local(self.peer_node_name, self.peer_node_id)
+            self.node.reqService(arrival+self.link_delay, "handle_packet_arrival",
+                                 pkt if self.peer_local else pkt.encode(),
                                  self.peer_node_name, self.peer_node_id)
+        else:
+            # this is a hack for bypassing the interconnect
+            pkt.set_nexthop(self.peer_iface_name, self.peer_iface_port)
+            self.node.reqService(arrival+self.link_delay, "handle_packet_arrival",
+                                 pkt if self.node.is_local("Host", pkt.dsthost) else pkt.encode(),
+                                 "Host", pkt.dsthost) # directly!!
+        self.stats["sent_bytes"] += sz
+        self.stats["sent_pkts"] += 1
+
+        # the packet leaves the buffer of this node as its
+        # transmission completes
+        if upstream is not None:
+            self.node.return_credits(upstream, sz, flush_time)
+        '''
+        # statistics for number of hops for each packet
+        #TODO: couting # of hops for data packet at the moment
+        if pkt.type[:4] == 'data':
+            pkt.num_hops += 1
+            print pkt.num_hops
+            if "num_hops" not in pkt.nonreturn_data:
+                pkt.nonreturn_data["num_hops"] = 1
             else:
-                # this is a hack for bypassing the interconnect
-                pkt.set_nexthop(self.peer_iface_name, self.peer_iface_port)
-                self.node.reqService(flush_time+self.link_delay, "handle_packet_arrival", dumps(pkt), 
-                                     "Host", pkt.dsthost) # directly!!
-            self.stats["sent_bytes"] += pkt.size()
-            self.stats["sent_pkts"] += 1
-            '''
-            # statistics for number of hops for each packet
-            #TODO: couting # of hops for data packet at the moment
-            if pkt.type[:4] == 'data':
-                pkt.num_hops += 1
-                print pkt.num_hops
-                if "num_hops" not in pkt.nonreturn_data:
-                    pkt.nonreturn_data["num_hops"] = 1
-                else:
-                    pkt.nonreturn_data["num_hops"] += 1
-            '''
+                pkt.nonreturn_data["num_hops"] += 1
+        '''
+
+
+class FlowOutport(Outport):
+    """outgoing portal of a host to the flow network (see flow.py)"""
+
+    def send_pkt(self, pkt, upstream=None):
+        """Hands a packet to the flow network, which carries it on."""
+
+        pkt.set_nexthop(self.peer_iface_name, self.peer_iface_port)
+        if self.peer_local is None:
+            self.peer_local = self.node.is_local("FlowNetwork", 0)
+        if "interface" in self.node.hpcsim_dict["debug_options"]:
+            print("%f: %s iface(%s) outport %d hands %s to flow network" % 
+                  (self.node.get_now(), self.node, self.iface.name, self.port, pkt))
+        self.node.reqService(self.link_delay, "start_flow",
+                             [pkt if self.peer_local else pkt.encode(), self.peer_node_id,
+                              self.bdw, self.link_delay],
+                             "FlowNetwork", 0)
+        self.stats["sent_bytes"] += pkt.size()
+        self.stats["sent_pkts"] += 1
 
 
 class Inport(object):
@@ -235,6 +440,9 @@ class Inport(object):
     #   qlen: current queue length (in bytes)
     #   queue: input queue implemented as a deque
     #   stats: statistics, including "rcvd_bytes", "rcvd_pkts"
+    #   ready_bit: the bit of this port in the node's ready_ports (the
+    #              set of ports with packets waiting), or 0 if the node
+    #              keeps no such set
 
     def __init__(self, iface, port, node):
         self.iface = iface # possibly None if this inport is fast_queue
@@ -242,6 +450,7 @@ class Inport(object):
         self.node = node
         self.qlen = 0 # in bytes
         self.queue = deque()
+        self.ready_bit = 0
         self.stats = dict()
         self.stats["rcvd_bytes"] = 0
         self.stats["rcvd_pkts"] = 0
@@ -249,6 +458,8 @@ class Inport(object):
     def enqueue(self, pkt):
         """Enqueues a packet."""
 
+        if self.ready_bit and not self.queue:
+            self.node.ready_ports |= self.ready_bit
         self.qlen += pkt.size()
         self.queue.append(pkt)
         self.stats["rcvd_bytes"] += pkt.size()
@@ -265,6 +476,8 @@ class Inport(object):
         if len(self.queue) > 0:
             pkt = self.queue.popleft()
             self.qlen -= pkt.size()
+            if self.ready_bit and not self.queue:
+                self.node.ready_ports &= ~self.ready_bit
             if "interface" in self.node.hpcsim_dict["debug_options"]:
                 print ("%f: %s iface(%s) inport %d deque %s (qlen=%d bytes, %d pkts)" %
                        (self.node.get_now(), self.node, 
@@ -293,9 +506,15 @@ class Interface(object):
     #   nports: number of (duplex) ports of the interface
     #   inports: list of input ports
     #   outports: list of output ports
+    #
+    # If the node has virtual channels (num_vcs), the output ports
+    # use credit-based flow control, each virtual channel with an
+    # equal share of the buffer size, unless hpcsim_dict["vc_bufsz"]
+    # gives it.
 
     def __init__(self, node, name, nports, peer_node_names, peer_node_ids, 
-                 peer_iface_names, peer_iface_ports, bdw, bufsz, link_delay):
+                 peer_iface_names, peer_iface_ports, bdw, bufsz, link_delay,
+                 outport_type=Outport):
         self.node = node # parent node (either a switch or a host)
         self.name = name
         self.nports = nports
@@ -303,9 +522,13 @@ class Interface(object):
         self.outports = []
         for p in xrange(nports):
             self.inports.append(Inport(self, p, self.node))
-            self.outports.append(Outport(self, p, self.node, peer_node_names[p], peer_node_ids[p], 
-                                         peer_iface_names[p], peer_iface_ports[p], 
-                                         bdw, bufsz, link_delay))
+            self.outports.append(outport_type(self, p, self.node, peer_node_names[p], peer_node_ids[p], 
+                                              peer_iface_names[p], peer_iface_ports[p], 
+                                              bdw, bufsz, link_delay))
+        if node.num_vcs > 0:
+            vc_bufsz = node.hpcsim_dict.get("vc_bufsz", bufsz/node.num_vcs)
+            for op in self.outports:
+                op.enable_credits(node.num_vcs, vc_bufsz)
 
     def __str__(self):
         return "iface(%s)" % self.name
@@ -326,19 +549,29 @@ class Interface(object):
         min delay
         """
 
-        # mop is min output port, m is the min queue delay
-        mop = self.outports[0]; m = mop.get_qdelay()
-        for op in self.outports[1:]:
-            d = op.get_qdelay() 
-            if d < m: m = d; mop = op
+        # mop is min output port, m is the min queue delay (as
+        # Outport.get_qdelay, with the current time looked up once);
+        # adaptive routing asks for it for every packet, so the search
+        # stops at a port with an empty queue
+        now = self.node.engine.now
+        mop = None
+        for op in self.outports:
+            d = op.last_sent_time-now
+            if d < 0: d = 0
+            if op.credits is not None and op.blocked_bytes:
+                d += op.blocked_bytes*8/op.bdw
+            if mop is None or d < m:
+                m = d; mop = op
+                if d == 0: break
         return m, mop
 
-    def send_pkt(self, pkt, port):
+    def send_pkt(self, pkt, port, upstream=None):
         """Sends a packet from a port.
         
         If port is non-negative, the function sends the packet out
         from the given port. If port is negative, the function sends
-        the packet out from a port with the minimal delay.
+        the packet out from a port with the minimal delay. Upstream is
+        where the packet arrived at this node (see Outport.send_pkt).
         """
 
         # at this point, the packet must not have the same source and
@@ -346,9 +579,9 @@ class Interface(object):
         assert pkt.dsthost != pkt.srchost
         if port < 0:
             m, mop = self.get_min_qdelay()
-            mop.send_pkt(pkt)
+            mop.send_pkt(pkt, upstream)
         else:
-            self.outports[port].send_pkt(pkt)
+            self.outports[port].send_pkt(pkt, upstream)
         return 0 # for now, we don't give processing time
 
     def drop_pkt(self, pkt, port):
@@ -422,11 +655,21 @@ class Switch(Node):
     """Base class for an interconnect switch/router."""
 
     # local variables: (class derived from Node)
-    #   proc_delay: processing delay in seconds
+    #   proc_delay: processing delay in seconds (for each packet routed)
+    #   iface_names: interface names by number (see index_interfaces)
+    #   iface_index: map from interface name to number
+    #   iface_nports: number of ports of each interface by number
+    #   iface_list: interfaces by number
+    #   arbiter_ports: interface/port pairs in the order the routing
+    #                  process serves them (None until it starts)
+    #   ready_ports: bit set of the ports (by position in arbiter_ports)
+    #                with packets waiting
 
     def __init__(self, baseinfo, hpcsim_dict, proc_delay, *args):
         super(Switch, self).__init__(baseinfo, hpcsim_dict)
         self.proc_delay = proc_delay
+        self.arbiter_ports = None
+        self.ready_ports = 0
 
         # the process is responsible for conducting traffic
         self.createProcess("packet_receiver", routing_process)
@@ -436,6 +679,46 @@ class Switch(Node):
     #def __str__(self):
     #    return "switch[%d]" % self.node_id
 
+    def index_interfaces(self, names):
+        """Numbers the interfaces for the routing tables.
+
+        The routing tables of a derived class store small integers
+        rather than interface names: the position of the interface in
+        the given list of names. The names are interned (also as the
+        keys of the interfaces), so that the name looked up for an
+        entry is the same string object as the key; iface_names maps
+        back from number to name, iface_nports has the number of
+        ports of each interface and iface_list the interface itself.
+        """
+
+        self.iface_names = tuple(intern(n) for n in names)
+        self.iface_index = dict((n, i) for i, n in enumerate(self.iface_names))
+        self.iface_nports = array('i', [self.interfaces[n].get_num_ports() for n in self.iface_names])
+        self.iface_list = tuple(self.interfaces[n] for n in self.iface_names)
+        for n in self.iface_names:
+            self.interfaces[n] = self.interfaces.pop(n)
+
+    def get_arbiter_ports(self):
+        """Returns the interface/port pairs in the order of arbitration.
+
+        On the first call, each input port is given its bit in
+        ready_ports, which from then on is kept up to date as packets
+        are enqueued and dequeued.
+        """
+
+        if self.arbiter_ports is None:
+            if len(self.interfaces) == 0:
+                raise Exception("zero interface switch %d not allowed" % self.node_id)
+            self.arbiter_ports = []
+            self.ready_ports = 0
+            for key, iface in self.interfaces.iteritems():
+                for p in range(iface.get_num_ports()):
+                    inport = iface.inports[p]
+                    inport.ready_bit = 1 << len(self.arbiter_ports)
+                    if not inport.is_empty(): self.ready_ports |= inport.ready_bit
+                    self.arbiter_ports.append((key, p))
+        return self.arbiter_ports
+
     def calc_route(self, pkt):
         """Calculates the route and returns the next hop.
 
@@ -445,17 +728,51 @@ class Switch(Node):
         """
         raise Exception("default switch doesn't know how to route")
 
+    def next_vc(self, pkt, iface_in, iface_out):
+        """Returns the virtual channel for a packet to be sent on in.
+
+        The packet arrived through interface iface_in, in virtual
+        channel pkt.vc, and goes out through iface_out. By default,
+        the packet sent by a host starts in virtual channel 0 and
+        moves to the next one at every switch after the first (and a
+        host takes it in channel 0). No cycle of channels waiting on
+        each other, hence no deadlock, is possible as long as there
+        are enough virtual channels for the longest route (see
+        Interconnect.min_vcs, checked by the cluster); a derived class
+        may assign them otherwise to need fewer of them.
+        """
+        if self.interfaces[iface_in].outports[0].peer_node_name != "Switch" or \
+           self.interfaces[iface_out].outports[0].peer_node_name != "Switch":
+            return 0
+        return pkt.vc+1
+
     def forward_packet(self, proc, pkt):
         """Forwards a packet for the routing process."""
 
         iface, port = self.calc_route(pkt)
 
+        # under credit-based flow control, the packet holds the buffer
+        # where it arrived until it's sent on, and goes on in the
+        # virtual channel next_vc assigns it
+        if self.num_vcs > 0:
+            i, p = pkt.get_nexthop()
+            upstream = (i, p, pkt.vc)
+            pkt.vc = self.next_vc(pkt, i, iface)
+        else:
+            upstream = None
+
         # handle packet time-to-live when we forward the packet
         # (moving from input queue to the output queue); note if ttl
         # is already negative or zero before this function is called,
         # it's considered as infinite
         pkt.ttl -= 1
         if pkt.ttl == 0: 
+            if upstream is not None:
+                # a lossless network has nothing to recover the packet
+                # (mpi doesn't resend under credit-based flow control),
+                # and its routes are never longer than the diameter
+                raise Exception("%f: %s: %s exceeds its time-to-live under credit-based flow control" %
+                                (self.get_now(), self, pkt))
             if "switch" in self.hpcsim_dict["debug_options"]:
                 print("%f: %s drops %s (ttl)" % 
                       (self.get_now(), self, pkt))
@@ -465,7 +782,7 @@ class Switch(Node):
                 print("%f: %s forwards %s to iface(%s) %s" % 
                       (self.get_now(), self, pkt, iface, 
                        ("port %d"%port if port>=0 else "")))
-            proc_time = self.interfaces[iface].send_pkt(pkt, port)
+            proc_time = self.interfaces[iface].send_pkt(pkt, port, upstream)
 
             # if nodal processing time is there, the process will
             # sleep for the set amount of time
@@ -481,47 +798,52 @@ def routing_process(self):
     sw = self.entity
 
     # in very beginning, no packet arrival, the process hibernates
+    # (a checkpoint taken while the process is idle restarts it from
+    # the top of its loop; see checkpoint.py in SimianPie)
     assert sw.arrival_semaphore == 0
+    self.setResumePoint(routing_loop, None)
     self.hibernate()
+    routing_loop(self, None)
+
+def routing_loop(self, nxtchk):
+    """The loop of a switch's routing process.
+
+    The interface/port pair to check first is nxtchk (the first one,
+    if None).
+    """
+
+    sw = self.entity
 
-    # list of interace/port pairs for checking; do this once, then we
-    # shuffle it in the loop
-    if len(sw.interfaces) == 0:
-        raise Exception("zero interface switch %d not allowed" % self.node_id)
-    keyportlist = []
-    for key, iface in sw.interfaces.iteritems():
-        for p in range(iface.get_num_ports()):
-            keyportlist.append((key, p))
-    nxtchk = keyportlist[0]
+    # the input ports are served round robin: the next packet comes
+    # from the first port with packets waiting, starting from the one
+    # after the port served last; the ports with packets waiting are
+    # the bits set in ready_ports, so that finding it takes the same
+    # time however many ports the switch has
+    ports = sw.get_arbiter_ports()
+    nxt = 0 if nxtchk is None else ports.index(nxtchk)
 
     while True:
-        # construct the new list of interface/port pairs to be checked
-        # for this round
-        idx = keyportlist.index(nxtchk)
-        kpl = keyportlist[idx:]+keyportlist[:idx]
-
-        for idx in range(len(kpl)):
-            # some miniscule nodal processing time may elapse here
-            if sw.proc_delay > 0:
-                self.sleep(sw.proc_delay)
-
-            # always check the fast queue first
-            if not sw.fast_queue.is_empty():
-                pkt = sw.fast_queue.dequeue()
-                if "switch" in sw.hpcsim_dict["debug_options"]:
-                    print("%f: %s routing_process found %s in fast queue" %
-                          (sw.get_now(), sw, pkt))
-                break
-            
-            # check whether the next interface port has a packet
-            (k,p) = kpl[idx]
-            if not sw.interfaces[k].is_recv_empty(p):
-                pkt = sw.interfaces[k].recv_pkt(p)
-                nxtchk = kpl[(idx+1)%len(kpl)]
-                if "switch" in sw.hpcsim_dict["debug_options"]:
-                    print("%f: %s routing_process found %s in iface(%s,%d)" %
-                          (sw.get_now(), sw, pkt, k, p))
-                break
+        # some miniscule nodal processing time may elapse here
+        if sw.proc_delay > 0:
+            self.sleep(sw.proc_delay)
+
+        # always check the fast queue first
+        if not sw.fast_queue.is_empty():
+            pkt = sw.fast_queue.dequeue()
+            if "switch" in sw.hpcsim_dict["debug_options"]:
+                print("%f: %s routing_process found %s in fast queue" %
+                      (sw.get_now(), sw, pkt))
+        elif sw.ready_ports:
+            # the lowest bit set from nxt on, or else from the start
+            ready = sw.ready_ports >> nxt
+            if ready: idx = nxt+(ready & -ready).bit_length()-1
+            else: idx = (sw.ready_ports & -sw.ready_ports).bit_length()-1
+            (k,p) = ports[idx]
+            pkt = sw.interfaces[k].recv_pkt(p)
+            nxt = (idx+1)%len(ports)
+            if "switch" in sw.hpcsim_dict["debug_options"]:
+                print("%f: %s routing_process found %s in iface(%s,%d)" %
+                      (sw.get_now(), sw, pkt, k, p))
         else: pkt = None
         
         # if we exhausted all input ports, time to go to sleep;
@@ -531,6 +853,7 @@ def routing_process(self):
             if "switch" in sw.hpcsim_dict["debug_options"]:
                 print("%f: %s routing_process sleeps" % (sw.get_now(), sw))
             assert sw.arrival_semaphore == 0
+            self.setResumePoint(routing_loop, ports[nxt])
             self.hibernate()
         else:
             sw.arrival_semaphore -= 1
@@ -544,6 +867,9 @@ class Host(Node):
     # local variables: (class derived from Node)
     #   intercon: the interconnection network
     #   mem_queue: for sending messages on the same host
+    #   traffic: the synthetic traffic the host sends and receives
+    #            (see traffic.py), or None
+    #   traffic_state: the state of the host sending the traffic
 
     def __init__(self, baseinfo, hpcsim_dict, *args):
         # list arguments (args) consist of:
@@ -564,8 +890,17 @@ class Host(Node):
         # 0) host has only one interface, named 'r', and only one port
         # 1) switch's entity name is "Switch"; it's id is given as 'swid'
         # 2) switch's network interface connecting to the hosts has name 'swiface' and port 'swport'
+        # 3) under the flow-level network model, the host hands its
+        #    packets to the flow network instead (see flow.py); the
+        #    interconnect may also have hosts send their packets in
+        #    its own way (see analytic.py)
+        if hpcsim_dict.get("network_model", "packet") == "flow":
+            outport_type = FlowOutport
+        else:
+            outport_type = self.intercon.host_outport_type()
         self.interfaces['r'] = Interface(self, "r",  1, ("Switch",), (swid,),
-                                         (swiface,), (swport,), bdw, bufsz, dly)
+                                         (swiface,), (swport,), bdw, bufsz, dly,
+                                         outport_type)
         if "host.connect" in hpcsim_dict["debug_options"]:
             print("%s %s[0] connects to switch[%d] iface(%s)[%d]" % 
                   (self, self.interfaces['r'], swid, swiface, swport))
@@ -574,6 +909,11 @@ class Host(Node):
         self.mem_queue = Outport(None, 0, self, None, None, #peer_node_id=None; peer_node_id=None
                                  "r", 0, mthru, mbfsz, mdly)
 
+        # with hpcsim_dict["traffic"], the host sends synthetic
+        # traffic (see inject_traffic)
+        self.traffic = hpcsim_dict.get("traffic_generator", None)
+        self.traffic_state = None
+
         # the process is responsible for receiving packets
         self.createProcess("packet_receiver", receive_process)
         self.startProcess("packet_receiver")
@@ -582,6 +922,13 @@ class Host(Node):
     #def __str__(self):
     #    return "host[%d]" % self.node_id
 
+    def trace_send(self, pkt):
+        """Adds this host to the path of a packet it sends (if the path
+        is kept), and records the send in the packet trace (if any)."""
+
+        if pkt.path is not None: pkt.add_to_path(str(self))
+        if self.tracer is not None: self.tracer.send(self, pkt)
+
     def notify_data_recv(self, pkt):
         """Callback method when data is received.
 
@@ -589,15 +936,17 @@ class Host(Node):
         to handle more delicate situations. Here we smply return a raw
         ACK packet.
         """
+
+        if self.traffic is not None: self.traffic.recv(self, pkt)
         
         # send back ack regardless of the sequence
         ack = Packet(self.node_id, pkt.srchost, "ack_raw", pkt.seqno, 0, 
                      return_data=pkt.return_data,
                      ttl=self.intercon.network_diameter(), 
                      prio=True, # ack is prioritized
-                     blaze_trail = pkt.get_path()) # do the same about path
+                     blaze_trail = pkt.get_path() is not None) # do the same about path
         ack.set_sendtime(self.get_now())
-        ack.add_to_path(str(self))
+        self.trace_send(ack)
 
         # check whether the source and destination hosts are the same
         if self.node_id == ack.dsthost:
@@ -633,7 +982,7 @@ class Host(Node):
                      ttl = self.intercon.network_diameter(),
                      blaze_trail = myargs['blaze'] or ("host" in self.hpcsim_dict["debug_options"]))
         pkt.set_sendtime(self.get_now())
-        pkt.add_to_path(str(self))
+        self.trace_send(pkt)
         if "host" in self.hpcsim_dict["debug_options"]:
             print("%f: %s test_raw_xfer sends %s" % (self.get_now(), self, pkt))
 
@@ -642,6 +991,18 @@ class Host(Node):
         else:
             self.interfaces['r'].send_pkt(pkt, 0)
 
+    def inject_traffic(self, *args):
+        """A service for sending synthetic traffic.
+
+        This is a service handler function. The host sends a message
+        of the traffic pattern (see traffic.py) and schedules the
+        next one, until the traffic ends.
+        """
+
+        gap = self.traffic.inject(self)
+        if gap is not None:
+            self.reqService(gap, "inject_traffic", None)
+
 def receive_process(self):
     """A host's process for receiving packets.
 
@@ -652,8 +1013,17 @@ def receive_process(self):
     host = self.entity
 
     # in the beginning, no packet arrival, the process hibernates
+    # (a checkpoint taken while the process is idle restarts it from
+    # the top of its loop; see checkpoint.py in SimianPie)
     assert host.arrival_semaphore == 0
+    self.setResumePoint(receive_loop)
     self.hibernate()
+    receive_loop(self)
+
+def receive_loop(self):
+    """The loop of a host's process for receiving packets."""
+
+    host = self.entity
 
     # we assume that host has only one interface named 'r' and it has
     # only one port
@@ -668,9 +1038,16 @@ def receive_process(self):
             assert host.arrival_semaphore >= 0
         else: 
             assert host.arrival_semaphore == 0
+            self.setResumePoint(receive_loop)
             self.hibernate()
             continue
 
+        # the packet leaves the buffer of the interface (unless it
+        # came from the host itself through memory)
+        if host.num_vcs > 0 and pkt.srchost != pkt.dsthost:
+            i, p = pkt.get_nexthop()
+            host.return_credits((i, p, pkt.vc), pkt.size(), 0)
+
         # handling all packets; we assume all data packets have type
         # starting with 'data' and all acknowledgment packets have
         # type starting with 'ack'
@@ -682,7 +1059,8 @@ def receive_process(self):
                 path = pkt.get_path()
                 #if path is not None:
                 #    for h in path: print("  =>%s" % h)
-                print("%f: %s receives packet delay=%f #hops: %d"%(host.get_now(), host, host.get_now()-pkt.get_sendtime(), len(path)-1))   
+                if path is not None:
+                    print("%f: %s receives packet delay=%f #hops: %d"%(host.get_now(), host, host.get_now()-pkt.get_sendtime(), len(path)-1))   
             # notify whoever wants to handle the received packet
             host.notify_data_recv(pkt)
             '''
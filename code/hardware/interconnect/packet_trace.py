@@ -0,0 +1,209 @@
+#
+# packet_trace.py :- binary traces of the packets' paths through the network
+#
+# With hpcsim_dict["packet_trace"] set to a file name prefix, each
+# rank writes a record to <prefix>.<rank>.trace whenever a packet is
+# sent by its source host, and whenever it arrives at a switch or a
+# host; the records are fixed-size binary structures (see
+# record_format), buffered and written out in blocks, so that tracing
+# neither keeps the paths in the packets nor formats strings. Each
+# packet sent is given an id, unique across ranks, from the id of its
+# source host and a count kept by the rank. A record of an arrival
+# names the input port of the node (the interface by its number in
+# the sorted names of the node's interfaces, and the port); the names
+# of the numbered interfaces are written to <prefix>.<rank>.ifaces at
+# the end of the run. Under the flow-level network model and the
+# analytic interconnect, packets don't visit the switches, and only
+# the hosts write records. (Under optimistic synchronization, the
+# records of rolled-back events are not taken back.)
+#
+# This module also reads the traces offline; run as a script, it
+# prints the latency histogram of the packets and the busiest links,
+# and saves the link utilization over time (a heatmap, one row per
+# link and one column per time bin) as a numpy .npz file:
+#
+#   python packet_trace.py [-b bins] [-l links] [-o heatmap.npz] prefix
+#
+
+import sys, glob, struct
+from optparse import OptionParser
+
+# kind of a record: sent by the source host, arrived at a switch, or
+# arrived at a host
+TRACE_SEND, TRACE_SWITCH, TRACE_HOST = 0, 1, 2
+
+# kind, time, packet id, node id, interface, port, packet size
+record_format = "<BdQiHHI"
+record_size = struct.calcsize(record_format)
+
+class PacketTracer(object):
+    """Writes the trace records of a rank."""
+
+    # local variables:
+    #   fname: name of the trace file
+    #   file: the trace file (opened upon the first record)
+    #   buf: records not yet written out
+    #   nrecords: number of records written or buffered
+    #   next_id: count of the packets sent from this rank
+    #   ifaces: map from (kind, node id) to the map from interface name
+    #           to its number
+    #   append: whether to append to the file (upon restart)
+
+    def __init__(self, prefix, rank, append=False, bufsz=4096):
+        self.fname = "%s.%d.trace" % (prefix, rank)
+        self.file = None
+        self.buf = []
+        self.bufsz = bufsz
+        self.nrecords = 0
+        self.next_id = 0
+        self.ifaces = dict()
+        self.append = append
+        self.pack = struct.Struct(record_format).pack
+
+    def iface_number(self, kind, node, name):
+        """Returns the number of the node's interface of the given name."""
+
+        numbers = self.ifaces.get((kind, node.node_id))
+        if numbers is None:
+            numbers = self.ifaces[(kind, node.node_id)] = \
+                dict((n, i) for i, n in enumerate(sorted(node.interfaces)))
+        return numbers[name]
+
+    def send(self, host, pkt):
+        """Gives the packet an id; records it's sent by the host."""
+
+        pkt.trace_id = (pkt.srchost << 32) | self.next_id
+        self.next_id = (self.next_id+1) & 0xffffffff
+        self.write(TRACE_SEND, host.get_now(), pkt.trace_id, host.node_id, 0, 0, pkt.size())
+
+    def arrive(self, node, pkt):
+        """Records the packet arrives at the node (a host or a switch)."""
+
+        kind = TRACE_HOST if node.name == "Host" else TRACE_SWITCH
+        i, p = pkt.get_nexthop()
+        self.write(kind, node.get_now(), getattr(pkt, "trace_id", 0), node.node_id,
+                   self.iface_number(kind, node, i), p, pkt.size())
+
+    def write(self, *record):
+        self.buf.append(self.pack(*record))
+        self.nrecords += 1
+        if len(self.buf) >= self.bufsz: self.flush()
+
+    def flush(self):
+        """Writes out the buffered records."""
+
+        if self.file is None:
+            self.file = open(self.fname, "ab" if self.append else "wb")
+        self.file.write("".join(self.buf))
+        self.buf = []
+
+    def close(self):
+        """Writes out the rest of the records and the interface names."""
+
+        self.flush()
+        self.file.close()
+        with open(self.fname[:-len(".trace")]+".ifaces", "w") as f:
+            for (kind, nid), numbers in sorted(self.ifaces.iteritems()):
+                for n, i in sorted(numbers.iteritems(), key=lambda x: x[1]):
+                    f.write("%d %d %d %s\n" % (kind, nid, i, n))
+
+
+def read_trace(prefix):
+    """Returns all records of the traces of the given prefix (of all
+    ranks), as a numpy structured array sorted by time."""
+
+    import numpy
+    dtype = numpy.dtype([("kind", "u1"), ("time", "<f8"), ("id", "<u8"), ("node", "<i4"),
+                         ("iface", "<u2"), ("port", "<u2"), ("size", "<u4")])
+    assert dtype.itemsize == record_size
+    parts = [numpy.fromfile(f, dtype=dtype) for f in sorted(glob.glob(prefix+".*.trace"))]
+    if not parts:
+        raise Exception("no trace files found for %s" % prefix)
+    rec = numpy.concatenate(parts)
+    return rec[numpy.argsort(rec["time"], kind="mergesort")]
+
+def read_ifaces(prefix):
+    """Returns the map from (kind, node id, interface number) to the
+    interface name, from all ranks."""
+
+    names = dict()
+    for fname in glob.glob(prefix+".*.ifaces"):
+        with open(fname) as f:
+            for line in f:
+                kind, nid, i, n = line.split()
+                names[(int(kind), int(nid), int(i))] = n
+    return names
+
+def packet_latencies(rec):
+    """Returns the ids of the packets that have arrived at their
+    destination hosts, and the time it took each."""
+
+    import numpy
+    sent = rec[rec["kind"] == TRACE_SEND]
+    arrived = rec[rec["kind"] == TRACE_HOST]
+    # (packets sent to the host itself arrive without being sent out)
+    ids, idx = numpy.unique(sent["id"], return_index=True)
+    pos = numpy.searchsorted(ids, arrived["id"])
+    pos[pos == len(ids)] = 0
+    ok = ids[pos] == arrived["id"]
+    return arrived["id"][ok], arrived["time"][ok]-sent["time"][idx[pos[ok]]]
+
+def link_utilization(rec, nbins):
+    """Returns the links (as (kind, node id, interface, port) of the
+    input port the packets arrived at), the edges of the time bins, and
+    the matrix of the bytes that arrived over each link in each bin."""
+
+    import numpy
+    hops = rec[rec["kind"] != TRACE_SEND]
+    keys = numpy.zeros(len(hops), dtype=[("kind", "u1"), ("node", "<i4"),
+                                         ("iface", "<u2"), ("port", "<u2")])
+    for k in keys.dtype.names: keys[k] = hops[k]
+    links, link_idx = numpy.unique(keys, return_inverse=True)
+    t0 = rec["time"][0]; t1 = rec["time"][-1]
+    edges = numpy.linspace(t0, t1 if t1 > t0 else t0+1e-9, nbins+1)
+    bins = numpy.clip(numpy.searchsorted(edges, hops["time"], side="right")-1, 0, nbins-1)
+    heat = numpy.zeros((len(links), nbins))
+    numpy.add.at(heat, (link_idx, bins), hops["size"])
+    return links, edges, heat
+
+def main(argv):
+    import numpy
+    parser = OptionParser(usage="%prog [options] prefix")
+    parser.add_option("-b", "--bins", type="int", dest="nbins", default=50,
+                      help="time bins of the heatmap")
+    parser.add_option("-l", "--links", type="int", dest="nlinks", default=10,
+                      help="busiest links to list")
+    parser.add_option("-o", "--output", dest="output", default=None,
+                      help="file to save the heatmap to (npz)")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1: parser.error("a trace prefix is required")
+    prefix = args[0]
+
+    rec = read_trace(prefix)
+    print("%d records, from %.9f to %.9f (seconds)" % (len(rec), rec["time"][0], rec["time"][-1]))
+
+    ids, lat = packet_latencies(rec)
+    print("%d packets delivered" % len(ids))
+    if len(lat):
+        print("latency: min=%.9f mean=%.9f max=%.9f (seconds)" % (lat.min(), lat.mean(), lat.max()))
+        counts, edges = numpy.histogram(lat, bins=10)
+        width = max(1, counts.max())
+        for c, lo, hi in zip(counts, edges[:-1], edges[1:]):
+            print("  [%.9f, %.9f) %8d %s" % (lo, hi, c, "#"*(40*c/width)))
+
+    links, edges, heat = link_utilization(rec, options.nbins)
+    names = read_ifaces(prefix)
+    total = heat.sum(1)
+    print("%d links used; busiest:" % len(links))
+    span = edges[-1]-edges[0]
+    for i in numpy.argsort(-total, kind="mergesort")[:options.nlinks]:
+        k, n, f, p = links[i]
+        print("  %s[%d] iface(%s)[%d]: %d bytes, %.3f Gb/s on average" %
+              ("host" if k == TRACE_HOST else "switch", n, names.get((k, n, f), f), p,
+               total[i], total[i]*8/span/1e9))
+    if options.output is not None:
+        numpy.savez(options.output, links=links, edges=edges, heatmap=heat)
+        print("heatmap saved to %s" % options.output)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,292 @@
+#
+# partition.py :- graph-based placement of hosts and switches on ranks
+#
+# For a parallel run, simian places each entity (a host or a switch)
+# on a rank using a partition function; by default, either a hash of
+# the entity name (the torus), or the block decomposition defined for
+# the interconnect (e.g., fattree_partition). Here the entities are
+# placed instead by partitioning the interconnect topology graph,
+# whose vertices are the hosts and switches and whose edges are the
+# links between them, weighted by the traffic they are estimated to
+# carry: each rank receives about the same vertex weight (so the same
+# amount of simulation work), while the weight of the edges cut by
+# the partition (the events sent between ranks) is kept small.
+#
+# The partition is computed in a sequential run, with traffic taken
+# from the packet counts of the ports if the model has already run
+# (see Cluster.save_partition), and stored in a placement file that a
+# later parallel run reads (hpcsim_dict["partition_file"]).
+#
+
+import hashlib
+import heapq
+from collections import deque
+
+class TopologyGraph(object):
+    """Hosts and switches of a model and the links between them."""
+
+    # local variables:
+    #   vertices: list of (entity name, entity id)
+    #   index: map from (entity name, entity id) to vertex index
+    #   vwgt: vertex weights (estimated work of each entity)
+    #   adj: for each vertex, a map from adjacent vertex to edge weight
+
+    def __init__(self):
+        self.vertices = []
+        self.index = dict()
+        self.vwgt = []
+        self.adj = []
+
+    def add_vertex(self, v, w=1):
+        """Adds an entity (or adds to its weight if it exists)."""
+        if v in self.index:
+            self.vwgt[self.index[v]] += w
+        else:
+            self.index[v] = len(self.vertices)
+            self.vertices.append(v)
+            self.vwgt.append(w)
+            self.adj.append(dict())
+
+    def add_edge(self, u, v, w=1):
+        """Adds a link between two entities (or adds to its weight)."""
+        self.add_vertex(u, 0)
+        self.add_vertex(v, 0)
+        i = self.index[u]; j = self.index[v]
+        if i != j:
+            self.adj[i][j] = self.adj[i].get(j, 0)+w
+            self.adj[j][i] = self.adj[j].get(i, 0)+w
+
+    @staticmethod
+    def from_simian(simian):
+        """Returns the topology graph of the nodes instantiated by simian.
+
+        Vertices are weighted by one plus the number of packets sent
+        and received, and links by one plus the packets sent over them,
+        so that the graph reflects the traffic of a run if there has
+        been one, and otherwise only the topology. All
+        entities must be local, i.e., simian must be run sequentially.
+        """
+
+        if simian.size > 1:
+            raise Exception("topology graph can only be collected in a sequential run")
+        simian.buildEntities() # those added lazily and never used
+        g = TopologyGraph()
+        for name in sorted(simian.entities.iterkeys()):
+            for id, node in sorted(simian.entities[name].iteritems()):
+                interfaces = getattr(node, "interfaces", None)
+                if interfaces is None: continue
+                u = (name, id)
+                sent = 0
+                for iface in interfaces.itervalues():
+                    for op in iface.outports:
+                        pkts = op.stats["sent_pkts"]
+                        sent += pkts
+                        if op.peer_node_id is not None and op.peer_node_id >= 0:
+                            # each direction adds half of the link's structural weight
+                            v = (op.peer_node_name, op.peer_node_id)
+                            g.add_edge(u, v, pkts+0.5)
+                            g.add_vertex(v, pkts) # packet arrivals at the peer
+                mem_queue = getattr(node, "mem_queue", None)
+                if mem_queue is not None: sent += mem_queue.stats["sent_pkts"]
+                g.add_vertex(u, 1+sent)
+        return g
+
+    def partition(self, nparts, tolerance=0.03, passes=4):
+        """Returns the rank of each vertex by recursive bisection.
+
+        Each bisection grows one side from a peripheral vertex,
+        always adding the frontier vertex most connected to it, until
+        it holds its share of the vertex weight; it is then improved by
+        moving boundary vertices that reduce the cut, as long as the
+        sides stay within the tolerance of their share.
+        """
+
+        parts = [0]*len(self.vertices)
+        self._split(range(len(self.vertices)), 0, nparts, parts, tolerance, passes)
+        return parts
+
+    def _split(self, verts, first, nparts, parts, tolerance, passes):
+        if nparts == 1 or len(verts) <= 1:
+            for v in verts: parts[v] = first
+            return
+        k = nparts/2
+        total = sum(self.vwgt[v] for v in verts)
+        target = 1.0*total*k/nparts
+        side = self._grow(verts, target)
+        self._refine(verts, side, target, total, tolerance, passes)
+        left = [v for v in verts if side[v]]
+        right = [v for v in verts if not side[v]]
+        self._split(left, first, k, parts, tolerance, passes)
+        self._split(right, first+k, nparts-k, parts, tolerance, passes)
+
+    def _peripheral(self, start, members):
+        # the vertex found last by a breadth-first search is far from
+        # the start; repeating it from there finds a peripheral vertex
+        for sweep in xrange(2):
+            seen = set([start]); q = deque([start]); last = start
+            while q:
+                last = q.popleft()
+                for u in self.adj[last]:
+                    if u in members and u not in seen:
+                        seen.add(u); q.append(u)
+            start = last
+        return start
+
+    def _grow(self, verts, target):
+        members = set(verts)
+        side = dict((v, False) for v in verts)
+        skipped = set() # vertices too heavy to add when last considered
+        weight = 0
+        conn = dict() # connectivity of frontier vertices to the grown side
+        heap = []
+        remaining = deque(verts)
+        while weight < target:
+            while heap and (side[heap[0][2]] or -heap[0][0] != conn[heap[0][2]]):
+                heapq.heappop(heap) # outdated entry
+            if heap:
+                v = heapq.heappop(heap)[2]
+            else:
+                # start from a peripheral vertex, or, if the grown side
+                # has no more neighbors (e.g., the graph is not
+                # connected), from any vertex left
+                while remaining and (side[remaining[0]] or remaining[0] in skipped):
+                    remaining.popleft()
+                if not remaining: break
+                if weight == 0: v = self._peripheral(remaining[0], members)
+                else: v = remaining.popleft()
+            # skip a vertex that overshoots the target more than the
+            # side now undershoots it
+            if weight > 0 and weight+self.vwgt[v]-target > target-weight:
+                skipped.add(v)
+                continue
+            side[v] = True
+            weight += self.vwgt[v]
+            for u, w in self.adj[v].iteritems():
+                if u in members and not side[u]:
+                    conn[u] = conn.get(u, 0)+w
+                    heapq.heappush(heap, (-conn[u], len(heap), u))
+        return side
+
+    def _gain(self, v, side, members):
+        # the cut weight saved by moving a vertex to the other side
+        gain = 0
+        for u, w in self.adj[v].iteritems():
+            if u in members:
+                if side[u] == side[v]: gain -= w
+                else: gain += w
+        return gain
+
+    def _refine(self, verts, side, target, total, tolerance, passes):
+        members = set(verts)
+        slack = tolerance*total
+        weight = sum(self.vwgt[v] for v in verts if side[v])
+        for p in xrange(passes):
+            # first restore the balance, moving from the heavier side
+            # the vertices that cost the least cut, then move the
+            # vertices that reduce the cut while the balance holds
+            moved = 0
+            if abs(weight-target) > slack:
+                heavy = weight > target
+                cands = sorted((-self._gain(v, side, members), v) for v in verts if side[v] == heavy)
+                for _, v in cands:
+                    if abs(weight-target) <= slack: break
+                    nw = weight-self.vwgt[v] if heavy else weight+self.vwgt[v]
+                    if abs(nw-target) >= abs(weight-target): continue
+                    side[v] = not side[v]
+                    weight = nw
+                    moved += 1
+            cands = sorted((-g, v) for (g, v) in ((self._gain(v, side, members), v) for v in verts) if g > 0)
+            for _, v in cands:
+                if self._gain(v, side, members) <= 0: continue # neighbors moved since
+                nw = weight-self.vwgt[v] if side[v] else weight+self.vwgt[v]
+                if abs(nw-target) > max(slack, abs(weight-target)): continue
+                side[v] = not side[v]
+                weight = nw
+                moved += 1
+            if moved == 0: break
+
+    def quality(self, parts, nparts):
+        """Returns (load imbalance, cut fraction) of a partition.
+
+        The load imbalance is the max vertex weight on a rank over the
+        mean; the cut fraction is the weight of the edges between
+        ranks over the total edge weight.
+        """
+
+        load = [0]*nparts
+        for v, w in enumerate(self.vwgt): load[parts[v]] += w
+        cut = 0; total = 0
+        for v, a in enumerate(self.adj):
+            for u, w in a.iteritems():
+                if u > v:
+                    total += w
+                    if parts[u] != parts[v]: cut += w
+        imbalance = max(load)*nparts/float(sum(load)) if sum(load) > 0 else 1.0
+        return imbalance, (cut/float(total) if total > 0 else 0.0)
+
+
+class Placement(object):
+    """Entity-to-rank map, as computed from a topology graph."""
+
+    # local variables:
+    #   nranks: number of ranks
+    #   ranks: map from (entity name, entity id) to rank
+
+    def __init__(self, nranks, ranks=None):
+        self.nranks = nranks
+        self.ranks = ranks if ranks is not None else dict()
+
+    @staticmethod
+    def from_graph(graph, nranks, **kargs):
+        """Partitions the topology graph among nranks ranks."""
+        parts = graph.partition(nranks, **kargs)
+        return Placement(nranks, dict(zip(graph.vertices, parts)))
+
+    def save(self, fname):
+        """Writes the placement, one 'name id rank' line per entity."""
+        with open(fname, "w") as f:
+            f.write("# ranks %d\n" % self.nranks)
+            for (name, id), r in sorted(self.ranks.iteritems()):
+                f.write("%s %d %d\n" % (name, id, r))
+
+    @staticmethod
+    def load(fname):
+        """Reads a placement written by save()."""
+        nranks = None; ranks = dict()
+        with open(fname) as f:
+            for line in f:
+                w = line.split()
+                if not w: continue
+                if w[0] == '#':
+                    if len(w) == 3 and w[1] == "ranks": nranks = int(w[2])
+                    continue
+                ranks[(w[0], int(w[1]))] = int(w[2])
+        if nranks is None:
+            raise Exception("placement file %s has no '# ranks' line" % fname)
+        return Placement(nranks, ranks)
+
+    def parts(self, graph, partfct=None, partarg=None):
+        """Returns the rank of each vertex of the graph in this
+        placement, or, if partfct is given, in the placement that
+        function makes (or simian's default, if partfct is None and
+        this placement is empty)."""
+
+        parts = []
+        for name, id in graph.vertices:
+            if partfct is not None:
+                parts.append(partfct(name, id, self.nranks, partarg))
+            elif self.ranks:
+                parts.append(self.ranks[(name, id)])
+            else: # as simian's getOffsetRank
+                parts.append((int(hashlib.md5(name).hexdigest(), 16)%self.nranks+id)%self.nranks)
+        return parts
+
+
+def placement_partition(entname, entid, nranks, placement):
+    """Partition function for simian that follows a placement."""
+    if nranks != placement.nranks:
+        raise Exception("placement is for %d ranks, not %d" % (placement.nranks, nranks))
+    try:
+        return placement.ranks[(entname, entid)]
+    except KeyError:
+        raise Exception("entity %s[%d] is not in the placement" % (entname, entid))
@@ -0,0 +1,310 @@
+#
+# telemetry.py :- time series of the load of the links and switches
+#
+# With hpcsim_dict["telemetry"] set (a dictionary, see
+# TelemetrySampler), each rank samples the output ports of its
+# switches and hosts every "interval" simulated seconds: the
+# utilization of each link over the interval (from the bytes sent),
+# the occupancy of its queue at the time of the sample (in bits, see
+# Outport.get_qlen_in_bits) and the packets it dropped over the
+# interval. The samples are kept in numpy ring buffers, with columns
+# preallocated for the ports of each interface of a node when the
+# node is first seen, which hold the last "samples" samples; at the
+# end of the run, they are written to <prefix>.<rank>.telemetry.npz
+# (or .csv), one column per quantity and one row per port and sample.
+# (Under the flow-level network model, the links don't keep the
+# packets in transmission, and telemetry isn't available.)
+#
+# The sampling is an event of its own, handled by one of the nodes
+# on the rank (see Node.sample_telemetry); sending and receiving
+# packets isn't touched. Samples are skipped while no link on the
+# rank is busy and the next event is more than an interval away (the
+# times of the samples taken are recorded), and a rank stops
+# sampling once it has no events left, unless sampling is to go on
+# "until" a given time (in a parallel run, for nodes that only get
+# traffic from other ranks late). (Under optimistic synchronization,
+# the samples of rolled-back events are not taken back.)
+#
+# This module also reads the telemetry offline; run as a script, it
+# prints the busiest links and switches:
+#
+#   python telemetry.py [-l links] prefix
+#
+
+import sys, glob
+from operator import itemgetter
+from optparse import OptionParser
+
+# the columns written, in order
+telemetry_columns = ("time", "kind", "node", "iface", "port", "util", "qlen_bits", "drops")
+
+get_sent_bytes = itemgetter("sent_bytes")
+get_dropped_pkts = itemgetter("dropped_pkts")
+
+class TelemetrySampler(object):
+    """Samples the links of the nodes of a rank."""
+
+    # local variables:
+    #   fname: name of the output file
+    #   interval: simulated time between samples (in seconds)
+    #   nsamples: length of the ring buffers
+    #   until: time up to which a rank samples (even without events), or None
+    #   times: ring buffer of the times of the samples
+    #   count: number of samples taken
+    #   ifaces: the interfaces sampled, each as (kind, node id, name,
+    #           number of the first sample, first column, number of ports)
+    #   outports: the output ports sampled (one column each)
+    #   stats: the statistics of the output ports
+    #   bdw: the bandwidth of the output ports
+    #   credits: whether any of the ports is under credit-based flow control
+    #   last_sent, last_backlog, last_dropped: the bytes sent, the bits
+    #           yet to be transmitted and the packets dropped by each
+    #           port at the last sample
+    #   util, qlen, drops: the ring buffers (one row per sample, one
+    #           column per port) of the utilization, queue occupancy
+    #           and drops
+    #   seen: the (kind, node id) of the nodes whose interfaces are sampled
+    #   nnodes: number of nodes instantiated on the rank at the last sample
+    #   restart: whether the run continues from a checkpoint
+
+    def __init__(self, prefix, rank, interval, samples=1024, format="npz", until=None,
+                 restart=False):
+        import numpy
+        if interval <= 0:
+            raise Exception("telemetry interval must be positive")
+        if format not in ("npz", "csv"):
+            raise Exception("telemetry format %s not implemented" % format)
+        self.fname = "%s.%d.telemetry.%s" % (prefix, rank, format)
+        self.interval = interval
+        self.nsamples = samples
+        self.until = until
+        self.times = numpy.zeros(samples)
+        self.count = 0
+        self.ifaces = []
+        self.outports = []
+        self.stats = []
+        self.bdw = numpy.zeros(0)
+        self.credits = False
+        self.last_sent = numpy.zeros(0)
+        self.last_backlog = numpy.zeros(0)
+        self.last_dropped = numpy.zeros(0, dtype=int)
+        self.util = numpy.zeros((samples, 0), dtype=numpy.float32)
+        self.qlen = numpy.zeros((samples, 0), dtype=numpy.float32)
+        self.drops = numpy.zeros((samples, 0), dtype=numpy.int32)
+        self.seen = set()
+        self.nnodes = 0
+        self.restart = restart
+
+    def add_nodes(self, nodes):
+        """Adds the columns of the ports of the nodes' interfaces.
+
+        Nodes is a list of (kind, node); the ring buffers are
+        reallocated once for all of them.
+        """
+
+        import numpy
+        ports = []
+        for kind, node in nodes:
+            for name in sorted(node.interfaces):
+                iface = node.interfaces[name]
+                n = iface.get_num_ports()
+                if n == 0: continue
+                self.ifaces.append((kind, node.node_id, name, self.count,
+                                    len(self.outports)+len(ports), n))
+                ports.extend(iface.outports)
+        if not ports: return
+        self.outports.extend(ports)
+        self.stats.extend(op.stats for op in ports)
+        self.bdw = numpy.append(self.bdw, [op.bdw for op in ports])
+        self.credits = self.credits or any(op.credits is not None for op in ports)
+        # upon restart from a checkpoint, the nodes keep their
+        # counters, which start over from the first sample
+        if self.restart and self.count == 0:
+            sent = [s["sent_bytes"] for s in self.stats[-len(ports):]]
+            dropped = [s["dropped_pkts"] for s in self.stats[-len(ports):]]
+        else:
+            sent = dropped = numpy.zeros(len(ports), dtype=int)
+        self.last_sent = numpy.append(self.last_sent, sent)
+        self.last_backlog = numpy.append(self.last_backlog, numpy.zeros(len(ports)))
+        self.last_dropped = numpy.append(self.last_dropped, dropped)
+        grow = numpy.zeros((self.nsamples, len(ports)), dtype=numpy.float32)
+        self.util = numpy.hstack((self.util, grow))
+        self.qlen = numpy.hstack((self.qlen, grow))
+        self.drops = numpy.hstack((self.drops, grow.astype(numpy.int32)))
+
+    def find_nodes(self, engine):
+        """Adds the nodes instantiated on the rank since the last sample."""
+
+        tables = [(kind, engine.entities.get(kind, {})) for kind in ("Switch", "Host")]
+        nnodes = sum(len(t) for kind, t in tables)
+        if nnodes == self.nnodes: return
+        self.nnodes = nnodes
+        nodes = []
+        for kind, t in tables:
+            for nid in sorted(t.iterkeys()):
+                if (kind, nid) not in self.seen:
+                    self.seen.add((kind, nid))
+                    nodes.append((kind, t[nid]))
+        self.add_nodes(nodes)
+
+    def sample(self, engine):
+        """Takes a sample of the rank's links; returns the time until
+        the next sample, or None if sampling is done.
+
+        A port's utilization is the share of the interval it spent
+        transmitting: the bits it was given to send, less the change
+        of the bits still to be transmitted, over its bandwidth times
+        the interval.
+        """
+
+        import numpy
+        self.find_nodes(engine)
+        now = engine.now
+        slot = self.count % self.nsamples
+        dt = now - (self.times[(self.count-1) % self.nsamples] if self.count else 0)
+
+        sent = numpy.array(map(get_sent_bytes, self.stats), dtype=float)
+        dropped = numpy.array(map(get_dropped_pkts, self.stats), dtype=int)
+        # only the ports that were given packets to send since the
+        # last sample, or were still transmitting then, may be now
+        active = numpy.flatnonzero((sent != self.last_sent) | (self.last_backlog > 0))
+        backlog = numpy.zeros(len(sent))
+        if len(active):
+            outports = self.outports
+            last = numpy.array([outports[i].last_sent_time for i in active], dtype=float) - now
+            backlog[active] = numpy.maximum(last, 0)*self.bdw[active]
+        if dt > 0:
+            self.util[slot] = ((sent-self.last_sent)*8-(backlog-self.last_backlog))/(self.bdw*dt)
+        else:
+            self.util[slot] = 0
+        if self.credits:
+            self.qlen[slot] = backlog + [getattr(op, "blocked_bytes", 0)*8 for op in self.outports]
+        else:
+            self.qlen[slot] = backlog
+        self.drops[slot] = dropped-self.last_dropped
+        busy = len(active) > 0
+        self.last_sent = sent
+        self.last_backlog = backlog
+        self.last_dropped = dropped
+        self.times[slot] = now
+        self.count += 1
+
+        # the next sample, unless the rank has nothing more to do
+        queue = engine.eventQueue
+        nxt = self.interval
+        if len(queue) == 0:
+            if self.until is None: return None
+        elif not busy:
+            ahead = queue.peek()[0]-now
+            if ahead > nxt: nxt *= float(numpy.ceil(ahead/nxt))
+        if self.until is not None and now+nxt > self.until: return None
+        return nxt
+
+    def columns(self):
+        """Returns the samples kept in the ring buffers, as a map from
+        column name to numpy array (see telemetry_columns)."""
+
+        import numpy
+        cols = dict((c, []) for c in telemetry_columns)
+        for kind, nid, name, first, col, nports in self.ifaces:
+            first = max(first, self.count-self.nsamples)
+            slots = numpy.arange(first, self.count) % self.nsamples
+            n = len(slots)*nports
+            cols["time"].append(numpy.repeat(self.times[slots], nports))
+            cols["kind"].append(numpy.repeat(numpy.array([kind]), n))
+            cols["node"].append(numpy.repeat(nid, n))
+            cols["iface"].append(numpy.repeat(numpy.array([name]), n))
+            cols["port"].append(numpy.tile(numpy.arange(nports), len(slots)))
+            cols["util"].append(self.util[slots, col:col+nports].ravel())
+            cols["qlen_bits"].append(self.qlen[slots, col:col+nports].ravel())
+            cols["drops"].append(self.drops[slots, col:col+nports].ravel())
+        for c in telemetry_columns:
+            cols[c] = numpy.concatenate(cols[c]) if cols[c] else numpy.zeros(0)
+        return cols
+
+    def close(self):
+        """Writes out the samples."""
+
+        import numpy
+        cols = self.columns()
+        if self.fname.endswith(".npz"):
+            numpy.savez_compressed(self.fname, **cols)
+        else:
+            with open(self.fname, "w") as f:
+                f.write(",".join(telemetry_columns)+"\n")
+                for row in zip(*[cols[c] for c in telemetry_columns]):
+                    f.write("%.12g,%s,%d,%s,%d,%g,%g,%d\n" % row)
+
+
+def read_telemetry(prefix):
+    """Returns the samples of all ranks of the given prefix (from the
+    npz files, or else the csv files), as a map from column name to
+    numpy array, sorted by time."""
+
+    import numpy
+    parts = []
+    for fname in sorted(glob.glob(prefix+".*.telemetry.npz")):
+        data = numpy.load(fname)
+        parts.append(dict((c, data[c]) for c in telemetry_columns))
+    if not parts:
+        for fname in sorted(glob.glob(prefix+".*.telemetry.csv")):
+            data = numpy.genfromtxt(fname, delimiter=",", names=True, dtype=None, encoding=None)
+            parts.append(dict((c, numpy.atleast_1d(data[c])) for c in telemetry_columns))
+    if not parts:
+        raise Exception("no telemetry files found for %s" % prefix)
+    cols = dict((c, numpy.concatenate([p[c] for p in parts])) for c in telemetry_columns)
+    order = numpy.argsort(cols["time"], kind="mergesort")
+    return dict((c, v[order]) for c, v in cols.iteritems())
+
+def node_utilization(cols, kind="Switch"):
+    """Returns the times of the samples, the ids of the nodes of the
+    given kind, and the matrix of the mean utilization of the output
+    ports of each node (one row per node) at each time."""
+
+    import numpy
+    sel = cols["kind"] == kind
+    times, t_idx = numpy.unique(cols["time"][sel], return_inverse=True)
+    nodes, n_idx = numpy.unique(cols["node"][sel], return_inverse=True)
+    total = numpy.zeros((len(nodes), len(times)))
+    nports = numpy.zeros((len(nodes), len(times)))
+    numpy.add.at(total, (n_idx, t_idx), cols["util"][sel])
+    numpy.add.at(nports, (n_idx, t_idx), 1)
+    return times, nodes, total/numpy.maximum(nports, 1)
+
+def main(argv):
+    import numpy
+    parser = OptionParser(usage="%prog [options] prefix")
+    parser.add_option("-l", "--links", type="int", dest="nlinks", default=10,
+                      help="busiest links and switches to list")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1: parser.error("a telemetry prefix is required")
+
+    cols = read_telemetry(args[0])
+    if len(cols["time"]) == 0:
+        print("no samples")
+        return
+    print("%d samples, from %.9f to %.9f (seconds)" % (len(numpy.unique(cols["time"])),
+          cols["time"][0], cols["time"][-1]))
+
+    keys = numpy.array(["%s[%d] %s(%d)" % k for k in
+                        zip(cols["kind"], cols["node"], cols["iface"], cols["port"])])
+    links, idx = numpy.unique(keys, return_inverse=True)
+    mean = numpy.bincount(idx, cols["util"])/numpy.bincount(idx)
+    peak = numpy.zeros(len(links))
+    numpy.maximum.at(peak, idx, cols["util"])
+    drops = numpy.bincount(idx, cols["drops"])
+    print("%d links; busiest:" % len(links))
+    print("  %-32s %9s %9s %9s" % ("link", "mean", "peak", "drops"))
+    for i in numpy.argsort(-mean, kind="mergesort")[:options.nlinks]:
+        print("  %-32s %9.4f %9.4f %9d" % (links[i], mean[i], peak[i], drops[i]))
+
+    times, nodes, util = node_utilization(cols)
+    if len(nodes):
+        print("%d switches; busiest:" % len(nodes))
+        print("  %-10s %9s %9s %18s" % ("switch", "mean", "peak", "peak at (s)"))
+        for i in numpy.argsort(-util.mean(1), kind="mergesort")[:options.nlinks]:
+            j = util[i].argmax()
+            print("  %-10d %9.4f %9.4f %18.9f" % (nodes[i], util[i].mean(), util[i, j], times[j]))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
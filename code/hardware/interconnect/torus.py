@@ -3,6 +3,7 @@
 #
 
 from intercon import *
+from array import array
 
 # block decomposition for both hosts and switches
 def torus_partition(entname, entid, nranks, torus):
@@ -24,6 +25,10 @@ class TorusSwitch(Switch):
     #   torus: the torus interconnect
     #   coords: the coordiates of this switch
     #   route_method: the routing method
+    #   route_dims: the dimensions in routing order
+    #   route_dirs: for each dimension, an array giving the number of
+    #               the interface towards each coordinate (-1 for this
+    #               switch's own coordinate)
 
     def __init__(self, baseinfo, hpcsim_dict, proc_delay, *args):
         super(TorusSwitch, self).__init__(baseinfo, hpcsim_dict, proc_delay)
@@ -79,62 +84,100 @@ class TorusSwitch(Switch):
                   (self, self.interfaces[dir], tuple(peer_node_ids),
                    peer_iface_names, peer_iface_ports))
 
+        # the routing tables: interface 2d is '+d', 2d+1 is '-d', and
+        # 2*ndims is 'h'; a packet goes along the first dimension in
+        # which its destination differs, in the shorter direction
+        if self.route_method != "deterministic_dimension_order" and \
+           self.route_method != "hashed_dimension_order" and \
+           self.route_method != "adaptive_dimension_order" and \
+           self.route_method != "minimal_adaptive":
+            raise Exception("route method %s has not been implemented" % self.route_method)
+        names = []
+        for d in xrange(ndims): names.extend(('+%d'%d, '-%d'%d))
+        names.append('h')
+        self.index_interfaces(names)
+        self.route_dims = tuple(xrange(ndims))
+        self.route_dirs = []
+        for d in xrange(ndims):
+            dirs = array('b', [-1])*self.torus.dims[d]
+            for c in xrange(self.torus.dims[d]):
+                if c != self.coords[d]:
+                    diff = c-self.coords[d]
+                    if diff < 0: diff = diff + self.torus.dims[d]
+                    if diff <= self.torus.dims[d]/2: dirs[c] = 2*d
+                    else: dirs[c] = 2*d+1
+            self.route_dirs.append(dirs)
+
     def __str__(self):
         return "switch[%d] %r" % (self.node_id, self.coords)
 
+    def next_vc(self, pkt, iface_in, iface_out):
+        """Returns the virtual channel for a packet to be sent on in.
+
+        Virtual channels are assigned with a dateline in each
+        dimension: a packet goes along a dimension in channel 0 until
+        it takes the wrap-around link, and in channel 1 from there on,
+        so that no ring of channels waits on itself; with dimension
+        order routing, two virtual channels rule out deadlocks.
+        """
+        o = self.iface_index[iface_out]
+        d = o>>1
+        if d == len(self.coords): return 0 # to host
+        if o&1: wrap = self.coords[d] == 0
+        else: wrap = self.coords[d] == self.torus.dims[d]-1
+        if wrap: return 1
+        if self.iface_index[iface_in]>>1 == d: return pkt.vc
+        return 0
+
     def calc_route(self, pkt):
         """Returns interface name and port number (only if next hop is host)
            needed to get to the next hop."""
 
-        if self.route_method is "deterministic_dimension_order" or \
-           self.route_method is "hashed_dimension_order" or \
-           self.route_method is "adaptive_dimension_order":
-            #     - deterministic_dimension_order: dimension-order routing with predetermined links within each dimension
-            #     - hashed_dimension_order: dimension-order routing with flexibility in selecting links
-            #     - adaptive_dimension_order (default): dimension-order routing but select lightly loaded links
-
-            c,p = self.torus.hid_to_coords(pkt.dsthost)
-
-            # first, dimension order routing
-            dirs = []
-            for d in xrange(len(self.torus.dims)):
-                if self.coords[d] != c[d]:
-                    diff = c[d]-self.coords[d]
-                    if diff < 0: diff = diff + self.torus.dims[d]
-                    if diff <= self.torus.dims[d]/2: dirs.append("+%d"%d)
-                    else: dirs.append("-%d"%d)
-                    break # stop when early dimension is found
-
-            if len(dirs) == 0:
-                # the packet arrived at the destination switch; send out to host
-                #if "switch" in self.hpcsim_dict["debug_options"]:
-                #    print("%s calc_route: to %d via iface(h)" % (self, pkt.dsthost))
-                return "h", p
-            else:
-                md = dirs[0] # we have only one dimension
-                if self.route_method is "adaptive_dimension_order":
-                    # find one with the min delay: just don't name the port
-                    #m = self.interfaces[md].get_min_qdelay()
-                    #for dir in dirs[1:]:
-                    #    d = self.interfaces[dir].get_min_qdelay()
-                    #    if d < m: md = dir; m = d
-                    return md, -1
-                elif self.route_method is "hashed_dimension_order":
-                    # there's no detail how hash is applied in cray's
-                    # gemini; we select the port according to
-                    # destination host id and sequence number
-                    m = self.interfaces[md].get_num_ports()
-                    port = (pkt.dsthost+self.seqno)%m
-                    return md, port
-                else: # self.route_method is "deterministic_dimension_order"
-                    # for deterministic, we select the port according
-                    # to the destination host id
-                    m = self.interfaces[md].get_num_ports()
-                    port = pkt.dsthost%m
-                    return md, port
-
-        else:
-            raise Exception("route method %d has not been implemented" % self.route_method)
+        #     - deterministic_dimension_order: dimension-order routing with predetermined links within each dimension
+        #     - hashed_dimension_order: dimension-order routing with flexibility in selecting links
+        #     - adaptive_dimension_order (default): dimension-order routing but select lightly loaded links
+        #     - minimal_adaptive: along any dimension that brings the packet closer, selecting
+        #       the least loaded link among them
+        dst = pkt.dsthost
+        swid = self.torus.host_swid[dst]
+        if swid == self.node_id:
+            # the packet arrived at the destination switch; send out to host
+            #if "switch" in self.hpcsim_dict["debug_options"]:
+            #    print("%s calc_route: to %d via iface(h)" % (self, dst))
+            return "h", self.torus.host_port[dst]
+
+        c = self.torus.swcoords[swid]
+        if self.route_method == "minimal_adaptive":
+            # the link with the min queuing delay in any productive
+            # direction (in dimension order among those with an empty
+            # queue)
+            m = None
+            for d in self.route_dims:
+                i = self.route_dirs[d][c[d]]
+                if i >= 0:
+                    q, op = self.iface_list[i].get_min_qdelay()
+                    if m is None or q < m:
+                        m = q; mop = op
+                        if q == 0: break
+            return mop.iface.name, mop.port
+
+        # dimension order routing: stop when early dimension is found
+        for d in self.route_dims:
+            i = self.route_dirs[d][c[d]]
+            if i >= 0: break
+        md = self.iface_names[i]
+        if self.route_method == "adaptive_dimension_order":
+            # find one with the min delay: just don't name the port
+            return md, -1
+        elif self.route_method == "hashed_dimension_order":
+            # there's no detail how hash is applied in cray's
+            # gemini; we select the port according to
+            # destination host id and sequence number
+            return md, (dst+pkt.seqno)%self.iface_nports[i]
+        else: # self.route_method == "deterministic_dimension_order"
+            # for deterministic, we select the port according
+            # to the destination host id
+            return md, dst%self.iface_nports[i]
 
 
 class Torus(Interconnect):
@@ -148,6 +191,9 @@ class Torus(Interconnect):
     #   cm: coordinate multiplier (for calculating switch id and its coordiates)
     #   switch_link_delay: link delay between two switches
     #   host_link_delay: link delay between switch and its attached host
+    #   swcoords: list of switch coordinates, indexed by switch id
+    #   host_swid: array of the switch id of each host
+    #   host_port: array of the switch-to-host port of each host
 
     def __init__(self, hpcsim, hpcsim_dict):
         super(Torus, self).__init__(hpcsim_dict)
@@ -220,7 +266,7 @@ class Torus(Interconnect):
             if len(dups) != len(self.dims):
                 raise Exception("invalid dups %r for torus %r" % (dups, self.dims))
         else:
-            dups = (1)*len(self.dims)
+            dups = (1,)*len(self.dims)
 
         bdwh = hpcsim_dict["torus"].get("bdwh", \
             hpcsim_dict["default_configs"]["intercon_bandwidth"])
@@ -238,6 +284,11 @@ class Torus(Interconnect):
 
         route_method = hpcsim_dict["torus"].get("route_method", \
             hpcsim_dict["default_configs"]["torus_route_method"])
+        if route_method == "minimal_adaptive" and \
+           hpcsim_dict.get("flow_control", "drop") == "credit":
+            # the dateline virtual channels (see TorusSwitch.next_vc)
+            # rule out deadlocks only in dimension order
+            raise Exception("route method minimal_adaptive can't be used with credit-based flow control")
 
         mem_bandwidth = hpcsim_dict["torus"].get("mem_bandwidth", \
             hpcsim_dict["default_configs"]["mem_bandwidth"])
@@ -262,28 +313,41 @@ class Torus(Interconnect):
             print("torus: mem_delay=%f (seconds)" % mem_delay)
             print("torus: route_method=%s" % route_method)
 
-        # add switches as entities
-        simian = hpcsim_dict["simian"]
+        # calc once: the coordinates of each switch, and the switch and
+        # switch-to-host port of each host (for routing)
         allcoords = [(i,) for i in range(self.dims[-1])]
         for d in self.dims[-2::-1]:
             allcoords = [(j,)+i for i in allcoords for j in xrange(d)]
+        self.swcoords = allcoords
+        self.host_swid = array('i', [0])*self.nhosts
+        self.host_port = array('i', [0])*self.nhosts
+        for h in xrange(self.nhosts):
+            c, p = self.hid_to_coords(h)
+            self.host_swid[h] = self.coords_to_swid(c)
+            self.host_port[h] = p
+
+        # add switches as entities
+        simian = hpcsim_dict["simian"]
         for s in xrange(self.nswitches):
             #print("creating switch: id=%d coords=%r" % (s, allcoords[s]))
             simian.addEntity("Switch", TorusSwitch, s, hpcsim_dict, proc_delay, 
                              self, allcoords[s], dups, bdws, bdwh, bufsz, 
-                             self.switch_link_delay, self.host_link_delay, route_method)#,
-                             #partition=torus_partition, partition_arg=self)
+                             self.switch_link_delay, self.host_link_delay, route_method,
+                             **hpcsim.get_partition())
+                             #**hpcsim.get_partition(torus_partition, self))
 
-        # add hosts and entities
+        # add hosts and entities (a host only sends over its link to
+        # the switch, whose delay is thus its lookahead)
         for h in xrange(self.nhosts):
-            c, p = self.hid_to_coords(h)
-            #print("creating host: id=%d coords=%r:%d" % (h, c, p))
-            swid = self.coords_to_swid(c)
+            swid = self.host_swid[h]; p = self.host_port[h]
+            #print("creating host: id=%d coords=%r:%d" % (h, self.swcoords[swid], p))
             simian.addEntity("Host", hpcsim.get_host_typename(hpcsim_dict), h,
                              hpcsim_dict, self, swid, 'h', p,
                              bdwh, bufsz, self.host_link_delay,
-                             mem_bandwidth, mem_bufsz, mem_delay)#,
-                             #partition=torus_partition, partition_arg=self)
+                             mem_bandwidth, mem_bufsz, mem_delay,
+                             lookahead=self.host_link_delay,
+                             **hpcsim.get_partition())
+                             #**hpcsim.get_partition(torus_partition, self))
 
 
     def network_diameter(self):
@@ -299,6 +363,10 @@ class Torus(Interconnect):
         d = self.network_diameter()
         return (d-2)*self.switch_link_delay+2*self.host_link_delay
 
+    def min_vcs(self):
+        """Returns the number of virtual channels needed (see TorusSwitch.next_vc)."""
+        return 2
+
     def coords_to_swid(self, c):
         """Converts from switch coordinates to switch id."""
     
@@ -395,6 +463,13 @@ class Gemini(Torus):
     """cray's gemini is a 3D torus."""
 
     def __init__(self, hpcsim, hpcsim_dict):
+        Gemini.set_torus_config(hpcsim_dict)
+        super(Gemini, self).__init__(hpcsim, hpcsim_dict)
+
+    @staticmethod
+    def set_torus_config(hpcsim_dict):
+        """Translates the gemini parameters into those of the torus."""
+
         # we'd need to do some translation
         if "torus" not in hpcsim_dict:
             raise Exception("'torus' must be specified for gemini interconnect")
@@ -413,12 +488,17 @@ class Gemini(Torus):
 
         hpcsim_dict["torus"]["dups"] = (2, 1, 2)
 
-        super(Gemini, self).__init__(hpcsim, hpcsim_dict)
-
 class BlueGeneQ(Torus):
     """IBM's Blue Gene/Q is a 5D torus."""
 
     def __init__(self, hpcsim, hpcsim_dict):
+        BlueGeneQ.set_torus_config(hpcsim_dict)
+        super(BlueGeneQ, self).__init__(hpcsim, hpcsim_dict)
+
+    @staticmethod
+    def set_torus_config(hpcsim_dict):
+        """Translates the blue gene/q parameters into those of the torus."""
+
         # we'd need to do some translation
         if "torus" not in hpcsim_dict:
             raise Exception("'torus' must be specified for bluegen/q interconnect")
@@ -441,5 +521,3 @@ class BlueGeneQ(Torus):
 
         hpcsim_dict["torus"]["dups"] = (2, 2, 2, 2, 2)
 
-        super(BlueGeneQ, self).__init__(hpcsim, hpcsim_dict)
-
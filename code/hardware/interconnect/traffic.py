@@ -0,0 +1,213 @@
+#
+# traffic.py :- synthetic traffic patterns at a given offered load
+#
+# With hpcsim_dict["traffic"] set (a dictionary, see TrafficGenerator),
+# every host sends raw messages (see Host.test_raw_xfer) of a given
+# size to the destinations picked by a traffic pattern, with the
+# times between messages drawn so that the host offers the given load
+# (a fraction of the bandwidth of its link to the interconnect). The
+# patterns are on host ids, which all interconnects number switch by
+# switch, so they work with any of them:
+#
+#   uniform_random: any other host, uniformly at random
+#   transpose: with the (lower 2k bits of the) host id as a row and
+#              a column of k bits each, the host with the two swapped
+#   bit_complement: the host with all bits of the id flipped (for a
+#              number of hosts other than a power of 2, n-1-src)
+#   nearest_neighbor: the host before or after, at random
+#   hotspot: one of the "hotspots" with probability "hotspot_fraction",
+#            else any other host at random
+#   all_to_all: all other hosts in turn, starting from the next one
+#
+# Hosts with no destination (such as those on the diagonal of the
+# transpose) don't send. A host is an event of its own for each
+# message it sends (see Host.inject_traffic); nothing is scheduled
+# ahead. The hosts send from "start" for "warmup" plus "duration"
+# seconds; the messages sent in the last "duration" seconds (the
+# measurement window) are the ones measured: the latency of each
+# (from the send until it's received) and those never received (lost,
+# if the links drop packets); the accepted throughput is from the
+# bytes of all messages received within the window. Under a parallel
+# run, each rank measures the messages received by its hosts (and
+# counts those sent by them).
+#
+
+import math, random
+from array import array
+
+def uniform_random(gen, src, k, rng):
+    dst = rng.randrange(gen.nhosts-1)
+    return dst+1 if dst >= src else dst
+
+def transpose(gen, src, k, rng):
+    half = gen.transpose_bits
+    if src >> 2*half: return None
+    mask = (1 << half)-1
+    dst = ((src & mask) << half) | (src >> half)
+    return dst if dst != src else None
+
+def bit_complement(gen, src, k, rng):
+    dst = gen.nhosts-1-src
+    return dst if dst != src else None
+
+def nearest_neighbor(gen, src, k, rng):
+    return (src+rng.choice((-1, 1)))%gen.nhosts
+
+def hotspot(gen, src, k, rng):
+    if rng.random() < gen.hotspot_fraction:
+        dst = rng.choice(gen.hotspots)
+        if dst != src: return dst
+    return uniform_random(gen, src, k, rng)
+
+def all_to_all(gen, src, k, rng):
+    return (src+1+k%(gen.nhosts-1))%gen.nhosts
+
+traffic_patterns = {
+    "uniform_random" : uniform_random,
+    "transpose" : transpose,
+    "bit_complement" : bit_complement,
+    "nearest_neighbor" : nearest_neighbor,
+    "hotspot" : hotspot,
+    "all_to_all" : all_to_all,
+}
+
+class TrafficGenerator(object):
+    """Injects a synthetic traffic pattern from the hosts of a rank."""
+
+    # local variables:
+    #   pattern: name of the traffic pattern
+    #   dest: the pattern function, returns the destination of the
+    #         k-th message of a host (or None)
+    #   load: offered load, as a fraction of the host link bandwidth
+    #   msg_size: size of each message in bytes
+    #   arrival: times between messages, "poisson" (exponential) or
+    #            "constant" (with a random phase for each host)
+    #   start, window_start, end: time the hosts start sending, the
+    #            measurement window starts, and the hosts stop sending
+    #   seed: seed of the random numbers (each host draws its own)
+    #   hotspots, hotspot_fraction: the destinations and the share of
+    #            the messages sent to them, for the hotspot pattern
+    #   nhosts: total number of hosts (set by start_hosts)
+    #   transpose_bits: bits in a row (and column) for transpose
+    #   nsenders: number of hosts of the rank sending (each keeps its
+    #          state in Host.traffic_state, as [random number generator,
+    #          mean time between messages, number of messages sent])
+    #   sent, sent_bytes: messages (and bytes) sent in the window
+    #   received, received_bytes: messages sent in the window (and
+    #            their bytes) received, whenever that was
+    #   window_bytes: bytes received within the window
+    #   latencies: latency of each message received
+
+    def __init__(self, pattern, load, msg_size=1024, duration=1e-4, warmup=0,
+                 start=0, arrival="poisson", seed=0, hotspots=(0,), hotspot_fraction=0.1):
+        if pattern not in traffic_patterns:
+            raise Exception("traffic pattern %s not implemented" % pattern)
+        if arrival not in ("poisson", "constant"):
+            raise Exception("traffic arrival %s not implemented" % arrival)
+        if load <= 0:
+            raise Exception("offered load must be positive")
+        if msg_size <= 0 or duration <= 0 or warmup < 0:
+            raise Exception("traffic requires a positive message size and duration")
+        self.pattern = pattern
+        self.dest = traffic_patterns[pattern]
+        self.load = load
+        self.msg_size = msg_size
+        self.arrival = arrival
+        self.start = start
+        self.window_start = start+warmup
+        self.end = start+warmup+duration
+        self.seed = seed
+        self.hotspots = tuple(hotspots)
+        self.hotspot_fraction = hotspot_fraction
+        self.nhosts = 0
+        self.transpose_bits = 0
+        self.nsenders = 0
+        self.sent = self.sent_bytes = 0
+        self.received = self.received_bytes = 0
+        self.window_bytes = 0
+        self.latencies = array('d')
+
+    def start_hosts(self, engine, nhosts, restart=False):
+        """Schedules the first message of each host on the rank
+        (unless restarting from a checkpoint, which has them)."""
+
+        if nhosts < 2:
+            raise Exception("traffic requires at least two hosts")
+        self.nhosts = nhosts
+        self.transpose_bits = int(math.log(nhosts, 2)+1e-9)//2
+        for h in self.hotspots:
+            if not 0 <= h < nhosts:
+                raise Exception("hotspot %d out of range: total #hosts=%d" % (h, nhosts))
+        table = engine.entities.get("Host")
+        if table is None: return
+        probe = random.Random(self.seed)
+        for hid in sorted(table.keys()+table.lazy.keys()):
+            if self.dest(self, hid, 0, probe) is None: continue
+            self.nsenders += 1
+            if not restart:
+                engine.schedService(self.start, "inject_traffic", None, "Host", hid)
+
+    def inject(self, host):
+        """Sends the next message of the host; returns the time until
+        the one after, or None once the host is done."""
+
+        now = host.get_now()
+        state = host.traffic_state
+        if state is None:
+            # the mean time between messages, from the bandwidth of
+            # the host's link; the first message is sent after a
+            # random time
+            rng = random.Random(self.seed*1000003+host.node_id)
+            gap = self.msg_size*8.0/(self.load*host.interfaces['r'].outports[0].bdw)
+            host.traffic_state = [rng, gap, 0]
+            if self.arrival == "poisson": gap = rng.expovariate(1.0/gap)
+            else: gap = rng.random()*gap
+            return gap if now+gap < self.end else None
+        rng, gap, k = state
+        dst = self.dest(self, host.node_id, k, rng)
+        state[2] = k+1
+        host.test_raw_xfer({ 'dest':dst, 'sz':self.msg_size, 'blaze':False })
+        if now >= self.window_start:
+            self.sent += 1
+            self.sent_bytes += self.msg_size
+        if self.arrival == "poisson": gap = rng.expovariate(1.0/gap)
+        if now+gap >= self.end: return None
+        return gap
+
+    def recv(self, host, pkt):
+        """Records a message received by the host."""
+
+        if pkt.type != "data_raw": return
+        now = host.get_now()
+        if self.window_start <= now < self.end:
+            self.window_bytes += pkt.msglen
+        if self.window_start <= pkt.sendtime < self.end:
+            self.received += 1
+            self.received_bytes += pkt.msglen
+            self.latencies.append(now-pkt.sendtime)
+
+    def summary(self, bdw=None):
+        """Returns the measurements of the rank as a dictionary.
+
+        The accepted throughput is the bits received within the
+        window per second and per sending host (and as a fraction of
+        bdw, the host link bandwidth, if given); the latencies are in
+        seconds.
+        """
+
+        import numpy
+        lat = numpy.frombuffer(self.latencies, dtype=float) if self.latencies else numpy.zeros(1)
+        window = self.end-self.window_start
+        s = {
+            "pattern" : self.pattern,
+            "offered_load" : self.load,
+            "sent" : self.sent,
+            "received" : self.received,
+            "lost" : self.sent-self.received,
+            "throughput" : self.window_bytes*8/window/max(self.nsenders, 1),
+            "mean_latency" : lat.mean(),
+            "p99_latency" : numpy.percentile(lat, 99),
+            "max_latency" : lat.max(),
+        }
+        if bdw: s["accepted_load"] = s["throughput"]/bdw
+        return s
@@ -16,7 +16,6 @@
 # node.py :- a node can be a switch node or a compute node
 #
 
-from pickle import loads
 from simian import *
 
 class Node(Entity):
@@ -28,6 +27,10 @@ class Node(Entity):
     #   interfaces: map from string name to interface object
     #   fast_queue: used for fast message delivery (for now)
     #   arrival_semaphore: used for waking up receiver process
+    #   num_vcs: number of virtual channels of the links, or 0 if the
+    #            links aren't under credit-based flow control
+    #   tracer: writes the packet trace of the rank (see packet_trace.py),
+    #           or None if packets aren't traced
 
     def __init__(self, baseinfo, hpcsim_dict):
         """Initializes the compute node."""
@@ -51,6 +54,22 @@ class Node(Entity):
         # "packet_receiver" process needs to wake up
         self.arrival_semaphore = 0
 
+        # with hpcsim_dict["flow_control"] as "credit", the links are
+        # lossless, with hpcsim_dict["num_vcs"] virtual channels
+        # (default 2); see Outport
+        if hpcsim_dict.get("flow_control", "drop") == "credit":
+            self.num_vcs = hpcsim_dict.get("num_vcs", 2)
+        else:
+            self.num_vcs = 0
+
+        # with hpcsim_dict["packet_trace"], the arrivals of packets
+        # are traced
+        self.tracer = hpcsim_dict.get("packet_tracer", None)
+
+        # packets from nodes on other ranks arrive encoded; the
+        # decoder is provided by the cluster (see Packet.decode)
+        self.decode_pkt = hpcsim_dict["packet_decoder"]
+
     def __str__(self):
         """Returns the string name of this compute node."""
         return "%s[%d]" % (self.__class__.__name__.lower(), self.node_id)
@@ -59,6 +78,19 @@ class Node(Entity):
         """Conveniently returns the current simulation time."""
         return self.engine.now
 
+    def is_local(self, name, id):
+        """Can packets be passed by reference to the given node?
+
+        They can if the node is on the same rank as this one (or is
+        this one, if name is None). Under optimistic synchronization
+        packets are always copied, since a rolled-back arrival is
+        handled again and must find the packet as it was sent.
+        """
+        engine = self.engine
+        if engine.timeWarp is not None: return False
+        if name is None: return True
+        return engine.getRank(name, id) == engine.rank
+
     def handle_packet_arrival(self, *args):
         """A service handler to handle packet arrivals.
 
@@ -68,8 +100,12 @@ class Node(Entity):
         the "packet receiver" process, which is waiting for arrivals
         """
 
-        pkt = loads(args[0])
-        pkt.add_to_path(str(self))
+        pkt = args[0]
+        if type(pkt) is str:
+            # encoded by a node on another rank
+            pkt = self.decode_pkt(pkt)
+        if pkt.path is not None: pkt.add_to_path(str(self))
+        if self.tracer is not None: self.tracer.arrive(self, pkt)
 
         if pkt.is_prioritized():
             if "switch" in self.hpcsim_dict["debug_options"]:
@@ -88,3 +124,42 @@ class Node(Entity):
         self.arrival_semaphore += 1
         if self.arrival_semaphore == 1:
             self.wakeProcess("packet_receiver")
+
+    def return_credits(self, upstream, nbytes, delay):
+        """Returns credits for buffer space freed at this node.
+
+        Upstream is the interface name, port number and virtual
+        channel in which a packet of nbytes arrived; the space is
+        freed after the given delay, and the credits take the link
+        delay to get back to the peer node that sent the packet.
+        """
+
+        i, p, vc = upstream
+        op = self.interfaces[i].outports[p]
+        self.reqService(delay+op.link_delay, "handle_credit_return",
+                        (op.peer_iface_name, op.peer_iface_port, vc, nbytes),
+                        op.peer_node_name, op.peer_node_id)
+
+    def handle_credit_return(self, *args):
+        """A service handler to handle credits returned by a peer node.
+
+        The credits go to the output port connected to the peer, which
+        may then send the packets waiting for them.
+        """
+
+        i, p, vc, nbytes = args[0]
+        if "interface" in self.hpcsim_dict["debug_options"]:
+            print("%f: %s iface(%s) outport %d gets %d credits in vc %d" %
+                  (self.get_now(), self, i, p, nbytes, vc))
+        self.interfaces[i].outports[p].add_credits(vc, nbytes)
+
+    def sample_telemetry(self, *args):
+        """A service handler to sample the links of the rank.
+
+        With hpcsim_dict["telemetry"], one node on each rank is given
+        this event every sampling interval (see telemetry.py).
+        """
+
+        nxt = self.hpcsim_dict["telemetry_sampler"].sample(self.engine)
+        if nxt is not None:
+            self.reqService(nxt, "sample_telemetry", None)
@@ -0,0 +1,807 @@
+#
+# collectives.py :- algorithms of the mpi collective operations
+#
+# mpi_barrier, mpi_bcast, mpi_allreduce, mpi_allgather, mpi_alltoall
+# and mpi_alltoallv (see mpi.py) each pick one of the algorithms below
+# at every call, from the size of the communicator and the size of the
+# message, as mpi libraries do (the rules and thresholds are those of
+# MPICH):
+#
+#   barrier:   dissemination (ceil(log2 n) rounds of tokens)
+#   bcast:     binomial tree for short messages or few ranks; for
+#              long ones, a binomial scatter of n chunks followed by a
+#              ring allgather of them (van de Geijn)
+#   allreduce: recursive doubling for short messages; Rabenseifner's
+#              for long ones (a reduce-scatter by recursive halving,
+#              then an allgather by recursive doubling); both fold the
+#              ranks beyond the largest power of two into the others
+#              before and after
+#   allgather: recursive doubling (if n is a power of two) while the
+#              total size is small enough, Bruck's for short totals
+#              otherwise, and a ring for long ones
+#   alltoall:  Bruck's (log2 n rounds, each with half the blocks) for
+#              short messages among many ranks; pairwise exchange (n-1
+#              rounds, partner p xor k for a power of two, p+k/p-k
+#              otherwise) else
+#   alltoallv: pairwise exchange
+#
+# The algorithms of mpi.py before these (reduce then bcast for barrier
+# and allreduce, gather then bcast for allgather, binomial trees, the
+# hypercube alltoall and the sequential pairs) are still there, as
+# "binomial", "hypercube" and "sequential". The choice can be tuned
+# per machine through the mpiopt dictionary (such as
+# configs.aries_mpiopt): "<collective>_algorithm" forces an algorithm
+# (default "auto", by the rules above), and the thresholds (in bytes)
+# are those in collective_defaults. All ranks of a communicator make
+# the same choice, as they call a collective with the same size.
+#
+# With mpiopt "collective_model" set to "analytic", no messages are
+# sent for the collectives (including mpi_reduce, mpi_gather and
+# mpi_scatter) at all: each rank tells rank 0 of the communicator (a
+# service on its host) when it arrives, with the data it contributes;
+# once all have arrived, rank 0 works out the results and releases
+# every rank at the time of the last arrival plus the cost of the
+# algorithm that would have been picked (collective_cost), by a LogGP
+# model: a message of m bytes takes L+2o+mG (latency, overhead at
+# either end, and gap per byte), and an algorithm costs the messages
+# on its critical path. It takes 2n events per call regardless of the
+# size of the message and the topology, but ignores the contention in
+# the network. The parameters are "loggp_L", "loggp_o" and "loggp_G"
+# in mpiopt; if not given, they're derived from the interconnect and
+# mpiopt (the network diameter time, the mpi call time, and the
+# injection rate or host link bandwidth, whichever is less, with the
+# data overhead of each packet), or they can be fitted to packet-level
+# runs (see apps/mpi_tests/collectives_calibrate.py).
+#
+# The new algorithms send with mpi_isend and wait for the acks only at
+# the end of the collective (or once the bytes pending fill the send
+# window, see mpi_send), as an eager send completes locally in mpi;
+# with mpi_send, every round would cost a round trip. Data moves with
+# the messages as usual, except where a rank already has the result
+# and only the time of moving the rest matters (the allgather phases
+# of Rabenseifner's and the ring allreduce, and of the long bcast):
+# those messages carry no data (None) but have the size of the chunks
+# they stand for. A reduction chunk is the combination of the whole
+# data, so the result is right for any data and op, though the order
+# of combining differs from the binomial reduction (floating-point
+# sums may differ in the last bits).
+#
+
+import math, copy
+import mpi
+
+collective_defaults = {
+    "barrier_algorithm" : "auto",
+    "bcast_algorithm" : "auto",
+    "allreduce_algorithm" : "auto",
+    "allgather_algorithm" : "auto",
+    "alltoall_algorithm" : "auto",
+    "alltoallv_algorithm" : "auto",
+    # bcast: binomial below this size or this many ranks
+    "bcast_short_msg" : 12288,
+    "bcast_min_procs" : 8,
+    # allreduce: recursive doubling up to this size
+    "allreduce_short_msg" : 2048,
+    # allgather: by the total size gathered
+    "allgather_short_msg" : 81920,
+    "allgather_long_msg" : 524288,
+    # alltoall: Bruck's up to this size with at least this many ranks
+    "alltoall_short_msg" : 256,
+    "alltoall_min_procs" : 8,
+    # "packet" or "analytic" (by the cost model)
+    "collective_model" : "packet",
+    # the LogGP parameters of the cost model (seconds, and seconds per
+    # byte for G); None to derive them (see loggp_parameters)
+    "loggp_L" : None,
+    "loggp_o" : None,
+    "loggp_G" : None,
+}
+
+def collective_options(mpiopt):
+    """Returns the collective options (collective_defaults overridden
+    by those in mpiopt); checks the algorithms forced exist."""
+
+    opts = dict(collective_defaults)
+    for k in opts:
+        if k in mpiopt: opts[k] = mpiopt[k]
+    for coll, algorithms in collective_algorithms.iteritems():
+        alg = opts[coll+"_algorithm"]
+        if alg != "auto" and alg not in algorithms:
+            raise Exception("mpi %s algorithm %s not implemented" % (coll, alg))
+    if opts["collective_model"] not in ("packet", "analytic"):
+        raise Exception("mpi collective model %s not implemented" % opts["collective_model"])
+    return opts
+
+def loggp_parameters(opts, mpiopt, host):
+    """Fills in the LogGP parameters not given in the collective
+    options, from the interconnect and mpiopt of a host."""
+
+    if opts["loggp_L"] is None:
+        opts["loggp_L"] = host.intercon.network_diameter_time()
+    if opts["loggp_o"] is None:
+        opts["loggp_o"] = mpiopt["call_time"]
+    if opts["loggp_G"] is None:
+        # bdw of the host link is in bits per second
+        rate = min(mpiopt["max_injection"], host.interfaces['r'].outports[0].bdw/8.0)
+        opts["loggp_G"] = (1.0+float(mpiopt["put_data_overhead"])/mpiopt["max_pktsz"])/rate
+
+def select_algorithm(mpi_comm, coll, data_size):
+    """Returns the name of the algorithm for a collective call."""
+
+    return choose_algorithm(mpi_comm['host'].mpi_coll, coll,
+                            len(mpi_comm['hostmap']), data_size)
+
+def choose_algorithm(opts, coll, n, data_size):
+    """Returns the name of the algorithm for a collective among n
+    ranks, with the given collective options."""
+
+    alg = opts[coll+"_algorithm"]
+    if alg != "auto": return alg
+    if coll == "barrier":
+        return "dissemination"
+    elif coll == "bcast":
+        if data_size < opts["bcast_short_msg"] or n < opts["bcast_min_procs"]:
+            return "binomial"
+        return "scatter_allgather"
+    elif coll == "allreduce":
+        # each rank of the power of two needs a chunk
+        if data_size <= opts["allreduce_short_msg"] or data_size < pof2(n):
+            return "recursive_doubling"
+        return "rabenseifner"
+    elif coll == "allgather":
+        total = data_size*n
+        if total < opts["allgather_long_msg"] and n == pof2(n):
+            return "recursive_doubling"
+        elif total < opts["allgather_short_msg"]:
+            return "bruck"
+        return "ring"
+    elif coll == "alltoall":
+        if data_size <= opts["alltoall_short_msg"] and n >= opts["alltoall_min_procs"]:
+            return "bruck"
+        return "pairwise"
+    else:
+        return "pairwise"
+
+def pof2(n):
+    """Returns the largest power of two no more than n."""
+    m = 1
+    while m*2 <= n: m *= 2
+    return m
+
+def chunk_size(data_size, parts):
+    """Returns the size of one of the parts of data (at least a byte)."""
+    return max(1, int(math.ceil(float(data_size)/parts)))
+
+def reduce_op(op, a, b):
+    """Combines two values with a reduction operator."""
+    if op == 'sum': return a+b
+    elif op == 'prod': return a*b
+    elif op == 'max': return a if a > b else b
+    elif op == 'min': return a if a < b else b
+    else: raise Exception("reduce operator %s not implemented" % op)
+
+def send(to_rank, data, sz, mpi_comm, type, sends):
+    """Sends a message of a collective without waiting for it to be
+    acknowledged; returns False if it (or one before) failed.
+
+    Sends is the list of (request, size) of the sends of the
+    collective pending; they're waited for first if this one would
+    overflow the send window, and a message beyond the window itself
+    is sent by mpi_send (which rate limits, unlike mpi_isend), unless
+    it goes by the rendezvous protocol (which keeps to the send window
+    itself, and would wait for the receiver to post its receive,
+    possibly after a send of its own).
+    """
+
+    bufsz = mpi_comm['host'].mpi_bufsz
+    if sends and sz+sum([x[1] for x in sends]) > bufsz:
+        if not wait_sends(sends): return False
+    if sz > bufsz and not mpi.is_rendezvous(mpi_comm, to_rank, sz):
+        return mpi.mpi_send(to_rank, data, sz, mpi_comm, type=type)
+    sends.append((mpi.mpi_isend(to_rank, data, sz, mpi_comm, type=type), sz))
+    return True
+
+def sendrecv(to_rank, data, sz, from_rank, mpi_comm, type, sends):
+    """Sends to a rank (see send) and receives from another; returns
+    the same as mpi_recv."""
+
+    if not send(to_rank, data, sz, mpi_comm, type, sends): return None
+    return mpi.mpi_recv(mpi_comm, from_rank, type)
+
+def wait_sends(sends):
+    """Waits for the sends pending; returns whether all succeeded."""
+
+    succ = True
+    for req, sz in sends:
+        mpi.mpi_wait(req)
+        if req["status"] != "success": succ = False
+    del sends[:]
+    return succ
+
+
+#
+# barrier
+#
+
+def barrier_binomial(mpi_comm):
+    """Reduce and then bcast, along binomial trees."""
+
+    mpi.mpi_reduce(0, 0, mpi_comm)
+    bcast_binomial(0, 0, mpi_comm)
+
+def barrier_dissemination(mpi_comm):
+    """In round k, each rank signals the one 2^k after it and waits
+    for the one 2^k before it."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    sends = []
+    dist = 1
+    while dist < n:
+        r = sendrecv((p+dist)%n, None, 4, (p-dist)%n, mpi_comm, "__barrier__", sends)
+        if r is None: return
+        dist *= 2
+    wait_sends(sends)
+
+
+#
+# bcast
+#
+
+def bcast_binomial(root, data, mpi_comm, data_size=4):
+    """Along a binomial tree (with ranks 0 and root swapped)."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+
+    # one node situation
+    if n <= 1: return data
+
+    # find out the number of binomial tree steps
+    steps = int(math.ceil(math.log(n,2)))
+
+    # my new rank (swapping 0 and root)
+    if p == root: rank = 0
+    elif p == 0: rank = root
+    else: rank = p
+
+    mid = 1
+    for s in range(steps):
+        # skip the round if it's not my turn
+        if rank < 2*mid:
+            if rank >= mid:
+                # receive in this round, from the parent (not any
+                # rank, which could be sending the next bcast already)
+                t = rank - mid
+                if t == root: t = 0
+                elif t == 0: t = root
+                r = mpi.mpi_recv(mpi_comm, t, "__bcast__")
+                if r is None: return None
+                data = r['data']
+            else:
+                # send in this round, but only if partner exists
+                t = rank + mid
+                if t < n:
+                    if t == root: t = 0
+                    elif t == 0: t = root
+                    r = mpi.mpi_send(t, data, data_size, mpi_comm, type="__bcast__")
+                    if r is None: return None
+
+        # carry on to the next round
+        mid *= 2
+    else: return data
+
+def bcast_scatter_allgather(root, data, mpi_comm, data_size=4):
+    """The root scatters n chunks along a binomial tree, and the ranks
+    then pass them around a ring."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    if n <= 1: return data
+    chunk = chunk_size(data_size, n)
+    sends = []
+
+    # scatter: a rank (relative to root) receives the chunks of its
+    # subtree from its parent, and passes on those of its children's
+    vr = (p-root)%n
+    mask = 1
+    while mask < n:
+        if vr & mask:
+            r = mpi.mpi_recv(mpi_comm, (p-mask)%n, "__bcast__")
+            if r is None: return None
+            data = r['data']
+            break
+        mask *= 2
+    mask /= 2
+    while mask > 0:
+        if vr+mask < n:
+            if not send((p+mask)%n, data, chunk*min(mask, n-vr-mask), mpi_comm,
+                        "__bcast__", sends):
+                return None
+        mask /= 2
+
+    # ring allgather of the chunks (the data is already here)
+    for s in range(n-1):
+        r = sendrecv((p+1)%n, None, chunk, (p-1)%n, mpi_comm, "__bcast__", sends)
+        if r is None: return None
+    if not wait_sends(sends): return None
+    return data
+
+
+#
+# allreduce
+#
+
+def allreduce_binomial(data, mpi_comm, data_size=4, op="sum"):
+    """Reduce and then bcast, along binomial trees."""
+
+    data = mpi.mpi_reduce(0, data, mpi_comm, data_size, op)
+    if data is None: return None
+    else: return bcast_binomial(0, data, mpi_comm, data_size)
+
+def allreduce_fold(data, mpi_comm, data_size, op, sends):
+    """Folds the ranks beyond the largest power of two: the first
+    2*rem ranks pair up, and the even one of each pair sends its data
+    to the odd one and sits out. Returns (data, rank among the power
+    of two or None if sitting out, the power of two, rem)."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    m = pof2(n)
+    rem = n-m
+    if p < 2*rem:
+        if p%2 == 0:
+            if not send(p+1, data, data_size, mpi_comm, "__allreduce__", sends):
+                return None, None, m, rem
+            return data, None, m, rem
+        r = mpi.mpi_recv(mpi_comm, p-1, "__allreduce__")
+        if r is None: return None, None, m, rem
+        return reduce_op(op, r['data'], data), p/2, m, rem
+    return data, p-rem, m, rem
+
+def allreduce_unfold(data, mpi_comm, data_size, rem, sends):
+    """The odd ranks of the pairs folded send the result back; waits
+    for the sends pending."""
+
+    p = mpi_comm['rank']
+    if p < 2*rem:
+        if p%2 == 1:
+            if not send(p-1, data, data_size, mpi_comm, "__allreduce__", sends):
+                return None
+        else:
+            r = mpi.mpi_recv(mpi_comm, p+1, "__allreduce__")
+            if r is None: return None
+            data = r['data']
+    if not wait_sends(sends): return None
+    return data
+
+def fold_rank(newrank, rem):
+    """Returns the rank of a rank among the power of two."""
+    return newrank*2+1 if newrank < rem else newrank+rem
+
+def allreduce_recursive_doubling(data, mpi_comm, data_size=4, op="sum"):
+    """In round k, each rank exchanges its partial result with the
+    rank 2^k away (among a power of two ranks)."""
+
+    if len(mpi_comm['hostmap']) <= 1: return data
+    sends = []
+    data, newrank, m, rem = allreduce_fold(data, mpi_comm, data_size, op, sends)
+    if data is None: return None
+    if newrank is not None:
+        mask = 1
+        while mask < m:
+            q = fold_rank(newrank^mask, rem)
+            r = sendrecv(q, data, data_size, q, mpi_comm, "__allreduce__", sends)
+            if r is None: return None
+            if newrank < newrank^mask: data = reduce_op(op, data, r['data'])
+            else: data = reduce_op(op, r['data'], data)
+            mask *= 2
+    return allreduce_unfold(data, mpi_comm, data_size, rem, sends)
+
+def allreduce_rabenseifner(data, mpi_comm, data_size=4, op="sum"):
+    """A reduce-scatter by recursive halving (the size exchanged
+    halves each round), then an allgather by recursive doubling."""
+
+    if len(mpi_comm['hostmap']) <= 1: return data
+    sends = []
+    data, newrank, m, rem = allreduce_fold(data, mpi_comm, data_size, op, sends)
+    if data is None: return None
+    if newrank is not None:
+        mask = 1
+        while mask < m:
+            q = fold_rank(newrank^mask, rem)
+            r = sendrecv(q, data, chunk_size(data_size, mask*2), q, mpi_comm,
+                         "__allreduce__", sends)
+            if r is None: return None
+            if newrank < newrank^mask: data = reduce_op(op, data, r['data'])
+            else: data = reduce_op(op, r['data'], data)
+            mask *= 2
+        mask = m/2
+        while mask > 0:
+            q = fold_rank(newrank^mask, rem)
+            r = sendrecv(q, None, chunk_size(data_size, mask*2), q, mpi_comm,
+                         "__allreduce__", sends)
+            if r is None: return None
+            mask /= 2
+    return allreduce_unfold(data, mpi_comm, data_size, rem, sends)
+
+def allreduce_ring(data, mpi_comm, data_size=4, op="sum"):
+    """A reduce-scatter around a ring (n-1 rounds, each rank passes on
+    what it has accumulated to the next), then an allgather around the
+    ring; each message is one n-th of the data."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    if n <= 1: return data
+    chunk = chunk_size(data_size, n)
+    sends = []
+    acc = data
+    for s in range(n-1):
+        r = sendrecv((p+1)%n, acc, chunk, (p-1)%n, mpi_comm, "__allreduce__", sends)
+        if r is None: return None
+        acc = reduce_op(op, r['data'], data)
+    for s in range(n-1):
+        r = sendrecv((p+1)%n, None, chunk, (p-1)%n, mpi_comm, "__allreduce__", sends)
+        if r is None: return None
+    if not wait_sends(sends): return None
+    return acc
+
+
+#
+# allgather
+#
+
+def allgather_binomial(data, mpi_comm, data_size=4):
+    """Gather at rank 0 and then bcast, along binomial trees."""
+
+    r = mpi.mpi_gather(0, data, mpi_comm, data_size)
+    if r is None: return None
+    else: return bcast_binomial(0, r, mpi_comm, data_size*len(mpi_comm['hostmap']))
+
+def allgather_recursive_doubling(data, mpi_comm, data_size=4):
+    """In round k, each rank exchanges all it has with the rank 2^k
+    away (Bruck's if n is not a power of two)."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    if n != pof2(n): return allgather_bruck(data, mpi_comm, data_size)
+    sends = []
+    blocks = { p : data }
+    mask = 1
+    while mask < n:
+        q = p^mask
+        r = sendrecv(q, blocks, data_size*mask, q, mpi_comm, "__allgather__", sends)
+        if r is None: return None
+        blocks.update(r['data'])
+        mask *= 2
+    if not wait_sends(sends): return None
+    return [blocks[i] for i in range(n)]
+
+def allgather_bruck(data, mpi_comm, data_size=4):
+    """In round k, each rank sends the (up to) 2^k blocks it has to
+    the rank 2^k before it; the blocks are kept relative to the rank."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    sends = []
+    blocks = [data]
+    dist = 1
+    while dist < n:
+        count = min(dist, n-dist)
+        r = sendrecv((p-dist)%n, blocks[:count], data_size*count, (p+dist)%n, mpi_comm,
+                     "__allgather__", sends)
+        if r is None: return None
+        blocks.extend(r['data'])
+        dist *= 2
+    if not wait_sends(sends): return None
+    return [blocks[(i-p)%n] for i in range(n)]
+
+def allgather_ring(data, mpi_comm, data_size=4):
+    """In n-1 rounds, each rank passes on the block it received last
+    to the next rank."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    sends = []
+    res = [None]*n
+    res[p] = data
+    for s in range(n-1):
+        r = sendrecv((p+1)%n, res[(p-s)%n], data_size, (p-1)%n, mpi_comm,
+                     "__allgather__", sends)
+        if r is None: return None
+        res[(p-s-1)%n] = r['data']
+    if not wait_sends(sends): return None
+    return res
+
+
+#
+# alltoall
+#
+
+def alltoall_hypercube(data, mpi_comm, data_size=4):
+    """Hypercube exchange of the whole matrix if n is a power of two,
+    sequential pairs otherwise."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+
+    steps = int(math.ceil(math.log(n,2)))
+    if n == int(math.pow(2, steps)):
+        # if power of two, we use hypercube pairwise exchange method
+        matrix = dict()
+        matrix[p] = data
+
+        m = 1
+        for s in range(steps):
+            q = p ^ m
+            # we simply gather data from all processes rather than
+            # trying to figure out exactly what needs to be exchanged
+            r = mpi.mpi_sendrecv(q, matrix, data_size*n/2, q, mpi_comm,
+                                 send_type = "__alltoall__", recv_type = "__alltoall__")
+            if r is None: return None
+            matrix.update(r['data'])
+            m *= 2
+        res = []
+        for i in range(n):
+            res.append(matrix[i][p])
+        return res
+    else:
+        return alltoallv_sequential(data, mpi_comm, [data_size]*n)
+
+def alltoall_pairwise(data, mpi_comm, data_size=4):
+    """In round k, each rank sends to p xor k and receives from it
+    (for n a power of two), or sends to p+k and receives from p-k."""
+
+    n = len(mpi_comm['hostmap'])
+    return alltoallv_pairwise(data, mpi_comm, [data_size]*n)
+
+def alltoall_bruck(data, mpi_comm, data_size=4):
+    """The blocks are rotated so that block i goes i ranks ahead; in
+    round k, each rank sends the blocks with bit k of i set to the
+    rank 2^k ahead, and the blocks are rotated back at the end."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    sends = []
+    blocks = [data[(p+i)%n] for i in range(n)]
+    dist = 1
+    while dist < n:
+        part = dict([(i, blocks[i]) for i in range(n) if i & dist])
+        r = sendrecv((p+dist)%n, part, data_size*len(part), (p-dist)%n, mpi_comm,
+                     "__alltoall__", sends)
+        if r is None: return None
+        for i, x in r['data'].iteritems(): blocks[i] = x
+        dist *= 2
+    if not wait_sends(sends): return None
+    return [blocks[(p-i)%n] for i in range(n)]
+
+def alltoallv_sequential(data, mpi_comm, data_sizes):
+    """Every pair of ranks exchange in turn, one pair at a time."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    for i in range(n):
+        for j in range(i, n):
+            if p  == i:
+                r = mpi.mpi_sendrecv(j, data[j], data_sizes[j], j, mpi_comm,
+                                     send_type = "__alltoall__", recv_type = "__alltoall__")
+                if r is None: return None
+                data[j] = r['data']
+            elif p == j:
+                r = mpi.mpi_sendrecv(i, data[i], data_sizes[i], i, mpi_comm,
+                                     send_type = "__alltoall__", recv_type = "__alltoall__")
+                if r is None: return None
+                data[i] = r['data']
+    return data
+
+def alltoallv_pairwise(data, mpi_comm, data_sizes):
+    """Pairwise exchange in n-1 rounds (see alltoall_pairwise)."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    sends = []
+    res = [None]*n
+    res[p] = data[p]
+    for k in range(1, n):
+        if n == pof2(n): to_rank = from_rank = p^k
+        else: to_rank, from_rank = (p+k)%n, (p-k)%n
+        r = sendrecv(to_rank, data[to_rank], data_sizes[to_rank], from_rank, mpi_comm,
+                     "__alltoall__", sends)
+        if r is None: return None
+        res[from_rank] = r['data']
+    if not wait_sends(sends): return None
+    return res
+
+
+#
+# analytic model
+#
+
+def log2ceil(n):
+    """Returns the number of rounds of doubling to reach n."""
+    s = 0
+    while (1<<s) < n: s += 1
+    return s
+
+def cost_terms(coll, alg, n, m):
+    """Returns the messages and the bytes on the critical path of an
+    algorithm of a collective among n ranks, of m bytes (per rank, or
+    per pair of ranks for alltoall, or the most for alltoallv).
+
+    The algorithms sending by mpi_send (those of mpi.py before) wait
+    for the ack each round, which counts as another message.
+    """
+
+    if n <= 1: return 0, 0
+    s = log2ceil(n)
+    p2 = pof2(n)
+    lg = log2ceil(p2)
+    # the folding of the ranks beyond the power of two, and back
+    fold = 2 if n > p2 else 0
+    if coll == "barrier":
+        if alg == "binomial": return 4*s, 8*s
+        return s, 4*s
+    elif coll == "bcast":
+        if alg == "binomial": return 2*s, s*m
+        return s+n-1, 2.0*m*(n-1)/n
+    elif coll == "allreduce":
+        if alg == "binomial": return 4*s, 2*s*m
+        elif alg == "recursive_doubling": return lg+fold, (lg+fold)*m
+        elif alg == "rabenseifner": return 2*lg+fold, 2.0*m*(p2-1)/p2+fold*m
+        return 2*(n-1), 2.0*m*(n-1)/n
+    elif coll == "allgather":
+        if alg == "binomial": return 4*s, s*(s+1)/2*m+s*n*m
+        elif alg == "ring": return n-1, (n-1)*m
+        return s, (n-1)*m
+    elif coll in ("alltoall", "alltoallv"):
+        if alg == "hypercube" and n == p2: return 2*s, s*n*m/2.0
+        elif alg in ("hypercube", "sequential"):
+            # the pairs go in a wavefront of 2n-3 steps
+            return 2*(2*n-3), (2*n-3)*m
+        elif alg == "bruck": return s, s*(n/2)*m
+        return n-1, (n-1)*m
+    elif coll == "reduce":
+        return 2*s, s*m
+    elif coll == "gather":
+        return 2*s, s*(s+1)/2*m
+    elif coll == "scatter":
+        return 2*s, (n-1)*m
+    else:
+        raise Exception("no cost model for mpi %s" % coll)
+
+def collective_cost(opts, coll, alg, n, m):
+    """Returns the time of a collective by the LogGP model."""
+
+    a, b = cost_terms(coll, alg, n, m)
+    return a*(opts["loggp_L"]+2*opts["loggp_o"])+b*opts["loggp_G"]
+
+def analytic_results(coll, parts, root, op):
+    """Returns the results of a collective for each rank, from the
+    data each contributed (parts)."""
+
+    n = len(parts)
+    if coll == "barrier":
+        return [None]*n
+    elif coll == "bcast":
+        return [parts[root]]*n
+    elif coll in ("reduce", "allreduce"):
+        data = parts[0]
+        for x in parts[1:]: data = reduce_op(op, data, x)
+        if coll == "allreduce": return [data]*n
+        return [data if p == root else parts[p] for p in range(n)]
+    elif coll == "gather":
+        # as mpi_gather, the ranks other than root get a partial list
+        return [parts if p == root else [parts[p] if i == p else 0 for i in range(n)]
+                for p in range(n)]
+    elif coll == "allgather":
+        return [parts]*n
+    elif coll == "scatter":
+        return [parts[root][p] for p in range(n)]
+    else:
+        return [[parts[q][p] for q in range(n)] for p in range(n)]
+
+def analytic_collective(mpi_comm, coll, data, data_size=4, root=0, op="sum"):
+    """Runs a collective by the cost model; returns the result."""
+
+    n = len(mpi_comm['hostmap'])
+    p = mpi_comm['rank']
+    if n <= 1: return analytic_results(coll, [data], root, op)[0]
+    host = mpi_comm['host']
+    if coll in collective_algorithms:
+        alg = select_algorithm(mpi_comm, coll, data_size)
+    else: alg = "binomial"
+
+    # the calls of a communicator are told apart by their sequence
+    # number; the communicators split from the same one share the id,
+    # but not rank 0
+    me = mpi.get_mpi_true_rank(mpi_comm, p)
+    r0 = mpi.get_mpi_true_rank(mpi_comm, 0)
+    k = (me, mpi_comm['commid'], r0)
+    seq = host.coll_seq.get(k, 0)
+    host.coll_seq[k] = seq+1
+    key = (mpi_comm['commid'], r0, seq)
+
+    # only what goes into the results is sent
+    if coll == "barrier" or (coll in ("bcast", "scatter") and p != root): data = None
+    arrival = {
+        "key" : key,
+        "coll" : coll,
+        "root" : root,
+        "op" : op,
+        "n" : n,
+        "rank" : p,
+        "true_rank" : me,
+        "true_host" : mpi.get_mpi_true_host(mpi_comm, p),
+        "time" : host.get_now(),
+        "cost" : collective_cost(host.mpi_coll, coll, alg, n, data_size),
+        "data" : data,
+    }
+    host.coll_waiting[(me, key)] = mpi_comm['mpiproc']
+    # an event to another host can't be sooner than the lookahead
+    host.reqService(host._lookahead, "collective_arrive", arrival,
+                    "Host", mpi.get_mpi_true_host(mpi_comm, 0))
+    return mpi_comm['mpiproc'].hibernate()
+
+def analytic_arrive(host, arrival):
+    """Takes in a rank arriving at a collective (on the host of rank
+    0); releases all ranks once the last one has arrived."""
+
+    key = arrival["key"]
+    call = host.coll_arrivals.get(key)
+    if call is None:
+        n = arrival["n"]
+        call = host.coll_arrivals[key] = {
+            "parts" : [None]*n,
+            "ranks" : [None]*n,
+            "count" : 0,
+            "last" : arrival["time"],
+        }
+    call["parts"][arrival["rank"]] = arrival["data"]
+    call["ranks"][arrival["rank"]] = (arrival["true_rank"], arrival["true_host"])
+    call["count"] += 1
+    if arrival["time"] > call["last"]: call["last"] = arrival["time"]
+    if call["count"] < arrival["n"]: return
+
+    del host.coll_arrivals[key]
+    results = analytic_results(arrival["coll"], call["parts"], arrival["root"], arrival["op"])
+    delay = max(call["last"]+arrival["cost"]-host.get_now(), host._lookahead)
+    for (true_rank, true_host), res in zip(call["ranks"], results):
+        release = {
+            "key" : key,
+            "true_rank" : true_rank,
+            "result" : copy.deepcopy(res),
+        }
+        host.reqService(delay, "collective_release", release, "Host", true_host)
+
+
+collective_algorithms = {
+    "barrier" : {
+        "binomial" : barrier_binomial,
+        "dissemination" : barrier_dissemination,
+    },
+    "bcast" : {
+        "binomial" : bcast_binomial,
+        "scatter_allgather" : bcast_scatter_allgather,
+    },
+    "allreduce" : {
+        "binomial" : allreduce_binomial,
+        "recursive_doubling" : allreduce_recursive_doubling,
+        "rabenseifner" : allreduce_rabenseifner,
+        "ring" : allreduce_ring,
+    },
+    "allgather" : {
+        "binomial" : allgather_binomial,
+        "recursive_doubling" : allgather_recursive_doubling,
+        "bruck" : allgather_bruck,
+        "ring" : allgather_ring,
+    },
+    "alltoall" : {
+        "hypercube" : alltoall_hypercube,
+        "pairwise" : alltoall_pairwise,
+        "bruck" : alltoall_bruck,
+    },
+    "alltoallv" : {
+        "sequential" : alltoallv_sequential,
+        "pairwise" : alltoallv_pairwise,
+    },
+}
@@ -0,0 +1,237 @@
+#
+# matching.py :- matching mpi receives with arriving messages
+#
+# Each mpi rank (MPIHost.recv_match) keeps the receives it has posted
+# and not yet matched, and the messages that have arrived for it (in
+# pieces, see mpi_isend) and not yet been matched with a receive (the
+# unexpected messages). Both are hashed by (communicator id, source
+# rank, message type); a receive may leave the source rank or the
+# type open (None), and the unexpected messages are also kept in
+# ordered lists by (communicator id, type), (communicator id, source
+# rank) and communicator id, for the receives with wildcards. (A
+# receive of any type never matches a message whose type starts with
+# '__', which is reserved.)
+#
+# A sender numbers its messages to each rank per communicator and
+# type (msg_id, see mpi_send), and a message can only be matched once
+# all messages before it of the same communicator, source and type
+# have been, which keeps mpi's non-overtaking order even if the
+# pieces arrive out of order (or are retransmitted). A message is
+# matched with the earliest posted receive it matches, or, if there's
+# none, with the next receive posted that matches it ahead of the
+# other messages arrived later. A message matched is delivered once
+# all its pieces have arrived.
+#
+# A message sent by the rendezvous protocol (see mpi_send) arrives as
+# a request to send (piece #0, with the data but none of its size);
+# its other pieces, the segments of its bulk, are sent only once the
+# message has been matched, upon the clear to send that the receiving
+# host sends back to the sender (see MPIHost.clear_to_send).
+#
+
+from collections import deque, OrderedDict
+
+class MatchingEngine(object):
+    """Matches the receives of an mpi rank with the messages arriving."""
+
+    # local variables:
+    #   seq: counts the receives posted and messages arrived (for their order)
+    #   next_msgid: the id of the next message to be matched, for each
+    #           (communicator id, source rank, type)
+    #   messages: the messages arrived and not yet delivered, each
+    #           indexed by (communicator id, source rank, type, msg_id)
+    #   unexpected: the messages not yet matched, for each (communicator
+    #           id, source rank, type), in the order of their arrival
+    #   unexpected_any_source, unexpected_any_type, unexpected_any:
+    #           the same, for each (communicator id, type),
+    #           (communicator id, source rank) and communicator id
+    #   posted: the receives not yet matched, for each (communicator
+    #           id, source rank or None, type or None), in the order
+    #           they were posted
+    #   rendezvous: the messages sent by the rendezvous protocol that
+    #           have been matched, whose senders are yet to be cleared
+    #           to send, as (sending host, the sender's key)
+    #
+    # A message is a dictionary with the from_rank, comm_id, msg_id,
+    # type, data_size (so far), missing_pieces, data (once piece #0
+    # has arrived), the rendezvous key if it's sent by the rendezvous
+    # protocol, and, while it's unexpected, its seq; a receive is
+    # a dictionary with the from_rank, comm_id and type asked for,
+    # its seq while it's posted, and either the mpi_process blocked
+    # in mpi_recv or the mpi_request of mpi_irecv, which is moved to
+    # the message it's matched with.
+
+    def __init__(self):
+        self.seq = 0
+        self.next_msgid = dict()
+        self.messages = dict()
+        self.unexpected = dict()
+        self.unexpected_any_source = dict()
+        self.unexpected_any_type = dict()
+        self.unexpected_any = dict()
+        self.posted = dict()
+        self.rendezvous = deque()
+
+    def recv(self, recvitem):
+        """Matches a receive with the unexpected messages.
+
+        Returns the message matched if it's complete (it's
+        delivered); otherwise, the receive is attached to the message
+        matched, or is posted, and None is returned.
+        """
+
+        c = recvitem["comm_id"]
+        f = recvitem["from_rank"]
+        t = recvitem["type"]
+        if f is not None and t is not None:
+            # only the next message in order can match
+            key = (c, f, t)
+            msg = self.messages.get(key+(self.next_msgid.get(key, 0),))
+            if msg is not None and "seq" not in msg: msg = None
+        else:
+            if t is not None: queue = self.unexpected_any_source.get((c, t))
+            elif f is not None: queue = self.unexpected_any_type.get((c, f))
+            else: queue = self.unexpected_any.get(c)
+            msg = None
+            if queue:
+                next_msgid = self.next_msgid
+                for m in queue.itervalues():
+                    if m["msg_id"] == next_msgid.get((c, m["from_rank"], m["type"]), 0):
+                        msg = m
+                        break
+
+        if msg is None:
+            self.seq += 1
+            recvitem["seq"] = self.seq
+            key = (c, f, t)
+            if key not in self.posted: self.posted[key] = deque()
+            self.posted[key].append(recvitem)
+            return None
+
+        self.match(msg)
+        if msg["missing_pieces"]:
+            if "mpi_process" in recvitem: msg["mpi_process"] = recvitem["mpi_process"]
+            else: msg["mpi_request"] = recvitem["mpi_request"]
+            return None
+        del self.messages[(c, msg["from_rank"], msg["type"], msg["msg_id"])]
+        return msg
+
+    def arrive(self, data):
+        """Adds a piece of a message that has arrived.
+
+        Data is the nonreturn_data of the packet. Returns the list of
+        messages matched with a receive and now complete (to be
+        delivered); a duplicate piece, or a piece of a message that
+        has been delivered, is ignored.
+        """
+
+        c = data["comm_id"]
+        f = data["from_rank"]
+        t = data["type"]
+        msg_id = data["msg_id"]
+        piece = data["piece_idx"]
+        msg = self.messages.get((c, f, t, msg_id))
+        if msg is None:
+            # a new message, unless it has been delivered
+            key = (c, f, t)
+            next_msgid = self.next_msgid.get(key, 0)
+            if msg_id < next_msgid: return []
+            missing_pieces = set(xrange(data["num_pieces"]))
+            missing_pieces.discard(piece)
+            msg = {
+                "from_rank" : f,
+                "comm_id" : c,
+                "msg_id" : msg_id,
+                "type" : t,
+                "data_size" : data["data_size"],
+                "missing_pieces" : missing_pieces,
+            }
+            if piece == 0: msg["data"] = data["data"]
+            if "rndv" in data: msg["rndv"] = data["rndv"]
+            self.messages[(c, f, t, msg_id)] = msg
+            self.add_unexpected(msg)
+            if msg_id == next_msgid:
+                return self.match_posted(key, msg_id)
+            return []
+
+        # another piece; piece #0 carries the data, and a piece may
+        # arrive more than once
+        if piece not in msg["missing_pieces"]: return []
+        msg["missing_pieces"].remove(piece)
+        msg["data_size"] += data["data_size"]
+        if piece == 0: msg["data"] = data["data"]
+        if msg["missing_pieces"] or "seq" in msg: return []
+        del self.messages[(c, f, t, msg_id)]
+        return [msg]
+
+    def match_posted(self, key, msg_id):
+        """Matches the messages of a communicator, source rank and
+        type, from the given msg_id on, with the posted receives, as
+        long as they're unexpected and next in order; returns those
+        complete."""
+
+        # a message becomes next in order either when it arrives, or
+        # when the one before it is matched upon arrival; when a
+        # receive matches the one before it, no posted receive can
+        # match it (the receive would have matched the one before)
+        c, f, t = key
+        done = []
+        while True:
+            msg = self.messages.get((c, f, t, msg_id))
+            if msg is None or "seq" not in msg: break
+            recvitem = self.find_posted(c, f, t)
+            if recvitem is None: break
+            self.match(msg)
+            if "mpi_process" in recvitem: msg["mpi_process"] = recvitem["mpi_process"]
+            else: msg["mpi_request"] = recvitem["mpi_request"]
+            if not msg["missing_pieces"]:
+                del self.messages[(c, f, t, msg_id)]
+                done.append(msg)
+            msg_id += 1
+        return done
+
+    def find_posted(self, c, f, t):
+        """Removes and returns the earliest posted receive matching a
+        message, or None."""
+
+        keys = [(c, f, t), (c, None, t)]
+        if t[:2] != '__': keys.extend([(c, f, None), (c, None, None)])
+        first = None
+        for key in keys:
+            queue = self.posted.get(key)
+            if queue and (first is None or queue[0]["seq"] < first[0]["seq"]):
+                first = queue
+        if first is None: return None
+        return first.popleft()
+
+    def add_unexpected(self, msg):
+        """Enters a message in the unexpected lists."""
+
+        self.seq += 1
+        s = msg["seq"] = self.seq
+        c = msg["comm_id"]
+        f = msg["from_rank"]
+        t = msg["type"]
+        tables = [(self.unexpected, (c, f, t)), (self.unexpected_any_source, (c, t))]
+        if t[:2] != '__':
+            tables.extend([(self.unexpected_any_type, (c, f)), (self.unexpected_any, c)])
+        for table, key in tables:
+            queue = table.get(key)
+            if queue is None: queue = table[key] = OrderedDict()
+            queue[s] = msg
+
+    def match(self, msg):
+        """Takes a message out of the unexpected lists, as it's matched."""
+
+        s = msg.pop("seq")
+        c = msg["comm_id"]
+        f = msg["from_rank"]
+        t = msg["type"]
+        del self.unexpected[(c, f, t)][s]
+        del self.unexpected_any_source[(c, t)][s]
+        if t[:2] != '__':
+            del self.unexpected_any_type[(c, f)][s]
+            del self.unexpected_any[c][s]
+        key = (c, f, t)
+        self.next_msgid[key] = self.next_msgid.get(key, 0)+1
+        if "rndv" in msg: self.rendezvous.append(msg["rndv"])
@@ -5,6 +5,8 @@
 import math, copy
 from collections import deque
 from interconnect import *
+from matching import *
+import collectives
 
 def mpi_comm_rank(mpi_comm):
     """Returns the mpi rank"""
@@ -25,8 +27,20 @@ def mpi_send(to_rank, data, sz, mpi_comm, type="default"):
     and message type to another mpi process 'to_rank' (it's ok to send
     data to itself). This function returns a boolean indicating
     whether the send operation has been successful. Data could be
-    None. Note that the user should not use a message type that starts
-    with '__'; it's reserved.
+    None; otherwise, the receiver gets a copy of it, so the sender may
+    modify the data once the function returns. Note that the user
+    should not use a message type that starts with '__'; it's reserved.
+
+    A message larger than the eager threshold (mpiopt "eager_thresh")
+    to another host is sent by the rendezvous protocol: a request to
+    send goes first, and once the receiver has matched it with a
+    receive and sent back a clear to send, the data follows in
+    segments of up to half the send window (as many at a time as fill
+    the window), each a stream pipelined through the network in
+    packets of the max packet size and acknowledged as a whole; the
+    send completes once all segments are acknowledged. Smaller
+    messages are sent eagerly, in pieces of the max packet size, each
+    acknowledged.
     """
 
     if not (0 <= to_rank < len(mpi_comm['hostmap'])):
@@ -47,12 +61,25 @@ def mpi_send(to_rank, data, sz, mpi_comm, type="default"):
         host.send_msgid[from_true_rank] = dict()
     if to_true_rank not in host.send_msgid[from_true_rank]:
         host.send_msgid[from_true_rank][to_true_rank] = dict()
-    if type not in host.send_msgid[from_true_rank][to_true_rank]:
-        host.send_msgid[from_true_rank][to_true_rank][type] = 0
-    msg_id = host.send_msgid[from_true_rank][to_true_rank][type]
-    host.send_msgid[from_true_rank][to_true_rank][type] += 1
+    key = (mpi_comm['commid'], type)
+    if key not in host.send_msgid[from_true_rank][to_true_rank]:
+        host.send_msgid[from_true_rank][to_true_rank][key] = 0
+    msg_id = host.send_msgid[from_true_rank][to_true_rank][key]
+    host.send_msgid[from_true_rank][to_true_rank][key] += 1
     to_host = get_mpi_true_host(mpi_comm, to_rank)
 
+    if is_rendezvous(mpi_comm, to_rank, sz):
+        sendreq = rendezvous_send(host, mpi_comm, to_rank, to_true_rank, to_host,
+                                  msg_id, data, sz, type)
+        # the process is woken up once the send completes
+        sendreq["mpi_process"] = proc
+        proc.hibernate()
+        succ = sendreq["status"] == "success"
+        if "mpi" in host.hpcsim_dict["debug_options"]:
+            print("rank %d (comm=%d) mpi_send: to_rank=%d, type=%s: DONE" % 
+                  (mpi_comm['rank'], mpi_comm['commid'], to_rank, type))
+        return succ
+
     # we may have to break data down to pieces according to the min
     # and max packet size requirement (we do this only if source and
     # destination are not on the same host)
@@ -87,7 +114,9 @@ def mpi_send(to_rank, data, sz, mpi_comm, type="default"):
             "msg_id" : msg_id, # so that we don't confuse successive messages from same rank
             "padded_size" : host.mpi_minsz if sendsz<host.mpi_minsz else sendsz,
             "data_size" : sendsz, # without padding
-            "data" : data if piece_idx == 0 else None, # data only attach data to first piece
+            # data only attach data to first piece; it's copied, since
+            # packets (with their data) are passed by reference
+            "data" : copy.deepcopy(data) if piece_idx == 0 else None,
             "type" : type,
             "piece_idx" : piece_idx,
             "num_pieces" : num_pieces,
@@ -146,14 +175,20 @@ def mpi_isend(to_rank, data, sz, mpi_comm, type="default"):
         host.send_msgid[from_true_rank] = dict()
     if to_true_rank not in host.send_msgid[from_true_rank]:
         host.send_msgid[from_true_rank][to_true_rank] = dict()
-    if type not in host.send_msgid[from_true_rank][to_true_rank]:
-        host.send_msgid[from_true_rank][to_true_rank][type] = 0
-    msg_id = host.send_msgid[from_true_rank][to_true_rank][type]
-    host.send_msgid[from_true_rank][to_true_rank][type] += 1
+    key = (mpi_comm['commid'], type)
+    if key not in host.send_msgid[from_true_rank][to_true_rank]:
+        host.send_msgid[from_true_rank][to_true_rank][key] = 0
+    msg_id = host.send_msgid[from_true_rank][to_true_rank][key]
+    host.send_msgid[from_true_rank][to_true_rank][key] += 1
 
 
     to_host = get_mpi_true_host(mpi_comm, to_rank)
 
+    if is_rendezvous(mpi_comm, to_rank, sz):
+        # by the rendezvous protocol (see mpi_send)
+        return rendezvous_send(host, mpi_comm, to_rank, to_true_rank, to_host,
+                               msg_id, data, sz, type)
+
     # we may have to break data down to pieces according to the min
     # and max packet size requirement (we do this only if source and
     # destination are not on the same host)
@@ -192,7 +227,9 @@ def mpi_isend(to_rank, data, sz, mpi_comm, type="default"):
             "msg_id" : msg_id, # so that we don't confuse successive messages from same rank
             "padded_size" : host.mpi_minsz if sendsz<host.mpi_minsz else sendsz,
             "data_size" : sendsz, # without padding
-            "data" : data if piece_idx == 0 else None, # data only attach data to first piece
+            # data only attach data to first piece; it's copied, since
+            # packets (with their data) are passed by reference
+            "data" : copy.deepcopy(data) if piece_idx == 0 else None,
             "type" : type,
             "piece_idx" : piece_idx,
             "num_pieces" : num_pieces,
@@ -209,6 +246,85 @@ def mpi_isend(to_rank, data, sz, mpi_comm, type="default"):
 
     return sendreq
 
+def is_rendezvous(mpi_comm, to_rank, sz):
+    """Returns whether a message is sent by the rendezvous protocol
+    (see mpi_send)."""
+
+    host = mpi_comm['host']
+    return sz > host.mpi_eager_thresh and \
+        host.node_id != get_mpi_true_host(mpi_comm, to_rank)
+
+def rendezvous_send(host, mpi_comm, to_rank, to_true_rank, to_host, msg_id, data, sz, type):
+    """Starts sending a message by the rendezvous protocol.
+
+    The request to send (piece #0) is handed to the send process; the
+    segments of the bulk (pieces #1 and on) are kept by the host until
+    the receiver clears them to send (see MPIHost.send_segments).
+    Returns the send request, which completes once all segments are
+    acknowledged.
+    """
+
+    segsz = host.mpi_segsz
+    num_segments = int((sz+segsz-1)/segsz)
+    sendreq = {
+        "mpi_comm" : mpi_comm,
+        "status" : "sending",
+        "pieces_left" : set(range(1, num_segments+1))
+    }
+    key = host.rndv_key
+    host.rndv_key += 1
+    rts = {
+        "to_rank" : to_rank,
+        "to_true_rank" : to_true_rank,
+        "to_host" : to_host,
+        "from_rank" : mpi_comm['rank'],
+        "comm_id" : mpi_comm['commid'],
+        "msg_id" : msg_id,
+        "padded_size" : host.mpi_minsz,
+        "data_size" : 0,
+        # the data goes with the request, as with the first piece
+        "data" : copy.deepcopy(data),
+        "type" : type,
+        "piece_idx" : 0,
+        "num_pieces" : num_segments+1,
+        "mpi_request" : sendreq,
+        "data_overhead" : host.mpi_put_datahdr,
+        "ack_overhead" : host.mpi_put_ackhdr,
+        "rndv" : (host.node_id, key),
+        "control" : True,
+    }
+
+    # each segment carries the header of every packet in it
+    is_get = sz > host.mpi_putget_thresh
+    segments = deque()
+    for i in xrange(num_segments):
+        sendsz = min(segsz, sz-i*segsz)
+        segments.append({
+            "to_rank" : to_rank,
+            "to_true_rank" : to_true_rank,
+            "to_host" : to_host,
+            "from_rank" : mpi_comm['rank'],
+            "comm_id" : mpi_comm['commid'],
+            "msg_id" : msg_id,
+            "padded_size" : host.mpi_minsz if sendsz<host.mpi_minsz else sendsz,
+            "data_size" : sendsz,
+            "data" : None,
+            "type" : type,
+            "piece_idx" : i+1,
+            "num_pieces" : num_segments+1,
+            "mpi_request" : sendreq,
+            "data_overhead" : int((sendsz+host.mpi_maxsz-1)/host.mpi_maxsz) * \
+                              (host.mpi_get_datahdr if is_get else host.mpi_put_datahdr),
+            "ack_overhead" : host.mpi_get_ackhdr if is_get else host.mpi_put_ackhdr,
+            "pipelined" : True,
+            "segments" : segments, # those yet to be sent
+        })
+    host.rndv_sends[key] = segments
+    host.send_buffer.append(rts)
+    if len(host.send_buffer) == 1:
+        host.wakeProcess("send_process")
+    return sendreq
+
 def mpi_recv(mpi_comm, from_rank=None, type=None):
     """Blocking mpi receive.
 
@@ -354,8 +470,18 @@ def mpi_sendrecv(to_rank, data, sz, from_rank, mpi_comm,
     in which case the corresponding receive or send operation is
     bypassed. Note that the user should not use type that starts with
     '__'; it's reserved.
+
+    A send by the rendezvous protocol completes only once the receiver
+    has posted the receive, which may be in a sendrecv of its own; in
+    that case, the send is started, and waited for after the receive.
     """
 
+    if to_rank is not None and from_rank is not None and \
+       is_rendezvous(mpi_comm, to_rank, sz):
+        req = mpi_isend(to_rank, data, sz, mpi_comm, type=send_type)
+        r = mpi_recv(mpi_comm, from_rank, type=recv_type)
+        mpi_wait(req)
+        return r
     if to_rank is not None:
         mpi_send(to_rank, data, sz, mpi_comm, type=send_type)
     if from_rank is not None:
@@ -373,6 +499,8 @@ def mpi_reduce(root, data, mpi_comm, data_size=4, op="sum"):
     if not (0 <= root < n):
         raise Exception("mpi_reduce root (%d) out of range (comm=%d, size=%d)" % 
                         (root, mpi_comm['commid'], n))
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "reduce", data, data_size, root, op)
 
     # one node situation
     if n <= 1: return data
@@ -401,7 +529,12 @@ def mpi_reduce(root, data, mpi_comm, data_size=4, op="sum"):
             # receive in this round, but only if partner exists
             if rank + mid < n:
                 #print("reduce: [[[%d]]] expecting to receive" % p)
-                x = mpi_recv(mpi_comm, type="__reduce__")
+                # from the partner (not any rank, which could be
+                # sending for the next call already)
+                t = rank + mid
+                if t == root: t = 0
+                elif t == 0: t = root
+                x = mpi_recv(mpi_comm, t, "__reduce__")
                 if x is None: return None
                 #print("reduce: [[[%d]]] receives from %d got d=%d (sum: %d)" % 
                 #      (p, x["from_rank"], x["data"], data+x["data"]))
@@ -424,6 +557,8 @@ def mpi_gather(root, data, mpi_comm, data_size=4):
     if not (0 <= root < n):
         raise Exception("mpi_gather root (%d) out of range (comm=%d, size=%d)" % 
                         (root, mpi_comm['commid'], n))
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "gather", data, data_size, root)
 
     res_dict = dict()
     res_dict[p] = data
@@ -460,7 +595,12 @@ def mpi_gather(root, data, mpi_comm, data_size=4):
             # receive in this round, but only if partner exists
             if rank + mid < n:
                 #print("reduce: [[[%d]]] expecting to receive" % p)
-                x = mpi_recv(mpi_comm, type="__gather__")
+                # from the partner (not any rank, which could be
+                # sending for the next call already)
+                t = rank + mid
+                if t == root: t = 0
+                elif t == 0: t = root
+                x = mpi_recv(mpi_comm, t, "__gather__")
                 if x is None: return None
                 #print("reduce: [[[%d]]] receives from %d got d=%d (sum: %d)" % 
                 #      (p, x["from_rank"], x["data"], data+x["data"]))
@@ -473,58 +613,27 @@ def mpi_gather(root, data, mpi_comm, data_size=4):
 def mpi_allgather(data, mpi_comm, data_size=4):
     """All gather.
 
-    It is implemented by first gathering at rank 0 then bcast.
+    Returns a vector of the values of all processes, gathered by one
+    of the algorithms in collectives.py.
     """
 
-    r = mpi_gather(0, data, mpi_comm, data_size)
-    if r is None: return None
-    else: return mpi_bcast(0, r, mpi_comm, data_size*len(mpi_comm['hostmap']))
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "allgather", data, data_size)
+    alg = collectives.select_algorithm(mpi_comm, "allgather", data_size)
+    return collectives.collective_algorithms["allgather"][alg](data, mpi_comm, data_size)
 
 def mpi_bcast(root, data, mpi_comm, data_size=4):
     """Returns the data provided only by the root."""
 
     n = len(mpi_comm['hostmap'])
-    p = mpi_comm['rank']
     if not (0 <= root < n):
         raise Exception("mpi_bcast root (%d) out of range (comm=%d, size=%d)" % 
                         (root, mpi_comm['commid'], n))
 
-    # one node situation
-    if n <= 1: return data
-
-    # find out the number of binomial tree steps
-    steps = int(math.ceil(math.log(n,2)))
-
-    # my new rank (swapping 0 and root)
-    if p == root: rank = 0
-    elif p == 0: rank = root
-    else: rank = p
-
-    mid = 1
-    for s in range(steps):
-        # skip the round if it's not my turn
-        if rank < 2*mid: 
-            if rank >= mid:
-                # receive in this round
-                #print("bcast: [[[%d]]] expecting to receive" % p)
-                r = mpi_recv(mpi_comm, type="__bcast__")
-                if r is None: return None
-                #print("bcast: [[[%d]]] receives from %d got d=%d" % 
-                #      (p, r["from_rank"], r["data"]))
-                data = r['data']
-            else:
-                # send in this round, but only if partner exists
-                t = rank + mid
-                if t < n: 
-                    if t == root: t = 0
-                    elif t == 0: t = root
-                    #print("bcast: [[[%d]]] sends to %d with d=%d" % (p, t, data))
-                    r = mpi_send(t, data, data_size, mpi_comm, type="__bcast__")
-                    if r is None: return None
-            
-        # carry on to the next round
-        mid *= 2
-    else: return data
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "bcast", data, data_size, root)
+    alg = collectives.select_algorithm(mpi_comm, "bcast", data_size)
+    return collectives.collective_algorithms["bcast"][alg](root, data, mpi_comm, data_size)
 
 def mpi_scatter(root, data, mpi_comm, data_size=4):
     """Takes a vector from root and distribute the elements to all ranks."""
@@ -534,6 +643,8 @@ def mpi_scatter(root, data, mpi_comm, data_size=4):
     if not (0 <= root < n):
         raise Exception("mpi_bcast root (%d) out of range (comm=%d, size=%d)" % 
                         (root, mpi_comm['commid'], n))
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "scatter", data, data_size, root)
 
     # it'd better be the data is a list of n elements
     res_dict = dict([(i,data[i]) for i in range(n)])
@@ -556,7 +667,12 @@ def mpi_scatter(root, data, mpi_comm, data_size=4):
             if rank >= mid:
                 # receive in this round
                 #print("bcast: [[[%d]]] expecting to receive" % p)
-                r = mpi_recv(mpi_comm, type="__scatter__")
+                # from the parent (not any rank, which could be
+                # sending for the next call already)
+                t = rank - mid
+                if t == root: t = 0
+                elif t == 0: t = root
+                r = mpi_recv(mpi_comm, t, "__scatter__")
                 if r is None: return None
                 #print("bcast: [[[%d]]] receives from %d got d=%d" % 
                 #      (p, r["from_rank"], r["data"]))
@@ -576,67 +692,38 @@ def mpi_scatter(root, data, mpi_comm, data_size=4):
     else: return res_dict[p]
 
 def mpi_barrier(mpi_comm):
-    """Barrier is implemented as reduce and then bcast."""
+    """Barrier, by one of the algorithms in collectives.py."""
 
-    mpi_reduce(0, 0, mpi_comm)
-    mpi_bcast(0, 0, mpi_comm)
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "barrier", None)
+    alg = collectives.select_algorithm(mpi_comm, "barrier", 4)
+    collectives.collective_algorithms["barrier"][alg](mpi_comm)
 
 def mpi_allreduce(data, mpi_comm, data_size=4, op="sum"):
-    """Implemented as reduce and then bcast."""
+    """Reduction whose result all ranks get.
+
+    The reduction operators are those of mpi_reduce; the algorithm is
+    one of those in collectives.py.
+    """
 
-    #print("%d before reduce" % mpi_comm['rank'])
-    data = mpi_reduce(0, data, mpi_comm, data_size, op)
-    #print("%d between reduce and bcast" % mpi_comm['rank'])
-    if data is None: return None
-    else: return mpi_bcast(0, data, mpi_comm, data_size)
-        #print("%d after bcast" % mpi_comm['rank'])
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "allreduce", data, data_size, op=op)
+    alg = collectives.select_algorithm(mpi_comm, "allreduce", data_size)
+    return collectives.collective_algorithms["allreduce"][alg](data, mpi_comm, data_size, op)
 
 def mpi_alltoall(data, mpi_comm, data_size=4):
     """All-to-all is a matrix transpose operation.
 
     Each rank sends a different message to other ranks. Data must be a
     list of n elements, where n is the total of processes; data_size
-    is the size of data to be sent to each of the processes.
+    is the size of data to be sent to each of the processes. The
+    algorithm is one of those in collectives.py.
     """
 
-    n = len(mpi_comm['hostmap'])
-    p = mpi_comm['rank']
-
-    steps = int(math.ceil(math.log(n,2)))
-    if n == int(math.pow(2, steps)):
-        # if power of two, we use hypercube pairwise exchange method
-        matrix = dict()
-        matrix[p] = data
-
-        m = 1
-        for s in range(steps):
-            q = p ^ m
-            # we simply gather data from all processes rather than
-            # trying to figure out exactly what needs to be exchanged
-            r = mpi_sendrecv(q, matrix, data_size*n/2, q, mpi_comm, 
-                             send_type = "__alltoall__", recv_type = "__alltoall__")
-            if r is None: return None
-            matrix.update(r['data'])
-            m *= 2
-        res = []
-        for i in range(n):
-            res.append(matrix[i][p])
-        return res
-    else:
-        # otherwise, use point to point exchange method
-        for i in range(n):
-            for j in range(i, n):
-                if p  == i:
-                    r = mpi_sendrecv(j, data[j], data_size, j, mpi_comm, 
-                                     send_type = "__alltoall__", recv_type = "__alltoall__")
-                    if r is None: return None
-                    data[j] = r['data']
-                elif p == j:
-                    r = mpi_sendrecv(i, data[i], data_size, i, mpi_comm, 
-                                     send_type = "__alltoall__", recv_type = "__alltoall__")
-                    if r is None: return None
-                    data[i] = r['data']
-        return data
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "alltoall", data, data_size)
+    alg = collectives.select_algorithm(mpi_comm, "alltoall", data_size)
+    return collectives.collective_algorithms["alltoall"][alg](data, mpi_comm, data_size)
 
 def mpi_alltoallv(data, mpi_comm, data_sizes=None):
     """All-to-all with variable data size.
@@ -647,25 +734,13 @@ def mpi_alltoallv(data, mpi_comm, data_sizes=None):
     """
 
     n = len(mpi_comm['hostmap'])
-    p = mpi_comm['rank']
-
     if data_sizes is None:
         data_sizes = [4]*n
 
-    # we only use point to point exchange method
-    for i in range(n):
-        for j in range(i, n):
-            if p  == i:
-                r = mpi_sendrecv(j, data[j], data_sizes[j], j, mpi_comm, 
-                                 send_type = "__alltoall__", recv_type = "__alltoall__")
-                if r is None: return None
-                data[j] = r['data']
-            elif p == j:
-                r = mpi_sendrecv(i, data[i], data_sizes[i], i, mpi_comm, 
-                                 send_type = "__alltoall__", recv_type = "__alltoall__")
-                if r is None: return None
-                data[i] = r['data']
-    return data
+    if mpi_comm['host'].mpi_coll["collective_model"] == "analytic":
+        return collectives.analytic_collective(mpi_comm, "alltoallv", data, max(data_sizes))
+    alg = collectives.select_algorithm(mpi_comm, "alltoallv", max(data_sizes))
+    return collectives.collective_algorithms["alltoallv"][alg](data, mpi_comm, data_sizes)
 
 def mpi_comm_split(mpi_comm, color, key):
     """Split the mpi communicator.
@@ -1006,10 +1081,12 @@ class MPIHost(Host):
     #   send_buffer: a deque for handing messages to send process
     #   resend_key: the send sequence number
     #   resend_buffer: stores unacknowledged messages (indexed by seqno)
-    #   recv_buffer: indexed by receiver's true rank
+    #   recv_match: matching engine indexed by receiver's true rank
     #   send_msgid: sequence number from rank to rank
-    #   recv_msgid: sequence number from rank to rank
     #   comm_world: everything to do with communicators
+    #   rndv_key: the sequence number of rendezvous sends
+    #   rndv_sends: the segments of rendezvous sends waiting to be
+    #       cleared to send (indexed by rendezvous key)
 
     def __init__(self, baseinfo, hpcsim_dict, *args):
         super(MPIHost, self).__init__(baseinfo, hpcsim_dict, *args)
@@ -1027,18 +1104,29 @@ class MPIHost(Host):
         self.resend_key = 0
         self.resend_buffer = dict()
 
-        # receive buffer is divided per receiver's (true) rank
-        self.recv_buffer = dict()
+        # receives are matched with the messages arriving per
+        # receiver's (true) rank (see matching.py)
+        self.recv_match = dict()
 
         # managing message serial number: 
-        # send_msgid[from_true_rank][to_true_rank]
-        # recv_msgid[to_true_rank][from_true_rank]
+        # send_msgid[from_true_rank][to_true_rank][(comm_id, type)]
         self.send_msgid = dict()
-        self.recv_msgid = dict()
 
         # managing communicators
         self.comm_world = dict()
 
+        # messages sent by the rendezvous protocol (see mpi_send)
+        self.rndv_key = 0
+        self.rndv_sends = dict()
+
+        # collectives by the cost model (see collectives.py): the
+        # calls of each rank so far per communicator, the processes
+        # waiting for a call to end, and the ranks arrived at the calls
+        # this host (having rank 0) keeps
+        self.coll_seq = dict()
+        self.coll_waiting = dict()
+        self.coll_arrivals = dict()
+
     def create_mpi_proc(self, *args):
         """A service scheduled by start_mpi to start user mpi process."""
 
@@ -1054,11 +1142,23 @@ class MPIHost(Host):
         self.mpi_get_datahdr = data["mpiopt"]["get_data_overhead"]
         self.mpi_get_ackhdr = data["mpiopt"]["get_ack_overhead"]
         self.mpi_putget_thresh = data["mpiopt"]["putget_thresh"]
+        self.mpi_eager_thresh = data["mpiopt"]["eager_thresh"]
         self.mpi_call_time = data["mpiopt"]["call_time"]
+        # the algorithms of the collectives and their thresholds
+        self.mpi_coll = collectives.collective_options(data["mpiopt"])
+        collectives.loggp_parameters(self.mpi_coll, data["mpiopt"], self)
         # multiplying the injection rate by round-trip-time (with some
         # slacks, factor of 2) would be the max send window
         self.mpi_bufsz = data["mpiopt"]["max_injection"] * \
                          self.intercon.network_diameter_time()*4
+        # a rendezvous send goes in segments (see mpi_send), each a
+        # whole number of packets within half the send window, and as
+        # many of them at a time as it takes to fill the window
+        self.mpi_segsz = max(1, int(self.mpi_bufsz/2/self.mpi_maxsz))*self.mpi_maxsz
+        self.mpi_segwin = int((self.mpi_bufsz+self.mpi_segsz-1)/self.mpi_segsz)
+        # the rate a stream (a segment of a rendezvous send) is sent at
+        self.mpi_stream_rate = min(data["mpiopt"]["max_injection"],
+                                   self.interfaces['r'].outports[0].bdw/8.0)
 
         # create the mpi main function
         proc_name = "%s_%d"% (data["main_proc"], data["rank"])
@@ -1090,6 +1190,17 @@ class MPIHost(Host):
         # run the mpi main function
         self.startProcess(proc_name, data["main_proc"], mpi_comm_world, *data["args"])
 
+    def collective_arrive(self, *args):
+        """A rank arrives at a collective run by the cost model."""
+        collectives.analytic_arrive(self, args[0])
+
+    def collective_release(self, *args):
+        """A collective run by the cost model ends for a rank."""
+
+        release = args[0]
+        proc = self.coll_waiting.pop((release["true_rank"], release["key"]))
+        proc.wake(release["result"])
+
     def send_mpi_message(self, senditem, key):
         """Sends message as a packet with seqno being the resend key."""
     
@@ -1113,15 +1224,35 @@ class MPIHost(Host):
                          "num_pieces" : senditem["num_pieces"],
                          "ack_overhead" : senditem["ack_overhead"],
                      },
-                     ttl=self.intercon.network_diameter())
+                     ttl=self.intercon.network_diameter(),
+                     # the handshake of the rendezvous protocol is
+                     # prioritized, as are acks
+                     prio=("control" in senditem),
+                     # the path is kept only for debugging
+                     blaze_trail=("host" in self.hpcsim_dict["debug_options"]))
+        # the handshake of the rendezvous protocol (see mpi_send)
+        if "rndv" in senditem:
+            pkt.nonreturn_data["rndv"] = senditem["rndv"]
+        if "cts" in senditem:
+            pkt.nonreturn_data["cts"] = senditem["cts"]
+        if "pipelined" in senditem:
+            pkt.pipeline_unit = self.mpi_maxsz
         pkt.set_sendtime(self.get_now())
-        pkt.add_to_path(str(self))
+        self.trace_send(pkt)
 
         if self.node_id == pkt.dsthost:
             self.mem_queue.send_pkt(pkt)
         else:
             self.interfaces['r'].send_pkt(pkt, 0)
 
+    def resend_interval(self, senditem):
+        """Returns the time to wait for a message to be acknowledged."""
+
+        # a segment is acknowledged only after all of it has arrived
+        if "pipelined" in senditem:
+            return self.mpi_resend_intv+4*senditem["padded_size"]/self.mpi_stream_rate
+        return self.mpi_resend_intv
+
     def resend_mpi_message(self, *args):
         """A service for resending messages upon timeout."""
     
@@ -1137,6 +1268,19 @@ class MPIHost(Host):
                 print("WARNING: %f: %s max rxmit reached for key=%d, item=%r" % 
                       (self.get_now(), self, key, senditem))
                 del self.resend_buffer[key]
+
+                if "rndv" in senditem:
+                    # the request to send failed (unless it's been
+                    # cleared to send, only its ack lost); its
+                    # segments are never sent
+                    if self.rndv_sends.pop(senditem["rndv"][1], None) is None:
+                        return
+                elif "cts" in senditem:
+                    # the sender's request will fail as well
+                    return
+                elif "segments" in senditem:
+                    # nor are the rest of the segments
+                    senditem["segments"].clear()
                 
                 assert "mpi_process" in senditem or "mpi_request" in senditem
                 if "mpi_process" in senditem:
@@ -1151,8 +1295,9 @@ class MPIHost(Host):
                 print("WARNING: %f: %s retransmit key=%d, retry=%d, item=%r" % 
                       (self.get_now(), self, key, self.resend_buffer[key]["trials"], 
                        self.resend_buffer[key]["senditem"]))
-                self.send_mpi_message(self.resend_buffer[key]["senditem"], key)
-                self.reqService(self.mpi_resend_intv, "resend_mpi_message", key)
+                senditem = self.resend_buffer[key]["senditem"]
+                self.send_mpi_message(senditem, key)
+                self.reqService(self.resend_interval(senditem), "resend_mpi_message", key)
         else:
             # otherwise, the message has already been properly acknowledge
             #print("%f: %s resend wakes for key=%d but finds nothing to do" % 
@@ -1171,6 +1316,13 @@ class MPIHost(Host):
             senditem = self.resend_buffer[key]["senditem"]
             del self.resend_buffer[key]
 
+            # the handshake of the rendezvous protocol completes nothing
+            if "control" in senditem:
+                return
+            # a segment acknowledged makes room for the next one
+            if "segments" in senditem:
+                self.send_segments(senditem["segments"], 1)
+
             assert "mpi_process" in senditem or "mpi_request" in senditem
             if "mpi_process" in senditem:
                 senditem["mpi_process"].wake(True)
@@ -1188,137 +1340,31 @@ class MPIHost(Host):
 
         This method is called by mpi_recv and mpi_irecv. If the
         request cannot be satisfied yet, it is entered into the
-        receive buffer.
+        matching engine of the receiving rank (see matching.py).
         """
 
         to_true_rank = get_mpi_true_rank(mpi_comm, to_rank)
-        if to_true_rank not in self.recv_buffer:
-            self.recv_buffer[to_true_rank] = []
-            self.recv_msgid[to_true_rank] = dict()
-            recvitem = {
-                "from_rank" : from_rank, # possibly None
-                "comm_id" : mpi_comm['commid'],
-                "type" : type, # possibly None
-            }
-            if proc: 
-                recvitem["mpi_process"] = proc
-            else: 
-                recvitem["mpi_request"] = recvreq
-            self.recv_buffer[to_true_rank].append(recvitem)
-            #print("%d: check_recv_buffer<1>: put %r in NEW buffer" % (to_true_rank, recvitem))
-            return None
-        else:
-            # linear search is easy
-            #print("%d: check_recv_buffer<2>: try match: comm_id=%d, to_rank=%s, from_rank=%r, type=%s" % \
-            #      (to_true_rank, mpi_comm['commid'], to_rank, from_rank, type))
-            for idx in range(len(self.recv_buffer[to_true_rank])):
-                recvitem = self.recv_buffer[to_true_rank][idx]
-                #print("%d: check_recv_buffer<2>: recvitem=%s" % (to_true_rank, recvitem))
-
-                if recvitem['comm_id'] != mpi_comm['commid']: continue
-
-                # if this is a pending request
-                if "mpi_process" in recvitem or "mpi_request" in recvitem:
-                    # this is a stringent requirement which may cause
-                    # problems: one cannot have two outstanding receives
-                    # posted with wildcard from-rank and message-type
-                    if (recvitem["from_rank"] is None or from_rank is None) and \
-                       (recvitem["type"] is None or type is None):
-                        raise Exception("ERROR: multiple recv requests to rank %d (comm=%d) found" % 
-                                        (to_rank, mpi_comm['commid']))
-                    continue
-
-                if from_rank is not None:
-                    f = get_mpi_true_rank(mpi_comm, from_rank)
-                else:
-                    rc = self.comm_world[to_true_rank]['comms'][recvitem["comm_id"]]
-                    f = get_mpi_true_rank(rc, recvitem["from_rank"])
-                assert f is not None
-
-                t = type
-                if type is None: t = recvitem["type"]
-                assert t is not None
-                
-                if f not in self.recv_msgid[to_true_rank]:
-                    self.recv_msgid[to_true_rank][f] = dict()
-                if t not in self.recv_msgid[to_true_rank][f]:
-                    self.recv_msgid[to_true_rank][f][t] = 0
-                #print("to_true_rank=%d, f=%d" % (to_true_rank, f))
-                #print("expect %d" % self.recv_msgid[to_true_rank][f][t])
-
-                # the match criteria:
-                # (1) the request has wildcard from_rank or rank is perfect match, and 
-                # (2) type is perfect match, or the reqeust has wildcard type and recv item is not reserved, and
-                # (3) the recv item must be the expected one in sequence
-                #print("%d: 1=%s,2=%s,3=%s,4=%s,5=%s,6=%s" % \
-                #      (to_true_rank, str(from_rank), str(recvitem["from_rank"]),
-                #       str(recvitem["type"]), str(type),
-                #       str(recvitem.get("msg_id")),
-                #       str(self.recv_msgid[to_true_rank][f][t])))
-		if (from_rank is None or recvitem["from_rank"] == from_rank) and \
-                   (recvitem["type"] == type or type is None and recvitem["type"][:2] != "__") and \
-                   ("msg_id" not in recvitem or recvitem["msg_id"] == self.recv_msgid[to_true_rank][f][t]):
-                    # if there's a match, we simply go with the first
-                    # match even though there might be multiple
-                    # matches (say, messages from other ranks), even
-                    # if the other matches would result more a
-                    # definitive receive at the moment
-                    break
-            else: recvitem = None
-
-            if recvitem is not None:
-                # there would be at most one receive request and
-                # recvitem found must be from received data
-                assert "mpi_process" not in recvitem and "mpi_request" not in recvitem
-                assert "missing_pieces" in recvitem
-
-                if len(recvitem["missing_pieces"]) > 0:
-                    # there's still at least one missing piece
-                    if proc: 
-                        recvitem["mpi_process"] = proc
-                    else:
-                        recvitem["mpi_request"] = recvreq
-                    #print("%d: check_recv_buffer<3>: found %r in buffer, wait for more pieces" % \
-                    #      (to_true_rank, recvitem))
-                    return None
-                else:
-                    # we got everything, return it to user
-                    del self.recv_buffer[to_true_rank][idx]
-                    from_rank = recvitem["from_rank"]
-                    rc = self.comm_world[to_true_rank]['comms'][recvitem["comm_id"]]
-                    from_true_rank = get_mpi_true_rank(rc, from_rank)
-                    t = recvitem["type"]
-                    if from_true_rank not in self.recv_msgid[to_true_rank]:
-                        self.recv_msgid[to_true_rank][from_true_rank] = dict()
-                    if t in self.recv_msgid[to_true_rank][from_true_rank]:
-                        self.recv_msgid[to_true_rank][from_true_rank][t] += 1
-                    else:
-                        self.recv_msgid[to_true_rank][from_true_rank][t] = 1
-
-                    if recvreq:
-                        #recvitem["mpi_request"] = recvreq
-                        recvreq["status"] = "success"
-                        recvreq["from_rank"] = from_rank
-                        recvreq["type"] = t
-                        recvreq["data"] = recvitem["data"]
-                        recvreq["data_size"] = recvitem["data_size"]
-                    #print("%d: check_recv_buffer<4>: found %r in buffer" % (to_true_rank, recvitem))
-                    return recvitem
-            else:
-                # there's no match exist, insert the request and
-                # return None
-                recvitem = {
-                    "from_rank" : from_rank,
-                    "comm_id" : mpi_comm['commid'],
-                    "type" : type,
-                }
-                if proc: 
-                    recvitem["mpi_process"] = proc
-                else: 
-                    recvitem["mpi_request"] = recvreq
-                self.recv_buffer[to_true_rank].append(recvitem)
-                #print("%d: check_recv_buffer<5>: put req %r in buffer" % (to_true_rank, recvitem))
-                return None
+        if to_true_rank not in self.recv_match:
+            self.recv_match[to_true_rank] = MatchingEngine()
+        recvitem = {
+            "from_rank" : from_rank, # possibly None
+            "comm_id" : mpi_comm['commid'],
+            "type" : type, # possibly None
+        }
+        if proc: 
+            recvitem["mpi_process"] = proc
+        else: 
+            recvitem["mpi_request"] = recvreq
+        recvitem = self.recv_match[to_true_rank].recv(recvitem)
+        self.clear_to_send(self.recv_match[to_true_rank])
+        if recvitem is not None and recvreq:
+            # we got everything, return it to user
+            recvreq["status"] = "success"
+            recvreq["from_rank"] = recvitem["from_rank"]
+            recvreq["type"] = recvitem["type"]
+            recvreq["data"] = recvitem["data"]
+            recvreq["data_size"] = recvitem["data_size"]
+        return recvitem
 
     def notify_data_recv(self, pkt):
         """Overrides the same method in the host class to handle receive.
@@ -1336,163 +1382,78 @@ class MPIHost(Host):
                      return_data=pkt.return_data,
                      ttl=self.intercon.network_diameter(), 
                      prio=True, # ack is prioritized
-                     blaze_trail = pkt.get_path()) # do the same about path
+                     blaze_trail = pkt.get_path() is not None) # do the same about path
         ack.set_sendtime(self.get_now())
-        ack.add_to_path(str(self))
+        self.trace_send(ack)
         
         if self.node_id == ack.dsthost:
             self.mem_queue.send_pkt(ack)
         else:
             self.interfaces['r'].send_pkt(ack, 0)
 
-        to_rank = pkt.nonreturn_data["to_rank"]
-        to_true_rank = pkt.nonreturn_data["to_true_rank"]
-        t = pkt.nonreturn_data["type"]
-        if to_true_rank not in self.recv_buffer:
-            self.recv_buffer[to_true_rank] = []
-            from_rank = pkt.nonreturn_data["from_rank"]
-            rc = self.comm_world[to_true_rank]['comms'][pkt.nonreturn_data["comm_id"]]
-            from_true_rank = get_mpi_true_rank(rc, from_rank)
-            self.recv_msgid[to_true_rank] = dict()
-            self.recv_msgid[to_true_rank][from_true_rank] = dict()
-            self.recv_msgid[to_true_rank][from_true_rank][t] = 0
-            msg_id = pkt.nonreturn_data["msg_id"]
-
-            # this message can only be the right one or the one from
-            # future; admit anyway
-            missing_pieces = set(range(pkt.nonreturn_data["num_pieces"]))
-            piece = pkt.nonreturn_data["piece_idx"]
-            missing_pieces.remove(piece)
-            recvitem = {
-                "from_rank" : from_rank,
-                "comm_id" : pkt.nonreturn_data["comm_id"],
-                "msg_id" : msg_id,
-                "type" : t,
-                "data_size" : pkt.nonreturn_data["data_size"],
-                "missing_pieces" : missing_pieces
-            }
-            # only piece #0 carries the data
-            if piece == 0:
-                recvitem["data"] = pkt.nonreturn_data["data"]
-            #print("%d: notify_data_recv<1>: put %r in NEW buffer" % (to_true_rank, recvitem))
-            self.recv_buffer[to_true_rank].append(recvitem)
-
-        else:
-            # linear search is easy
-            #print("%d: notify_data_recv<2>: try match: pkt=%s, type=%s" % \
-            #      (to_true_rank, pkt, t))
-            for idx in range(len(self.recv_buffer[to_true_rank])):
-                recvitem = self.recv_buffer[to_true_rank][idx]
-                #print("%d: notify_data_recv<2>: recvitem=%r" % (to_true_rank, recvitem))
-                # the match criteria:
-                # (0) same communicator, and
-                # (1) the request has wildcard from_rank or rank is perfect match, and 
-                # (2) type is perfect match, or the reqeust has wildcard type and recv item is not reserved, and
-                # (3) the recv item does not have msg id or it has the same msg id
-                if (recvitem["comm_id"] == pkt.nonreturn_data["comm_id"]) and \
-                   (recvitem["from_rank"] is None or recvitem["from_rank"] == pkt.nonreturn_data["from_rank"]) and \
-                   (recvitem["type"] == t or recvitem["type"] is None and t[:2] != '__') and \
-                   ("msg_id" not in recvitem or recvitem["msg_id"] == pkt.nonreturn_data["msg_id"]):
-                    # there can be at most one match
-                    break
-            else: recvitem = None
-
-            if recvitem is not None:
-                if "missing_pieces" in recvitem:
-                    # meaning that this is not only a request without
-                    # any arrival of data
-                    missing_pieces = recvitem["missing_pieces"]
-                    piece = pkt.nonreturn_data["piece_idx"]
-                    # piece #0 carries the data
-                    if piece == 0:
-                        recvitem["data"] = pkt.nonreturn_data["data"]
-                    # there's possibility the piece has already been
-                    # received ealier; that is, this is a duplicate;
-                    # otherwise, remove the piece from expected set
-                    if piece in missing_pieces:
-                        missing_pieces.remove(piece)
-                        recvitem["data_size"] += pkt.nonreturn_data["data_size"]
-                else:
-                    # found a lonely request
-                    missing_pieces = set(range(pkt.nonreturn_data["num_pieces"]))
-                    piece = pkt.nonreturn_data["piece_idx"]
-                    missing_pieces.remove(piece)
-                    recvitem["missing_pieces"] = missing_pieces
-                    # the first arrival piece must fill in information
-                    # except that only piece #0 has the data
-                    recvitem["from_rank"] = pkt.nonreturn_data["from_rank"]
-                    recvitem["type"] = t
-                    recvitem["data_size"] = pkt.nonreturn_data["data_size"]
-                    if piece == 0:
-                        recvitem["data"] = pkt.nonreturn_data["data"]
-
-                if len(missing_pieces) == 0:
-                    # if there's no more missing piece and it's a receive
-                    # request, inform the receive process
-
-                    from_rank = recvitem["from_rank"]
-                    rc = self.comm_world[to_true_rank]['comms'][recvitem["comm_id"]]
-                    from_true_rank = get_mpi_true_rank(rc, from_rank)
-                    #print("%d: notify_data_recv<4>: found (full) %r in buffer" % (to_true_rank, recvitem))
-                    if "mpi_process" in recvitem:
-                        del self.recv_buffer[to_true_rank][idx]
-                        if from_true_rank not in self.recv_msgid[to_true_rank]:
-                            self.recv_msgid[to_true_rank][from_true_rank] = dict()
-                        if t in self.recv_msgid[to_true_rank][from_true_rank]:
-                            self.recv_msgid[to_true_rank][from_true_rank][t] += 1
-                        else:
-                            self.recv_msgid[to_true_rank][from_true_rank][t] = 1
-                        #print("%d: recv_msgid[%d][%d][%s]=%d" %
-                        #      (to_true_rank, to_true_rank, from_true_rank, t,
-                        #       self.recv_msgid[to_true_rank][from_true_rank][t]-1))
-                        recvitem["mpi_process"].wake(recvitem)
-                    elif "mpi_request" in recvitem:
-                        del self.recv_buffer[to_true_rank][idx]
-                        if from_true_rank not in self.recv_msgid[to_true_rank]: 
-                           self.recv_msgid[to_true_rank][from_true_rank] = dict()
-                        if t in self.recv_msgid[to_true_rank][from_true_rank]:
-                           self.recv_msgid[to_true_rank][from_true_rank][t] += 1
-                        else:
-                            self.recv_msgid[to_true_rank][from_true_rank][t] = 1
-                        #print("%d: recv_msgid[%d][%d][%s]=%d" %
-                        #      (to_true_rank, to_true_rank, from_true_rank, t,
-                        #       self.recv_msgid[to_true_rank][from_true_rank][t]-1))
-                        recvitem["mpi_request"]["status"] = "success"
-                        recvitem["mpi_request"]["from_rank"] = from_rank
-                        recvitem["mpi_request"]["type"] = recvitem["type"]
-                        recvitem["mpi_request"]["data"] = recvitem["data"]
-                        recvitem["mpi_request"]["data_size"] = recvitem["data_size"]
-                        if "mpi_process" in recvitem["mpi_request"]:
-                            recvitem["mpi_request"]["mpi_process"].wake()
+        if "cts" in pkt.nonreturn_data:
+            # the receiver is ready for the segments of a rendezvous
+            # send (unless this is a retransmission of the clear to
+            # send), as many as fill the send window
+            segments = self.rndv_sends.pop(pkt.nonreturn_data["cts"], None)
+            if segments is not None:
+                self.send_segments(segments, self.mpi_segwin)
+            return
 
+        # the messages now complete (with this piece) that have been
+        # matched with receives are handed to the receiving process
+        to_true_rank = pkt.nonreturn_data["to_true_rank"]
+        if to_true_rank not in self.recv_match:
+            self.recv_match[to_true_rank] = MatchingEngine()
+        for recvitem in self.recv_match[to_true_rank].arrive(pkt.nonreturn_data):
+            if "mpi_process" in recvitem:
+                recvitem["mpi_process"].wake(recvitem)
             else:
-                # if nothing matches, create one as long as in
-                # sequence or from future
-                from_rank = pkt.nonreturn_data["from_rank"]
-                #print("HERE: rank=%d incoming: comm=%d" % (to_true_rank, pkt.nonreturn_data["comm_id"]))
-                rc = self.comm_world[to_true_rank]['comms'][pkt.nonreturn_data["comm_id"]]
-                from_true_rank = get_mpi_true_rank(rc, from_rank)
-                msg_id = pkt.nonreturn_data["msg_id"]
-                if from_true_rank not in self.recv_msgid[to_true_rank]:
-                    self.recv_msgid[to_true_rank][from_true_rank] = dict()
-                if t not in self.recv_msgid[to_true_rank][from_true_rank]:
-                    self.recv_msgid[to_true_rank][from_true_rank][t] = 0
-                if self.recv_msgid[to_true_rank][from_true_rank][t] <= msg_id:
-                    missing_pieces = set(range(pkt.nonreturn_data["num_pieces"]))
-                    piece = pkt.nonreturn_data["piece_idx"]
-                    missing_pieces.remove(piece)
-                    recvitem = {
-                        "from_rank" : from_rank,
-                        "comm_id" : pkt.nonreturn_data["comm_id"],
-                        "msg_id" : msg_id,
-                        "type" : t,
-                        "data_size" : pkt.nonreturn_data["data_size"],
-                        "missing_pieces" : missing_pieces
-                    }
-                    if piece == 0:
-                        recvitem["data"] = pkt.nonreturn_data["data"]
-                    self.recv_buffer[to_true_rank].append(recvitem)
-                    #print("%d: notify_data_recv<5>: %r no match in buffer" % (to_true_rank, recvitem))
+                recvitem["mpi_request"]["status"] = "success"
+                recvitem["mpi_request"]["from_rank"] = recvitem["from_rank"]
+                recvitem["mpi_request"]["type"] = recvitem["type"]
+                recvitem["mpi_request"]["data"] = recvitem["data"]
+                recvitem["mpi_request"]["data_size"] = recvitem["data_size"]
+                if "mpi_process" in recvitem["mpi_request"]:
+                    recvitem["mpi_request"]["mpi_process"].wake()
+        self.clear_to_send(self.recv_match[to_true_rank])
+
+    def send_segments(self, segments, count):
+        """Hands (up to) the given number of segments of a rendezvous
+        send to the send process."""
+
+        while segments and count > 0:
+            self.send_buffer.append(segments.popleft())
+            if len(self.send_buffer) == 1:
+                self.wakeProcess("send_process")
+            count -= 1
+
+    def clear_to_send(self, engine):
+        """Sends a clear to send for each rendezvous send the matching
+        engine has matched since."""
+
+        while engine.rendezvous:
+            from_host, rkey = engine.rendezvous.popleft()
+            self.send_buffer.append({
+                "to_rank" : None,
+                "to_true_rank" : None,
+                "to_host" : from_host,
+                "from_rank" : None,
+                "comm_id" : None,
+                "msg_id" : None,
+                "padded_size" : self.mpi_minsz,
+                "data_size" : 0,
+                "data" : None,
+                "type" : "__cts__",
+                "piece_idx" : 0,
+                "num_pieces" : 1,
+                "data_overhead" : self.mpi_put_datahdr,
+                "ack_overhead" : self.mpi_put_ackhdr,
+                "cts" : rkey,
+                "control" : True,
+            })
+            if len(self.send_buffer) == 1:
+                self.wakeProcess("send_process")
 
 def send_process(self):
     """A process for (reliably) sending mpi data upon user request."""
@@ -1500,9 +1461,18 @@ def send_process(self):
     # self is the send proces itself; host is the process' entity
     host = self.entity
 
-    # in the beginning, no send, the process hibernates
+    # in the beginning, no send, the process hibernates (a checkpoint
+    # taken while the process is idle restarts it from the top of its
+    # loop; see checkpoint.py in SimianPie)
     #host.send_semaphore == 0
+    self.setResumePoint(send_loop)
     self.hibernate()
+    send_loop(self)
+
+def send_loop(self):
+    """The loop of the process sending mpi data."""
+
+    host = self.entity
 
     while True:
         #print("check: send_process wakes up")
@@ -1516,7 +1486,12 @@ def send_process(self):
                 "senditem" : senditem,
                 "trials" : 0,
             }
-            host.reqService(host.mpi_resend_intv, "resend_mpi_message", key)
+            # there's no need to resend what a lossless network
+            # (under credit-based flow control) delivers; it neither
+            # drops packets nor lets them exceed their time-to-live
+            # (see Switch.forward_packet)
+            if host.num_vcs == 0 or senditem["to_host"] == host.node_id:
+                host.reqService(host.resend_interval(senditem), "resend_mpi_message", key)
 
             # send it out
             host.send_mpi_message(senditem, key)
@@ -1524,6 +1499,7 @@ def send_process(self):
         else:
             #print("check: send_process sleeps")
             #host.send_semaphore = 0
+            self.setResumePoint(send_loop)
             self.hibernate()
 
 def kernel_main_function(self, user_main_function, mpi_comm_world, *arg):
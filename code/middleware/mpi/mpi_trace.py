@@ -0,0 +1,287 @@
+#
+# mpi_trace.py :- replaying traces of mpi applications
+#
+# An mpi trace is the sequence of events of each rank of an
+# application (as a tool such as DUMPI records them): compute bursts,
+# point-to-point sends and receives (blocking, or nonblocking with a
+# request id to wait for later), waits, and collectives, all on
+# mpi_comm_world. Each rank's events are in a file of its own, either
+# <prefix>.<rank>.bin, of fixed-size binary records (see
+# record_format), or <prefix>.<rank>.txt, with one event per line:
+#
+#   compute <seconds>
+#   send <to> <size> <tag>
+#   isend <to> <size> <tag> <request>
+#   recv <from> <size> <tag>              (from or tag -1 for any)
+#   irecv <from> <size> <tag> <request>
+#   wait <request>
+#   waitall                               (all requests outstanding)
+#   barrier
+#   bcast|reduce|gather|scatter <root> <size>
+#   allreduce|allgather|alltoall <size>
+#
+# (with '#' starting a comment). The sizes are in bytes, per rank for
+# the collectives (or per pair of ranks for alltoall), and a tag
+# becomes the message type (as a string). The events carry no data.
+#
+# replay is the mpi main function (see Cluster.start_mpi) that has
+# each rank carry out its events by the mpi calls (a compute burst by
+# mpi_ext_sleep); the events are read lazily, a block at a time, and
+# the file is opened only to read a block, so that the traces need not
+# fit in memory, nor each rank hold a file open.
+#
+# Run as a script, this module writes a synthetic trace for testing:
+# iterations of a compute burst, a halo exchange with the neighbors in
+# a ring (irecv, isend and waitall), and an allreduce, with a bcast and
+# an alltoall now and then and a barrier at the end:
+#
+#   python mpi_trace.py [-n ranks] [-i iterations] [-s size] [-c seconds] [-t] prefix
+#
+
+import sys, struct, random
+from optparse import OptionParser
+
+# the events, by their number in the binary records
+ops = ("compute", "send", "isend", "recv", "irecv", "wait", "waitall", "barrier",
+       "bcast", "reduce", "gather", "scatter", "allreduce", "allgather", "alltoall")
+op_number = dict((op, i) for i, op in enumerate(ops))
+
+# the fields of each event in the text lines (the others are 0)
+op_fields = {
+    "compute" : ("duration",),
+    "send" : ("peer", "size", "tag"),
+    "isend" : ("peer", "size", "tag", "req"),
+    "recv" : ("peer", "size", "tag"),
+    "irecv" : ("peer", "size", "tag", "req"),
+    "wait" : ("req",),
+    "waitall" : (),
+    "barrier" : (),
+    "bcast" : ("peer", "size"),
+    "reduce" : ("peer", "size"),
+    "gather" : ("peer", "size"),
+    "scatter" : ("peer", "size"),
+    "allreduce" : ("size",),
+    "allgather" : ("size",),
+    "alltoall" : ("size",),
+}
+
+# event, peer (or root) rank, tag, request id, size, duration
+record_format = "<BiiIQd"
+record_size = struct.calcsize(record_format)
+
+def trace_files(prefix, rank):
+    """Returns the names of the binary and the text trace of a rank."""
+    return "%s.%d.bin" % (prefix, rank), "%s.%d.txt" % (prefix, rank)
+
+class TraceWriter(object):
+    """Writes the trace of a rank."""
+
+    # local variables:
+    #   file: the trace file
+    #   binary: whether the records are binary (or text lines)
+    #   buf: records not yet written out
+
+    def __init__(self, prefix, rank, binary=True, bufsz=4096):
+        self.binary = binary
+        self.file = open(trace_files(prefix, rank)[0 if binary else 1],
+                         "wb" if binary else "w")
+        self.buf = []
+        self.bufsz = bufsz
+        self.pack = struct.Struct(record_format).pack
+
+    def write(self, op, peer=0, tag=0, req=0, size=0, duration=0.0):
+        """Adds an event to the trace."""
+
+        if self.binary:
+            self.buf.append(self.pack(op_number[op], peer, tag, req, size, duration))
+        else:
+            args = {"peer" : peer, "tag" : tag, "req" : req, "size" : size,
+                    "duration" : duration}
+            self.buf.append(" ".join([op]+[repr(args[f]) for f in op_fields[op]])+"\n")
+        if len(self.buf) >= self.bufsz: self.flush()
+
+    def flush(self):
+        self.file.write("".join(self.buf))
+        self.buf = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class RankTraceReader(object):
+    """Reads the events of a rank lazily, a block at a time; iterating
+    yields the events as tuples of (event, peer, tag, request id,
+    size, duration)."""
+
+    # local variables:
+    #   fname: the trace file of the rank
+    #   binary: whether the file is binary
+    #   offset: where the next block starts in the file
+    #   block: records of a block to read at a time
+
+    def __init__(self, prefix, rank, block=4096):
+        import os
+        binfile, txtfile = trace_files(prefix, rank)
+        if os.path.exists(binfile):
+            self.fname, self.binary = binfile, True
+        elif os.path.exists(txtfile):
+            self.fname, self.binary = txtfile, False
+        else:
+            raise Exception("no trace of rank %d found for %s" % (rank, prefix))
+        self.offset = 0
+        self.block = block
+
+    def __iter__(self):
+        unpack = struct.Struct(record_format).unpack_from
+        while True:
+            events = self.read_block()
+            if not events: return
+            if self.binary:
+                for i in xrange(0, len(events), record_size):
+                    r = unpack(events, i)
+                    yield (ops[r[0]],)+r[1:]
+            else:
+                for e in events: yield e
+
+    def read_block(self):
+        """Returns the next block of the file (the raw records, or the
+        events of the text lines), or None at the end."""
+
+        with open(self.fname, "rb" if self.binary else "r") as f:
+            f.seek(self.offset)
+            if self.binary:
+                data = f.read(record_size*self.block)
+                if len(data)%record_size:
+                    raise Exception("%s: truncated record" % self.fname)
+                self.offset += len(data)
+                return data
+            events = []
+            while len(events) < self.block:
+                line = f.readline()
+                if not line: break
+                e = parse_line(line)
+                if e is not None: events.append(e)
+            self.offset = f.tell()
+            return events
+
+def parse_line(line):
+    """Returns the event of a text line, or None if there's none."""
+
+    words = line.split("#", 1)[0].split()
+    if not words: return None
+    op = words[0]
+    if op not in op_fields or len(words) != len(op_fields[op])+1:
+        raise Exception("bad trace line: %s" % line.strip())
+    args = {"peer" : 0, "tag" : 0, "req" : 0, "size" : 0, "duration" : 0.0}
+    for f, w in zip(op_fields[op], words[1:]):
+        args[f] = float(w) if f == "duration" else int(w)
+    return (op, args["peer"], args["tag"], args["req"], args["size"], args["duration"])
+
+
+def replay(mpi_comm_world, prefix):
+    """Carries out the events of the rank's trace; rank 0 prints the
+    number of events of all ranks and the time the last one ended."""
+
+    # the mpi calls are those of the simulator (loaded by ppt)
+    from mpi import mpi_comm_rank, mpi_comm_size, mpi_send, mpi_isend, mpi_recv, \
+        mpi_irecv, mpi_wait, mpi_barrier, mpi_bcast, mpi_reduce, mpi_gather, \
+        mpi_scatter, mpi_allreduce, mpi_allgather, mpi_alltoall, mpi_ext_sleep, \
+        mpi_wtime, mpi_finalize
+
+    c = mpi_comm_world
+    n = mpi_comm_size(c)
+    p = mpi_comm_rank(c)
+    reqs = dict()
+    count = 0
+    for op, peer, tag, req, size, duration in RankTraceReader(prefix, p):
+        count += 1
+        if op == "compute":
+            mpi_ext_sleep(duration, c)
+        elif op == "send":
+            if not mpi_send(peer, None, size, c, type=str(tag)):
+                raise Exception("rank %d: send to %d failed (event %d)" % (p, peer, count))
+        elif op == "isend":
+            reqs[req] = mpi_isend(peer, None, size, c, type=str(tag))
+        elif op == "recv":
+            r = mpi_recv(c, None if peer < 0 else peer, None if tag < 0 else str(tag))
+            if r is None:
+                raise Exception("rank %d: recv from %d failed (event %d)" % (p, peer, count))
+        elif op == "irecv":
+            reqs[req] = mpi_irecv(c, None if peer < 0 else peer, None if tag < 0 else str(tag))
+        elif op == "wait":
+            if req not in reqs:
+                raise Exception("rank %d: wait for unknown request %d (event %d)" % (p, req, count))
+            mpi_wait(reqs.pop(req))
+        elif op == "waitall":
+            for k in sorted(reqs): mpi_wait(reqs[k])
+            reqs.clear()
+        elif op == "barrier":
+            mpi_barrier(c)
+        elif op == "bcast":
+            mpi_bcast(peer, None, c, size)
+        elif op == "reduce":
+            mpi_reduce(peer, 0, c, size)
+        elif op == "gather":
+            mpi_gather(peer, None, c, size)
+        elif op == "scatter":
+            mpi_scatter(peer, [None]*n, c, size)
+        elif op == "allreduce":
+            mpi_allreduce(0, c, size)
+        elif op == "allgather":
+            mpi_allgather(None, c, size)
+        else:
+            mpi_alltoall([None]*n, c, size)
+    if reqs:
+        raise Exception("rank %d: requests never waited for: %r" % (p, sorted(reqs)))
+
+    t = mpi_wtime(c)
+    t = mpi_reduce(0, t, c, 8, op="max")
+    count = mpi_reduce(0, count, c, 8)
+    if p == 0:
+        print("REPLAYED: %d events, %.9f seconds" % (count, t))
+    mpi_finalize(c)
+
+
+def write_synthetic(prefix, n, iters, size, compute, binary=True, seed=0):
+    """Writes a synthetic trace of n ranks (see above)."""
+
+    for p in xrange(n):
+        rnd = random.Random(seed*1000003+p)
+        w = TraceWriter(prefix, p, binary)
+        left, right = (p-1)%n, (p+1)%n
+        for i in xrange(iters):
+            # the compute bursts vary by up to 10%
+            w.write("compute", duration=compute*(1+0.1*rnd.random()))
+            if n > 1:
+                w.write("irecv", peer=left, size=size, tag=1, req=0)
+                w.write("irecv", peer=right, size=size, tag=2, req=1)
+                w.write("isend", peer=right, size=size, tag=1, req=2)
+                w.write("isend", peer=left, size=size, tag=2, req=3)
+                w.write("waitall")
+            w.write("allreduce", size=8)
+            if i%10 == 9:
+                w.write("bcast", peer=0, size=size)
+                w.write("alltoall", size=max(1, size/n))
+        w.write("barrier")
+        w.close()
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] prefix")
+    parser.add_option("-n", "--ranks", type="int", dest="n", default=16, help="number of ranks")
+    parser.add_option("-i", "--iterations", type="int", dest="iters", default=100,
+                      help="iterations")
+    parser.add_option("-s", "--size", type="int", dest="size", default=4096,
+                      help="size of the halo messages (bytes)")
+    parser.add_option("-c", "--compute", type="float", dest="compute", default=1e-5,
+                      help="compute burst of an iteration (seconds)")
+    parser.add_option("-t", "--text", action="store_true", dest="text", default=False,
+                      help="write text traces (instead of binary)")
+    parser.add_option("-r", "--seed", type="int", dest="seed", default=0, help="random seed")
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1: parser.error("a trace prefix is required")
+    write_synthetic(args[0], options.n, options.iters, options.size, options.compute,
+                    not options.text, options.seed)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
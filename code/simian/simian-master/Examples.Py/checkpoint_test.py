@@ -0,0 +1,158 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer. 
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution. 
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission. 
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""
+CHECKPOINT TEST checks that a restarted simulation ends as an uninterrupted one
+
+Usage: python checkpoint_test.py [-l launcher] [-n nodes] [-t endTime] [-c interval] [-k crashTime]
+
+A PHOLD model whose nodes also run a process (which declares resume points,
+see checkpoint.py in SimianPie) is run three times, in separate interpreters:
+once to the end; once with a checkpoint every interval of simulated time,
+crashing (exiting abruptly) at crashTime; and once restarted from the last
+checkpoint of the crashed run. The output files and event counts of the
+uninterrupted and the restarted runs must be identical; the wall-clock times
+of both are reported. With a launcher (e.g., "mpirun -np 4"), all runs are
+parallel.
+"""
+
+import os
+import sys
+import glob
+import time
+import math
+import random
+import subprocess
+from optparse import OptionParser
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, ".."))
+
+def exponential(mean):
+    return -math.log(random.random())*mean
+
+def appProcess(this, naps):
+    #Naps for random times, counting them; before suspending, it declares
+    #that a restarted run resumes it with the same count
+    while True:
+        x = exponential(10.0)
+        this.setResumePoint(appResume, naps, x)
+        this.sleep(x)
+        naps = appWoken(this, naps, x)
+
+def appWoken(this, naps, x):
+    entity = this.entity
+    entity.naps = naps + 1
+    entity.out.write("Time %.6f: %s[%d] woke after %.6f (nap %d)\n" % (entity.engine.now, entity.name, entity.num, x, naps + 1))
+    return naps + 1
+
+def appResume(this, naps, x):
+    appProcess(this, appWoken(this, naps, x))
+
+def model(options, simName, useMPI, checkpointInterval=None, restart=False, crashTime=None):
+    from SimianPie.simian import Simian
+
+    random.seed(1)
+    engine = Simian(simName, 0, options.endTime, 1.0, useMPI,
+                    checkpointInterval=checkpointInterval, checkpointName=simName, restart=restart)
+    count = options.nodes
+
+    class Node(engine.Entity):
+        def __init__(self, baseInfo, *args):
+            super(Node, self).__init__(baseInfo)
+            self.rng = random.Random(self.num) #Entity state, saved in the checkpoint
+            self.received = 0
+            self.naps = 0
+            self.createProcess("App", appProcess)
+            self.startProcess("App", 0)
+
+        def generate(self, data, tx, txId):
+            if crashTime is not None and self.engine.now >= crashTime:
+                os._exit(3) #A crash: nothing is cleaned up
+            self.received += 1
+            target = self.rng.randrange(count)
+            self.out.write("Time %.6f: %s[%d] got %r, sends to %d (received %d)\n" % (self.engine.now,
+                           self.name, self.num, data, target, self.received))
+            self.reqService(1.0 + exponential(2.0), "generate", self.received, "Node", target)
+
+    for i in xrange(count):
+        engine.addEntity("Node", Node, i)
+    for i in xrange(count):
+        engine.schedService(0, "generate", None, "Node", i)
+    engine.run()
+    engine.exit()
+
+def run(options, mode, launcher):
+    #Returns the exit code, output and wall-clock time of one run in a child interpreter
+    t0 = time.time()
+    p = subprocess.Popen(launcher + [sys.executable, os.path.abspath(__file__), "--child", mode,
+                         "-n", str(options.nodes), "-t", str(options.endTime), "-c", str(options.interval),
+                         "-k", str(options.crashTime)] + (["--mpi"] if launcher else []),
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    return p.returncode, out, time.time() - t0
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+def outputs(simName):
+    return [open(f).read() for f in sorted(glob.glob(simName + ".*.out"))]
+
+parser = OptionParser(usage="%prog [-l launcher] [-n nodes] [-t endTime] [-c interval] [-k crashTime]")
+parser.add_option("-l", "--launcher", dest="launcher", default="", help="MPI launch command, if parallel")
+parser.add_option("-n", "--nodes", type="int", dest="nodes", default=50, help="PHOLD nodes")
+parser.add_option("-t", "--time", type="float", dest="endTime", default=2000.0, help="simulated time")
+parser.add_option("-c", "--interval", type="float", dest="interval", default=100.0, help="checkpoint interval")
+parser.add_option("-k", "--crash", type="float", dest="crashTime", default=1500.0, help="time of the crash")
+parser.add_option("--child", dest="child", default=None, help="(internal) full, crash or restart")
+parser.add_option("--mpi", action="store_true", dest="mpi", default=False, help="(internal) run with MPI")
+(options, args) = parser.parse_args()
+
+if options.child == "full":
+    model(options, "CKPT_full", options.mpi)
+    sys.exit(0)
+elif options.child == "crash":
+    model(options, "CKPT_restart", options.mpi, options.interval, crashTime=options.crashTime)
+    sys.exit(0)
+elif options.child == "restart":
+    model(options, "CKPT_restart", options.mpi, options.interval, restart=True)
+    sys.exit(0)
+
+launcher = options.launcher.split()
+for f in glob.glob("CKPT_restart.*.ckpt"): os.remove(f)
+code, full, tFull = run(options, "full", launcher)
+if code:
+    sys.stderr.write(full)
+    sys.exit("uninterrupted run failed")
+code, crash, tCrash = run(options, "crash", launcher)
+if code == 0:
+    sys.exit("the run did not crash; the crash time should be less than the end time")
+if not glob.glob("CKPT_restart.*.ckpt"):
+    sys.stderr.write(crash)
+    sys.exit("the run crashed before its first checkpoint")
+code, restart, tRestart = run(options, "restart", launcher)
+if code:
+    sys.stderr.write(restart)
+    sys.exit("restarted run failed")
+
+print "uninterrupted: %s events in %.3f s" % (field(full, "SIMULATED EVENTS"), tFull)
+print "restarted:     %s events in %.3f s, from the checkpoint at %s" % (field(restart, "SIMULATED EVENTS"),
+        tRestart, field(restart, "RESTARTED FROM CHECKPOINT AT"))
+if field(full, "SIMULATED EVENTS") == field(restart, "SIMULATED EVENTS") and outputs("CKPT_full") == outputs("CKPT_restart"):
+    print "PASSED: the restarted run matches the uninterrupted one"
+else:
+    print "FAILED: the restarted run differs from the uninterrupted one"
+    sys.exit(1)
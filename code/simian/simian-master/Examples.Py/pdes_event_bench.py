@@ -0,0 +1,120 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer. 
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution. 
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission. 
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+PDES EVENT BENCHMARK measures the event throughput of the SimianPie engine
+
+Usage: python pdes_event_bench.py [-r repeat] n_ent s_ent q_avg p_receive ... logName [queueType]
+
+The arguments are passed unchanged to pdes_lanl_benchmarkV8_CTypes.py, which
+is run repeat times (default 3) in separate interpreters; the best and median
+EVENTS PER SECOND are reported. The benchmark imports the engine as
+SimianPieCTypes, which is aliased to SimianPie here.
+
+Before the end-to-end runs, an event-record microbenchmark pushes and pops
+the same number of events through heapq twice: once as (time, dict) pairs,
+the representation SimianPie used originally, and once as the flat event
+tuples it uses now.
+"""
+
+import os
+import sys
+import time
+import heapq
+import random
+import subprocess
+from optparse import OptionParser
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, ".."))
+benchmark = os.path.join(here, "pdes_lanl_benchmarkV8_CTypes.py")
+
+def child(args):
+    #Run the LANL benchmark in this interpreter against SimianPie
+    import SimianPie, SimianPie.simian
+    sys.modules["SimianPieCTypes"] = SimianPie
+    sys.modules["SimianPieCTypes.simian"] = SimianPie.simian
+    sys.argv = [benchmark] + args
+    execfile(benchmark, {"__name__": "__main__"})
+
+def run_benchmark(args, launcher=()):
+    #Returns the output of one benchmark run and its wall-clock time;
+    #launcher is an optional command prefix such as ["mpirun", "-np", "4"]
+    t0 = time.time()
+    p = subprocess.Popen(list(launcher) + [sys.executable, os.path.abspath(__file__), "--child"] + args,
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate()[0]
+    return out, time.time() - t0
+
+def run_once(args):
+    out = run_benchmark(args)[0]
+    events, rate = None, None
+    for line in out.splitlines():
+        if line.startswith("SIMULATED EVENTS:"):
+            events = int(line.split(":")[1])
+        elif line.startswith("EVENTS PER SECOND:"):
+            rate = float(line.split(":")[1])
+    if rate is None:
+        sys.stderr.write(out)
+        raise RuntimeError("benchmark run failed")
+    return events, rate
+
+def record_microbench(n, depth=1000):
+    #Hold depth events in the queue and churn n events through it
+    times = [random.random() for i in xrange(depth + n)]
+
+    q = []
+    t0 = time.time()
+    for i in xrange(depth + n):
+        t = times[i]
+        heapq.heappush(q, (t, {"tx": "Node", "txId": 0, "rx": "Node", "rxId": 1,
+                               "name": "generate", "data": None, "time": t}))
+        if i >= depth:
+            (t, e) = heapq.heappop(q)
+            e["name"]
+    t_dict = time.time() - t0
+
+    q = []
+    t0 = time.time()
+    for i in xrange(depth + n):
+        heapq.heappush(q, (times[i], 0, "Node", 0, i, "Node", 1, "generate", None, "Node", 0))
+        if i >= depth:
+            (t, _, _, _, _, rx, rxId, name, data, tx, txId) = heapq.heappop(q)
+    t_tuple = time.time() - t0
+
+    e = (0.0, 0, "Node", 0, 0, "Node", 1, "generate", None, "Node", 0)
+    d = {"tx": "Node", "txId": 0, "rx": "Node", "rxId": 1, "name": "generate", "data": None, "time": 0.0}
+    print "Event records (%d events, queue depth %d):" % (n, depth)
+    print "  dict:  %.0f events/s, %d bytes/event" % (n/t_dict, sys.getsizeof(d) + sys.getsizeof((0.0, d)))
+    print "  tuple: %.0f events/s, %d bytes/event" % (n/t_tuple, sys.getsizeof(e))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2:])
+        sys.exit(0)
+
+    parser = OptionParser(usage="%prog [-r repeat] n_ent s_ent q_avg p_receive p_send invert m_ent p_list ops_ent ops_sigma cache_friendliness init_seed time_bins endTime minDelay useMPI logName [queueType]")
+    parser.add_option("-r", "--repeat", type="int", dest="repeat", default=3, help="number of benchmark runs")
+    (options, args) = parser.parse_args()
+    if len(args) not in (17, 18):
+        parser.error("expected 17 or 18 benchmark arguments")
+    repeat = options.repeat
+
+    record_microbench(200000)
+
+    rates = []
+    for i in xrange(repeat):
+        events, rate = run_once(args)
+        rates.append(rate)
+        print "run %d: %d events, %.0f events/s" % (i, events, rate)
+    rates.sort()
+    print "best: %.0f events/s, median: %.0f events/s" % (rates[-1], rates[len(rates)//2])
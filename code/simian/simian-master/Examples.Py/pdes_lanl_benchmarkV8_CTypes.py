@@ -92,8 +92,8 @@ import sys
 from SimianPieCTypes.simian import Simian
 
 ############ Variables ###########################
-if len(sys.argv) != 18:
-    print "Usage: python " + sys.argv[0] + " n_ent s_ent q_avg p_receive p_send invert m_ent p_list ops_ent ops_sigma cache_friendliness init_seed time_bins endTime minDelay useMPI logName"
+if len(sys.argv) not in (18, 19, 20):
+    print "Usage: python " + sys.argv[0] + " n_ent s_ent q_avg p_receive p_send invert m_ent p_list ops_ent ops_sigma cache_friendliness init_seed time_bins endTime minDelay useMPI logName [queueType [syncMode]]"
     sys.exit()
 
 n_ent = int(sys.argv[1])
@@ -119,6 +119,12 @@ minDelay = float(sys.argv[15])
 useMPI = (str(sys.argv[16]).lower() == "true")
 
 logName = sys.argv[17]
+queueType = "heap" # Event queue backend of the engine: heap, calendar or ladder
+if len(sys.argv) >= 19:
+    queueType = sys.argv[18]
+syncMode = "conservative" # Synchronization of the engine: conservative or optimistic
+if len(sys.argv) >= 20:
+    syncMode = sys.argv[19]
 
 print n_ent, s_ent, q_avg, p_receive, p_send, invert, m_ent, p_list, ops_ent, ops_sigma, cache_friendliness, init_seed, time_bins, endTime, minDelay, useMPI, logName
 
@@ -186,7 +192,7 @@ target_global_sends = n_ent * s_ent
 
 simName = "PDES_LANL_Benchmark_" + logName
 startTime =  0.0
-simianEngine = Simian(simName, startTime, endTime+10*minDelay, minDelay, useMPI)
+simianEngine = Simian(simName, startTime, endTime+10*minDelay, minDelay, useMPI, queueType=queueType, syncMode=syncMode)
 # Note little trick with endTime setting, as we need to collect statistics in the end
 
 
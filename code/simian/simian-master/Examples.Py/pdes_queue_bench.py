@@ -0,0 +1,58 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer. 
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution. 
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission. 
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+PDES QUEUE BENCHMARK compares the SimianPie event-queue backends
+
+Usage: python pdes_queue_bench.py [options]
+
+For every combination of the LANL PDES benchmark knobs q_avg, n_ent and
+p_receive given (comma-separated lists), pdes_lanl_benchmarkV8_CTypes.py is run
+once per backend, and the events per second of each are reported together with
+the speedup over the binary heap. All backends must simulate the same number
+of events; a mismatch is flagged. The remaining benchmark parameters are fixed
+to light handlers (ops_ent, m_ent), so that the queue dominates the run time.
+"""
+
+import sys
+from optparse import OptionParser
+
+from pdes_event_bench import run_once
+
+backends = ["heap", "calendar", "ladder"]
+
+def floats(s): return [float(x) for x in s.split(",")]
+def ints(s): return [int(x) for x in s.split(",")]
+
+parser = OptionParser()
+parser.add_option("-q", "--q_avg", dest="q_avg", default="1,10,100", help="comma-separated q_avg values")
+parser.add_option("-n", "--n_ent", dest="n_ent", default="100,1000", help="comma-separated n_ent values")
+parser.add_option("-p", "--p_receive", dest="p_receive", default="0,0.5", help="comma-separated p_receive values")
+parser.add_option("-s", "--s_ent", type="int", dest="s_ent", default=100, help="average send events per entity")
+parser.add_option("-e", "--endTime", type="float", dest="endTime", default=100, help="simulated end time")
+parser.add_option("-b", "--backends", dest="backends", default=",".join(backends), help="comma-separated backends")
+(options, args) = parser.parse_args()
+
+print "%8s %8s %10s %10s %12s %12s %8s" % ("q_avg", "n_ent", "p_receive", "backend", "events", "events/s", "speedup")
+for q_avg in floats(options.q_avg):
+    for n_ent in ints(options.n_ent):
+        for p_receive in floats(options.p_receive):
+            base, count = None, None
+            for backend in options.backends.split(","):
+                args = [n_ent, options.s_ent, q_avg, p_receive, 0, False, 10, 0, 10, 0, 0.5, 1, 10,
+                        options.endTime, 1, False, "queue", backend]
+                events, rate = run_once([str(a) for a in args])
+                if base is None: base, count = rate, events
+                flag = ""
+                if events != count: flag = "  EVENT COUNT MISMATCH"
+                print "%8g %8d %10g %10s %12d %12.0f %7.2fx%s" % (q_avg, n_ent, p_receive, backend, events, rate, rate/base, flag)
+                sys.stdout.flush()
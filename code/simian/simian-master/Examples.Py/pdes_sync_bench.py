@@ -0,0 +1,74 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer. 
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution. 
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission. 
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""
+PDES SYNC BENCHMARK compares conservative and optimistic (Time Warp) synchronization
+
+Usage: python pdes_sync_bench.py [-l launcher] [-r repeat] n_ent s_ent q_avg p_receive ... endTime minDelay
+
+pdes_lanl_benchmarkV8_CTypes.py is run under the MPI launcher (default
+"mpirun -np 4") with useMPI on, once per synchronization mode, and the
+wall-clock time, events per second, rollback statistics and whether the
+per-rank outputs of both modes agree are reported. The benchmark entities
+have no processes and use the default state saving, so they run unchanged in
+optimistic mode.
+"""
+
+import os
+import sys
+import glob
+from optparse import OptionParser
+
+from pdes_event_bench import run_benchmark
+
+def field(out, name):
+    for line in out.splitlines():
+        if line.startswith(name + ":"):
+            return line.split(":", 1)[1].strip()
+    return "-"
+
+def outputs(logName):
+    #Sorted output lines of all ranks, less the per-rank placement lines
+    lines = []
+    for fname in glob.glob("PDES_LANL_Benchmark_" + logName + ".*.out"):
+        lines.extend(l for l in open(fname) if "Running on rank" not in l)
+    return sorted(lines)
+
+parser = OptionParser(usage="%prog [-l launcher] [-r repeat] n_ent s_ent q_avg p_receive p_send invert m_ent p_list ops_ent ops_sigma cache_friendliness init_seed time_bins endTime minDelay")
+parser.add_option("-l", "--launcher", dest="launcher", default="mpirun -np 4", help="MPI launch command")
+parser.add_option("-r", "--repeat", type="int", dest="repeat", default=1, help="runs per mode (best is reported)")
+(options, args) = parser.parse_args()
+if len(args) != 15:
+    parser.error("expected 15 benchmark arguments")
+
+results = {}
+for mode in ["conservative", "optimistic"]:
+    best = None
+    for i in xrange(options.repeat):
+        out, wall = run_benchmark(args + ["True", "sync_" + mode, "heap", mode], options.launcher.split())
+        if field(out, "SIMULATED EVENTS") == "-":
+            sys.stderr.write(out)
+            sys.exit("benchmark run failed in %s mode" % mode)
+        if best is None or wall < best[1]: best = (out, wall)
+    results[mode] = best
+    out, wall = best
+    print "%-12s wall %8.3f s, events %s, events/s %s" % (mode, wall,
+            field(out, "SIMULATED EVENTS"), field(out, "EVENTS PER SECOND"))
+    if mode == "optimistic":
+        print "%-12s rollbacks %s, anti-messages %s, GVT computations %s" % ("",
+                field(out, "ROLLBACKS"), field(out, "ANTI-MESSAGES"), field(out, "GVT COMPUTATIONS"))
+
+print "speedup of optimistic over conservative: %.2fx" % (results["conservative"][1]/results["optimistic"][1])
+if outputs("sync_conservative") == outputs("sync_optimistic"):
+    print "outputs agree"
+else:
+    print "OUTPUTS DIFFER"
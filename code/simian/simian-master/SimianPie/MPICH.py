@@ -58,6 +58,8 @@ def loadMPI(mpichLib):
     mpi.MPI_Probe.restype = C.c_int
     mpi.MPI_Send.restype = C.c_int
     mpi.MPI_Isend.restype = C.c_int
+    mpi.MPI_Test.restype = C.c_int
+    mpi.MPI_Wait.restype = C.c_int
     mpi.MPI_Recv.restype = C.c_int
     mpi.MPI_Get_count.restype = C.c_int
     mpi.MPI_Get_elements.restype = C.c_int
@@ -72,6 +74,8 @@ def loadMPI(mpichLib):
     mpi.MPI_Probe.argtypes = [C.c_int, C.c_int, mpi.MPI_Comm, C.POINTER(mpi.MPI_Status)]
     mpi.MPI_Send.argtypes = [C.c_void_p, C.c_int, mpi.MPI_Datatype, C.c_int, C.c_int, mpi.MPI_Comm]
     mpi.MPI_Isend.argtypes = [C.c_void_p, C.c_int, mpi.MPI_Datatype, C.c_int, C.c_int, mpi.MPI_Comm, C.POINTER(mpi.MPI_Request)]
+    mpi.MPI_Test.argtypes = [C.POINTER(mpi.MPI_Request), C.POINTER(C.c_int), C.POINTER(mpi.MPI_Status)]
+    mpi.MPI_Wait.argtypes = [C.POINTER(mpi.MPI_Request), C.POINTER(mpi.MPI_Status)]
     mpi.MPI_Recv.argtypes = [C.c_void_p, C.c_int, mpi.MPI_Datatype, C.c_int, C.c_int, mpi.MPI_Comm, C.POINTER(mpi.MPI_Status)]
     mpi.MPI_Get_count.argtypes = [C.POINTER(mpi.MPI_Status), mpi.MPI_Datatype, C.POINTER(C.c_int)]
     mpi.MPI_Get_elements.argtypes = [C.POINTER(mpi.MPI_Status), mpi.MPI_Datatype, C.POINTER(C.c_int)]
@@ -17,6 +17,7 @@
 #  NOTE: Currently, MPICH-v3.1.3 and Open-MPI-v1.6.5 work
 #      There are some severe bugs in Open-MPI-v1.8.3
 import ctypes as C
+from collections import deque
 
 from MPICH import loadMPI
 mpi = None
@@ -36,6 +37,7 @@ class MPI(object):
             raise SimianError("Could not initialize MPI")
 
         self.CBUF_LEN = 32*1024 #32kB
+        self.MAX_ISENDS = 64 #Bound on non-blocking sends in flight
 
         self.comm = mpi.MPI_COMM_WORLD
         self.BYTE = mpi.MPI_BYTE
@@ -44,7 +46,9 @@ class MPI(object):
         self.SUM = mpi.MPI_SUM
 
         self.request = mpi.MPI_Request()
+        self.requests = deque() #In-flight (request, buffer) of isend, oldest first
         self.status = mpi.MPI_Status()
+        self.sendStatus = mpi.MPI_Status()
         self.itemp = C.c_int()
         self.dtemp0 = C.c_double()
         self.dtemp1 = C.c_double()
@@ -85,10 +89,30 @@ class MPI(object):
             raise SimianError("Could not Send in MPI")
 
     def isend(self, x, dst, tag=None): #Non-Blocking
+        #The packed buffer is held until the send completes; once MAX_ISENDS
+        #sends are in flight, the oldest is waited for
         m = Pack(x)
         tag = tag or len(m) #Set to message length if None
-        if mpi.MPI_Isend(m, len(m), self.BYTE, dst, tag, self.comm, C.byref(self.request)) != mpi.MPI_SUCCESS:
+        requests = self.requests
+        while requests and self.test(requests[0][0]): requests.popleft()
+        if len(requests) >= self.MAX_ISENDS: self.wait(requests.popleft()[0])
+        request = mpi.MPI_Request()
+        if mpi.MPI_Isend(m, len(m), self.BYTE, dst, tag, self.comm, C.byref(request)) != mpi.MPI_SUCCESS:
             raise SimianError("Could not Isend in MPI")
+        requests.append((request, m))
+
+    def test(self, request): #Non-blocking
+        if mpi.MPI_Test(C.byref(request), C.byref(self.itemp), C.byref(self.sendStatus)) == mpi.MPI_SUCCESS:
+            return (self.itemp.value != 0)
+        raise SimianError("Could not Test in MPI")
+
+    def wait(self, request): #Blocking
+        if mpi.MPI_Wait(C.byref(request), C.byref(self.sendStatus)) != mpi.MPI_SUCCESS:
+            raise SimianError("Could not Wait in MPI")
+
+    def waitSends(self): #Blocking: completes all isend in flight
+        requests = self.requests
+        while requests: self.wait(requests.popleft()[0])
 
     def recv(self, maxSize, src=None, tag=None): #Blocking
         src = src or mpi.MPI_ANY_SOURCE
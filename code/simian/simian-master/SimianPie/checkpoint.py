@@ -0,0 +1,221 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Purpose: PDES Engine in Python, mirroring a subset of the Simian JIT-PDES
+#  Checkpoint/restart, enabled with Simian(..., checkpointInterval=T) and
+#  Simian(..., restart=True)
+#
+#Every T of simulated time, at the end of a synchronization window, each
+#rank writes <checkpointName>.<rank>.ckpt (replacing the previous one),
+#holding its pending events, the engine clocks and counters, the state of
+#its entities and processes, the state of the random module and how far
+#its output file had been written. All messages in flight between ranks
+#are received first, so the checkpoints of all ranks are consistent.
+#
+#A run restarts from the last checkpoint when the model is set up again in
+#the same way, with restart=True: entities are added as usual, after which
+#Simian.run() replaces their state by the saved one and continues from
+#the saved time, appending to the output file from where it had reached.
+#
+#Entity attributes are pickled, except that references to the engine, to
+#entities and processes, and to objects registered with
+#Simian.registerShared() are saved by name and resolved again on restart.
+#Functions are pickled by name, so process functions must be defined at
+#module level.
+#
+#A greenlet cannot be pickled, so a suspended process is recreated from a
+#resume point that it declares before it suspends, with
+#proc.setResumePoint(fun, *args): on restart, the process restarts by
+#calling fun(proc, *args), followed by the arguments of the wake. A resume
+#point holds for the next suspension only; a checkpoint fails if a process
+#is suspended without one.
+import os
+import random
+import cPickle as pickle
+
+from utils import SimianError
+from entity import Entity
+from process import Process
+
+#Entity attributes that are set up by the engine rather than saved
+_unsavedEntityState = ("name", "num", "out", "engine", "_procList")
+
+class _Dead(object):
+    #Stands in for the function of a process that had finished
+    pass
+
+def _persistentId(engine, obj):
+    if obj is engine:
+        return ("engine",)
+    if isinstance(obj, Entity):
+        return ("entity", obj.name, obj.num)
+    if isinstance(obj, Process):
+        return ("process", obj.entity.name, obj.entity.num, obj.name)
+    key = engine.sharedKeys.get(id(obj))
+    if key is not None:
+        return ("shared", key)
+    if obj is engine.out:
+        return ("out",)
+    return None
+
+def _processState(proc):
+    #Picklable description of a process, from which it can be recreated
+    if proc.co is None or proc.co.dead:
+        run = (_Dead, ())
+    elif not proc.started:
+        run = (proc.co.run, ())
+    elif proc.resumePoint is None:
+        entity = proc.entity
+        raise SimianError("Process " + proc.name + " of " + entity.name + "[" + str(entity.num)
+            + "] is suspended without a resume point, so cannot be checkpointed")
+    else:
+        run = proc.resumePoint
+    return {
+        "name": proc.name,
+        "run": run,
+        "started": proc.started,
+        "kinds": proc._kindSet,
+        "children": proc._childList,
+        "parent": proc.parent and proc.parent.name,
+        "switches": proc.switches,
+    }
+
+def save(engine, state):
+    #Writes the checkpoint of this rank; state is that of the event loop
+    events = []
+    queue = engine.eventQueue
+    while len(queue) > 0: events.append(queue.pop())
+    for e in events: queue.push(e)
+
+    engine.out.flush()
+    entities = {}
+    for name, ents in engine.entities.iteritems():
+        for num, entity in ents.iteritems():
+            entities[(name, num)] = (
+                dict((k, v) for (k, v) in entity.__dict__.iteritems() if k not in _unsavedEntityState),
+                [_processState(proc) for proc in entity._procList.itervalues()])
+
+    fname = engine.checkpointName + "." + str(engine.rank) + ".ckpt"
+    with open(fname + ".tmp", "wb") as f:
+        p = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        p.persistent_id = lambda obj: _persistentId(engine, obj)
+        p.dump({
+            "size": engine.size,
+            "now": engine.now,
+            "loop": state,
+            "events": events,
+            "schedSeq": engine.schedSeq,
+            "numWindows": engine.numWindows,
+            "numRemote": engine.numRemote,
+            "numBatches": engine.numBatches,
+            "numReceived": engine.numReceived,
+            "outOffset": engine.out.tell(),
+            "random": random.getstate(),
+            "entities": entities,
+        })
+    os.rename(fname + ".tmp", fname) #A crash while writing leaves the previous checkpoint
+    engine.numCheckpoints += 1
+
+def load(engine):
+    #Restores the checkpoint of this rank; returns the state of the event loop
+    fname = engine.checkpointName + "." + str(engine.rank) + ".ckpt"
+    procs = {} #Processes by (entity name, num, process name), created on first reference
+
+    def getProcess(name, num, procName):
+        key = (name, num, procName)
+        if key not in procs: procs[key] = Process.__new__(Process)
+        return procs[key]
+
+    def persistentLoad(pid):
+        kind = pid[0]
+        if kind == "engine": return engine
+        if kind == "out": return engine.out
+        if kind == "shared":
+            if pid[1] not in engine.shared:
+                raise SimianError("Checkpoint refers to an unregistered shared object: " + str(pid[1]))
+            return engine.shared[pid[1]]
+        if kind == "entity":
+            entity = engine.getEntity(pid[1], pid[2])
+            if entity is None:
+                raise SimianError("Checkpoint refers to an entity not on this rank: " + pid[1] + "[" + str(pid[2]) + "]")
+            return entity
+        if kind == "process": return getProcess(pid[1], pid[2], pid[3])
+        raise SimianError("Unknown reference in checkpoint: " + str(pid))
+
+    try:
+        f = open(fname, "rb")
+    except IOError:
+        raise SimianError("Cannot restart: no checkpoint " + fname)
+
+    #The output file is kept as far as the checkpoint had written it; the
+    #entities log to it from now on
+    outName = engine.name + "." + str(engine.rank) + ".out"
+    out = open(outName, "r+")
+    with f:
+        u = pickle.Unpickler(f)
+        u.persistent_load = persistentLoad
+        engine.out = out #Before unpickling, so that references to it resolve
+        ckpt = u.load()
+    if ckpt["size"] != engine.size:
+        raise SimianError("Checkpoint " + fname + " was taken on " + str(ckpt["size"]) + " ranks, not " + str(engine.size))
+    out.seek(0, 2)
+    if out.tell() < ckpt["outOffset"]:
+        raise SimianError("Output file " + outName + " is shorter than when the checkpoint was taken")
+    out.truncate(ckpt["outOffset"])
+    out.seek(ckpt["outOffset"])
+
+    queue = engine.eventQueue
+    while len(queue) > 0: queue.pop() #Events scheduled when the model was set up again
+    for e in ckpt["events"]: queue.push(e)
+    engine.now = ckpt["now"]
+    engine.schedSeq = ckpt["schedSeq"]
+    engine.numWindows = ckpt["numWindows"]
+    engine.numRemote = ckpt["numRemote"]
+    engine.numBatches = ckpt["numBatches"]
+    engine.numReceived = ckpt["numReceived"]
+    random.setstate(ckpt["random"])
+
+    for (name, num), (state, procStates) in ckpt["entities"].iteritems():
+        entity = engine.getEntity(name, num)
+        if entity is None:
+            raise SimianError("Checkpoint holds an entity that the model did not add on this rank: " + name + "[" + str(num) + "]")
+        for k in entity.__dict__.keys():
+            if k not in _unsavedEntityState: del entity.__dict__[k]
+        entity.__dict__.update(state)
+        entity.out = out
+        entity._procList = {}
+        for p in procStates:
+            proc = getProcess(name, num, p["name"])
+            fun, args = p["run"]
+            if fun is _Dead:
+                Process.__init__(proc, p["name"], None, entity, None)
+                proc.co = None
+            elif p["started"]:
+                Process.__init__(proc, p["name"], _resumer(proc, fun, args), entity, None)
+                proc.suspended = True
+            else:
+                Process.__init__(proc, p["name"], fun, entity, None)
+            proc.started = p["started"]
+            proc._kindSet = p["kinds"]
+            proc._childList = p["children"]
+            proc.switches = p["switches"]
+            entity._procList[p["name"]] = proc
+        for p in procStates:
+            if p["parent"] is not None:
+                entity._procList[p["name"]].parent = entity._procList[p["parent"]]
+    return ckpt["loop"]
+
+def _resumer(proc, fun, args):
+    #The body of a recreated process: the first wake resumes it
+    def resume(*wakeArgs):
+        return fun(proc, *(args + wakeArgs))
+    return resume
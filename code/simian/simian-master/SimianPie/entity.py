@@ -17,8 +17,8 @@
 Process = None
 
 from utils import SimianError
-import heapq
 import types #Used to bind Service at runtime to specific instances
+import copy #Used to save state in optimistic mode
 
 #Making this pythonic - this is a base class that all derived Entity classes will inherit from
 class Entity(object):
@@ -29,19 +29,22 @@ class Entity(object):
         self.out = initInfo["out"] #Log file for this instance
         self.engine = initInfo["engine"] #Engine
         self.num = initInfo["num"] #Serial Number
+        self._lookahead = initInfo.get("lookahead", self.engine.minDelay) #Least delay of events sent to others
         self._procList = {} #A separate process table for each instance
+        self._sendSeq = 0 #Number of events sent, to order simultaneous events
         self._category = {} #A map of sets for each kind of process
 
     def __str__(self):
         return self.name + "(" + str(self.num) + ")"
 
-    def reqService(self, offset, eventName, data, rx=None, rxId=None):
+    def reqService(self, offset, eventName, data, rx=None, rxId=None, priority=0):
         #Purpose: Send an event if Simian is running.
+        #Simultaneous events run in increasing order of priority
         engine = self.engine #Get the engine for this entity
 
-        if rx != None and offset < engine.minDelay:
+        if rx != None and offset < self._lookahead:
             if not engine.running: raise SimianError("Sending event when Simian is idle!")
-            #If sending to self, then do not check against min-delay
+            #If sending to self, then do not check against lookahead (at least min-delay)
             raise SimianError(self.name + "[" + str(self.num) + "]"
                 + " attempted to send with too little delay")
 
@@ -51,15 +54,9 @@ class Entity(object):
 
         if rx == None: rx = self.name
         if rxId == None: rxId = self.num
-        e = {
-                "tx": self.name, #String
-                "txId": self.num, #Number
-                "rx": rx, #String
-                "rxId": rxId, #Number
-                "name": eventName, #String
-                "data": data, #Object
-                "time": time, #Number
-            }
+        seq = self._sendSeq
+        self._sendSeq = seq + 1
+        e = (time, priority, self.name, self.num, seq, rx, rxId, eventName, data, self.name, self.num) #See Simian.eventQueue
 
         if engine.partfct:
             recvRank = engine.partfct(rx, rxId, engine.size, engine.partarg)
@@ -67,22 +64,44 @@ class Entity(object):
             recvRank = engine.getOffsetRank(rx, rxId)
 
         if recvRank == engine.rank: #Send to self
-            heapq.heappush(engine.eventQueue, (time, e))
+            engine.eventQueue.push(e)
         else:
             if time < engine.minSent: engine.minSent = time
-            #engine.MPI.isend(e, recvRank) #Send to others (Problem with MPI buffers getting filled too fast)
-            engine.MPI.send(e, recvRank) #Send to others
+            events = engine.sendBuffers[recvRank] #Send to others, see Simian.flushSends
+            if not events: engine.sendRanks.append(recvRank)
+            events.append(e)
+            if len(events) >= engine.batchSize: engine.flushSends()
+        if engine.timeWarp: engine.timeWarp.record(recvRank, e) #For rollback
 
     def attachService(self, name, fun):
         #Attaches a service at runtime to instance
         setattr(self, name, types.MethodType(fun, self))
 
+    #State saving for optimistic (Time Warp) synchronization:
+    #The default snapshot is a deep copy of the instance attributes, less the
+    #engine bookkeeping. Derived entities may override both methods to save
+    #only what their services modify, or instead provide a reverse handler
+    #<service>Reverse(data, tx, txId) that undoes <service>.
+    _unsavedState = ("name", "num", "out", "engine", "_procList", "_category", "_sendSeq", "_lookahead")
+
+    def saveState(self):
+        state = dict((k, v) for (k, v) in self.__dict__.iteritems() if k not in self._unsavedState)
+        memo = {id(self.engine): self.engine, id(self.out): self.out} #Shared, never copied
+        return copy.deepcopy(state, memo)
+
+    def restoreState(self, state):
+        for k in self.__dict__.keys():
+            if k not in state and k not in self._unsavedState: del self.__dict__[k]
+        self.__dict__.update(state)
+
     #Following code is to support coroutine processes on entities:
     #Entity methods to interact with processes
     def createProcess(self, name, fun, kind=None): #Creates a named process
         global Process
         if not Process:
             from process import Process
+        if self.engine.timeWarp:
+            raise SimianError("Processes cannot be rolled back, so are not supported in optimistic mode: " + name)
         if name == "*":
             raise SimianError("Reserved name to represent all child processes: " + name)
         proc = Process(name, fun, self, None) #No parent means, entity is parent
@@ -0,0 +1,236 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Purpose: PDES Engine in Python, mirroring a subset of the Simian JIT-PDES
+#  Pluggable event-queue backends
+#
+#Every backend holds event tuples (see simian.py) and provides:
+#   push(event)  - insert an event
+#   pop()        - remove and return the least event
+#   peek()       - return the least event without removing it
+#   len(queue)   - number of events held
+#Events are ordered by plain tuple comparison, so every backend drains
+#the same events in exactly the same order.
+import heapq, bisect, functools, operator
+
+from utils import SimianError
+
+class HeapQueue(list):
+    #Binary heap; the original SimianPie queue
+    #The methods are bound straight to the C heapq functions, so that this
+    #backend costs no more than calling heapq on a bare list
+    def __init__(self):
+        list.__init__(self)
+        self.push = functools.partial(heapq.heappush, self)
+        self.pop = functools.partial(heapq.heappop, self)
+        self.peek = functools.partial(operator.getitem, self, 0)
+
+class CalendarQueue(object):
+    #Calendar queue (R. Brown, CACM 31(10), 1988)
+    #Events are hashed by time into a circular array of sorted buckets, each
+    #bucket covering one "day" of the given width. The number of buckets
+    #follows the queue size, and the width is re-estimated from the spacing
+    #of the events at the front of the queue on every resize.
+    def __init__(self, nBuckets=2, width=1.0, startTime=0.0):
+        self.size = 0
+        self._setup(nBuckets, width, startTime)
+
+    def __len__(self):
+        return self.size
+
+    def _setup(self, nBuckets, width, lastTime):
+        self.nBuckets = nBuckets
+        self.width = width
+        self.buckets = [[] for i in xrange(nBuckets)]
+        self.lastTime = lastTime
+        self.day = int(lastTime/width) #Day of the least event
+        self.lastBucket = self.day % nBuckets
+        self.topThreshold = 2*nBuckets
+        self.botThreshold = nBuckets/2 - 2
+
+    def push(self, e):
+        t = e[0]
+        day = int(t/self.width)
+        bisect.insort(self.buckets[day % self.nBuckets], e)
+        if t < self.lastTime: #Earlier than the current day: restart from here
+            self.lastTime = t
+            self.day = day
+            self.lastBucket = day % self.nBuckets
+        self.size += 1
+        if self.size > self.topThreshold:
+            self._resize(2*self.nBuckets)
+
+    def _find(self):
+        #Locate the bucket holding the least event and make it current
+        if self.size == 0:
+            raise IndexError("pop from empty event queue")
+        buckets, nBuckets, width = self.buckets, self.nBuckets, self.width
+        i, day = self.lastBucket, self.day
+        for n in xrange(nBuckets):
+            b = buckets[i]
+            if b and int(b[0][0]/width) <= day:
+                self.lastBucket, self.day = i, day
+                self.lastTime = b[0][0]
+                return b
+            i += 1
+            day += 1
+            if i == nBuckets: i = 0
+        #Nothing within a year: jump straight to the least event
+        b = min((b for b in buckets if b), key=operator.itemgetter(0))
+        self.lastTime = b[0][0]
+        self.day = int(self.lastTime/width)
+        self.lastBucket = self.day % nBuckets
+        return b
+
+    def peek(self):
+        return self._find()[0]
+
+    def pop(self):
+        e = self._find().pop(0)
+        self.size -= 1
+        if self.size < self.botThreshold:
+            self._resize(self.nBuckets/2)
+        return e
+
+    def _resize(self, nBuckets):
+        events = []
+        for b in self.buckets: events.extend(b)
+        events.sort()
+        self._setup(nBuckets, self._newWidth(events), self.lastTime)
+        buckets, width = self.buckets, self.width
+        for e in events: #Sorted, so plain appends keep buckets sorted
+            buckets[int(e[0]/width) % nBuckets].append(e)
+
+    def _newWidth(self, events):
+        #Three times the mean separation of the first few events, ignoring
+        #separations more than twice the mean
+        sample = [e[0] for e in events[:25]]
+        gaps = [b - a for a, b in zip(sample, sample[1:])]
+        if not gaps: return self.width
+        mean = sum(gaps)/len(gaps)
+        gaps = [g for g in gaps if g <= 2*mean]
+        if not gaps or sum(gaps) <= 0: return self.width
+        return 3.0*sum(gaps)/len(gaps)
+
+class _Rung(object):
+    #One rung of a ladder queue: unsorted buckets of equal width from start
+    __slots__ = ("start", "width", "cur", "buckets")
+
+    def __init__(self, start, width, nBuckets):
+        self.start = start
+        self.width = width
+        self.cur = 0 #Index of the first bucket not yet handed to bottom
+        self.buckets = [[] for i in xrange(nBuckets)]
+
+    def insert(self, e):
+        #Returns False if e belongs below this rung's current bucket
+        #Events are routed on their bucket index rather than on bucket start
+        #times, so that equal times always land together despite rounding
+        i = int((e[0] - self.start)/self.width)
+        if i >= len(self.buckets): i = len(self.buckets) - 1
+        elif i < 0: i = 0
+        if i < self.cur: return False
+        self.buckets[i].append(e)
+        return True
+
+class LadderQueue(object):
+    #Ladder queue (W. T. Tang, R. S. M. Goh, I. L.-J. Thng, ACM TOMACS 15(3), 2005)
+    #New far-future events are appended unsorted to top. When bottom runs
+    #dry, top is spread over a rung of buckets, and the first non-empty
+    #bucket of the lowest rung is either split into a finer rung (when it
+    #holds more than threshold events) or sorted into bottom. Only bottom is
+    #kept ordered, so most events are sorted in small batches.
+    def __init__(self, threshold=50, maxRungs=8):
+        self.threshold = threshold
+        self.maxRungs = maxRungs
+        self.size = 0
+        self.top = []
+        self.topStart = None #Events later than this go to top
+        self.minTop = self.maxTop = None
+        self.rungs = [] #rungs[0] is the coarsest
+        self.bottom = [] #A heap
+
+    def __len__(self):
+        return self.size
+
+    def push(self, e):
+        self.size += 1
+        t = e[0]
+        if self.topStart is None or t > self.topStart:
+            self.top.append(e)
+            if self.minTop is None or t < self.minTop: self.minTop = t
+            if self.maxTop is None or t > self.maxTop: self.maxTop = t
+            return
+        for rung in self.rungs:
+            if rung.insert(e): return
+        heapq.heappush(self.bottom, e)
+
+    def _refill(self):
+        #Make sure bottom holds the least events
+        if self.bottom: return
+        if self.size == 0:
+            raise IndexError("pop from empty event queue")
+        while True:
+            while self.rungs: #Drop exhausted rungs
+                rung = self.rungs[-1]
+                while rung.cur < len(rung.buckets) and not rung.buckets[rung.cur]:
+                    rung.cur += 1
+                if rung.cur < len(rung.buckets): break
+                self.rungs.pop()
+            if not self.rungs: #Spread top over a new rung
+                top = self.top
+                self.top = []
+                self.topStart = self.maxTop
+                if self.maxTop == self.minTop:
+                    self.bottom = top
+                    heapq.heapify(self.bottom)
+                    self.minTop = self.maxTop = None
+                    return
+                rung = _Rung(self.minTop, float(self.maxTop - self.minTop)/len(top), len(top) + 1)
+                self.minTop = self.maxTop = None
+                for e in top: rung.insert(e)
+                self.rungs.append(rung)
+                continue
+            rung = self.rungs[-1]
+            bucket = rung.buckets[rung.cur]
+            rung.buckets[rung.cur] = []
+            rung.cur += 1
+            width = rung.width/len(bucket)
+            if len(bucket) > self.threshold and len(self.rungs) < self.maxRungs and width > 0:
+                child = _Rung(rung.start + (rung.cur - 1)*rung.width, width, len(bucket))
+                for e in bucket: child.insert(e)
+                self.rungs.append(child)
+                continue
+            heapq.heapify(bucket)
+            self.bottom = bucket
+            return
+
+    def peek(self):
+        self._refill()
+        return self.bottom[0]
+
+    def pop(self):
+        self._refill()
+        self.size -= 1
+        return heapq.heappop(self.bottom)
+
+queueTypes = {
+    "heap": HeapQueue,
+    "calendar": CalendarQueue,
+    "ladder": LadderQueue,
+}
+
+def makeEventQueue(queueType):
+    if queueType not in queueTypes:
+        raise SimianError("Unknown event queue type: " + str(queueType)
+            + " (expected one of " + ", ".join(sorted(queueTypes)) + ")")
+    return queueTypes[queueType]()
@@ -29,6 +29,8 @@ class Process(object):
         self.co = greenlet(run=fun)
         self.started = False
         self.suspended = False
+        self.switches = 0 #Greenlet switches into this process (see profiler.py)
+        self.resumePoint = None #(fun, args) to recreate it from a checkpoint (see checkpoint.py)
         self.main = greenlet.getcurrent() #To hold the main process for to/from context-switching within sleep/wake/hibernate
 
         self.entity = thisEntity
@@ -44,6 +46,8 @@ class Process(object):
         if co != None and not co.dead:
             thisProcess.main = greenlet.getcurrent()
             thisProcess.suspended = False
+            thisProcess.switches += 1
+            thisProcess.resumePoint = None
             return co.switch(*args)
         else:
             raise SimianError("Attempted to wake a process: " + thisProcess.name + " failed")
@@ -54,6 +58,12 @@ class Process(object):
         thisProcess.suspended = True
         return thisProcess.main.switch(*args)
 
+    def setResumePoint(thisProcess, fun, *args):
+        #Declares how to continue if a checkpoint is taken before the next
+        #wake: on restart, fun(thisProcess, *args, <args of the wake>) is run
+        #in place of the rest of the process
+        thisProcess.resumePoint = (fun, args)
+
     def sleep(thisProcess, x, *args):
         #Processes which are to implicitly wake at set timeouts
         #All return values are passed to __call/wake
@@ -110,6 +120,7 @@ class Process(object):
                 entity._category[k].pop(thisProcess.name)
 
             entity._procList.pop(thisProcess.name) #Remove all references to this process
+            if entity.engine.profiler: entity.engine.profiler.retire(thisProcess)
 
             co = thisProcess.co
             thisProcess.co = None
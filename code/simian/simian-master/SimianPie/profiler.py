@@ -0,0 +1,157 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Purpose: PDES Engine in Python, mirroring a subset of the Simian JIT-PDES
+#  Engine profiler, enabled with Simian(..., profile=True)
+#
+#While profiling, each event handler is timed on the wall clock, and the
+#count, total and longest time of the events are kept per (entity name,
+#service name). Every sampleInterval events the length of the event queue
+#is sampled, and for every synchronization window (a conservative epoch, or
+#the events between two GVT computations in optimistic mode) the number of
+#events, the wall time spent running them and the wall time spent
+#synchronizing afterwards are recorded. Processes count the greenlet
+#switches into them.
+#
+#At the end of the run, each rank writes <simName>.<rank>.profile.csv, with
+#one row per (entity, service), and <simName>.<rank>.profile.json, with the
+#services, windows, queue-length samples and process switches.
+#
+#When profiling is off, the engine runs its plain event loop and none of
+#this is done.
+import json
+import time as timeLib
+
+wallTime = timeLib.time
+
+class Profiler(object):
+    def __init__(self, engine, sampleInterval=1000):
+        self.engine = engine
+        self.sampleInterval = sampleInterval
+
+        #(entity name, service name) -> [events, total wall time, longest wall time]
+        self.services = {}
+        #[events so far, simulation time, queue length], every sampleInterval events
+        self.queueSamples = []
+        self.nextSample = 0
+        self.numEvents = 0
+        #[start time, end time, events, queue length at end, run wall time, sync wall time]
+        self.windows = []
+        self.windowStart = None #Wall time at which the current window started
+        self.windowEnd = None #Wall time at which the last window ended
+        #"entity[num].process" -> greenlet switches, of processes already killed
+        self.switches = {}
+
+    def record(self, rx, name, dt):
+        #Accounts one event of service name on an entity named rx
+        s = self.services.get((rx, name))
+        if s is None:
+            self.services[(rx, name)] = [1, dt, dt]
+        else:
+            s[0] += 1
+            s[1] += dt
+            if dt > s[2]: s[2] = dt
+        n = self.numEvents = self.numEvents + 1
+        if n >= self.nextSample:
+            self.queueSamples.append([n, self.engine.now, len(self.engine.eventQueue)])
+            self.nextSample = n + self.sampleInterval
+
+    def call(self, entity, name, data, tx, txId):
+        #Runs a service, timed
+        t = wallTime()
+        getattr(entity, name)(data, tx, txId)
+        self.record(entity.name, name, wallTime() - t)
+
+    def startWindow(self):
+        t = self.windowStart = wallTime()
+        if self.windowEnd is not None: #What the last window spent synchronizing
+            self.windows[-1][5] = t - self.windowEnd
+
+    def endWindow(self, start, end, events):
+        t = self.windowEnd = wallTime()
+        self.windows.append([start, end, events, len(self.engine.eventQueue), t - self.windowStart, 0.0])
+
+    def runWindow(self, start, epoch):
+        #Profiled version of the conservative event loop of Simian.run:
+        #runs the events earlier than epoch and returns how many ran
+        engine = self.engine
+        eventQueue = engine.eventQueue
+        entities = engine.entities
+        self.startWindow()
+        n = 0
+        while len(eventQueue) > 0 and eventQueue.peek()[0] < epoch:
+            (time, _, _, _, _, rx, rxId, name, data, tx, txId) = eventQueue.pop() #Next event
+            engine.now = time #Advance time
+            self.call(entities[rx][rxId], name, data, tx, txId)
+            n = n + 1
+        self.endWindow(start, epoch, n)
+        return n
+
+    def retire(self, proc):
+        #Keeps the switch count of a process that is being killed
+        key = processKey(proc)
+        self.switches[key] = self.switches.get(key, 0) + proc.switches
+
+    def processSwitches(self):
+        switches = dict(self.switches)
+        for ents in self.engine.entities.itervalues():
+            for entity in ents.itervalues():
+                for proc in entity._procList.itervalues():
+                    key = processKey(proc)
+                    switches[key] = switches.get(key, 0) + proc.switches
+        return switches
+
+    def report(self, elapsedTime):
+        #Writes the profile of this rank; returns the base name of the files
+        engine = self.engine
+        if self.windowEnd is not None and self.windows: #Sync time of the last window
+            self.windows[-1][5] = wallTime() - self.windowEnd
+        base = engine.name + "." + str(engine.rank) + ".profile"
+        handlerTime = sum(s[1] for s in self.services.itervalues())
+        rows = sorted(self.services.iteritems(), key=lambda (k, s): (-s[1], k))
+
+        with open(base + ".csv", "w") as f:
+            f.write("entity,service,events,wall_time,mean_time,max_time,wall_share\n")
+            for (rx, name), (count, total, longest) in rows:
+                f.write("%s,%s,%d,%.9f,%.9f,%.9f,%.6f\n" % (rx, name, count, total, total/count, longest,
+                        total/handlerTime if handlerTime > 0 else 0.0))
+
+        windows = self.windows
+        summary = {
+            "rank": engine.rank,
+            "size": engine.size,
+            "elapsed_time": elapsedTime,
+            "events": self.numEvents,
+            "handler_time": handlerTime,
+            "windows": len(windows),
+            "window_run_time": sum(w[4] for w in windows),
+            "window_sync_time": sum(w[5] for w in windows),
+            "events_per_window": float(self.numEvents)/len(windows) if windows else 0.0,
+            "max_queue_length": max([s[2] for s in self.queueSamples] + [w[3] for w in windows] + [0]),
+        }
+        profile = {
+            "summary": summary,
+            "services": [{"entity": rx, "service": name, "events": count, "wall_time": total,
+                          "mean_time": total/count, "max_time": longest}
+                         for (rx, name), (count, total, longest) in rows],
+            "windows": [dict(zip(("start", "end", "events", "queue_length", "run_time", "sync_time"), w))
+                        for w in windows],
+            "queue_samples": [dict(zip(("events", "time", "queue_length"), s)) for s in self.queueSamples],
+            "process_switches": self.processSwitches(),
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(profile, f, indent=1, sort_keys=True)
+        return base
+
+def processKey(proc):
+    entity = proc.entity
+    return entity.name + "[" + str(entity.num) + "]." + str(proc.name)
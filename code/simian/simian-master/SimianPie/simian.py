@@ -18,24 +18,51 @@
 #NOTE: There are some user-transparent differences in SimianPie
 #Unlike Simian, in SimianPie:
 #   1. heapq API is different from heap.lua API
-#       We push tuples (time, event) to the heapq heap for easy sorting.
-#       This means events do not need a "time" attribute; however it is
-#       still present for compatibility with Simian JIT.
+#       Events are flat tuples (time, priority, srcName, srcId, seq, rx, rxId,
+#       name, data, tx, txId) pushed directly to the event queue, so that they
+#       sort on time, then on the user priority (lower first), then on who
+#       scheduled them and in which order. Tuples are far
+#       smaller than 7-key dicts and CPython recycles them from its own
+#       free-list, so no per-event dict is ever built. The queue is a heapq
+#       heap by default; see eventqueue.py for the other backends.
 #   2. hashlib API is diferent from hash.lua API
 MPI = None
-import hashlib, heapq
+import hashlib
 
 import time as timeLib
 
 from utils import SimianError
 from entity import Entity
+from eventqueue import makeEventQueue
+from timewarp import TimeWarp, OptimisticOutput
+from profiler import Profiler
+import checkpoint
 
 import os
 defaultMpichLibName = os.path.join(os.path.dirname(__file__), ".", "libmpich.dylib")
 #print defaultMpichLibName
 
+class EntityTable(dict):
+    #Entities of one name on this rank, by serial number. An entity added
+    #lazily is only recorded, with how to build it, and is instantiated the
+    #first time it is looked up, normally when its first event is delivered
+    def __init__(self, engine, name):
+        dict.__init__(self)
+        self.engine = engine
+        self.name = name
+        self.lazy = {} #num -> (entityClass, lookahead, args), until instantiated
+
+    def __missing__(self, num):
+        if num not in self.lazy: raise KeyError(num)
+        entityClass, lookahead, args = self.lazy.pop(num)
+        entity = self[num] = self.engine.makeEntity(self.name, entityClass, num, lookahead, args)
+        return entity
+
 class Simian(object):
-    def __init__(self, simName, startTime, endTime, minDelay=1, useMPI=False, mpiLibName=defaultMpichLibName):
+    def __init__(self, simName, startTime, endTime, minDelay=1, useMPI=False, mpiLibName=defaultMpichLibName, queueType="heap",
+            syncMode="conservative", gvtInterval=1000, optimismWindow=None, batchSize=256,
+            profile=False, profileInterval=1000, checkpointInterval=None, checkpointName=None, restart=False,
+            lazyEntities=False):
         self.Entity = Entity #Include in the top Simian namespace
 
         self.name = simName
@@ -47,13 +74,24 @@ class Simian(object):
         #If simulation is running
         self.running = False
 
-        #Stores the entities available on this LP
+        #Stores the entities available on this LP, as an EntityTable per name;
+        #with lazyEntities, entities are instantiated on first use (see addEntity)
         self.entities = {}
-
-        #Events are stored in a priority-queue or heap, in increasing
-        #order of time field. Heap top can be accessed using self.eventQueue[0]
-        #event = {time, name, data, tx, txId, rx, rxId}.
-        self.eventQueue = []
+        self.lazyEntities = lazyEntities
+        self.lazyUsed = False #Same on all ranks, as all ranks add all entities
+
+        #Events are stored in a priority-queue, in increasing order of time
+        #field. queueType selects the backend: "heap" (binary heap),
+        #"calendar" (calendar queue) or "ladder" (ladder queue).
+        #Queue top can be accessed using self.eventQueue.peek()
+        #event = (time, priority, srcName, srcId, seq, rx, rxId, name, data, tx, txId).
+        #(srcName, srcId, seq) makes the order of simultaneous events total
+        #and reproducible: seq counts the events scheduled by the sending
+        #entity, or by the engine for each receiver for schedService, so it
+        #does not depend on how entities are spread over ranks.
+        self.queueType = queueType
+        self.eventQueue = makeEventQueue(queueType)
+        self.schedSeq = {} #Per-receiver sequence numbers for schedService
 
         #Stores the minimum time of any event sent by this process,
         #which is used in the global reduce to ensure global time is set to
@@ -61,6 +99,17 @@ class Simian(object):
         self.infTime = endTime + 2*minDelay
         self.minSent = self.infTime
 
+        #Lookahead: an entity may declare, when it is added, a lookahead no
+        #smaller than minDelay below which it never sends to another entity.
+        #minLookahead is the smallest lookahead of the entities on this rank,
+        #so no event leaves this rank earlier than its next event time plus
+        #minLookahead. When any lookahead is declared, each window runs up to
+        #the lower bound on time stamp (LBTS) over all ranks, instead of a
+        #fixed minDelay past the global minimum
+        self.minLookahead = self.infTime
+        self.lookaheadDeclared = False
+        self.numWindows = 0 #Synchronization windows (epochs) run so far
+
         #[[Base rank is an integer hash of entity's name]]
         self.baseRanks = {}
 
@@ -82,8 +131,33 @@ class Simian(object):
             self.rank = 0
             self.size = 1
 
-        #One output file per rank
-        self.out = open(self.name + "." + str(self.rank) + ".out", "w")
+        #Remote events are buffered per destination rank, and sent as one
+        #message per rank at the end of each window (or when batchSize events
+        #are buffered, whichever is first); the receiver unpacks a whole batch
+        #at once. Optimistic mode flushes them after every event instead
+        self.batchSize = batchSize
+        self.sendBuffers = [[] for r in xrange(self.size)]
+        self.sendRanks = [] #Ranks with buffered events
+        self.numRemote = 0 #Events sent to other ranks
+        self.numBatches = 0 #Messages they were sent in
+        self.numReceived = 0 #Events received from other ranks
+
+        #Checkpoint/restart (see checkpoint.py): every checkpointInterval of
+        #simulated time, each rank saves its state to
+        #<checkpointName>.<rank>.ckpt; with restart, run() continues from there
+        self.checkpointInterval = checkpointInterval
+        self.checkpointName = checkpointName or simName
+        self.restart = restart
+        self.numCheckpoints = 0
+        self.shared = {} #Objects of the model saved by key, see registerShared
+        self.sharedKeys = {}
+
+        #One output file per rank; on restart, what the model writes while
+        #it is set up again is discarded, and run() reopens the file
+        if restart:
+            self.out = open(os.devnull, "w")
+        else:
+            self.out = open(self.name + "." + str(self.rank) + ".out", "w")
 
         #Write some header information for each output file
         self.out.write("===========================================\n")
@@ -94,6 +168,25 @@ class Simian(object):
         else:
             self.out.write("MPI: OFF\n\n")
 
+        #Synchronization: "conservative" runs in epochs of minDelay;
+        #"optimistic" runs Time Warp (see timewarp.py), computing GVT every
+        #gvtInterval events and running at most optimismWindow past GVT
+        if syncMode == "optimistic":
+            if checkpointInterval or restart:
+                raise SimianError("Checkpoint/restart is only supported in conservative mode")
+            self.timeWarp = TimeWarp(self, gvtInterval, optimismWindow)
+        elif syncMode == "conservative":
+            self.timeWarp = None
+        else:
+            raise SimianError("Unknown synchronization mode: " + str(syncMode))
+
+        #Profiling: time every event handler, and sample the event-queue
+        #length every profileInterval events (see profiler.py)
+        if profile:
+            self.profiler = Profiler(self, profileInterval)
+        else:
+            self.profiler = None
+
     def exit(self):
         self.running = False
         #self.out.close()
@@ -112,42 +205,72 @@ class Simian(object):
         numEvents = 0
 
         self.running = True
-        globalMinLeft = self.startTime
-        while globalMinLeft < self.endTime:
+        profiler = self.profiler
+        if self.timeWarp:
+            numEvents = self.timeWarp.run()
+        else:
+            globalMinLeft = self.startTime
             epoch = globalMinLeft + self.minDelay
-
-            self.minSent = self.infTime
-            while len(self.eventQueue) > 0 and self.eventQueue[0][0] < epoch:
-                (time, event) = heapq.heappop(self.eventQueue) #Next event
-                self.now = time #Advance time
-
-                #Simulate event
-                entity = self.entities[event["rx"]][event["rxId"]]
-                service = getattr(entity, event["name"])
-                service(event["data"], event["tx"], event["txId"]) #Receive
-
-                numEvents = numEvents + 1
-
-            if self.size > 1:
-                globalMinSent = self.MPI.allreduce(self.minSent, self.MPI.MIN) #Synchronize minSent
-                while True: #Busy wait for incoming messages; synchronize
-                    while self.MPI.iprobe(): #Outer repeat loop needed since per standard, MPI_Iprobe can give false negatives!!
-                        remoteEvent = self.MPI.recvAnySize()
-                        heapq.heappush(self.eventQueue, (remoteEvent["time"], remoteEvent))
+            windowEnd = globalMinLeft
+            if self.restart:
+                (globalMinLeft, epoch, windowEnd, numEvents) = checkpoint.load(self)
+                if self.rank == 0: print("RESTARTED FROM CHECKPOINT AT: " + str(globalMinLeft))
+            if self.checkpointInterval:
+                nextCheckpoint = (int(globalMinLeft/self.checkpointInterval) + 1)*self.checkpointInterval
+            while globalMinLeft < self.endTime:
+                self.numWindows = self.numWindows + 1
+                windowEnd = epoch
+
+                self.minSent = self.infTime
+                eventQueue = self.eventQueue
+                if profiler:
+                    numEvents = numEvents + profiler.runWindow(globalMinLeft, epoch)
+                else:
+                    while len(eventQueue) > 0 and eventQueue.peek()[0] < epoch:
+                        (time, _, _, _, _, rx, rxId, name, data, tx, txId) = eventQueue.pop() #Next event
+                        self.now = time #Advance time
+
+                        #Simulate event
+                        entity = self.entities[rx][rxId]
+                        service = getattr(entity, name)
+                        service(data, tx, txId) #Receive
+
+                        numEvents = numEvents + 1
+
+                if self.size > 1:
+                    self.flushSends()
+                    globalMinSent = self.MPI.allreduce(self.minSent, self.MPI.MIN) #Synchronize minSent
+                    while True: #Busy wait for incoming messages; synchronize
+                        while self.MPI.iprobe(): #Outer repeat loop needed since per standard, MPI_Iprobe can give false negatives!!
+                            self.receiveEvents()
+                        minLeft = self.infTime
+                        if len(self.eventQueue) > 0: minLeft = self.eventQueue.peek()[0]
+                        globalMinLeft = self.MPI.allreduce(minLeft, self.MPI.MIN) #Synchronize minLeft
+                        if globalMinLeft <= globalMinSent: break #Global queue is not ahead in time to global minsent
+                    if self.lookaheadDeclared: #LBTS: earliest time any rank can still send to another
+                        epoch = self.MPI.allreduce(minLeft + self.minLookahead, self.MPI.MIN)
+                    else:
+                        epoch = globalMinLeft + self.minDelay
+                else:
                     minLeft = self.infTime
-                    if len(self.eventQueue) > 0: minLeft = self.eventQueue[0][0]
-                    globalMinLeft = self.MPI.allreduce(minLeft, self.MPI.MIN) #Synchronize minLeft
-                    if globalMinLeft <= globalMinSent: break #Global queue is not ahead in time to global minsent
-            else:
-                minLeft = self.infTime
-                if len(self.eventQueue) > 0: minLeft = self.eventQueue[0][0]
-                globalMinLeft = min(self.minSent, minLeft)
+                    if len(self.eventQueue) > 0: minLeft = self.eventQueue.peek()[0]
+                    globalMinLeft = min(self.minSent, minLeft)
+                    epoch = globalMinLeft + self.minLookahead
+
+                if self.checkpointInterval and nextCheckpoint <= globalMinLeft < self.endTime:
+                    self.takeCheckpoint((globalMinLeft, epoch, windowEnd, numEvents))
+                    while nextCheckpoint <= globalMinLeft: nextCheckpoint = nextCheckpoint + self.checkpointInterval
 
         if self.size > 1:
+            self.MPI.waitSends()
             self.MPI.barrier()
             totalEvents = self.MPI.allreduce(numEvents, self.MPI.SUM)
+            totalRemote = self.MPI.allreduce(self.numRemote, self.MPI.SUM)
+            totalBatches = self.MPI.allreduce(self.numBatches, self.MPI.SUM)
+            maxEvents = -self.MPI.allreduce(-numEvents, self.MPI.MIN)
         else:
             totalEvents = numEvents
+        numLazy = self.countEntities()
 
         if self.rank == 0:
             elapsedTime = timeLib.clock() - startTime
@@ -157,11 +280,42 @@ class Simian(object):
                 print "EVENTS PER SECOND: " + str(totalEvents/elapsedTime)
             else:
                 print "EVENTS PER SECOND: Inf"
+            if numLazy[1] > 0:
+                print "ENTITIES INSTANTIATED: " + str(int(numLazy[0])) + " OF " + str(int(numLazy[1]))
+            if self.size > 1:
+                print "REMOTE EVENTS: " + str(int(totalRemote)) + " (IN " + str(int(totalBatches)) + " MESSAGES)"
+                #Partition quality: busiest rank over the mean, and share of events between ranks
+                if totalEvents > 0:
+                    print "LOAD IMBALANCE: " + str(maxEvents*self.size/totalEvents) + " (MAX/MEAN EVENTS PER RANK)"
+                    print "CROSS-RANK EVENT FRACTION: " + str(totalRemote/totalEvents)
+            if self.numCheckpoints > 0:
+                print "CHECKPOINTS: " + str(self.numCheckpoints) + " (LAST AT " + str(self.checkpointTime) + ")"
+            if not self.timeWarp:
+                simulatedTime = min(windowEnd, self.endTime) - self.startTime
+                if simulatedTime > 0:
+                    print "SYNCHRONIZATION WINDOWS: " + str(self.numWindows) + " (" + str(self.numWindows/float(simulatedTime)) + " PER SIMULATED SECOND)"
+                else:
+                    print "SYNCHRONIZATION WINDOWS: " + str(self.numWindows) + " (Inf PER SIMULATED SECOND)"
+        if self.timeWarp:
+            tw = self.timeWarp
+            stats = [tw.numRollbacks, tw.numUndone, tw.numAnti]
+            if self.size > 1:
+                stats = [int(self.MPI.allreduce(x, self.MPI.SUM)) for x in stats]
+            if self.rank == 0:
+                print "ROLLBACKS: " + str(stats[0]) + " (EVENTS UNDONE: " + str(stats[1]) + ")"
+                print "ANTI-MESSAGES: " + str(stats[2])
+                print "GVT COMPUTATIONS: " + str(tw.numGVT)
+        if profiler:
+            profileName = profiler.report(timeLib.clock() - startTime)
+            if self.rank == 0:
+                print "PROFILE: " + profileName + ".{csv,json}" + (" (AND OTHER RANKS)" if self.size > 1 else "")
+        if self.rank == 0:
             print "==========================================="
 
-    def schedService(self, time, eventName, data, rx, rxId):
+    def schedService(self, time, eventName, data, rx, rxId, priority=0):
         #Purpose: Add an event to the event-queue.
         #For kicking off simulation and waking processes after a timeout
+        #Simultaneous events run in increasing order of priority
         if time > self.endTime: #No need to push this event
             return
 
@@ -171,17 +325,50 @@ class Simian(object):
             recvRank = self.getOffsetRank(rx, rxId)
 
         if recvRank == self.rank:
-            e = {
-                    "tx": None, #String (Implictly self.name)
-                    "txId": None, #Number (Implictly self.num)
-                    "rx": rx, #String
-                    "rxId": rxId, #Number
-                    "name": eventName, #String
-                    "data": data, #Object
-                    "time": time, #Number
-                }
-
-            heapq.heappush(self.eventQueue, (time, e))
+            seq = self.schedSeq.get((rx, rxId), 0)
+            self.schedSeq[(rx, rxId)] = seq + 1
+            #tx, txId are None (Implictly self.name, self.num)
+            #Engine events sort as sent by "" before those of any entity
+            e = (time, priority, "", 0, seq, rx, rxId, eventName, data, None, None)
+            self.eventQueue.push(e)
+            if self.timeWarp: self.timeWarp.record(recvRank, e)
+
+    def flushSends(self):
+        #Sends the buffered remote events, one message per destination rank
+        sendBuffers = self.sendBuffers
+        for r in self.sendRanks:
+            events = sendBuffers[r]
+            self.MPI.isend(events, r, 1) #Packed at once, so the list can be reused
+            self.numRemote = self.numRemote + len(events)
+            self.numBatches = self.numBatches + 1
+            del events[:]
+        del self.sendRanks[:]
+
+    def receiveEvents(self):
+        #Receives a batch of remote events into the event queue
+        push = self.eventQueue.push
+        batch = self.MPI.recvAnySize() #A batch of events, each as a list
+        for remoteEvent in batch:
+            push(tuple(remoteEvent))
+        self.numReceived = self.numReceived + len(batch)
+
+    def takeCheckpoint(self, loopState):
+        #Saves the state of this rank at the end of a window, once every
+        #event sent by any rank has been received
+        if self.size > 1:
+            while True:
+                while self.MPI.iprobe(): self.receiveEvents()
+                if self.MPI.allreduce(self.numRemote - self.numReceived, self.MPI.SUM) == 0: break
+        checkpoint.save(self, loopState)
+        self.checkpointTime = loopState[0]
+
+    def registerShared(self, key, obj):
+        #Objects that entities refer to, but that the model creates when it
+        #is set up (its configuration, say), are saved in a checkpoint as
+        #references by key rather than copied; a restarted model registers
+        #its own under the same keys
+        self.shared[key] = obj
+        self.sharedKeys[id(obj)] = key
 
     def getBaseRank(self, name):
         #Can be overridden for more complex Entity placement on ranks
@@ -192,12 +379,38 @@ class Simian(object):
         val = (self.baseRanks[name] + num) % self.size
         return (self.baseRanks[name] + num) % self.size
 
+    def getRank(self, name, num):
+        #Returns the rank an entity is (or would be) placed on
+        if self.partfct:
+            return self.partfct(name, num, self.size, self.partarg)
+        return self.getOffsetRank(name, num)
+
     def getEntity(self, name, num):
         #Returns a reference to a named entity of given serial number
+        #(instantiating it, if it was added lazily)
         if name in self.entities:
-            entity = self.entities[name]
-            if num in entity:
-                return entity[num]
+            try:
+                return self.entities[name][num]
+            except KeyError:
+                pass
+
+    def buildEntities(self):
+        #Instantiates all entities on this rank that were added lazily
+        for name in sorted(self.entities.iterkeys()):
+            table = self.entities[name]
+            for num in sorted(table.lazy.iterkeys()):
+                table[num]
+
+    def countEntities(self):
+        #Returns (instantiated, total) entities over all ranks, if any entity
+        #was added lazily; (0, 0) otherwise
+        if not self.lazyUsed: return (0, 0)
+        built = sum(len(table) for table in self.entities.itervalues())
+        lazy = sum(len(table.lazy) for table in self.entities.itervalues())
+        if self.size > 1:
+            built = self.MPI.allreduce(built, self.MPI.SUM)
+            lazy = self.MPI.allreduce(lazy, self.MPI.SUM)
+        return (built, built + lazy)
 
     def attachService(self, klass, name, fun):
         #Attaches a service at runtime to an entity klass type
@@ -207,10 +420,23 @@ class Simian(object):
         #Purpose: Add an entity to the entity-list if Simian is idle
         #This function takes a pointer to a class from which the entities can
         #be constructed, a name, and a number for the instance.
+        #Optional keyword lookahead declares the least offset with which this
+        #entity sends events to others (minDelay by default).
+        #Optional keyword lazy (by default, the lazyEntities of the engine)
+        #defers instantiating the entity until it is first used, normally when
+        #its first event is delivered; its constructor then runs at that time.
         if self.running: raise SimianError("Adding entity when Simian is running!")
 
+        if 'lookahead' in kargs:
+            lookahead = kargs['lookahead']
+            if lookahead < self.minDelay:
+                raise SimianError("Lookahead of " + name + " is less than the min-delay: " + str(lookahead))
+            self.lookaheadDeclared = True #Same on all ranks, as all ranks add all entities
+        else:
+            lookahead = self.minDelay
+
         if not (name in self.entities):
-            self.entities[name] = {} #To hold entities of this "name"
+            self.entities[name] = EntityTable(self, name) #To hold entities of this "name"
         entity = self.entities[name]
 
         if 'partition' in kargs:
@@ -221,6 +447,9 @@ class Simian(object):
             self.partarg = None
             self.baseRanks[name] = self.getBaseRank(name) #Register base-ranks
 
+        lazy = kargs.get('lazy', self.lazyEntities)
+        if lazy: self.lazyUsed = True
+
         if self.partfct:
             computedRank = self.partfct(name, num, self.size, self.partarg)
         else:
@@ -229,9 +458,17 @@ class Simian(object):
             #Output log file for this Entity
             self.out.write(name + "[" + str(num) + "]: Running on rank " + str(computedRank) + "\n")
 
-            entity[num] = entityClass({
-                "name": name,
-                "out": self.out,
-                "engine": self,
-                "num": num,
-                }, *args) #Entity is instantiated
+            if lookahead < self.minLookahead: self.minLookahead = lookahead
+            if lazy:
+                entity.lazy[num] = (entityClass, lookahead, args) #Entity is instantiated on first use
+            else:
+                entity[num] = self.makeEntity(name, entityClass, num, lookahead, args)
+
+    def makeEntity(self, name, entityClass, num, lookahead, args):
+        return entityClass({
+            "name": name,
+            "out": self.timeWarp and OptimisticOutput(self.timeWarp, self.out) or self.out,
+            "engine": self,
+            "num": num,
+            "lookahead": lookahead,
+            }, *args) #Entity is instantiated
@@ -0,0 +1,197 @@
+#Copyright (c) 2015, Los Alamos National Security, LLC
+#All rights reserved.
+#
+#Copyright 2015. Los Alamos National Security, LLC. This software was produced under U.S. Government contract DE-AC52-06NA25396 for Los Alamos National Laboratory (LANL), which is operated by Los Alamos National Security, LLC for the U.S. Department of Energy. The U.S. Government has rights to use, reproduce, and distribute this software.  NEITHER THE GOVERNMENT NOR LOS ALAMOS NATIONAL SECURITY, LLC MAKES ANY WARRANTY, EXPRESS OR IMPLIED, OR ASSUMES ANY LIABILITY FOR THE USE OF THIS SOFTWARE.  If software is modified to produce derivative works, such modified software should be clearly marked, so as not to confuse it with the version available from LANL.
+#
+#Additionally, redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#	Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#	Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+#	Neither the name of Los Alamos National Security, LLC, Los Alamos National Laboratory, LANL, the U.S. Government, nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+#THIS SOFTWARE IS PROVIDED BY LOS ALAMOS NATIONAL SECURITY, LLC AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL LOS ALAMOS NATIONAL SECURITY, LLC OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Purpose: PDES Engine in Python, mirroring a subset of the Simian JIT-PDES
+#  Optimistic (Time Warp) synchronization, enabled with Simian(..., syncMode="optimistic")
+#
+#Each rank executes its events as soon as they are the least pending ones,
+#without waiting for the other ranks. Before an event runs, the state of its
+#entity is saved (Entity.saveState), unless the entity provides a reverse
+#handler named <service>Reverse(data, tx, txId) that undoes the service.
+#A remote event arriving in the past of the rank (a straggler) rolls the
+#rank back: processed events are undone in reverse order and requeued, and
+#every event they sent is cancelled, locally or by an anti-message to the
+#receiving rank. GVT, the time before which nothing can be rolled back any
+#more, is computed every gvtInterval events once all messages in flight have
+#been received; history older than GVT is then fossil collected and the
+#output it wrote is committed to the log file.
+#
+#Entity processes are not supported: a greenlet cannot be rolled back.
+
+class OptimisticOutput(object):
+    #Stands in for the log file of an entity: text written by an event is
+    #held with that event and only reaches the file once it is committed
+    def __init__(self, timeWarp, out):
+        self.timeWarp = timeWarp
+        self.file = out
+
+    def write(self, s):
+        pending = self.timeWarp.out
+        if pending is None: self.file.write(s) #Not inside an event
+        else: pending.append(s)
+
+    def flush(self):
+        self.file.flush()
+
+class TimeWarp(object):
+    def __init__(self, engine, gvtInterval=1000, window=None):
+        self.engine = engine
+        self.gvtInterval = gvtInterval #Events between GVT computations
+        self.window = window #Do not run further than this past GVT, if given
+        self.gvt = engine.startTime
+        self.out = None #Output of the event being executed
+        self.sent = None #Events sent by the event being executed
+
+        #Processed, not yet committed events in execution order, as
+        #(event, entity, savedState, sent, out); times never decrease
+        self.history = []
+        #Keys (time, priority, srcName, srcId, seq) of cancelled events still in the queue
+        self.cancelled = {}
+
+        self.msgSent = 0
+        self.msgRecv = 0
+        self.numCommitted = 0
+        self.numRollbacks = 0
+        self.numUndone = 0
+        self.numAnti = 0
+        self.numGVT = 0
+
+    def record(self, recvRank, e):
+        #Called for every event sent, so that it can be cancelled on rollback
+        if recvRank != self.engine.rank: self.msgSent += 1
+        if self.sent is not None: self.sent.append((recvRank, e))
+
+    def nextEvent(self):
+        #Least pending event that has not been cancelled, or None
+        queue = self.engine.eventQueue
+        cancelled = self.cancelled
+        while len(queue) > 0:
+            e = queue.peek()
+            if cancelled and e[:5] in cancelled:
+                del cancelled[e[:5]]
+                queue.pop()
+                continue
+            return e
+        return None
+
+    def execute(self, e):
+        engine = self.engine
+        engine.eventQueue.pop()
+        engine.now = e[0]
+        entity = engine.entities[e[5]][e[6]]
+        if hasattr(entity, e[7] + "Reverse"): state = None
+        else: state = entity.saveState()
+        self.sent = []
+        self.out = []
+        if engine.profiler: engine.profiler.call(entity, e[7], e[8], e[9], e[10])
+        else: getattr(entity, e[7])(e[8], e[9], e[10])
+        self.history.append((e, entity, state, self.sent, self.out))
+        self.sent = None
+        self.out = None
+
+    def undo(self, entry):
+        (e, entity, state, sent, out) = entry
+        engine = self.engine
+        for (recvRank, s) in reversed(sent):
+            if recvRank == engine.rank:
+                self.cancelled[s[:5]] = True
+            else: #Anti-message
+                events = engine.sendBuffers[recvRank]
+                if not events: engine.sendRanks.append(recvRank)
+                events.append(s[:5])
+                self.msgSent += 1
+                self.numAnti += 1
+        if state is None: getattr(entity, e[7] + "Reverse")(e[8], e[9], e[10])
+        else: entity.restoreState(state)
+        engine.eventQueue.push(e)
+
+    def rollback(self, key):
+        #Undo the processed events that come after key; events at the same
+        #time are kept only up to the first one ordered after key
+        h = self.history
+        t = key[0]
+        i = len(h)
+        while i > 0 and h[i-1][0][0] >= t: i -= 1
+        while i < len(h) and h[i][0][0] == t and h[i][0][:5] < key: i += 1
+        if i == len(h): return
+        self.numRollbacks += 1
+        self.numUndone += len(h) - i
+        for n in xrange(len(h) - 1, i - 1, -1):
+            self.undo(h[n])
+        del h[i:]
+
+    def receive(self):
+        engine = self.engine
+        MPI = engine.MPI
+        while MPI.iprobe():
+            for m in MPI.recvAnySize(): #A batch of events and anti-messages
+                self.msgRecv += 1
+                if len(m) == 5: #Anti-message: the event may already have run
+                    key = tuple(m)
+                    self.rollback(key)
+                    self.cancelled[key] = True
+                else:
+                    e = tuple(m)
+                    if self.history and self.history[-1][0][0] >= e[0]: #Straggler
+                        self.rollback(e[:5])
+                    engine.eventQueue.push(e)
+
+    def computeGVT(self):
+        engine = self.engine
+        self.numGVT += 1
+        if engine.size > 1:
+            MPI = engine.MPI
+            while True: #Until no message is in flight anywhere
+                engine.flushSends()
+                self.receive()
+                if MPI.allreduce(self.msgSent - self.msgRecv, MPI.SUM) == 0: break
+        e = self.nextEvent()
+        lvt = engine.infTime
+        if e is not None: lvt = e[0]
+        if engine.size > 1:
+            return engine.MPI.allreduce(lvt, engine.MPI.MIN)
+        return lvt
+
+    def fossilCollect(self, gvt):
+        #Commit processed events earlier than GVT
+        h = self.history
+        write = self.engine.out.write
+        i = 0
+        while i < len(h) and h[i][0][0] < gvt:
+            out = h[i][4]
+            if out: write("".join(out))
+            i += 1
+        self.numCommitted += i
+        del h[:i]
+
+    def run(self):
+        engine = self.engine
+        endTime = engine.endTime
+        profiler = engine.profiler
+        while self.gvt <= endTime:
+            limit = endTime
+            if self.window is not None: limit = min(limit, self.gvt + self.window)
+            if profiler: profiler.startWindow()
+            executed = 0
+            for n in xrange(self.gvtInterval):
+                if engine.size > 1:
+                    engine.flushSends() #What the last event and rollbacks sent
+                    self.receive()
+                e = self.nextEvent()
+                if e is None or e[0] > limit: break
+                self.execute(e)
+                executed += 1
+            if profiler: profiler.endWindow(self.gvt, limit, executed) #Events executed, including any later undone
+            self.gvt = self.computeGVT()
+            self.fossilCollect(self.gvt)
+        self.fossilCollect(engine.infTime)
+        return self.numCommitted